@@ -9,6 +9,7 @@ behind nginx at ``/mcp`` (e.g. https://atlas.seas.upenn.edu/mcp).
 """
 
 import asyncio
+import hashlib
 from typing import Literal, Optional
 
 from fastmcp import Context, FastMCP
@@ -306,11 +307,28 @@ if config.ALLOW_LOCAL_FILES:
                 "openai_json_schema", or "anthropic_json_schema". Defaults to
                 "openai_json_schema".
 
-        Returns a mapping of filename to processing task id. Track progress with
-        `wait_for_papers` or `get_paper_status`, then read values with
-        `get_project_results`.
+        Returns a mapping of filename to processing task id. Track progress
+        with `wait_for_papers` or `get_paper_status`, then read values with
+        `get_project_results`. A PDF the user already has in Atlas is not
+        uploaded again; it is added to the project and queued straight away.
         """
         filename, content = read_local_pdf(file_path)
+        check = await atlas_request(
+            "POST",
+            "/assistant/check_papers",
+            json={
+                "papers": [
+                    {
+                        "sha256": hashlib.sha256(content).hexdigest(),
+                        "filename": filename,
+                    }
+                ],
+                "project_id": project_id,
+                "strategy_type": strategy_type,
+            },
+        )
+        if check.get("tasks"):
+            return check["tasks"]
         return await atlas_upload(
             "/assistant/add_paper",
             files=[("files[]", (filename, content, "application/pdf"))],
@@ -501,20 +519,29 @@ async def reprocess_paper(
 
 @mcp.tool
 async def reprocess_project(
-    project_id: str, strategy_type: str = "json_schema"
+    project_id: str, strategy_type: str = "json_schema", mode: str = "sync"
 ) -> dict:
     """Re-run feature extraction for every paper in a project.
 
-    Returns a per-paper mapping of task ids; follow them with `wait_for_papers`.
+    In "sync" mode, returns a per-paper mapping of task ids; follow them with
+    `wait_for_papers`. "concurrent" mode runs the papers in parallel inside one
+    worker (usually faster for large projects) and returns a single `task_id`
+    to pass to `wait_for_papers`. In "batch" mode the whole project is
+    submitted to the provider's batch API at a lower price; results typically
+    take minutes to hours and show up in `get_project_results` as they are
+    ingested.
 
     Args:
         project_id: The id of the project whose papers should be reprocessed.
         strategy_type: Extraction strategy. Defaults to "json_schema".
+        mode: "sync" (default), "concurrent" or "batch". Batch mode needs a
+            JSON-schema strategy ("json_schema", "openai_json_schema" or
+            "anthropic_json_schema").
     """
     return await atlas_request(
         "POST",
         f"/assistant/reprocess_project/{project_id}",
-        json={"strategy_type": strategy_type, "sid": ""},
+        json={"strategy_type": strategy_type, "sid": "", "mode": mode},
     )
 
 
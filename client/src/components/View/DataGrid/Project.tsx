@@ -182,27 +182,79 @@ const Project: React.FC = () => {
     }
   }
 
+  // Ask the server which files it already stores (by SHA-256). Stored papers
+  // are queued for this project right away; only the rest need uploading.
+  // Files are hashed one at a time so only one is held in memory at once.
+  const checkStoredPapers = async (files: File[], strategyType: string) => {
+    const papers: { sha256: string; filename: string; file: File }[] = []
+    for (const file of files) {
+      const digest = await crypto.subtle.digest('SHA-256', await file.arrayBuffer())
+      const sha256 = Array.from(new Uint8Array(digest), (byte) =>
+        byte.toString(16).padStart(2, '0'),
+      ).join('')
+      papers.push({ sha256, filename: file.name, file })
+    }
+    const response = await api.post('/assistant/check_papers', {
+      papers: papers.map(({ sha256, filename }) => ({ sha256, filename })),
+      project_id: params.project_id,
+      strategy_type: strategyType,
+      sid: socket?.id || '',
+    })
+    const stored = response.data as {
+      existing: { sha256: string; task_id?: string }[]
+      missing: { sha256: string }[]
+    }
+    // Match by digest: different files may share a name.
+    const missing = new Set(stored.missing.map((paper) => paper.sha256))
+    const tasks: Record<string, string> = {}
+    for (const paper of stored.existing) {
+      if (paper.task_id) tasks[paper.sha256] = paper.task_id
+    }
+    return {
+      tasks,
+      toUpload: papers.filter((paper) => missing.has(paper.sha256)).map((paper) => paper.file),
+    }
+  }
+
   const handleBackend = async (files: FileList) => {
     if (!params.project_id) return
 
-    const data = new FormData()
-    for (const file of files) {
-      data.append('files[]', file, file.name)
-    }
-    data.append('sid', socket?.id || '')
-    data.append('project_id', params.project_id)
-    data.append('strategy_type', 'openai_json_schema') // 'openai_json_schema', 'anthropic_json_schema', or 'assistant_api' for backend processing
+    const strategyType = 'openai_json_schema' // 'openai_json_schema', 'anthropic_json_schema', or 'assistant_api' for backend processing
 
     try {
       toast.loading('Uploading files...')
-      const response = await api.post('/assistant/add_paper', data)
+      let tasks: Record<string, string> = {}
+      let toUpload = Array.from(files)
+      try {
+        const stored = await checkStoredPapers(toUpload, strategyType)
+        tasks = stored.tasks
+        toUpload = stored.toUpload
+      } catch (error) {
+        // Hashing needs a secure context; without it, just upload everything.
+        console.warn('Paper pre-check failed, uploading all files:', error)
+      }
 
-      if (response.status === 200) {
+      let uploaded = true
+      if (toUpload.length) {
+        const data = new FormData()
+        for (const file of toUpload) {
+          data.append('files[]', file, file.name)
+        }
+        data.append('sid', socket?.id || '')
+        data.append('project_id', params.project_id)
+        data.append('strategy_type', strategyType)
+
+        const response = await api.post('/assistant/add_paper', data)
+        uploaded = response.status === 200
+        if (uploaded) tasks = { ...tasks, ...response.data }
+      }
+
+      if (uploaded) {
         toast.dismiss()
         toast.success('Files uploaded successfully!')
-        setTasksMapping(response.data)
+        setTasksMapping(tasks)
 
-        const taskIds = Object.values(response.data)
+        const taskIds = Object.values(tasks)
         const toastId = toast.loading(`Processing ${taskIds.length} tasks...`)
 
         const waitForTasksCompletion = new Promise<void>((resolve) => {
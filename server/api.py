@@ -15,6 +15,7 @@ from sanic import json as json_response
 from sanic.request import Request
 from sanic.worker.manager import WorkerManager
 from sanic_ext import Extend
+from workers.services.pdf_cache import cache_stats
 
 load_dotenv()
 
@@ -102,6 +103,15 @@ async def health_check(_request: Request):
     return json_response({"status": "ok"}, status=200)
 
 
+@app.get("/health/pdf_cache")
+@health_docs.pdf_cache_stats
+async def pdf_cache_stats(_request: Request):
+    """
+    Hit rate and fill/eviction counters of the workers' PDF cache.
+    """
+    return json_response(cache_stats(), status=200)
+
+
 @sio.on("connect", namespace="/home")
 async def handle_connect(sid, _environ, _auth):
     """
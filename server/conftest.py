@@ -98,3 +98,34 @@ def patch_auth_user(monkeypatch, fake_user):
     fake_user_model = SimpleNamespace(email=_EmailField(), find_one=_find_one)
     monkeypatch.setattr("routes.auth.User", fake_user_model)
     return fake_user
+
+
+@pytest.fixture
+def fake_storage(monkeypatch):
+    """Replace FileService with an in-memory bucket for upload routes.
+
+    ``objects`` maps keys to stored bytes; ``stored`` maps file hashes to the
+    papers ``find_papers_by_hash`` reports as already in the library.
+    """
+    from workers.services import file_s3_service
+
+    storage = SimpleNamespace(objects={}, stored={})
+
+    def _put_object(Bucket, Key, Body, **kwargs):
+        storage.objects[Key] = Body
+
+    def _delete_object(Bucket, Key):
+        storage.objects.pop(Key, None)
+
+    service = SimpleNamespace(
+        bucket_name="bucket",
+        s3_client=SimpleNamespace(
+            put_object=_put_object, delete_object=_delete_object
+        ),
+        staging_key=file_s3_service.FileService.staging_key,
+        find_papers_by_hash=lambda hashes: {
+            h: storage.stored[h] for h in hashes if h in storage.stored
+        },
+    )
+    monkeypatch.setattr(file_s3_service, "FileService", lambda: service)
+    return storage
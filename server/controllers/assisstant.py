@@ -2,29 +2,43 @@
 endpoint for running the assistant
 """
 
+import asyncio
 import logging
 import os
+import re
 import uuid
-from typing import Any, Dict
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
 
 from database.models.projects import Project
 from database.models.users import User
 from openai import OpenAI
+from services.extraction_cache import (
+    ExtractionFingerprint,
+    lookup_extraction,
+    store_extraction,
+)
 from services.llm_credentials import (
     LlmCredentials,
     record_usage,
     resolve_and_check,
 )
 from services.model_pricing import micros_to_usd
+from services.pdf_preprocess import (
+    PreprocessedPaper,
+    preprocess_paper,
+    preprocess_variant,
+)
+from utils.upload_stream import S3Sink
 from workers.services.socket_emitter import SocketEmmiter
+from workers.strategies.extraction_strategy import ExtractionStrategy
 from workers.strategies.strategy_factory import ExtractionStrategyFactory
 
 logger = logging.getLogger(__name__)
 
-UPLOAD_DIRECTORY = "papers/"
-
-if not os.path.exists(UPLOAD_DIRECTORY):
-    os.makedirs(UPLOAD_DIRECTORY)
+# Most digests a single hash pre-check may look up.
+MAX_HASH_CHECK = 1000
+_SHA256 = re.compile(r"^[0-9a-f]{64}$")
 
 
 def _provider_for_strategy(strategy_type: str) -> str:
@@ -32,12 +46,170 @@ def _provider_for_strategy(strategy_type: str) -> str:
     return "anthropic" if strategy_type == "anthropic_json_schema" else "openai"
 
 
+@dataclass
+class _PreparedExtraction:
+    """Everything resolved before the provider call of one extraction."""
+
+    credentials: LlmCredentials
+    strategy: ExtractionStrategy
+    custom_prompt: Optional[str]
+    file_name: str
+    feature_ids: Optional[List[str]] = None
+    fingerprint: Optional[ExtractionFingerprint] = None
+    cached_output: Optional[Dict[str, Any]] = None
+
+
+def _prepare_extraction(
+    file_path: str,
+    project_id: str,
+    emitter: SocketEmmiter,
+    user: User,
+    strategy_type: str,
+    file_hash: Optional[str],
+    use_cache: bool,
+    feature_ids: Optional[List[str]] = None,
+) -> _PreparedExtraction:
+    """Resolve credentials, prompt and strategy, and consult the cache."""
+    provider = _provider_for_strategy(strategy_type)
+    # Resolve the key + budget decision atomically, and fail before spending
+    # money if this is a metered (platform-key) call over the monthly limit.
+    credentials: LlmCredentials = resolve_and_check(user, provider)
+
+    # The strategy factory always receives an OpenAI client built from the
+    # resolved key. OpenAI strategies use it directly; the Anthropic strategy
+    # ignores it and builds its own client from the same resolved key.
+    openai_key = (
+        credentials.api_key if provider == "openai" else os.getenv("OPENAI_API_KEY")
+    )
+    client = OpenAI(api_key=openai_key) if openai_key else OpenAI()
+
+    # Get project for custom prompt - only if project_id is provided
+    custom_prompt = None
+    if project_id and project_id.strip():
+        try:
+            project = Project.get(project_id).run()
+            if project:
+                custom_prompt = (
+                    project.prompt if project.prompt and project.prompt.strip() else None
+                )
+        except Exception as e:
+            logger.warning(
+                "Failed to fetch project %s in run_assistant_api: %s", project_id, e
+            )
+
+    # Create strategy - ensure strategy factory can handle None project_id if needed
+    # (Though we already refactored extraction strategy to allow Optional[str])
+    strategy = ExtractionStrategyFactory.create_strategy(
+        strategy_type=strategy_type,
+        client=client,
+        project_id=project_id if project_id and project_id.strip() else None,
+        emitter=emitter,
+        api_key=credentials.api_key,
+    )
+    strategy.file_hash = file_hash
+    strategy.byo_user_id = str(user.id) if credentials.is_byo else None
+
+    logger.info("Using extraction strategy: %s", strategy.get_strategy_name())
+    prepared = _PreparedExtraction(
+        credentials=credentials,
+        strategy=strategy,
+        custom_prompt=custom_prompt,
+        file_name=file_path.split("/")[-1],
+        feature_ids=feature_ids,
+    )
+
+    if file_hash:
+        schema_hash, instructions = strategy.cache_inputs(custom_prompt, feature_ids)
+        prepared.fingerprint = ExtractionFingerprint.build(
+            file_hash,
+            schema_hash,
+            strategy.MODEL,
+            instructions,
+            input_variant=preprocess_variant(),
+        )
+        if use_cache:
+            prepared.cached_output = lookup_extraction(prepared.fingerprint)
+    return prepared
+
+
+def _cached_response(
+    prepared: _PreparedExtraction, emitter: SocketEmmiter
+) -> Dict[str, Any]:
+    """Build the response for a cache hit; nothing is metered."""
+    emitter.emit_status(
+        message="Inputs unchanged, reusing previous extraction...",
+        progress=60,
+    )
+    return {
+        "file_name": prepared.file_name,
+        "output": prepared.cached_output,
+        "strategy_used": prepared.strategy.get_strategy_name(),
+        "metered": False,
+        "usd_charged": 0.0,
+        "cached": True,
+    }
+
+
+def _preprocess(
+    prepared: _PreparedExtraction, file_path: str, file_hash: Optional[str]
+) -> PreprocessedPaper:
+    """Run the optional local preprocessing and point the strategy at it."""
+    paper = preprocess_paper(file_path, file_hash)
+    prepared.strategy.paper_text = paper.text
+    if file_hash and paper.variant:
+        # Uploads of the pruned input must not be pooled with the original's.
+        prepared.strategy.file_hash = f"{file_hash}:{paper.variant}"
+    return paper
+
+
+def _finish_extraction(
+    prepared: _PreparedExtraction,
+    user: User,
+    output: Dict[str, Any],
+    preprocessing: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Any]:
+    """Cache and meter a completed extraction, and build the response.
+
+    *preprocessing* carries the savings stats of the preprocessing stage.
+    """
+    strategy = prepared.strategy
+    if prepared.fingerprint is not None:
+        store_extraction(prepared.fingerprint, strategy.get_strategy_name(), output)
+
+    # Meter the call's USD cost against the monthly budget — a no-op for BYO
+    # keys. Only reached on success, so failed/interrupted calls are never
+    # charged. Pricing uses the model the strategy actually called.
+    model = output.get("model") or ""
+    charged_micros = record_usage(
+        user,
+        prepared.credentials,
+        model=model,
+        prompt_tokens=output.get("prompt_tokens", 0) or 0,
+        completion_tokens=output.get("completion_tokens", 0) or 0,
+        cached_tokens=output.get("cached_prompt_tokens", 0) or 0,
+        cache_write_tokens=output.get("cache_write_tokens", 0) or 0,
+    )
+
+    return {
+        "file_name": prepared.file_name,
+        "output": output,
+        "strategy_used": strategy.get_strategy_name(),
+        "metered": not prepared.credentials.is_byo,
+        "usd_charged": micros_to_usd(charged_micros),
+        "cached": False,
+        "preprocessing": preprocessing,
+    }
+
+
 def run_assistant_api(
     file_path: str,
     project_id: str,
     emitter: SocketEmmiter,
     user: User,
     strategy_type: str = "assistant_api",
+    file_hash: Optional[str] = None,
+    use_cache: bool = True,
+    feature_ids: Optional[List[str]] = None,
 ) -> Dict[str, Any]:
     """
     Runs the assistant API to extract features from a paper.
@@ -47,95 +219,151 @@ def run_assistant_api(
     resulting token usage is charged against the user's monthly budget. Budget is
     verified *before* any provider call so an over-limit user fails fast.
 
+    When ``file_hash`` is given, the request is fingerprinted (paper hash,
+    schema, model, instructions) and looked up in the extraction cache first. A
+    hit returns the stored output without calling the provider and without
+    metering; a miss runs the strategy and stores its output.
+
+    On a miss the paper first goes through the optional local preprocessing
+    stage (``EXTRACTION_PREPROCESS``, see ``services.pdf_preprocess``); its
+    savings are reported under ``preprocessing`` in the response.
+
     Args:
         file_path: Path to the uploaded file
         project_id: ID of the project
         emitter: Socket emitter for progress updates
         user: The owner of the paper (for credential resolution + metering)
         strategy_type: Type of extraction strategy to use
+        file_hash: ``Paper.file_hash`` of the file, for the extraction cache
+        use_cache: Set False to skip the cache lookup and force a provider call
+        feature_ids: Extract only these features instead of the project's
 
     Returns:
         Dictionary containing extraction results
     """
-    provider = _provider_for_strategy(strategy_type)
-    # Resolve the key + budget decision atomically, and fail before spending
-    # money if this is a metered (platform-key) call over the monthly limit.
-    credentials: LlmCredentials = resolve_and_check(user, provider)
-
-    # The strategy factory always receives an OpenAI client built from the
-    # resolved key. OpenAI strategies use it directly; the Anthropic strategy
-    # ignores it and builds its own client from the same resolved key.
-    openai_key = (
-        credentials.api_key if provider == "openai" else os.getenv("OPENAI_API_KEY")
+    prepared = _prepare_extraction(
+        file_path,
+        project_id,
+        emitter,
+        user,
+        strategy_type,
+        file_hash,
+        use_cache,
+        feature_ids,
     )
-    client = OpenAI(api_key=openai_key) if openai_key else OpenAI()
-
     try:
-        # Get project for custom prompt - only if project_id is provided
-        project = None
-        custom_prompt = None
-        if project_id and project_id.strip():
-            try:
-                project = Project.get(project_id).run()
-                if project:
-                    custom_prompt = (
-                        project.prompt
-                        if project.prompt and project.prompt.strip()
-                        else None
-                    )
-            except Exception as e:
-                logger.warning(
-                    "Failed to fetch project %s in run_assistant_api: %s", project_id, e
-                )
+        if prepared.cached_output is not None:
+            return _cached_response(prepared, emitter)
 
-        # Create strategy - ensure strategy factory can handle None project_id if needed
-        # (Though we already refactored extraction strategy to allow Optional[str])
-        strategy = ExtractionStrategyFactory.create_strategy(
-            strategy_type=strategy_type,
-            client=client,
-            project_id=project_id if project_id and project_id.strip() else None,
-            emitter=emitter,
-            api_key=credentials.api_key,
-        )
+        # Execute extraction
+        paper = _preprocess(prepared, file_path, file_hash)
+        try:
+            output = prepared.strategy.extract(
+                file_path=paper.file_path,
+                custom_prompt=prepared.custom_prompt,
+                feature_ids=prepared.feature_ids,
+            )
+        finally:
+            paper.cleanup()
+        return _finish_extraction(prepared, user, output, paper.stats)
 
-        logger.info("Using extraction strategy: %s", strategy.get_strategy_name())
+    except Exception as e:
+        logger.error("Error in run_assistant_api: %s", e)
+        raise
 
-        # Execute extraction
-        output = strategy.extract(
-            file_path=file_path,
-            custom_prompt=custom_prompt,
+
+async def arun_assistant_api(
+    file_path: str,
+    project_id: str,
+    emitter: SocketEmmiter,
+    user: User,
+    strategy_type: str = "assistant_api",
+    file_hash: Optional[str] = None,
+    use_cache: bool = True,
+    feature_ids: Optional[List[str]] = None,
+) -> Dict[str, Any]:
+    """
+    Async counterpart of ``run_assistant_api``, with the same credential,
+    cache and metering behaviour.
+
+    The provider call goes through the strategy's ``aextract`` so many papers
+    can be in flight on one event loop; the blocking database work before and
+    after it runs in a worker thread.
+    """
+    prepared = await asyncio.to_thread(
+        _prepare_extraction,
+        file_path,
+        project_id,
+        emitter,
+        user,
+        strategy_type,
+        file_hash,
+        use_cache,
+        feature_ids,
+    )
+    try:
+        if prepared.cached_output is not None:
+            return _cached_response(prepared, emitter)
+
+        paper = await asyncio.to_thread(_preprocess, prepared, file_path, file_hash)
+        try:
+            output = await prepared.strategy.aextract(
+                file_path=paper.file_path,
+                custom_prompt=prepared.custom_prompt,
+                feature_ids=prepared.feature_ids,
+            )
+        finally:
+            paper.cleanup()
+        return await asyncio.to_thread(
+            _finish_extraction, prepared, user, output, paper.stats
         )
 
-        # Meter the call's USD cost against the monthly budget — a no-op for BYO
-        # keys. Only reached on success, so failed/interrupted calls are never
-        # charged. Pricing uses the model the strategy actually called.
-        model = output.get("model") or ""
-        charged_micros = record_usage(
-            user,
-            credentials,
-            model=model,
-            prompt_tokens=output.get("prompt_tokens", 0) or 0,
-            completion_tokens=output.get("completion_tokens", 0) or 0,
+    except Exception as e:
+        logger.error("Error in arun_assistant_api: %s", e)
+        raise
+
+
+def paper_upload_sinks(file_service, user):
+    """Open a streamed paper upload straight into the user's staging area."""
+    from workers.services.file_s3_service import PAPER_STAGING_PREFIX
+
+    def open_sink(_field: str, filename: str) -> S3Sink:
+        key = file_service.staging_key(PAPER_STAGING_PREFIX, str(user.id), filename)
+        return S3Sink(
+            file_service.s3_client,
+            file_service.bucket_name,
+            key,
+            {"ContentType": "application/pdf", "ServerSideEncryption": "AES256"},
         )
 
-        file_name = file_path.split("/")[-1]
+    return open_sink
 
-        return {
-            "file_name": file_name,
-            "output": output,
-            "strategy_used": strategy.get_strategy_name(),
-            "metered": not credentials.is_byo,
-            "usd_charged": micros_to_usd(charged_micros),
-        }
 
-    except Exception as e:
-        logger.error("Error in run_assistant_api: %s", e)
-        raise
+def _queue_stored_paper(user, paper, project_id, strategy_type, socket_id) -> str:
+    """Queue extraction of a stored paper for a project; return the task id."""
+    from workers.celery_config import reprocess_paper
+
+    return reprocess_paper.delay(
+        paper_id=str(paper.id),
+        socket_id=socket_id or "",
+        user_email=user.email,
+        project_id=project_id,
+        strategy_type=strategy_type,
+    ).id
 
 
-def add_paper_to_project_controller(user, files, socket_id, project_id, strategy_type):
+async def add_paper_to_project_controller(
+    user, files, socket_id, project_id, strategy_type, file_service
+):
     """
     Logic for adding papers to a project.
+
+    ``files`` were streamed by the route into the staging area of object
+    storage (see ``paper_upload_sinks``), hashing them on the way. Papers the
+    library already stores are queued for the project without their upload,
+    which is deleted, as is a second copy of the same PDF in one request; the
+    rest are handed to ``add_paper`` tasks by staged key, so any worker node
+    can pick them up.
     """
     from workers.celery_config import add_paper
 
@@ -149,27 +377,32 @@ def add_paper_to_project_controller(user, files, socket_id, project_id, strategy
             "status": 400,
         }
 
-    user_email = user.email
-    gpt_process = {}
-
-    # Save files temporarily
-    for file in files:
-        file_path = f"papers/{socket_id}-{file.name}"
-        with open(file_path, "wb") as f:
-            f.write(file.body)
+    stored = await asyncio.to_thread(
+        file_service.find_papers_by_hash, [file.sink.sha256 for file in files]
+    )
 
-    # Process files
+    user_email = user.email
+    gpt_process, queued = {}, {}
     for file in files:
-        file_path = f"papers/{socket_id}-{file.name}"
-        task = add_paper.delay(
-            file_path,
-            socket_id,
-            user_email,
-            project_id,
-            strategy_type,
-            original_filename=file.name,
-        )
-        gpt_process[file.name] = task.id
+        digest = file.sink.sha256
+        if digest in queued or digest in stored:
+            await file.sink.abort()
+        if digest not in queued:
+            if digest in stored:
+                queued[digest] = _queue_stored_paper(
+                    user, stored[digest], project_id, strategy_type, socket_id
+                )
+            else:
+                queued[digest] = add_paper.delay(
+                    "",  # no local file path; bytes are staged in S3
+                    socket_id,
+                    user_email,
+                    project_id,
+                    strategy_type,
+                    original_filename=file.name,
+                    staged_s3_key=file.sink.key,
+                ).id
+        gpt_process[file.name] = queued[digest]
 
     return gpt_process
 
@@ -181,7 +414,11 @@ def create_paper_upload_controller(user, filename, project_id, strategy_type):
     The returned ``upload_token`` is later passed to
     ``finalize_paper_upload_controller`` to start extraction.
     """
-    from workers.services.file_s3_service import MAX_UPLOAD_BYTES, FileService
+    from workers.services.file_s3_service import (
+        MAX_UPLOAD_BYTES,
+        PAPER_STAGING_PREFIX,
+        FileService,
+    )
 
     available_strategies = ExtractionStrategyFactory.get_available_strategies()
     if strategy_type not in available_strategies:
@@ -194,9 +431,9 @@ def create_paper_upload_controller(user, filename, project_id, strategy_type):
     if not safe_name.lower().endswith(".pdf"):
         safe_name += ".pdf"
 
-    # Opaque staging key; the canonical hashed key is assigned during processing.
+    # Opaque staging key; the canonical key is assigned during processing.
     token = uuid.uuid4().hex
-    s3_key = f"papers/uploads/{user.id}/{token}/{safe_name}"
+    s3_key = f"{PAPER_STAGING_PREFIX}{user.id}/{token}/{safe_name}"
 
     file_service = FileService()
     # Presigned POST (not PUT) so S3 itself enforces a size cap at upload time
@@ -228,7 +465,11 @@ def finalize_paper_upload_controller(
     processes it.
     """
     from workers.celery_config import add_paper
-    from workers.services.file_s3_service import MAX_UPLOAD_BYTES, FileService
+    from workers.services.file_s3_service import (
+        MAX_UPLOAD_BYTES,
+        PAPER_STAGING_PREFIX,
+        FileService,
+    )
 
     if not upload_token:
         return {"error": "upload_token is required", "status": 400}
@@ -241,7 +482,7 @@ def finalize_paper_upload_controller(
         }
 
     # Only allow finalizing keys that belong to this user's staging area.
-    expected_prefix = f"papers/uploads/{user.id}/"
+    expected_prefix = f"{PAPER_STAGING_PREFIX}{user.id}/"
     if not upload_token.startswith(expected_prefix):
         return {"error": "Invalid upload token.", "status": 403}
 
@@ -293,6 +534,76 @@ def finalize_paper_upload_controller(
     return {original_filename: task.id}
 
 
+def check_paper_hashes_controller(
+    user, papers, project_id, strategy_type, socket_id
+):
+    """Report which papers are already stored, by SHA-256, before any upload.
+
+    ``papers`` is a list of ``{"sha256": ..., "filename": ...}``. Papers the
+    caller can already access (their uploads and the papers in their projects)
+    come back under ``existing``; every other digest is ``missing`` and must be
+    uploaded, even if someone else stored those bytes. With a ``project_id``,
+    each existing paper is also attached to
+    the project and queued for extraction (as ``reprocess_paper`` does), and
+    ``tasks`` maps filenames to task ids the way ``add_paper`` does.
+    """
+    from workers.services.file_s3_service import FileService
+
+    if not isinstance(papers, list) or not papers:
+        return {"error": "papers must be a non-empty list", "status": 400}
+    if len(papers) > MAX_HASH_CHECK:
+        return {
+            "error": f"At most {MAX_HASH_CHECK} papers can be checked at once.",
+            "status": 400,
+        }
+
+    entries = []
+    for entry in papers:
+        if not isinstance(entry, dict):
+            return {
+                "error": "Each paper must be an object with sha256 and filename.",
+                "status": 400,
+            }
+        digest = str(entry.get("sha256") or "").lower()
+        if not _SHA256.match(digest):
+            return {"error": f"Invalid sha256 digest: {digest!r}", "status": 400}
+        filename = os.path.basename(str(entry.get("filename") or f"{digest}.pdf"))
+        entries.append((digest, filename))
+
+    if project_id:
+        available_strategies = ExtractionStrategyFactory.get_available_strategies()
+        if strategy_type not in available_strategies:
+            return {
+                "error": f"Invalid strategy type. Available: {available_strategies}",
+                "status": 400,
+            }
+
+    stored = FileService.accessible_papers_by_hash(
+        [digest for digest, _ in entries], user
+    )
+
+    existing, missing, tasks, queued = [], [], {}, {}
+    for digest, filename in entries:
+        paper = stored.get(digest)
+        if paper is None:
+            missing.append({"sha256": digest, "filename": filename})
+            continue
+        item = {"sha256": digest, "filename": filename, "paper_id": str(paper.id)}
+        if project_id:
+            # The same PDF listed twice is only queued once.
+            if digest not in queued:
+                queued[digest] = _queue_stored_paper(
+                    user, paper, project_id, strategy_type, socket_id
+                )
+            item["task_id"] = tasks[filename] = queued[digest]
+        existing.append(item)
+
+    result = {"existing": existing, "missing": missing}
+    if project_id:
+        result["tasks"] = tasks
+    return result
+
+
 def get_paper_task_status_controller(task_id):
     """
     Get the status of a paper processing task.
@@ -323,11 +634,39 @@ def reprocess_paper_controller(user, paper_id, project_id, strategy_type, socket
     return {"task_id": task.id, "paper_id": paper_id}
 
 
-def reprocess_project_controller(user, project_id, strategy_type, socket_id):
+def reprocess_project_controller(
+    user, project_id, strategy_type, socket_id, mode="sync"
+):
     """
     Reprocess all papers in a project.
+
+    ``mode="sync"`` queues one extraction task per paper. ``mode="concurrent"``
+    queues a single task that runs the papers' provider calls concurrently on
+    one worker. ``mode="incremental"`` queues one task per paper that extracts
+    only the features its latest result lacks or has at an older version, and
+    merges them into a new result version. ``mode="batch"`` submits the whole
+    project to the provider's batch API in one task; results are ingested when
+    the provider finishes (typically minutes to hours) and are billed at the
+    batch rate.
     """
-    from workers.celery_config import reprocess_paper
+    from workers.celery_config import (
+        extract_papers_concurrently,
+        reprocess_paper,
+        submit_extraction_batch,
+    )
+
+    if mode not in ("sync", "concurrent", "incremental", "batch"):
+        return {
+            "error": "mode must be 'sync', 'concurrent', 'incremental' or 'batch'",
+            "status": 400,
+        }
+    if mode == "batch":
+        batch_strategies = ExtractionStrategyFactory.get_batch_strategies()
+        if strategy_type not in batch_strategies:
+            return {
+                "error": f"Batch mode requires one of: {batch_strategies}",
+                "status": 400,
+            }
 
     try:
         # Get the project and verify ownership
@@ -338,7 +677,40 @@ def reprocess_project_controller(user, project_id, strategy_type, socket_id):
         if not project:
             return {"error": "Project not found", "status": 404}
 
+        if mode == "batch":
+            task = submit_extraction_batch.delay(
+                project_id=project_id,
+                user_email=user.email,
+                strategy_type=strategy_type,
+                socket_id=socket_id,
+            )
+            return {
+                "message": f"Submitting {len(project.papers)} papers in batch mode",
+                "task_id": task.id,
+                "mode": "batch",
+                "total_papers": len(project.papers),
+            }
+
+        if mode == "concurrent":
+            task = extract_papers_concurrently.delay(
+                project_id=project_id,
+                user_email=user.email,
+                strategy_type=strategy_type,
+                socket_id=socket_id,
+            )
+            return {
+                "message": f"Started reprocessing {len(project.papers)} papers",
+                "task_id": task.id,
+                "mode": "concurrent",
+                # Socket progress events for each paper carry these ids.
+                "progress_ids": {
+                    str(p.id): f"{task.id}:{p.id}" for p in project.papers
+                },
+                "total_papers": len(project.papers),
+            }
+
         # Start reprocessing tasks for all papers
+        extra = {"incremental": True} if mode == "incremental" else {}
         task_ids = {}
         for ppr in project.papers:
             paper_id = str(ppr.id)
@@ -348,14 +720,18 @@ def reprocess_project_controller(user, project_id, strategy_type, socket_id):
                 user_email=user.email,
                 project_id=project_id,
                 strategy_type=strategy_type,
+                **extra,
             )
             task_ids[paper_id] = task.id
 
-        return {
+        result = {
             "message": f"Started reprocessing {len(task_ids)} papers",
             "task_ids": task_ids,
             "total_papers": len(task_ids),
         }
+        if extra:
+            result["mode"] = mode
+        return result
 
     except Exception as e:
         return {"error": str(e), "status": 500}
@@ -5,11 +5,17 @@ This module contains the controller for the repeatability results and evaluation
 import math
 import json
 from bunnet import PydanticObjectId
-from database.models.repeatability import RepeatabilityResult
+from database.models.projects import Project
+from database.models.repeatability import RepeatabilityReport, RepeatabilityResult
 
-def evaluate_repeatability_controller(user, feature_id, paper_id, project_id, socket_id):
+def evaluate_repeatability_controller(
+    user, feature_id, paper_id, project_id, socket_id, adaptive=False
+):
     """
     Trigger repeatability evaluation for a feature.
+
+    With ``adaptive`` the 5 runs are an upper bound: the task stops once alpha
+    has converged or the runs agree.
     """
     if not paper_id or not socket_id:
         return {"error": "Missing parameters.", "status": 400}
@@ -23,6 +29,37 @@ def evaluate_repeatability_controller(user, feature_id, paper_id, project_id, so
         project_id=project_id,
         socket_id=socket_id,
         num_runs=5,
+        adaptive=bool(adaptive),
+    )
+
+    return {"task_id": task.id}
+
+def evaluate_project_repeatability_controller(
+    user, project_id, socket_id, paper_ids=None, sample_size=None, num_runs=None
+):
+    """
+    Trigger a repeatability evaluation of every feature of a project.
+    """
+    num_runs = 5 if num_runs is None else num_runs
+    if not isinstance(num_runs, int) or num_runs < 2:
+        return {"error": "num_runs must be an integer of at least 2.", "status": 400}
+    if paper_ids is not None and not isinstance(paper_ids, list):
+        return {"error": "paper_ids must be a list.", "status": 400}
+
+    project = Project.get(project_id).run()
+    if not project:
+        return {"error": "Project not found.", "status": 404}
+
+    from workers.evaluate_repeatability_task import evaluate_project_repeatability
+
+    extra = {"sample_size": sample_size} if sample_size else {}
+    task = evaluate_project_repeatability.delay(
+        project_id=project_id,
+        user_id=str(user.id),
+        socket_id=socket_id,
+        paper_ids=paper_ids,
+        num_runs=num_runs,
+        **extra,
     )
 
     return {"task_id": task.id}
@@ -65,9 +102,15 @@ def get_feature_evaluations_controller(feature_id):
         res.append(
             {
                 "id": str(e.id),
-                "paper_id": str(e.paper.id),
+                "paper_id": str(e.paper.id) if e.paper else None,
+                "report_id": str(e.report.id) if e.report else None,
                 "version": e.feature_version,
                 "alpha": None if math.isnan(e.alpha_score) else e.alpha_score,
+                "alpha_ci": (
+                    [e.alpha_ci_lower, e.alpha_ci_upper]
+                    if e.alpha_ci_lower is not None
+                    else None
+                ),
                 "status": e.status,
                 "created_at": e.created_at.isoformat(),
             }
@@ -84,3 +127,40 @@ def get_repeatability_result_controller(result_id):
         return {"error": "Result not found", "status": 404}
 
     return json.loads(result.model_dump_json())
+
+def get_project_repeatability_reports_controller(project_id):
+    """
+    List the repeatability reports of a project, newest first.
+    """
+    reports = (
+        RepeatabilityReport.find(
+            RepeatabilityReport.project.id == PydanticObjectId(project_id),
+        )
+        .sort("-created_at")
+        .to_list()
+    )
+
+    return {
+        "reports": [
+            {
+                "id": str(r.id),
+                "num_runs": r.num_runs,
+                "papers": len(r.papers),
+                "features": len(r.features),
+                "mean_alpha": r.mean_alpha,
+                "status": r.status,
+                "created_at": r.created_at.isoformat(),
+            }
+            for r in reports
+        ]
+    }
+
+def get_repeatability_report_controller(report_id):
+    """
+    Get a project repeatability report with its per-feature scores.
+    """
+    report = RepeatabilityReport.get(report_id).run()
+    if not report:
+        return {"error": "Report not found", "status": 404}
+
+    return json.loads(report.model_dump_json())
@@ -72,6 +72,7 @@ def patch_services(monkeypatch):
         fake_fs_module = types.ModuleType("workers.services.file_s3_service")
         fake_fs_module.FileService = lambda: file_service
         fake_fs_module.MAX_UPLOAD_BYTES = 50 * 1024 * 1024
+        fake_fs_module.PAPER_STAGING_PREFIX = "papers/uploads/"
         monkeypatch.setitem(
             sys.modules, "workers.services.file_s3_service", fake_fs_module
         )
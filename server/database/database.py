@@ -6,15 +6,20 @@ import os
 
 from bunnet import init_bunnet
 from database.models.api_keys import ApiKey
+from database.models.extraction_batch import ExtractionBatch
+from database.models.extraction_cache import ExtractionCache
 from database.models.features import Features
 from database.models.features_quality import FeaturesQuality
 from database.models.inclusion_criteria import InclusionCriteria
+from database.models.paper_text import PaperText
 from database.models.papers import Paper
 from database.models.passkeys import Passkey
 from database.models.project_paper_result import ProjectPaperResult
 from database.models.projects import Project
-from database.models.repeatability import RepeatabilityResult
+from database.models.provider_resources import ProviderResource
+from database.models.repeatability import RepeatabilityReport, RepeatabilityResult
 from database.models.results import Result
+from database.models.string_comparison_cache import StringComparisonCache
 from database.models.users import User
 from database.models.webauthn_challenge import WebAuthnChallenge
 from dotenv import load_dotenv
@@ -46,8 +51,14 @@ def init_db():
             ProjectPaperResult,
             FeaturesQuality,
             RepeatabilityResult,
+            RepeatabilityReport,
             InclusionCriteria,
             Passkey,
             WebAuthnChallenge,
+            ExtractionCache,
+            ExtractionBatch,
+            ProviderResource,
+            PaperText,
+            StringComparisonCache,
         ],
     )
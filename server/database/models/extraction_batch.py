@@ -0,0 +1,61 @@
+"""
+ExtractionBatch model — one provider batch job submitted for a project.
+
+A batch reprocess (``mode="batch"``) submits the papers of a project to the
+provider's batch API instead of running one blocking call per paper. Each
+submitted job is tracked here from submission until every item has been
+ingested into ``Result`` / ``ProjectPaperResult``.
+"""
+
+from datetime import datetime
+from typing import List, Optional
+
+from bunnet import Document, Indexed, Link
+from pydantic import BaseModel, Field
+
+from database.models.projects import Project
+from database.models.users import User
+
+
+class ExtractionBatchItem(BaseModel):
+    """One paper within a batch."""
+
+    custom_id: str
+    paper_id: str
+    # pending -> succeeded | failed
+    status: str = "pending"
+    result_id: Optional[str] = None
+    error: Optional[str] = None
+
+
+class ExtractionBatch(Document):
+    """A provider batch job and the papers it covers."""
+
+    project: Link[Project]
+    user: Link[User]
+    strategy_type: str
+    provider: str
+    provider_batch_id: Indexed(str)  # type: ignore[valid-type]
+    model: str
+    # Compiled schema hash + instructions, for the extraction cache on ingest.
+    schema_hash: str
+    instructions: str
+    # Whether the submitting key was the user's own (unmetered) key.
+    is_byo: bool = False
+
+    # submitted -> completed | failed
+    status: str = "submitted"
+    items: List[ExtractionBatchItem] = []
+    poll_count: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    error: Optional[str] = None
+
+    created_at: datetime = Field(default_factory=datetime.now)
+    updated_at: datetime = Field(default_factory=datetime.now)
+    completed_at: Optional[datetime] = None
+
+    class Settings:
+        """Settings for the ExtractionBatch model."""
+
+        name = "extraction_batches"
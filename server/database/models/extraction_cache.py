@@ -0,0 +1,45 @@
+"""
+ExtractionCache model — content-addressed store of completed LLM extractions.
+
+An extraction is fully determined by four inputs: the paper bytes
+(``Paper.file_hash``), the strict JSON schema sent to the provider, the model,
+and the system instructions. ``cache_key`` is a SHA-256 over exactly those
+inputs (see ``services/extraction_cache.py``), so a reprocess whose inputs did
+not change can reuse the stored output instead of paying the provider again.
+
+Entries are never invalidated explicitly: changing a feature, the prompt or the
+model produces a different key, and the stale entry simply stops being read.
+"""
+
+from datetime import UTC, datetime
+from typing import Any, Dict, Optional
+
+from bunnet import Document, Indexed
+from pydantic import Field
+
+
+class ExtractionCache(Document):
+    """A cached extraction output, addressed by its input fingerprint."""
+
+    # SHA-256 over (file_hash, schema_hash, model, instructions_hash).
+    cache_key: Indexed(str, unique=True)  # type: ignore[valid-type]
+
+    # The individual key components, kept for debugging and bulk purges
+    # (e.g. "drop everything for this paper").
+    file_hash: Indexed(str)  # type: ignore[valid-type]
+    schema_hash: str
+    model: str
+    instructions_hash: str
+    strategy: str
+
+    # The strategy output that was cached (``result`` is the json_response).
+    result: Dict[str, Any]
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+
+    hits: int = 0
+    created_at: datetime = Field(default_factory=lambda: datetime.now(UTC))
+    last_hit_at: Optional[datetime] = None
+
+    class Settings:
+        name = "extraction_cache"
@@ -0,0 +1,28 @@
+"""
+PaperText model — locally extracted text of a PDF, per page.
+
+Text extraction is pure CPU work but not free on long papers, and the result
+only depends on the PDF bytes and the extractor. It is stored once per
+``Paper.file_hash`` so preprocessing (see ``services/pdf_preprocess.py``) can
+re-apply different section rules without parsing the PDF again.
+"""
+
+from datetime import UTC, datetime
+from typing import List
+
+from bunnet import Document, Indexed
+from pydantic import Field
+
+
+class PaperText(Document):
+    """The per-page text layer of one PDF."""
+
+    file_hash: Indexed(str, unique=True)  # type: ignore[valid-type]
+    # Extractor name and version; entries from another extractor are ignored.
+    extractor: str
+    pages: List[str]
+
+    created_at: datetime = Field(default_factory=lambda: datetime.now(UTC))
+
+    class Settings:
+        name = "paper_text"
@@ -0,0 +1,73 @@
+"""
+ProviderResource model — registry of reusable provider-side objects.
+
+The Assistants strategy needs an assistant (model + instructions + schema) and
+a vector store holding the paper; the JSON-schema strategies need the paper
+uploaded to their provider's Files API. All of these are expensive to create
+and identical across runs with the same inputs, so instead of creating them per
+call they are pooled (see ``workers/services/resource_pool.py``):
+
+- assistants are keyed by a hash of (model, instructions, schema hash);
+- vector stores (and the uploaded file inside) by ``Paper.file_hash``;
+- uploaded papers by ``Paper.file_hash``, per provider.
+
+Provider objects belong to the account of the API key that created them, so
+every entry records a hash of that key (``owner``) and, for bring-your-own
+keys, the user whose key it is so the janitor can resolve it again.
+
+Entries expire after a TTL; ``sweep_provider_resources`` deletes the provider
+objects of expired entries and then the entries themselves.
+"""
+
+from datetime import UTC, datetime
+from typing import Optional
+
+from bunnet import Document, Indexed
+from pydantic import Field
+from pymongo import ASCENDING, IndexModel
+
+# Resource kinds.
+RESOURCE_ASSISTANT = "assistant"
+RESOURCE_VECTOR_STORE = "vector_store"
+RESOURCE_FILE = "file"
+
+
+class ProviderResource(Document):
+    """A pooled provider object and the inputs it was built from."""
+
+    # "openai" or "anthropic" (files only).
+    provider: str = "openai"
+    # One of RESOURCE_ASSISTANT / RESOURCE_VECTOR_STORE / RESOURCE_FILE.
+    kind: str
+    # SHA-256 of the API key the object was created with.
+    owner: str
+    # Assistant: hash of its inputs. Vector store or file: the paper's hash.
+    pool_key: str
+
+    resource_id: str
+    # Vector stores: the uploaded file attached to the store.
+    file_id: Optional[str] = None
+
+    # Set when ``owner`` is a user's BYO key rather than the platform key.
+    user_id: Optional[str] = None
+
+    uses: int = 0
+    created_at: datetime = Field(default_factory=lambda: datetime.now(UTC))
+    last_used_at: datetime = Field(default_factory=lambda: datetime.now(UTC))
+    expires_at: Indexed(datetime)  # type: ignore[valid-type]
+
+    class Settings:
+        name = "provider_resources"
+        # One live object per (provider, kind, key account, inputs); racing
+        # creators lose on insert and fall back to the winner's object.
+        indexes = [
+            IndexModel(
+                [
+                    ("provider", ASCENDING),
+                    ("kind", ASCENDING),
+                    ("owner", ASCENDING),
+                    ("pool_key", ASCENDING),
+                ],
+                unique=True,
+            ),
+        ]
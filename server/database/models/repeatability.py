@@ -9,21 +9,64 @@ from pydantic import Field
 
 from database.models.features import Features
 from database.models.papers import Paper
+from database.models.projects import Project
 from database.models.users import User
 
+
+class RepeatabilityReport(Document):
+    """Project-wide repeatability: all features scored from one set of runs."""
+
+    project: Link[Project]
+    user: Link[User]
+    # The sampled papers, each extracted num_runs times with the full schema.
+    papers: List[Link[Paper]] = Field(default_factory=list)
+    num_runs: int = 0
+    runs_failed: int = 0
+
+    # One entry per feature: feature_id, feature_identifier, alpha, alpha_ci
+    # and result_id.
+    features: List[Dict[str, Any]] = Field(default_factory=list)
+    mean_alpha: Optional[float] = None
+
+    prompt_tokens: int = 0
+    cached_prompt_tokens: int = 0
+
+    status: str = "pending" # pending, processing, completed, failed
+    task_id: Optional[str] = None
+
+    created_at: datetime = Field(default_factory=datetime.now)
+    updated_at: datetime = Field(default_factory=datetime.now)
+
+    class Settings:
+        """Settings for the RepeatabilityReport model."""
+        name = "repeatability_reports"
+
 class RepeatabilityResult(Document):
     """This class represents a repeatability test result."""
 
     feature: Link[Features]
     feature_version: int
-    paper: Link[Paper]
+    # Unset for project-wide evaluations, which pool the report's papers.
+    paper: Optional[Link[Paper]] = None
     user: Link[User]
+    report: Optional[Link[RepeatabilityReport]] = None
     
     # The 10 extraction results
     extractions: List[Dict[str, Any]] = Field(default_factory=list)
     
     # Calculated scores
     alpha_score: float = 0.0
+    # 95% bootstrap interval of alpha; unset when undefined (e.g. one run).
+    alpha_ci_lower: Optional[float] = None
+    alpha_ci_upper: Optional[float] = None
+
+    # Input tokens over all runs, and the part served from the prompt cache.
+    prompt_tokens: int = 0
+    cached_prompt_tokens: int = 0
+
+    # Runs that were started, and runs skipped once adaptive mode stopped.
+    runs_used: int = 0
+    runs_skipped: int = 0
     
     status: str = "pending" # pending, processing, completed, failed
     task_id: Optional[str] = None
@@ -3,7 +3,7 @@ Results model.
 """
 
 from datetime import datetime
-from typing import Optional
+from typing import Dict, Optional
 from bunnet import Document, Link, PydanticObjectId
 from pydantic import BaseModel, Field
 
@@ -22,7 +22,12 @@ class Result(Document):
     json_response: dict
     prompt_token: int
     completion_token: int
+    # Part of prompt_token read from the provider's prompt cache.
+    cached_prompt_token: int = 0
     feature_list: list
+    # Feature id -> version the result was extracted with (for incremental
+    # reprocessing). Empty on results stored before it was recorded.
+    feature_versions: Dict[str, int] = Field(default_factory=dict)
     project: Link[Project]
     task_id: Optional[str] = None
     finished: bool = False
@@ -0,0 +1,30 @@
+"""
+StringComparisonCache model — stored verdicts of semantic string comparisons.
+
+Ground-truth scoring asks a model whether a reference string and an extracted
+string convey the same thing. The verdict depends only on the two normalized
+strings and the model, so ``cache_key`` is a SHA-256 over exactly those (see
+``services/string_comparison.py``) and a repeated pair is never asked twice.
+"""
+
+from datetime import UTC, datetime
+
+from bunnet import Document, Indexed
+from pydantic import Field
+
+
+class StringComparisonCache(Document):
+    """A similarity verdict, addressed by the normalized pair and the model."""
+
+    # SHA-256 over (model, normalized truth, normalized prediction).
+    cache_key: Indexed(str, unique=True)  # type: ignore[valid-type]
+
+    model: str
+    truth: str
+    prediction: str
+    verdict: str
+
+    created_at: datetime = Field(default_factory=lambda: datetime.now(UTC))
+
+    class Settings:
+        name = "string_comparison_cache"
@@ -2,11 +2,13 @@
 Functions to interact with the OpenAI API.
 """
 
+import copy
 import json
 import logging
 from datetime import datetime
-from typing import Dict, List, Tuple
+from typing import Dict, List, Optional, Tuple
 
+from bunnet.operators import In
 from database.models.features import Features
 from database.models.projects import Project
 from dotenv import load_dotenv
@@ -18,6 +20,13 @@ load_dotenv()
 logger = logging.getLogger(__name__)
 
 
+DEFAULT_ASSISTANT_PROMPT = (
+    "You are a research assistnant for a team of scientists tasked with research cartography. "
+    "You are given a PDF of the paper and are asked to provide a summary of the key findings. Your response should be in JSON format. "
+    "Just provide the JSON response without any additional text. Do not include ```json or any other formatting."
+)
+
+
 class AssistantException(Exception):
     """
     Custom exception class for assistant errors.
@@ -94,10 +103,52 @@ def enforce_additional_properties(schema):
     return schema
 
 
-def build_parent_objects(feature_list: list[str], feature_object: dict) -> dict:
+def parent_identifiers(feature_list: List[str]) -> List[str]:
+    """
+    Returns the ``<key>.parent`` identifiers the given features nest under,
+    in first-seen order.
+    """
+    seen = {}
+    for feature in feature_list:
+        for key in feature.split(".")[:-1]:
+            seen.setdefault(f"{key}.parent", None)
+    return list(seen)
+
+
+def get_parent_schemas(feature_list: List[str]) -> Dict[str, dict]:
+    """
+    Fetches the parent definitions for the given features in a single query.
+
+    Returns:
+    - Mapping of parent key (without the ``.parent`` suffix) to its schema.
+    """
+    identifiers = parent_identifiers(feature_list)
+    if not identifiers:
+        return {}
+
+    parents = Features.find(In(Features.feature_identifier, identifiers)).run()
+    return {
+        parent.feature_identifier[: -len(".parent")]: (
+            parent.feature_gpt_interface.parent_dump()
+        )
+        for parent in parents
+    }
+
+
+def build_parent_objects(
+    feature_list: list[str],
+    feature_object: dict,
+    parent_schemas: Optional[Dict[str, dict]] = None,
+) -> dict:
     """
     Builds the parent objects for the given features.
+
+    ``parent_schemas`` maps a parent key to its schema (see
+    ``get_parent_schemas``); when omitted the parents are fetched in one query.
     """
+    if parent_schemas is None:
+        parent_schemas = get_parent_schemas(feature_list)
+
     nested_dict = {}
     for feature in feature_list:
         keys = feature.split(".")
@@ -106,14 +157,11 @@ def build_parent_objects(feature_list: list[str], feature_object: dict) -> dict:
         for key in keys[:-1]:
             if key not in current_dict:
                 logger.info("Adding key %s to the dictionary", key)
-                feature_class = Features.find_one(
-                    Features.feature_identifier == f"{key}.parent"
-                ).run()
-                if feature_class:
-                    schema = feature_class.feature_gpt_interface.parent_dump()
-                    logger.info("Enforcing additional properties %s", schema)
+                if key in parent_schemas:
                     # Ensure that the schema has additionalProperties set to False
-                    schema = enforce_additional_properties(schema)
+                    schema = enforce_additional_properties(
+                        copy.deepcopy(parent_schemas[key])
+                    )
                     current_dict[key] = schema
                 else:
                     current_dict[key] = {
@@ -171,19 +219,27 @@ def build_openai_feature_functions(
         None
     """
 
-    openai_function_object = {
-        "name": "extract_features",
-        "description": ("Extract features from a scientific paper. "),
-        "strict": True,
-        "parameters": {
+    return openai_feature_function(
+        {
             "type": "object",
             "properties": build_parent_objects(feature_list, feature_object),
             "additionalProperties": False,
             "required": ["paper"],
-        },
-    }
+        }
+    )
+
 
-    return openai_function_object
+def openai_feature_function(schema: dict) -> dict:
+    """
+    Wraps an already built strict feature schema as the OpenAI
+    ``extract_features`` function object.
+    """
+    return {
+        "name": "extract_features",
+        "description": ("Extract features from a scientific paper. "),
+        "strict": True,
+        "parameters": schema,
+    }
 
 
 def upload_file_to_vector_store(client: OpenAI, file_path: str) -> VectorStore:
@@ -281,13 +337,7 @@ def create_temporary_assistant(client: OpenAI, custom_prompt: str = None):
         - The created assistant.
     """
 
-    default_prompt = (
-        "You are a research assistnant for a team of scientists tasked with research cartography. "
-        "You are given a PDF of the paper and are asked to provide a summary of the key findings. Your response should be in JSON format. "
-        "Just provide the JSON response without any additional text. Do not include ```json or any other formatting."
-    )
-
-    instructions = custom_prompt if custom_prompt else default_prompt
+    instructions = custom_prompt if custom_prompt else DEFAULT_ASSISTANT_PROMPT
 
     logger.info(
         "Creating temporary assistant with model: %s",
@@ -1,7 +1,7 @@
 # management/commands/cleanup_orphaned_files.py
 import click
 from database.models.papers import Paper
-from workers.services.file_s3_service import FileService
+from workers.services.file_s3_service import PAPER_STAGING_PREFIX, FileService
 
 
 @click.command()
@@ -25,6 +25,8 @@ def cleanup_orphaned_files(dry_run):
 
     for obj in s3_objects["Contents"]:
         s3_key = obj["Key"]
+        if s3_key.startswith(PAPER_STAGING_PREFIX):
+            continue  # staged uploads expire through the lifecycle rules
 
         # Check if paper exists with this S3 key
         paper = Paper.find_one(Paper.s3_key == s3_key).run()
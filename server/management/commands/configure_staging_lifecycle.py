@@ -0,0 +1,25 @@
+# management/commands/configure_staging_lifecycle.py
+import click
+from workers.services.file_s3_service import STAGING_TTL_DAYS, FileService
+
+
+@click.command()
+@click.option(
+    "--days",
+    default=STAGING_TTL_DAYS,
+    show_default=True,
+    help="Days before a staged upload or abandoned multipart upload expires",
+)
+def configure_staging_lifecycle(days):
+    """Install the bucket lifecycle rules that expire staged uploads."""
+    file_service = FileService()
+    rules = file_service.ensure_staging_lifecycle(days)
+
+    for rule in rules:
+        prefix = rule.get("Filter", {}).get("Prefix", "")
+        click.echo(f"{rule.get('ID', '<unnamed>')}: {prefix or '(whole bucket)'}")
+    click.echo(f"\nStaged uploads now expire after {days} day(s)")
+
+
+if __name__ == "__main__":
+    configure_staging_lifecycle()  # pylint: disable=no-value-for-parameter
@@ -4,9 +4,11 @@ This module contains the routes for the assistant API.
 
 from controllers.assisstant import (
     add_paper_to_project_controller,
+    check_paper_hashes_controller,
     create_paper_upload_controller,
     finalize_paper_upload_controller,
     get_paper_task_status_controller,
+    paper_upload_sinks,
     reprocess_paper_controller,
     reprocess_project_controller,
 )
@@ -15,11 +17,14 @@ from routes.error_handler import error_handler
 from routes.v1.docs import assistant as docs
 from sanic import Blueprint, Request
 from sanic.response import json as json_response
+from utils.upload_stream import UploadError, read_form, request_chunks
 
 assistant_bp = Blueprint("assistant", url_prefix="/assistant")
 
 
-@assistant_bp.route("/add_paper", methods=["POST", "GET"], name="add_paper")
+@assistant_bp.route(
+    "/add_paper", methods=["POST", "GET"], name="add_paper", stream=True
+)
 @docs.add_paper
 @require_jwt
 @error_handler
@@ -30,15 +35,31 @@ async def add_paper(request: Request):
     user = request.ctx.user
 
     if request.method == "POST":
-        files = request.files.getlist("files[]")
-        socket_id = request.form.get("sid")
-        project_id = request.form.get("project_id")
-        strategy_type = request.form.get("strategy_type", "assistant_api")
-
-        result = add_paper_to_project_controller(
-            user, files, socket_id, project_id, strategy_type
+        from workers.services.file_s3_service import MAX_UPLOAD_BYTES, FileService
+
+        # The body is streamed: files go to object storage chunk by chunk,
+        # never whole into memory or onto this node's disk, and an oversized
+        # one is rejected as soon as it is.
+        file_service = FileService()
+        try:
+            form = await read_form(
+                request_chunks(request),
+                request.content_type,
+                paper_upload_sinks(file_service, user),
+                MAX_UPLOAD_BYTES,
+            )
+        except UploadError as e:
+            return json_response({"error": str(e)}, status=e.status)
+        files = form.getlist("files[]")
+        socket_id = form.get("sid")
+        project_id = form.get("project_id")
+        strategy_type = form.get("strategy_type", "assistant_api")
+
+        result = await add_paper_to_project_controller(
+            user, files, socket_id, project_id, strategy_type, file_service
         )
         if "error" in result:
+            await form.discard()
             return json_response(result, status=result.pop("status", 400))
         return json_response(result)
 
@@ -87,6 +108,27 @@ async def finalize_paper_upload(request: Request):
     return json_response(result)
 
 
+@assistant_bp.route("/check_papers", methods=["POST"], name="check_papers")
+@docs.check_papers
+@require_jwt
+@error_handler
+async def check_papers(request: Request):
+    """Report which PDFs are stored already, by hash, so uploads skip them."""
+    user = request.ctx.user
+    data = request.json or {}
+    papers = data.get("papers")
+    project_id = data.get("project_id")
+    strategy_type = data.get("strategy_type", "assistant_api")
+    socket_id = data.get("sid")
+
+    result = check_paper_hashes_controller(
+        user, papers, project_id, strategy_type, socket_id
+    )
+    if "error" in result:
+        return json_response(result, status=result.pop("status", 400))
+    return json_response(result)
+
+
 @assistant_bp.route(
     "/reprocess_paper/<paper_id:str>", methods=["POST"], name="reprocess_paper"
 )
@@ -125,8 +167,11 @@ async def reprocess_project(request: Request, project_id: str):
     data = request.json
     strategy_type = data.get("strategy_type", "assistant_api")
     socket_id = data.get("sid")
+    mode = data.get("mode", "sync")
 
-    result = reprocess_project_controller(user, project_id, strategy_type, socket_id)
+    result = reprocess_project_controller(
+        user, project_id, strategy_type, socket_id, mode=mode
+    )
     if "error" in result:
         return json_response(result, status=result.pop("status", 400))
     return json_response(result)
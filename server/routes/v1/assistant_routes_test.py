@@ -4,6 +4,7 @@ Real controllers run; only the Celery task boundary and the ``Project`` DB
 model are mocked.
 """
 
+import hashlib
 from types import SimpleNamespace
 
 import pytest
@@ -35,6 +36,95 @@ async def test_add_paper_rejects_missing_files(client, auth_headers, patch_auth_
     assert response.json["error"] == "No file uploaded."
 
 
+async def test_add_paper_streams_files_to_staging(
+    client, auth_headers, patch_auth_user, monkeypatch, fake_storage
+):
+    calls = []
+
+    def _delay(*args, **kwargs):
+        calls.append((args, kwargs))
+        return SimpleNamespace(id=f"task-{len(calls)}")
+
+    monkeypatch.setattr("workers.celery_config.add_paper.delay", _delay)
+
+    _, response = await client.post(
+        "/api/v1/assistant/add_paper",
+        files=[
+            ("files[]", ("a.pdf", b"%PDF-1.7 a")),
+            ("files[]", ("b.pdf", b"%PDF-1.7 b")),
+        ],
+        data={"project_id": "p1", "sid": "s1", "strategy_type": "json_schema"},
+        headers=auth_headers(),
+    )
+
+    assert response.status_code == 200
+    assert response.json == {"a.pdf": "task-1", "b.pdf": "task-2"}
+    # Workers get object keys, never a path on this node.
+    keys = [kwargs["staged_s3_key"] for _, kwargs in calls]
+    assert all(args[0] == "" for args, _ in calls)
+    assert all(key.startswith("papers/uploads/user-1/") for key in keys)
+    assert [fake_storage.objects[key] for key in keys] == [b"%PDF-1.7 a", b"%PDF-1.7 b"]
+
+
+async def test_add_paper_skips_uploads_of_stored_and_repeated_papers(
+    client, auth_headers, patch_auth_user, monkeypatch, fake_storage
+):
+    stored_pdf, new_pdf = b"%PDF-1.7 stored", b"%PDF-1.7 new"
+    fake_storage.stored[hashlib.sha256(stored_pdf).hexdigest()] = SimpleNamespace(
+        id="paper-1"
+    )
+    added, reprocessed = [], []
+
+    def _add(*args, **kwargs):
+        added.append(kwargs)
+        return SimpleNamespace(id="task-new")
+
+    def _reprocess(**kwargs):
+        reprocessed.append(kwargs)
+        return SimpleNamespace(id="task-stored")
+
+    monkeypatch.setattr("workers.celery_config.add_paper.delay", _add)
+    monkeypatch.setattr("workers.celery_config.reprocess_paper.delay", _reprocess)
+
+    _, response = await client.post(
+        "/api/v1/assistant/add_paper",
+        files=[
+            ("files[]", ("stored.pdf", stored_pdf)),
+            ("files[]", ("new.pdf", new_pdf)),
+            ("files[]", ("new-copy.pdf", new_pdf)),
+        ],
+        data={"project_id": "p1", "sid": "s1", "strategy_type": "json_schema"},
+        headers=auth_headers(),
+    )
+
+    assert response.status_code == 200
+    assert response.json == {
+        "stored.pdf": "task-stored",
+        "new.pdf": "task-new",
+        "new-copy.pdf": "task-new",
+    }
+    assert [kwargs["paper_id"] for kwargs in reprocessed] == ["paper-1"]
+    assert [kwargs["original_filename"] for kwargs in added] == ["new.pdf"]
+    # Only the one upload a worker still needs is kept.
+    assert list(fake_storage.objects.values()) == [new_pdf]
+
+
+async def test_add_paper_rejects_oversized_files_mid_stream(
+    client, auth_headers, patch_auth_user, monkeypatch, fake_storage
+):
+    monkeypatch.setattr("workers.services.file_s3_service.MAX_UPLOAD_BYTES", 1024)
+
+    _, response = await client.post(
+        "/api/v1/assistant/add_paper",
+        files={"files[]": ("big.pdf", b"%PDF-" + b"x" * 4096)},
+        data={"project_id": "p1"},
+        headers=auth_headers(),
+    )
+
+    assert response.status_code == 413
+    assert fake_storage.objects == {}
+
+
 # ---------------------------------------------------------------------------
 # GET /api/v1/assistant/add_paper  (task status)
 # ---------------------------------------------------------------------------
@@ -55,6 +145,109 @@ async def test_add_paper_get_returns_task_result(
     assert response.json["status"] == "done"
 
 
+# ---------------------------------------------------------------------------
+# POST /api/v1/assistant/check_papers
+# ---------------------------------------------------------------------------
+
+STORED, NEW = "a" * 64, "b" * 64
+
+
+@pytest.fixture
+def stored_papers(monkeypatch, fake_user):
+    lookups = []
+
+    def _find(file_hashes, user):
+        # Only the caller's own papers are ever looked up.
+        assert user is fake_user
+        lookups.append(sorted(file_hashes))
+        return {STORED: SimpleNamespace(id="paper-1", file_hash=STORED)}
+
+    monkeypatch.setattr(
+        "workers.services.file_s3_service.FileService.accessible_papers_by_hash",
+        _find,
+    )
+    return lookups
+
+
+async def test_check_papers_reports_existing_and_missing(
+    client, auth_headers, patch_auth_user, stored_papers
+):
+    _, response = await client.post(
+        "/api/v1/assistant/check_papers",
+        json={
+            "papers": [
+                {"sha256": STORED, "filename": "old.pdf"},
+                {"sha256": NEW.upper(), "filename": "new.pdf"},
+            ]
+        },
+        headers=auth_headers(),
+    )
+
+    assert response.status_code == 200
+    assert response.json == {
+        "existing": [{"sha256": STORED, "filename": "old.pdf", "paper_id": "paper-1"}],
+        "missing": [{"sha256": NEW, "filename": "new.pdf"}],
+    }
+    # One bulk lookup for the whole batch.
+    assert stored_papers == [[STORED, NEW]]
+
+
+async def test_check_papers_queues_existing_papers_for_a_project(
+    client, auth_headers, patch_auth_user, stored_papers, monkeypatch
+):
+    calls = []
+
+    def _delay(**kwargs):
+        calls.append(kwargs)
+        return SimpleNamespace(id="task-1")
+
+    monkeypatch.setattr("workers.celery_config.reprocess_paper.delay", _delay)
+
+    _, response = await client.post(
+        "/api/v1/assistant/check_papers",
+        json={
+            "papers": [
+                {"sha256": STORED, "filename": "old.pdf"},
+                {"sha256": STORED, "filename": "copy.pdf"},
+                {"sha256": NEW, "filename": "new.pdf"},
+            ],
+            "project_id": "proj-1",
+            "strategy_type": "openai_json_schema",
+            "sid": "s1",
+        },
+        headers=auth_headers(),
+    )
+
+    assert response.status_code == 200
+    assert response.json["tasks"] == {"old.pdf": "task-1", "copy.pdf": "task-1"}
+    assert response.json["missing"] == [{"sha256": NEW, "filename": "new.pdf"}]
+    assert len(calls) == 1
+    assert calls[0]["paper_id"] == "paper-1"
+    assert calls[0]["project_id"] == "proj-1"
+
+
+@pytest.mark.parametrize(
+    "papers, error",
+    [
+        ([], "papers must be a non-empty list"),
+        ([{"sha256": "not-a-digest"}], "Invalid sha256 digest"),
+        ([{"sha256": STORED}] * 1001, "At most 1000 papers"),
+    ],
+)
+async def test_check_papers_rejects_bad_batches(
+    client, auth_headers, patch_auth_user, stored_papers, papers, error
+):
+    _, response = await client.post(
+        "/api/v1/assistant/check_papers",
+        json={"papers": papers},
+        headers=auth_headers(),
+    )
+
+    assert response.status_code == 400
+    assert error in response.json["error"]
+    assert stored_papers == []
+
+
 # ---------------------------------------------------------------------------
 # POST /api/v1/assistant/reprocess_paper/<paper_id>
 # ---------------------------------------------------------------------------
@@ -148,3 +341,74 @@ async def test_reprocess_project_dispatches_per_paper(
     assert response.status_code == 200
     assert response.json["total_papers"] == 2
     assert sorted(calls) == ["paper-1", "paper-2"]
+
+
+async def test_reprocess_project_incremental_mode_flags_each_task(
+    client, auth_headers, patch_auth_user, monkeypatch
+):
+    project = SimpleNamespace(papers=[SimpleNamespace(id="paper-1")])
+    monkeypatch.setattr(
+        "controllers.assisstant.Project.get", lambda *a, **k: FakeQuery(project)
+    )
+    calls = []
+
+    def _delay(**kwargs):
+        calls.append(kwargs)
+        return SimpleNamespace(id="task-1")
+
+    monkeypatch.setattr("workers.celery_config.reprocess_paper.delay", _delay)
+
+    _, response = await client.post(
+        "/api/v1/assistant/reprocess_project/proj-1",
+        json={"sid": "s1", "strategy_type": "json_schema", "mode": "incremental"},
+        headers=auth_headers(),
+    )
+
+    assert response.status_code == 200
+    assert response.json["mode"] == "incremental"
+    assert calls[0]["incremental"] is True
+
+
+async def test_reprocess_project_batch_mode_submits_one_task(
+    client, auth_headers, patch_auth_user, monkeypatch
+):
+    project = SimpleNamespace(
+        papers=[SimpleNamespace(id="paper-1"), SimpleNamespace(id="paper-2")]
+    )
+    monkeypatch.setattr(
+        "controllers.assisstant.Project.get", lambda *a, **k: FakeQuery(project)
+    )
+
+    calls = []
+
+    def _delay(**kwargs):
+        calls.append(kwargs)
+        return SimpleNamespace(id="batch-task")
+
+    monkeypatch.setattr("workers.celery_config.submit_extraction_batch.delay", _delay)
+    monkeypatch.setattr(
+        "workers.celery_config.reprocess_paper.delay",
+        lambda **kw: pytest.fail("sync task queued in batch mode"),
+    )
+
+    _, response = await client.post(
+        "/api/v1/assistant/reprocess_project/proj-1",
+        json={"sid": "s1", "strategy_type": "anthropic_json_schema", "mode": "batch"},
+        headers=auth_headers(),
+    )
+
+    assert response.status_code == 200
+    assert response.json["task_id"] == "batch-task"
+    assert response.json["total_papers"] == 2
+    assert calls[0]["strategy_type"] == "anthropic_json_schema"
+
+
+async def test_reprocess_project_batch_mode_rejects_assistant_strategy(
+    client, auth_headers, patch_auth_user
+):
+    _, response = await client.post(
+        "/api/v1/assistant/reprocess_project/proj-1",
+        json={"sid": "s1", "strategy_type": "assistant_api", "mode": "batch"},
+        headers=auth_headers(),
+    )
+    assert response.status_code == 400
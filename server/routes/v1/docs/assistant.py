@@ -36,6 +36,9 @@ __getattr__ = make_getattr(
                 "extraction job.\n"
                 "- **GET** — poll an extraction task's status/result using "
                 "`task_id`.\n\n"
+                "Files stream straight into object storage for the workers; a PDF "
+                "the library already stores (or a repeat within one request) is "
+                "not processed twice — it is queued from the stored copy.\n\n"
                 "For large files or SDK/server-to-server use, prefer the presigned "
                 "flow: `upload_link` then `upload_complete`."
             ),
@@ -77,6 +80,7 @@ __getattr__ = make_getattr(
                     ),
                 ),
                 response("400", "Missing files or project."),
+                response("413", "A file exceeds the upload size limit."),
             ],
         ),
         "create_paper_upload": Endpoint(
@@ -165,6 +169,84 @@ __getattr__ = make_getattr(
                 response("403", "Token is outside the caller's upload area."),
             ],
         ),
+        "check_papers": Endpoint(
+            summary="Check which PDFs are already stored before uploading",
+            description=(
+                "Pre-upload deduplication. Send the SHA-256 digest (hex) and "
+                "filename of each PDF; papers you already have access to (your "
+                "uploads and the papers in your projects) come back under "
+                "`existing` with their `paper_id`, and only those under `missing` "
+                "need uploading. Papers stored only by other users are reported "
+                "as `missing`.\n\n"
+                "With a `project_id`, every existing paper is also added to that "
+                "project and queued for extraction without transferring any bytes; "
+                "`tasks` maps filenames to task ids, like `add_paper` does. At most "
+                "1000 papers per request."
+            ),
+            body=json_body(
+                {
+                    "papers": {
+                        "type": "array",
+                        "items": obj(
+                            {
+                                "sha256": {
+                                    "type": "string",
+                                    "description": "Hex SHA-256 of the PDF bytes.",
+                                },
+                                "filename": {"type": "string"},
+                            },
+                            required=["sha256"],
+                        ),
+                    },
+                    "project_id": {
+                        "type": "string",
+                        "description": (
+                            "Optional. Queue existing papers for this project."
+                        ),
+                    },
+                    "strategy_type": _STRATEGY,
+                    "sid": _SID,
+                },
+                required=["papers"],
+            ),
+            responses=[
+                response(
+                    "200",
+                    "Stored and missing papers.",
+                    json_content(
+                        obj(
+                            {
+                                "existing": {
+                                    "type": "array",
+                                    "items": obj(
+                                        {
+                                            "sha256": {"type": "string"},
+                                            "filename": {"type": "string"},
+                                            "paper_id": {"type": "string"},
+                                            "task_id": {"type": "string"},
+                                        }
+                                    ),
+                                },
+                                "missing": {
+                                    "type": "array",
+                                    "items": obj(
+                                        {
+                                            "sha256": {"type": "string"},
+                                            "filename": {"type": "string"},
+                                        }
+                                    ),
+                                },
+                                "tasks": {"type": "object"},
+                            }
+                        )
+                    ),
+                ),
+                response(
+                    "400",
+                    "Empty or oversized batch, malformed digest, or bad strategy.",
+                ),
+            ],
+        ),
         "reprocess_paper": Endpoint(
             summary="Reprocess a single paper",
             description=(
@@ -196,8 +278,17 @@ __getattr__ = make_getattr(
         "reprocess_project": Endpoint(
             summary="Reprocess all papers in a project",
             description=(
-                "Re-run feature extraction for every paper in a project. Returns a "
-                "per-paper mapping of task ids to follow."
+                "Re-run feature extraction for every paper in a project. In `sync` "
+                "mode, returns a per-paper mapping of task ids to follow. "
+                "`concurrent` mode runs all papers in one worker task with many "
+                "provider calls in flight and returns one `task_id`, plus the "
+                "per-paper socket `progress_ids`. `incremental` mode works like "
+                "`sync` but each task extracts only the features the paper's "
+                "latest result lacks (or holds at an older feature version) and "
+                "merges them into a new result version. In `batch` mode, submits "
+                "the whole project to the provider's batch API (billed at the "
+                "batch rate) and returns a single `task_id`; "
+                "results appear as new result versions when the provider finishes."
             ),
             parameters=[
                 path_param("project_id", "The project whose papers to reprocess.")
@@ -206,14 +297,32 @@ __getattr__ = make_getattr(
                 {
                     "strategy_type": _STRATEGY,
                     "sid": _SID,
+                    "mode": {
+                        "type": "string",
+                        "enum": ["sync", "concurrent", "incremental", "batch"],
+                        "description": (
+                            "`sync` (default), `concurrent`, `incremental` or "
+                            "`batch`. Batch mode requires "
+                            "`openai_json_schema` or `anthropic_json_schema`."
+                        ),
+                    },
                 }
             ),
             responses=[
                 response(
                     "200",
                     "Reprocessing started for the project's papers.",
-                    json_content(obj({"tasks": {"type": "object"}})),
+                    json_content(
+                        obj(
+                            {
+                                "task_ids": {"type": "object"},
+                                "task_id": {"type": "string"},
+                                "total_papers": {"type": "integer"},
+                            }
+                        )
+                    ),
                 ),
+                response("400", "Invalid mode, or strategy without batch support."),
             ],
         ),
     },
@@ -28,6 +28,44 @@ __getattr__ = make_getattr(
                 ),
             ],
         ),
+        "pdf_cache_stats": Endpoint(
+            summary="PDF cache metrics",
+            description=(
+                "Counters of the workers' local PDF cache, summed over all "
+                "workers: lookups served from disk (`hits`) or S3 (`misses`), "
+                "fills and their bytes, evictions and corrupt entries dropped, "
+                "and the resulting `hit_rate` (null before any lookup). Requires "
+                "no authentication."
+            ),
+            responses=[
+                response(
+                    "200",
+                    "Cache counters.",
+                    json_content(
+                        obj(
+                            {
+                                "hits": {"type": "integer"},
+                                "misses": {"type": "integer"},
+                                "fills": {"type": "integer"},
+                                "fill_bytes": {"type": "integer"},
+                                "evictions": {"type": "integer"},
+                                "corrupt": {"type": "integer"},
+                                "hit_rate": {"type": "number", "nullable": True},
+                            }
+                        ),
+                        example={
+                            "hits": 42,
+                            "misses": 8,
+                            "fills": 8,
+                            "fill_bytes": 201326592,
+                            "evictions": 1,
+                            "corrupt": 0,
+                            "hit_rate": 0.84,
+                        },
+                    ),
+                ),
+            ],
+        ),
     },
     secured=False,
 )
@@ -141,7 +141,9 @@ __getattr__ = make_getattr(
             description=(
                 "- **POST** — upload a CSV file (multipart form field `file`) to "
                 "score it against the project. Enqueues a background task and "
-                "returns its `task_id`.\n"
+                "returns its `task_id`. With `against_results`, the CSV holds only "
+                "ground truth keyed by a `paper_id` column, and is scored against "
+                "the project's latest results.\n"
                 "- **GET** — poll a scoring task's status and result using "
                 "`task_id`."
             ),
@@ -157,7 +159,14 @@ __getattr__ = make_getattr(
                                 "type": "string",
                                 "format": "binary",
                                 "description": "The CSV file to score.",
-                            }
+                            },
+                            "against_results": {
+                                "type": "boolean",
+                                "description": (
+                                    "Score the ground truth against the "
+                                    "project's latest results (default false)."
+                                ),
+                            },
                         },
                         required=["file"],
                     )
@@ -178,6 +187,7 @@ __getattr__ = make_getattr(
                     ),
                 ),
                 response("400", "No CSV file (POST) or missing `task_id` (GET)."),
+                response("413", "The CSV exceeds the upload size limit."),
             ],
         ),
         "get_feature_scores": Endpoint(
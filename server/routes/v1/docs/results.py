@@ -10,18 +10,53 @@ from routes.v1.docs.common import (
 
 _FEATURE_ID = path_param("feature_id", "The id of the feature.")
 
-_EVAL_BODY = json_body(
+_EVAL_PROPERTIES = {
+    "paper_id": {"type": "string", "description": "The paper to evaluate against."},
+    "project_id": {"type": "string", "description": "The project context."},
+    "sid": {
+        "type": "string",
+        "description": "Optional Socket.IO id for live progress on `/home`.",
+    },
+}
+
+_EVAL_BODY = json_body(_EVAL_PROPERTIES, required=["paper_id", "project_id"])
+
+_REPEATABILITY_BODY = json_body(
     {
-        "paper_id": {"type": "string", "description": "The paper to evaluate against."},
-        "project_id": {"type": "string", "description": "The project context."},
-        "sid": {
-            "type": "string",
-            "description": "Optional Socket.IO id for live progress on `/home`.",
+        **_EVAL_PROPERTIES,
+        "adaptive": {
+            "type": "boolean",
+            "description": (
+                "Stop before the 5th run once the runs agree or the bootstrap "
+                "interval of alpha is narrow enough. Defaults to false."
+            ),
         },
     },
     required=["paper_id", "project_id"],
 )
 
+_PROJECT_ID = path_param("project_id", "The id of the project.")
+
+_PROJECT_EVAL_BODY = json_body(
+    {
+        "sid": _EVAL_PROPERTIES["sid"],
+        "paper_ids": {
+            "type": "array",
+            "items": {"type": "string"},
+            "description": "Papers to evaluate; defaults to a random sample.",
+        },
+        "sample_size": {
+            "type": "integer",
+            "description": "Papers sampled when `paper_ids` is not given (10).",
+        },
+        "num_runs": {
+            "type": "integer",
+            "minimum": 2,
+            "description": "Full-schema extractions per paper. Defaults to 5.",
+        },
+    },
+)
+
 __getattr__ = make_getattr(
     "Results",
     {
@@ -33,7 +68,7 @@ __getattr__ = make_getattr(
                 "responds `202 Accepted` and emits progress over the WebSocket."
             ),
             parameters=[_FEATURE_ID],
-            body=_EVAL_BODY,
+            body=_REPEATABILITY_BODY,
             responses=[
                 response("202", "Evaluation accepted and running."),
             ],
@@ -57,6 +92,41 @@ __getattr__ = make_getattr(
             parameters=[_FEATURE_ID],
             responses=[response("200", "Evaluation history.")],
         ),
+        "evaluate_project_repeatability": Endpoint(
+            summary="Trigger repeatability evaluation for every feature of a project",
+            description=(
+                "Extract each sampled paper several times with the project's full "
+                "schema and compute Krippendorff's alpha for every feature from "
+                "those same runs. Stores one repeatability result per feature and "
+                "a report; responds `202 Accepted` and emits progress over the "
+                "WebSocket."
+            ),
+            parameters=[_PROJECT_ID],
+            body=_PROJECT_EVAL_BODY,
+            responses=[
+                response("202", "Evaluation accepted and running."),
+                response("400", "Invalid `num_runs` or `paper_ids`."),
+                response("404", "Project not found."),
+            ],
+        ),
+        "get_project_repeatability_reports": Endpoint(
+            summary="List repeatability reports for a project",
+            description="Return the project's repeatability reports, newest first.",
+            parameters=[_PROJECT_ID],
+            responses=[response("200", "Report list.")],
+        ),
+        "get_repeatability_report": Endpoint(
+            summary="Get a repeatability report by id",
+            description=(
+                "Return a project repeatability report with the alpha of every "
+                "feature and the id of its repeatability result."
+            ),
+            parameters=[path_param("report_id", "The id of the report.")],
+            responses=[
+                response("200", "Repeatability report."),
+                response("404", "Report not found."),
+            ],
+        ),
         "get_repeatability_result": Endpoint(
             summary="Get a repeatability result by id",
             description="Return the detailed record for a single repeatability result.",
@@ -4,7 +4,6 @@ This module contains the routes for the projects API.
 
 import logging
 import os
-import uuid
 
 from bunnet import PydanticObjectId
 from bunnet.operators import In
@@ -25,12 +24,16 @@ from routes.v1.docs import projects as docs
 from sanic import Blueprint
 from sanic import json as json_response
 from sanic.request import Request
+from utils.upload_stream import S3Sink, UploadError, read_form, request_chunks
 from workers.celery_config import score_csv_data
 
 logger = logging.getLogger(__name__)
 
 projects_bp = Blueprint("projects", url_prefix="/projects")
 
+# Largest ground-truth CSV accepted for scoring (env: MAX_CSV_UPLOAD_BYTES).
+MAX_CSV_UPLOAD_BYTES = int(os.getenv("MAX_CSV_UPLOAD_BYTES", str(50 * 1024 * 1024)))
+
 
 @projects_bp.route("/", methods=["GET", "POST"], name="projects")
 @docs.project
@@ -312,7 +315,10 @@ async def project_results(request: Request, project_id: str):
 
 
 @projects_bp.route(
-    "/<project_id>/score_csv", methods=["POST", "GET"], name="project_analysis"
+    "/<project_id>/score_csv",
+    methods=["POST", "GET"],
+    name="project_analysis",
+    stream=True,
 )
 @docs.score_csv_endpoint
 @require_jwt
@@ -324,23 +330,48 @@ async def score_csv_endpoint(request: Request, project_id: str):
     user: User = request.ctx.user  # Get user from JWT context
 
     if request.method == "POST":
-        csv_file = request.files.get("file")
-        if not csv_file:
-            return json_response({"error": "No CSV file provided."}, status=400)
-
-        file_id = str(uuid.uuid4())
-
-        # Save CSV file temporarily (following the same pattern as add_paper)
-        file_path = f"papers/{file_id}-{csv_file.name}"
-
-        # Ensure directory exists
-        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        from workers.services.file_s3_service import CSV_STAGING_PREFIX, FileService
+
+        # Stream the CSV into the staging area of object storage, where any
+        # worker can read it, without holding it in memory or on local disk.
+        file_service = FileService()
+
+        def open_sink(_field: str, filename: str) -> S3Sink:
+            key = file_service.staging_key(CSV_STAGING_PREFIX, str(user.id), filename)
+            return S3Sink(
+                file_service.s3_client,
+                file_service.bucket_name,
+                key,
+                {"ContentType": "text/csv", "ServerSideEncryption": "AES256"},
+            )
 
-        with open(file_path, "wb") as f:
-            f.write(csv_file.body)
+        try:
+            form = await read_form(
+                request_chunks(request),
+                request.content_type,
+                open_sink,
+                MAX_CSV_UPLOAD_BYTES,
+            )
+        except UploadError as e:
+            return json_response({"error": str(e)}, status=e.status)
 
-        # Call the Celery task with the file path and user email
-        task = score_csv_data.delay(file_path, project_id, user.email)
+        uploads = form.getlist("file")
+        if not uploads:
+            await form.discard()
+            return json_response({"error": "No CSV file provided."}, status=400)
+        csv_file = uploads[0]
+        for extra in uploads[1:]:
+            await extra.sink.abort()
+
+        # Score against the project's stored results instead of predictions
+        # pasted into the CSV.
+        flag = str(form.get("against_results", "")).lower()
+        against_results = flag in ("1", "true", "yes")
+
+        # Call the Celery task with the staged key and user email
+        task = score_csv_data.delay(
+            csv_file.sink.key, project_id, user.email, against_results=against_results
+        )
 
         return json_response(
             {
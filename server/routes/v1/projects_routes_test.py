@@ -211,6 +211,34 @@ async def test_score_csv_post_requires_file(client, auth_headers, patch_auth_use
     assert response.json["error"] == "No CSV file provided."
 
 
+async def test_score_csv_post_can_score_against_results(
+    client, auth_headers, patch_auth_user, monkeypatch, fake_storage
+):
+    calls = []
+
+    def _delay(*args, **kwargs):
+        calls.append((args, kwargs))
+        return SimpleNamespace(id="task-1")
+
+    monkeypatch.setattr("routes.v1.projects.score_csv_data.delay", _delay)
+
+    _, response = await client.post(
+        "/api/v1/projects/p1/score_csv",
+        headers=auth_headers(),
+        files={"file": ("truth.csv", b"paper_id,paper.title\np,T\n")},
+        data={"against_results": "true"},
+    )
+
+    assert response.status_code == 200
+    assert response.json["task_id"] == "task-1"
+    ((args, kwargs),) = calls
+    assert args[1:] == ("p1", patch_auth_user.email)
+    assert kwargs == {"against_results": True}
+    # The worker is handed the staged object, not a path on the API node.
+    assert args[0].startswith("uploads/csv/user-1/")
+    assert fake_storage.objects[args[0]] == b"paper_id,paper.title\np,T\n"
+
+
 async def test_score_csv_get_requires_task_id(client, auth_headers, patch_auth_user):
     _, response = await client.get(
         "/api/v1/projects/p1/score_csv", headers=auth_headers()
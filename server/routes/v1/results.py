@@ -3,8 +3,11 @@ This module contains the routes for repeatability results and evaluations.
 """
 
 from controllers.results import (
+    evaluate_project_repeatability_controller,
     evaluate_repeatability_controller,
     get_feature_evaluations_controller,
+    get_project_repeatability_reports_controller,
+    get_repeatability_report_controller,
     get_repeatability_result_controller,
     run_feature_extraction_controller,
 )
@@ -33,9 +36,10 @@ async def evaluate_repeatability(request: Request, feature_id: str):
     paper_id = request.json.get("paper_id")
     project_id = request.json.get("project_id")
     socket_id = request.json.get("sid")
+    adaptive = request.json.get("adaptive", False)
 
     result = evaluate_repeatability_controller(
-        user, feature_id, paper_id, project_id, socket_id
+        user, feature_id, paper_id, project_id, socket_id, adaptive=adaptive
     )
     status = result.pop("status", 202)
     return json_response(result, status=status)
@@ -97,3 +101,64 @@ async def get_repeatability_result(request: Request, result_id: str):
     if "error" in result:
         return json_response(result, status=404)
     return json_response(result)
+
+
+@results_bp.route(
+    "/projects/<project_id:str>/evaluate_repeatability",
+    methods=["POST"],
+    name="evaluate_project_repeatability",
+)
+@docs.evaluate_project_repeatability
+@require_jwt
+@error_handler
+async def evaluate_project_repeatability(request: Request, project_id: str):
+    """
+    Trigger a repeatability evaluation of every feature of a project.
+    """
+    user = request.ctx.user
+    body = request.json or {}
+
+    result = evaluate_project_repeatability_controller(
+        user,
+        project_id,
+        body.get("sid"),
+        paper_ids=body.get("paper_ids"),
+        sample_size=body.get("sample_size"),
+        num_runs=body.get("num_runs"),
+    )
+    status = result.pop("status", 202)
+    return json_response(result, status=status)
+
+
+@results_bp.route(
+    "/projects/<project_id:str>/repeatability_reports",
+    methods=["GET"],
+    name="get_project_repeatability_reports",
+)
+@docs.get_project_repeatability_reports
+@require_jwt
+@error_handler
+async def get_project_repeatability_reports(request: Request, project_id: str):
+    """
+    List the repeatability reports of a project.
+    """
+    result = get_project_repeatability_reports_controller(project_id)
+    return json_response(result)
+
+
+@results_bp.route(
+    "/repeatability_reports/<report_id:str>",
+    methods=["GET"],
+    name="get_repeatability_report",
+)
+@docs.get_repeatability_report
+@require_jwt
+@error_handler
+async def get_repeatability_report(request: Request, report_id: str):
+    """
+    Get a project repeatability report.
+    """
+    result = get_repeatability_report_controller(report_id)
+    if "error" in result:
+        return json_response(result, status=404)
+    return json_response(result)
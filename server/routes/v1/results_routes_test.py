@@ -53,6 +53,31 @@ async def test_evaluate_repeatability_dispatches_task(
     assert captured["num_runs"] == 5
 
 
+async def test_evaluate_repeatability_forwards_adaptive_mode(
+    client, auth_headers, patch_auth_user, monkeypatch
+):
+    captured = {}
+
+    def _delay(**kwargs):
+        captured.update(kwargs)
+        return SimpleNamespace(id="task-eval")
+
+    monkeypatch.setattr(
+        "workers.evaluate_repeatability_task.evaluate_feature_repeatability.delay",
+        _delay,
+    )
+
+    _, response = await client.post(
+        "/api/v1/results/features/feat-1/evaluate_repeatability",
+        json={"paper_id": "paper-1", "project_id": "p1", "sid": "s1", "adaptive": True},
+        headers=auth_headers(),
+    )
+
+    assert response.status_code == 202
+    assert captured["adaptive"] is True
+    assert captured["num_runs"] == 5
+
+
 # ---------------------------------------------------------------------------
 # POST /api/v1/results/features/<feature_id>/extract
 # ---------------------------------------------------------------------------
@@ -115,3 +140,69 @@ async def test_get_repeatability_result_not_found(
     )
     assert response.status_code == 404
     assert response.json["error"] == "Not found"
+
+
+# ---------------------------------------------------------------------------
+# POST /api/v1/results/projects/<project_id>/evaluate_repeatability
+# ---------------------------------------------------------------------------
+
+
+class _Query:
+    def __init__(self, value):
+        self.value = value
+
+    def run(self):
+        return self.value
+
+
+async def test_evaluate_project_repeatability_dispatches_one_task(
+    client, auth_headers, patch_auth_user, monkeypatch
+):
+    captured = {}
+
+    def _delay(**kwargs):
+        captured.update(kwargs)
+        return SimpleNamespace(id="task-project")
+
+    monkeypatch.setattr(
+        "controllers.results.Project.get",
+        lambda *a, **k: _Query(SimpleNamespace(id="p1")),
+    )
+    monkeypatch.setattr(
+        "workers.evaluate_repeatability_task.evaluate_project_repeatability.delay",
+        _delay,
+    )
+
+    _, response = await client.post(
+        "/api/v1/results/projects/p1/evaluate_repeatability",
+        json={"sid": "s1", "paper_ids": ["paper-1", "paper-2"], "num_runs": 3},
+        headers=auth_headers(),
+    )
+
+    assert response.status_code == 202
+    assert response.json["task_id"] == "task-project"
+    assert captured["project_id"] == "p1"
+    assert captured["paper_ids"] == ["paper-1", "paper-2"]
+    assert captured["num_runs"] == 3
+
+
+async def test_evaluate_project_repeatability_validates_input(
+    client, auth_headers, patch_auth_user, monkeypatch
+):
+    monkeypatch.setattr(
+        "controllers.results.Project.get", lambda *a, **k: _Query(None)
+    )
+
+    _, response = await client.post(
+        "/api/v1/results/projects/p1/evaluate_repeatability",
+        json={"num_runs": 1},
+        headers=auth_headers(),
+    )
+    assert response.status_code == 400
+
+    _, response = await client.post(
+        "/api/v1/results/projects/missing/evaluate_repeatability",
+        json={},
+        headers=auth_headers(),
+    )
+    assert response.status_code == 404
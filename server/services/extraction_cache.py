@@ -0,0 +1,157 @@
+"""Content-addressed cache of completed extractions.
+
+Re-running extraction on a paper whose inputs did not change is pure waste: the
+provider is sent the same PDF, schema, model and instructions and bills the
+same tokens again. This module fingerprints those four inputs and stores the
+strategy output under the fingerprint (see
+``database/models/extraction_cache``) so reprocessing can reuse it without any
+provider call.
+
+The fingerprint is deliberately strict. Any change that could alter the model's
+answer — a feature's schema, the project prompt, the model, the paper bytes —
+produces a new key, so a hit is always safe to reuse. Changes that cannot alter
+the answer (project title, description, paper order) do not touch the key.
+
+Cache failures never fail an extraction: a lookup error is treated as a miss
+and a store error is logged and ignored.
+"""
+
+import hashlib
+import json
+import logging
+from dataclasses import dataclass
+from datetime import UTC, datetime
+from typing import Any, Dict, Optional
+
+from bunnet.operators import Inc, Set
+from database.models.extraction_cache import ExtractionCache
+from pymongo.errors import DuplicateKeyError
+
+logger = logging.getLogger(__name__)
+
+
+def canonical_hash(value: Any) -> str:
+    """SHA-256 of *value* serialized as canonical JSON.
+
+    Keys are sorted and whitespace is fixed so two structurally equal schemas
+    hash identically regardless of how they were assembled.
+    """
+    payload = json.dumps(
+        value, sort_keys=True, separators=(",", ":"), ensure_ascii=False
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+@dataclass(frozen=True)
+class ExtractionFingerprint:
+    """The inputs that fully determine an extraction, and their joint key."""
+
+    file_hash: str
+    schema_hash: str
+    model: str
+    instructions_hash: str
+    # How the paper was transformed before sending (see
+    # ``services.pdf_preprocess``); "" when it is sent as uploaded.
+    input_variant: str = ""
+
+    @classmethod
+    def build(
+        cls,
+        file_hash: str,
+        schema_hash: str,
+        model: str,
+        instructions: str,
+        input_variant: str = "",
+    ) -> "ExtractionFingerprint":
+        """Fingerprint a request from its inputs.
+
+        ``schema_hash`` is ``canonical_hash`` of the schema, as precomputed by
+        ``services.schema_registry``.
+        """
+        return cls(
+            file_hash=file_hash,
+            schema_hash=schema_hash,
+            model=model,
+            instructions_hash=hashlib.sha256(
+                (instructions or "").encode("utf-8")
+            ).hexdigest(),
+            input_variant=input_variant,
+        )
+
+    @property
+    def key(self) -> str:
+        """The cache key: a hash over all components.
+
+        The input variant only enters the key when set, so keys of unmodified
+        inputs are unchanged.
+        """
+        parts = [self.file_hash, self.schema_hash, self.model, self.instructions_hash]
+        if self.input_variant:
+            parts.append(self.input_variant)
+        return canonical_hash(parts)
+
+
+def lookup_extraction(fingerprint: ExtractionFingerprint) -> Optional[Dict[str, Any]]:
+    """Return the cached strategy output for *fingerprint*, or None on a miss.
+
+    The returned dict has the same shape a strategy's ``extract`` returns
+    (``result``, ``model``, ``prompt_tokens``, ``completion_tokens``) so
+    callers can use it interchangeably. The hit counter is bumped atomically.
+    """
+    try:
+        entry = ExtractionCache.find_one(
+            ExtractionCache.cache_key == fingerprint.key
+        ).run()
+        if not entry:
+            return None
+        ExtractionCache.find_one(ExtractionCache.id == entry.id).update(
+            Inc({ExtractionCache.hits: 1}),
+            Set({ExtractionCache.last_hit_at: datetime.now(UTC)}),
+        ).run()
+    except Exception as e:
+        logger.warning("Extraction cache lookup failed; treating as miss: %s", e)
+        return None
+
+    logger.info(
+        "Extraction cache hit for file %s (model %s)",
+        fingerprint.file_hash[:12],
+        fingerprint.model,
+    )
+    return {
+        "result": entry.result,
+        "model": entry.model,
+        "prompt_tokens": entry.prompt_tokens,
+        "completion_tokens": entry.completion_tokens,
+    }
+
+
+def store_extraction(
+    fingerprint: ExtractionFingerprint, strategy: str, output: Dict[str, Any]
+) -> None:
+    """Persist a successful strategy *output* under *fingerprint*.
+
+    Outputs that are not a completed extraction (not a dict, or carrying an
+    error marker) are not cached. Concurrent writers racing on the same key are
+    harmless: the unique index keeps the first and the rest are ignored.
+    """
+    result = output.get("result")
+    if not isinstance(result, dict) or "error" in result:
+        return
+
+    entry = ExtractionCache(
+        cache_key=fingerprint.key,
+        file_hash=fingerprint.file_hash,
+        schema_hash=fingerprint.schema_hash,
+        model=fingerprint.model,
+        instructions_hash=fingerprint.instructions_hash,
+        strategy=strategy,
+        result=result,
+        prompt_tokens=output.get("prompt_tokens", 0) or 0,
+        completion_tokens=output.get("completion_tokens", 0) or 0,
+    )
+    try:
+        entry.insert()
+    except DuplicateKeyError:
+        logger.info("Extraction already cached under %s", fingerprint.key[:12])
+    except Exception as e:
+        logger.warning("Failed to store extraction in cache: %s", e)
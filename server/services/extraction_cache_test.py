@@ -0,0 +1,248 @@
+"""Tests for the content-addressed extraction cache.
+
+The key must be stable across equivalent inputs (so reprocessing hits) and
+must change with every input that can alter the model's answer (so a hit is
+always safe). The controller wiring is exercised with the cache and the
+strategy faked: a hit must skip both the provider call and metering.
+"""
+
+import os
+from types import SimpleNamespace
+
+import pytest
+
+os.environ.setdefault("ENCRYPTION_KEY", "ejLBwioJGDEHsU2B81jWR_RAQg5DMSglU8b7VDYbnm4=")
+
+from controllers import assisstant as A  # noqa: E402
+from services.extraction_cache import (  # noqa: E402
+    ExtractionFingerprint,
+    canonical_hash,
+    store_extraction,
+)
+
+SCHEMA = {
+    "type": "object",
+    "properties": {"paper": {"type": "object", "properties": {"title": {}}}},
+    "required": ["paper"],
+}
+
+
+def _fp(**overrides):
+    base = dict(
+        file_hash="f" * 64,
+        schema_hash=canonical_hash(SCHEMA),
+        model="gpt-5.4-mini",
+        instructions="x",
+    )
+    base.update(overrides)
+    return ExtractionFingerprint.build(**base)
+
+
+@pytest.mark.unit
+def test_canonical_hash_ignores_key_order():
+    a = {"b": 1, "a": {"y": [1, 2], "x": None}}
+    b = {"a": {"x": None, "y": [1, 2]}, "b": 1}
+    assert canonical_hash(a) == canonical_hash(b)
+    # List order is meaningful and must not be normalized away.
+    assert canonical_hash([1, 2]) != canonical_hash([2, 1])
+
+
+@pytest.mark.unit
+def test_fingerprint_key_is_deterministic():
+    assert _fp().key == _fp().key
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize(
+    "change",
+    [
+        {"file_hash": "0" * 64},
+        {"schema_hash": canonical_hash({**SCHEMA, "required": []})},
+        {"model": "claude-opus-4-8"},
+        {"instructions": "y"},
+        {"input_variant": "pruned"},
+    ],
+)
+def test_fingerprint_key_changes_with_every_input(change):
+    assert _fp(**change).key != _fp().key
+
+
+@pytest.mark.unit
+def test_unmodified_input_keeps_the_original_key():
+    fp = _fp()
+    assert fp.key == canonical_hash(
+        [fp.file_hash, fp.schema_hash, fp.model, fp.instructions_hash]
+    )
+
+
+@pytest.mark.unit
+def test_store_skips_failed_extractions(monkeypatch):
+    inserted = []
+
+    class FakeEntry:
+        def __init__(self, **kwargs):
+            self.kwargs = kwargs
+
+        def insert(self):
+            inserted.append(self.kwargs)
+
+    monkeypatch.setattr("services.extraction_cache.ExtractionCache", FakeEntry)
+
+    store_extraction(_fp(), "openai_json_schema", {"result": {"error": "boom"}})
+    store_extraction(_fp(), "openai_json_schema", {"result": None})
+    assert inserted == []
+
+    store_extraction(
+        _fp(),
+        "openai_json_schema",
+        {"result": {"paper": {}}, "prompt_tokens": 10, "completion_tokens": 2},
+    )
+    assert len(inserted) == 1
+    assert inserted[0]["cache_key"] == _fp().key
+    assert inserted[0]["prompt_tokens"] == 10
+
+
+# ---------------------------------------------------------------------------
+# run_assistant_api wiring
+# ---------------------------------------------------------------------------
+class FakeStrategy:
+    MODEL = "gpt-5.4-mini"
+
+    def __init__(self):
+        self.extract_calls = 0
+        self.paths = []
+
+    def get_strategy_name(self):
+        return "openai_json_schema"
+
+    def cache_inputs(self, custom_prompt=None, feature_ids=None):
+        return canonical_hash(SCHEMA), custom_prompt or "default"
+
+    async def aextract(self, file_path, custom_prompt=None, feature_ids=None):
+        return self.extract(file_path, custom_prompt, feature_ids)
+
+    def extract(self, file_path, custom_prompt=None, feature_ids=None):
+        self.extract_calls += 1
+        self.paths.append(file_path)
+        return {
+            "result": {"paper": {"title": "fresh"}},
+            "model": self.MODEL,
+            "prompt_tokens": 100,
+            "completion_tokens": 10,
+        }
+
+
+@pytest.fixture
+def controller(monkeypatch):
+    """Fake every external boundary of ``run_assistant_api``."""
+    strategy = FakeStrategy()
+    state = SimpleNamespace(strategy=strategy, cache={}, metered=[])
+
+    monkeypatch.setattr(
+        A,
+        "resolve_and_check",
+        lambda user, provider: SimpleNamespace(api_key="sk-test", is_byo=False),
+    )
+    monkeypatch.setattr(
+        A.ExtractionStrategyFactory, "create_strategy", lambda **kw: strategy
+    )
+    monkeypatch.setattr(
+        A, "lookup_extraction", lambda fp: state.cache.get(fp.key)
+    )
+    monkeypatch.setattr(
+        A,
+        "store_extraction",
+        lambda fp, name, output: state.cache.setdefault(fp.key, output),
+    )
+
+    def _record(user, credentials, **kwargs):
+        state.metered.append(kwargs)
+        return 1_000
+
+    monkeypatch.setattr(A, "record_usage", _record)
+    return state
+
+
+def _run(**kwargs):
+    emitter = SimpleNamespace(emit_status=lambda **kw: None)
+    return A.run_assistant_api(
+        "papers/p.pdf",
+        "",
+        emitter,
+        SimpleNamespace(email="u@example.com"),
+        strategy_type="openai_json_schema",
+        **kwargs,
+    )
+
+
+@pytest.mark.unit
+def test_cache_hit_skips_provider_and_metering(controller):
+    first = _run(file_hash="a" * 64)
+    assert first["cached"] is False
+    assert controller.strategy.extract_calls == 1
+    assert len(controller.metered) == 1
+
+    second = _run(file_hash="a" * 64)
+    assert second["cached"] is True
+    assert second["usd_charged"] == 0.0
+    assert second["output"]["result"] == {"paper": {"title": "fresh"}}
+    assert controller.strategy.extract_calls == 1
+    assert len(controller.metered) == 1
+
+
+@pytest.mark.unit
+def test_cache_bypassed_without_hash_or_when_disabled(controller):
+    _run(file_hash="a" * 64)
+    _run(file_hash="a" * 64, use_cache=False)
+    _run()
+    assert controller.strategy.extract_calls == 3
+    assert len(controller.metered) == 3
+
+
+@pytest.mark.unit
+async def test_async_run_caches_and_meters_like_sync(controller):
+    emitter = SimpleNamespace(emit_status=lambda **kw: None)
+    user = SimpleNamespace(email="u@example.com")
+
+    async def _arun():
+        return await A.arun_assistant_api(
+            "papers/p.pdf",
+            "",
+            emitter,
+            user,
+            strategy_type="openai_json_schema",
+            file_hash="b" * 64,
+        )
+
+    first = await _arun()
+    second = await _arun()
+
+    assert (first["cached"], second["cached"]) == (False, True)
+    assert controller.strategy.extract_calls == 1
+    assert len(controller.metered) == 1
+
+
+@pytest.mark.unit
+def test_preprocessed_input_is_sent_and_cached_separately(controller, monkeypatch):
+    _run(file_hash="c" * 64)
+
+    from services.pdf_preprocess import PreprocessedPaper
+
+    stats = {"mode": "text", "est_input_tokens_saved": 1200}
+    monkeypatch.setattr(A, "preprocess_variant", lambda: "v1")
+    monkeypatch.setattr(
+        A,
+        "preprocess_paper",
+        lambda path, file_hash: PreprocessedPaper(
+            file_path="papers/p.txt", text="pruned", variant="v1", stats=stats
+        ),
+    )
+    res = _run(file_hash="c" * 64)
+
+    # Not served from the entry computed on the unmodified PDF.
+    assert res["cached"] is False
+    assert res["preprocessing"] == stats
+    strategy = controller.strategy
+    assert strategy.paths == ["papers/p.pdf", "papers/p.txt"]
+    assert strategy.paper_text == "pruned"
+    assert strategy.file_hash == "c" * 64 + ":v1"
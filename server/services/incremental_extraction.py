@@ -0,0 +1,131 @@
+"""Incremental extraction: extract only the features a paper's result lacks.
+
+Reprocessing a paper re-extracts every feature of its project. After a feature
+is added (or edited), the latest result of each paper already holds the values
+of every other feature, so incremental mode compares the result's
+``feature_list`` / ``feature_versions`` with the project's current features and
+asks the model only for the ones that are
+
+- missing from the result (added to the project since), or
+- at another version than the one the result was extracted with.
+
+The narrower extraction also asks for the key fields (see
+``services.schema_sharding.KEY_FIELDS``) of every array scope above those
+features, so its experiments and conditions can be aligned with the previous
+result's. ``merge_incremental`` then builds the new result: the previous
+values, minus those of changed or removed features, merged with the new ones.
+
+Results stored before ``feature_versions`` existed only reveal missing
+features; edits to their features are not detected.
+"""
+
+import copy
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+from services.schema_sharding import KEY_FIELDS, merge_results
+
+
+@dataclass
+class IncrementalPlan:
+    """What an incremental extraction of one paper has to do."""
+
+    # Feature ids to extract (the changed features and their key fields).
+    feature_ids: List[str] = field(default_factory=list)
+    # Identifiers whose previous values are dropped from the result.
+    stale: Set[str] = field(default_factory=set)
+
+    @property
+    def up_to_date(self) -> bool:
+        return not self.feature_ids
+
+
+def feature_versions(features: Iterable[Any]) -> Dict[str, int]:
+    """Map feature id to version, as recorded on a ``Result``."""
+    return {str(f.id): f.version for f in features if hasattr(f, "version")}
+
+
+def plan_incremental(
+    features: Iterable[Any],
+    previous_list: Iterable[str],
+    previous_versions: Optional[Dict[str, int]] = None,
+) -> IncrementalPlan:
+    """Compare the project's *features* with the previous result's.
+
+    *features* are the project's feature documents; *previous_list* and
+    *previous_versions* are the ``feature_list`` and ``feature_versions`` of
+    the latest result.
+    """
+    previous_versions = previous_versions or {}
+    previous_ids = set(previous_list)
+    leaves = [f for f in features if not f.feature_identifier.endswith("parent")]
+    by_identifier = {f.feature_identifier: f for f in leaves}
+
+    wanted = []
+    stale = set()
+    for feature in leaves:
+        identifier = feature.feature_identifier
+        known = previous_versions.get(str(feature.id))
+        if identifier not in previous_ids:
+            wanted.append(feature)
+        elif known is not None and known != feature.version:
+            wanted.append(feature)
+            stale.add(identifier)
+    stale |= {
+        identifier
+        for identifier in previous_ids
+        if identifier not in by_identifier and not identifier.endswith("parent")
+    }
+    if not wanted:
+        return IncrementalPlan(stale=stale)
+
+    # Key fields of every scope above the wanted features, for alignment.
+    chosen = {f.feature_identifier for f in wanted}
+    for feature in list(wanted):
+        scopes = feature.feature_identifier.split(".")[:-1]
+        for depth in range(1, len(scopes) + 1):
+            prefix = ".".join(scopes[:depth])
+            key = next(
+                (
+                    by_identifier[f"{prefix}.{name}"]
+                    for name in KEY_FIELDS
+                    if f"{prefix}.{name}" in by_identifier
+                ),
+                None,
+            )
+            if key is not None and key.feature_identifier not in chosen:
+                chosen.add(key.feature_identifier)
+                wanted.append(key)
+
+    return IncrementalPlan(feature_ids=[str(f.id) for f in wanted], stale=stale)
+
+
+def drop_leaves(result: Any, identifiers: Iterable[str]) -> Any:
+    """A copy of *result* without the values of the given features."""
+    result = copy.deepcopy(result)
+    for identifier in identifiers:
+        _drop(result, identifier.split("."))
+    return result
+
+
+def _drop(node: Any, path: List[str]) -> None:
+    if isinstance(node, list):
+        for item in node:
+            _drop(item, path)
+    elif isinstance(node, dict):
+        if len(path) == 1:
+            node.pop(path[0], None)
+        elif path[0] in node:
+            _drop(node[path[0]], path[1:])
+
+
+def merge_incremental(
+    schema: dict, previous: dict, partial: dict, stale: Iterable[str]
+) -> dict:
+    """The previous result with *stale* values replaced by *partial*'s.
+
+    *schema* is the project's full extraction schema. Previous values win
+    wherever both have one (notably the key fields), so untouched values and
+    the identity of existing items are kept.
+    """
+    return merge_results(schema, [drop_leaves(previous, stale), partial])
@@ -0,0 +1,106 @@
+"""Tests for planning and merging incremental extractions."""
+
+from types import SimpleNamespace
+
+import pytest
+from services import incremental_extraction as I
+from services.schema_sharding_test import _schema
+
+
+def _features(*specs):
+    return [
+        SimpleNamespace(id=f"id-{identifier}", feature_identifier=identifier, version=v)
+        for identifier, v in specs
+    ]
+
+
+FEATURES = _features(
+    ("paper.parent", 1),
+    ("paper.title", 1),
+    ("paper.experiments.parent", 1),
+    ("paper.experiments.name", 1),
+    ("paper.experiments.n", 2),
+    ("paper.experiments.new", 1),
+)
+
+
+@pytest.mark.unit
+def test_plan_extracts_missing_and_changed_features_with_their_keys():
+    previous_list = ["paper.title", "paper.experiments.name", "paper.experiments.n"]
+    versions = {"id-paper.title": 1, "id-paper.experiments.name": 1}
+
+    plan = I.plan_incremental(FEATURES, previous_list, versions)
+    # The new feature, plus the key fields that align it with the old result.
+    assert plan.feature_ids == [
+        "id-paper.experiments.new",
+        "id-paper.title",
+        "id-paper.experiments.name",
+    ]
+    assert plan.stale == set()
+
+    # "n" was extracted at version 1 and is now at 2; "old" left the project.
+    versions["id-paper.experiments.n"] = 1
+    plan = I.plan_incremental(FEATURES, previous_list + ["paper.old"], versions)
+    assert set(plan.feature_ids) == {
+        "id-paper.experiments.n",
+        "id-paper.experiments.new",
+        "id-paper.experiments.name",
+        "id-paper.title",
+    }
+    assert plan.stale == {"paper.experiments.n", "paper.old"}
+
+
+@pytest.mark.unit
+def test_plan_is_up_to_date_when_nothing_changed():
+    identifiers = [f.feature_identifier for f in FEATURES]
+    plan = I.plan_incremental(FEATURES, identifiers, I.feature_versions(FEATURES))
+    assert plan.up_to_date and not plan.stale
+
+
+@pytest.mark.unit
+def test_merge_keeps_untouched_values_and_replaces_stale_ones():
+    schema = _schema(
+        ["paper.title", "paper.experiments.name"]
+        + ["paper.experiments.n", "paper.experiments.new"]
+    )
+    previous = {
+        "paper": [
+            {
+                "title": "T",
+                "old": "gone",
+                "experiments": [
+                    {"name": "Study 1", "n": "10"},
+                    {"name": "Study 2", "n": "20"},
+                ],
+            }
+        ]
+    }
+    partial = {
+        "paper": [
+            {
+                "title": "T.",
+                "experiments": [
+                    {"name": "study 2", "n": "21", "new": "b"},
+                    {"name": "Study 1", "n": "11", "new": "a"},
+                ],
+            }
+        ]
+    }
+
+    merged = I.merge_incremental(
+        schema, previous, partial, {"paper.experiments.n", "paper.old"}
+    )
+
+    assert merged == {
+        "paper": [
+            {
+                "title": "T",
+                "experiments": [
+                    {"name": "Study 1", "n": "11", "new": "a"},
+                    {"name": "Study 2", "n": "21", "new": "b"},
+                ],
+            }
+        ]
+    }
+    # The previous result itself is not modified.
+    assert previous["paper"][0]["old"] == "gone"
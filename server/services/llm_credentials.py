@@ -190,7 +190,16 @@ def resolve_llm_credentials(user: User, provider: Provider) -> LlmCredentials:
     byo_key = _decrypt_user_key(user, provider)
     if byo_key:
         return LlmCredentials(provider=provider, api_key=byo_key, is_byo=True)
+    return platform_credentials(provider)
 
+
+def platform_credentials(provider: Provider) -> LlmCredentials:
+    """The Atlas platform key for *provider*, whatever key the user has.
+
+    Raises :class:`MissingPlatformKeyError` if it is not configured.
+    """
+    if provider not in _PLATFORM_ENV:
+        raise ValueError(f"Unknown provider: {provider!r}")
     platform_key = os.getenv(_PLATFORM_ENV[provider])
     if not platform_key:
         raise MissingPlatformKeyError(
@@ -233,12 +242,17 @@ def record_usage(
     model: str,
     prompt_tokens: int,
     completion_tokens: int,
+    batch: bool = False,
+    cached_tokens: int = 0,
+    cache_write_tokens: int = 0,
 ) -> int:
     """Record the USD cost of a call against the monthly budget.
 
-    Cost is computed from *model* pricing and the input/output token split, then
-    charged in micro-dollars. Only platform (non-BYO) calls are metered; BYO
-    calls are ignored because the user pays the provider directly.
+    Cost is computed from *model* pricing and the input/output token split (at
+    the batch rate when ``batch`` is set, with prompt-cache reads and writes at
+    the model's cache rates), then charged in micro-dollars. Only platform
+    (non-BYO) calls are metered; BYO calls are ignored because the user pays
+    the provider directly.
 
     The increment is atomic (Mongo ``$inc``) so concurrent workers for the same
     user cannot clobber each other's counts. A stale monthly window is reset
@@ -248,7 +262,14 @@ def record_usage(
     if credentials.is_byo:
         return 0
 
-    charge_micros = cost_micros(model, prompt_tokens, completion_tokens)
+    charge_micros = cost_micros(
+        model,
+        prompt_tokens,
+        completion_tokens,
+        batch=batch,
+        cached_tokens=cached_tokens,
+        cache_write_tokens=cache_write_tokens,
+    )
     if charge_micros <= 0:
         return 0
 
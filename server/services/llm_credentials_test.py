@@ -18,6 +18,9 @@ os.environ.setdefault("ENCRYPTION_KEY", "ejLBwioJGDEHsU2B81jWR_RAQg5DMSglU8b7VDY
 from services import llm_credentials as L  # noqa: E402
 from services.model_pricing import MICROS_PER_USD, cost_micros  # noqa: E402
 from utils.crypto import encrypt_secret  # noqa: E402
+from workers.strategies.anthropic_json_schema_strategy import (  # noqa: E402
+    AnthropicJSONSchemaStrategy,
+)
 
 
 def _user(**overrides):
@@ -171,6 +174,33 @@ def test_record_usage_charges_platform_by_model_price():
     assert user.monthly_usd_used_micros == 5_250_000
 
 
+def test_record_usage_prices_anthropic_cache_reads_and_writes():
+    user = _user(
+        monthly_usd_used_micros=0, usage_period_start=L._current_period_start()
+    )
+    cred = L.LlmCredentials(provider="anthropic", api_key="sk-ant", is_byo=False)
+    usage = {
+        "input_tokens": 10_000,
+        "cache_read_input_tokens": 800_000,
+        "cache_creation_input_tokens": 100_000,
+        "output_tokens": 2_000,
+    }
+    output = AnthropicJSONSchemaStrategy._output("{}", usage)
+    # $5/1M input, $0.50/1M cache read, $6.25/1M cache write, $25/1M output:
+    # 50_000 + 400_000 + 625_000 + 50_000 micros.
+    charged = L.record_usage(
+        user,
+        cred,
+        model=output["model"],
+        prompt_tokens=output["prompt_tokens"],
+        completion_tokens=output["completion_tokens"],
+        cached_tokens=output["cached_prompt_tokens"],
+        cache_write_tokens=output["cache_write_tokens"],
+    )
+    assert charged == 1_125_000
+    assert user.monthly_usd_used_micros == 1_125_000
+
+
 def test_record_usage_unknown_model_charges_zero():
     user = _user(
         monthly_usd_used_micros=10, usage_period_start=L._current_period_start()
@@ -200,6 +230,21 @@ def test_cost_micros_gpt55():
     assert micros == 35_000_000  # $35
 
 
+def test_cost_micros_batch_rate_is_half():
+    assert cost_micros("gpt-5.5", 1_000_000, 1_000_000, batch=True) == 17_500_000
+
+
+def test_cost_micros_prices_cached_input_at_the_cache_rate():
+    # 1M input of which 800k cached: 200k * $5 + 800k * $0.5 = $1.40.
+    assert cost_micros("gpt-5.5", 1_000_000, 0, cached_tokens=800_000) == 1_400_000
+    # No cache-write rate listed: writes are billed as normal input.
+    assert cost_micros("gpt-5.5", 1_000_000, 0, cache_write_tokens=1_000_000) == (
+        cost_micros("gpt-5.5", 1_000_000, 0)
+    )
+    # Cache counts larger than the total input are clamped.
+    assert cost_micros("gpt-5.5", 100, 0, cached_tokens=500) == 50
+
+
 # ---------------------------------------------------------------------------
 # period helpers
 # ---------------------------------------------------------------------------
@@ -9,6 +9,11 @@ Prices are expressed in USD per 1,000,000 tokens (the unit providers publish).
 Update ``MODEL_PRICING`` whenever a provider changes prices or a new model is
 added.
 
+Prompt caching: providers bill input tokens served from their prompt cache at
+a discount (and Anthropic bills writing the cache at a premium). Strategies
+report those counts separately and ``cost_micros`` prices them with the
+model's cache rates, falling back to the full input rate when none is listed.
+
 Money is handled internally in **integer micro-dollars** (1 USD = 1,000,000
 micros) to avoid floating-point drift when accumulating many small charges with
 atomic ``$inc`` operations. Convert to/from USD only at the edges (display).
@@ -22,6 +27,10 @@ logger = logging.getLogger(__name__)
 
 MICROS_PER_USD = 1_000_000
 
+# Provider batch APIs (OpenAI Batch, Anthropic Message Batches) bill both input
+# and output tokens at half the synchronous rate.
+BATCH_DISCOUNT = 0.5
+
 
 @dataclass(frozen=True)
 class ModelPrice:
@@ -30,17 +39,32 @@ class ModelPrice:
     provider: str
     input_per_million: float
     output_per_million: float
+    # Input tokens read from the provider's prompt cache. None = input rate.
+    cached_input_per_million: Optional[float] = None
+    # Input tokens written to the prompt cache (Anthropic). None = input rate.
+    cache_write_per_million: Optional[float] = None
 
 
 # Canonical price list. Keys are the exact model identifiers passed to the
 # provider APIs. Keep this in sync with provider pricing pages.
 MODEL_PRICING: dict[str, ModelPrice] = {
-    "gpt-5.4-mini": ModelPrice("openai", 0.75, 4.5),
-    "gpt-5.4": ModelPrice("openai", 2.5, 15.0),
-    "gpt-5.5": ModelPrice("openai", 5.0, 30.0),
+    "gpt-5.4-mini": ModelPrice("openai", 0.75, 4.5, cached_input_per_million=0.075),
+    "gpt-5.4": ModelPrice("openai", 2.5, 15.0, cached_input_per_million=0.25),
+    "gpt-5.5": ModelPrice("openai", 5.0, 30.0, cached_input_per_million=0.5),
+    # Semantic string comparison in ground-truth scoring (string_comparison).
+    "o3-mini": ModelPrice("openai", 1.1, 4.4, cached_input_per_million=0.55),
     # Used by the Assistant API strategy (assistant_api).
     # TODO(pricing): confirm real gpt-4.1 prices — these are PLACEHOLDERS.
-    "gpt-4.1": ModelPrice("openai", 2.0, 8.0),
+    "gpt-4.1": ModelPrice("openai", 2.0, 8.0, cached_input_per_million=0.5),
+    # Anthropic JSON schema strategy (anthropic_json_schema). Cache reads are
+    # 0.1x input; writes to the default 5-minute cache are 1.25x input.
+    "claude-opus-4-8": ModelPrice(
+        "anthropic",
+        5.0,
+        25.0,
+        cached_input_per_million=0.5,
+        cache_write_per_million=6.25,
+    ),
 }
 
 
@@ -49,9 +73,21 @@ def get_price(model: str) -> Optional[ModelPrice]:
     return MODEL_PRICING.get(model)
 
 
-def cost_micros(model: str, prompt_tokens: int, completion_tokens: int) -> int:
+def cost_micros(
+    model: str,
+    prompt_tokens: int,
+    completion_tokens: int,
+    batch: bool = False,
+    cached_tokens: int = 0,
+    cache_write_tokens: int = 0,
+) -> int:
     """Compute the cost of a call in integer micro-dollars.
 
+    ``prompt_tokens`` is the total input of the call; ``cached_tokens`` (read
+    from the prompt cache) and ``cache_write_tokens`` (written to it) are the
+    parts of it billed at the model's cache rates. ``batch`` prices the call at
+    the provider batch rate (``BATCH_DISCOUNT``).
+
     Returns 0 (and logs a warning) for an unknown model so that a successful
     extraction is never lost just because we can't price it yet — better to
     under-charge with a loud log than to fail the user's completed work.
@@ -68,10 +104,25 @@ def cost_micros(model: str, prompt_tokens: int, completion_tokens: int) -> int:
 
     prompt_tokens = max(0, prompt_tokens or 0)
     completion_tokens = max(0, completion_tokens or 0)
+    cached_tokens = min(max(0, cached_tokens or 0), prompt_tokens)
+    cache_write_tokens = min(
+        max(0, cache_write_tokens or 0), prompt_tokens - cached_tokens
+    )
+    uncached_tokens = prompt_tokens - cached_tokens - cache_write_tokens
+    cached_rate = price.cached_input_per_million
+    if cached_rate is None:
+        cached_rate = price.input_per_million
+    write_rate = price.cache_write_per_million
+    if write_rate is None:
+        write_rate = price.input_per_million
     micros = (
-        prompt_tokens * price.input_per_million
+        uncached_tokens * price.input_per_million
+        + cached_tokens * cached_rate
+        + cache_write_tokens * write_rate
         + completion_tokens * price.output_per_million
     )
+    if batch:
+        micros *= BATCH_DISCOUNT
     return round(micros)
 
 
@@ -0,0 +1,295 @@
+"""Local PDF preprocessing before an extraction call.
+
+Every strategy normally sends the raw PDF, so references, acknowledgements and
+similar back matter are billed as input tokens on every call. With
+``EXTRACTION_PREPROCESS`` set, ``run_assistant_api`` first extracts the text
+layer locally (pypdf, CPU only), drops low-value sections, and sends:
+
+- ``text``: the remaining text, as plain text;
+- ``pdf``: a copy of the PDF without the pages that were dropped entirely.
+
+Section rules are headings matched on their own line. A dropped section runs
+from its heading to the next dropped or resume heading (or the end of the
+paper). Drop headings in the first ``min_position`` of the text are ignored, so
+a table of contents or a front-matter "Funding" note cannot swallow the body.
+
+The per-page text is cached per ``Paper.file_hash`` (``PaperText``), so rule
+changes never need a re-parse. The preprocessing settings form an input
+variant that is part of the extraction cache key and of upload pooling: an
+answer computed from pruned input is never reused for a different pruning.
+
+Papers without a usable text layer (scans) are sent unchanged.
+"""
+
+import logging
+import os
+import re
+import tempfile
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+from database.models.paper_text import PaperText
+from pymongo.errors import DuplicateKeyError
+from pypdf import PdfReader, PdfWriter
+from services.extraction_cache import canonical_hash
+
+logger = logging.getLogger(__name__)
+
+PREPROCESS_OFF = "off"
+PREPROCESS_TEXT = "text"
+PREPROCESS_PDF = "pdf"
+
+EXTRACTOR = "pypdf-1"
+
+DEFAULT_DROP = (
+    "references",
+    "bibliography",
+    "works cited",
+    "literature cited",
+    "acknowledgements",
+    "acknowledgments",
+    "acknowledgement",
+    "acknowledgment",
+    "funding",
+    "conflict of interest",
+    "conflicts of interest",
+    "competing interests",
+    "author contributions",
+)
+DEFAULT_RESUME = (
+    "appendix",
+    "appendices",
+    "supplementary material",
+    "supplementary materials",
+    "supplementary information",
+    "supporting information",
+    "online appendix",
+    "methods",
+    "materials and methods",
+    "online methods",
+)
+
+# Rough input tokens per character of English text, for savings estimates.
+CHARS_PER_TOKEN = 4
+# Below this many characters the PDF is assumed to have no text layer.
+MIN_TEXT_CHARS = 500
+
+# Optional section number ("3", "3.2.", "A.", "IV.") then the heading text.
+_HEADING = re.compile(
+    r"^\s*(?:(?:\d+(?:\.\d+)*|[A-Z]|[IVX]+)\.?\s+)?"
+    r"([A-Za-z][A-Za-z &\-]{2,60}?)\s*:?\s*$"
+)
+
+
+def _env_list(name: str, default: Tuple[str, ...]) -> Tuple[str, ...]:
+    raw = os.getenv(name)
+    if not raw:
+        return default
+    return tuple(item.strip().lower() for item in raw.split(",") if item.strip())
+
+
+@dataclass(frozen=True)
+class SectionRules:
+    """Which sections to drop, and which headings end a dropped section."""
+
+    drop: Tuple[str, ...] = DEFAULT_DROP
+    resume: Tuple[str, ...] = DEFAULT_RESUME
+    min_position: float = 0.3
+
+    @classmethod
+    def from_env(cls) -> "SectionRules":
+        return cls(
+            drop=_env_list("EXTRACTION_PREPROCESS_DROP", DEFAULT_DROP),
+            resume=_env_list("EXTRACTION_PREPROCESS_RESUME", DEFAULT_RESUME),
+        )
+
+    def heading(self, line: str) -> Optional[str]:
+        """The normalized heading name if *line* is a drop/resume heading."""
+        match = _HEADING.match(line)
+        if not match:
+            return None
+        name = " ".join(match.group(1).lower().split())
+        return name if name in self.drop or name in self.resume else None
+
+
+@dataclass
+class PreprocessedPaper:
+    """What to send for one paper, and what preprocessing saved."""
+
+    file_path: str
+    # Set in text mode: the pruned paper text, sent instead of the file.
+    text: Optional[str] = None
+    # Identifies the preprocessing settings; "" when the input is unchanged.
+    variant: str = ""
+    stats: Optional[Dict[str, Any]] = None
+    _temp_path: Optional[str] = field(default=None, repr=False)
+
+    def cleanup(self) -> None:
+        """Remove the derived file, if one was written."""
+        if self._temp_path and os.path.exists(self._temp_path):
+            os.remove(self._temp_path)
+
+
+def preprocess_mode() -> str:
+    mode = os.getenv("EXTRACTION_PREPROCESS", PREPROCESS_OFF).lower()
+    if mode not in (PREPROCESS_OFF, PREPROCESS_TEXT, PREPROCESS_PDF):
+        logger.warning("Unknown EXTRACTION_PREPROCESS=%r; preprocessing is off", mode)
+        return PREPROCESS_OFF
+    return mode
+
+
+def preprocess_variant(
+    mode: Optional[str] = None, rules: Optional[SectionRules] = None
+) -> str:
+    """Short id of the preprocessing settings ("" when it is off)."""
+    mode = mode or preprocess_mode()
+    if mode == PREPROCESS_OFF:
+        return ""
+    rules = rules or SectionRules.from_env()
+    return canonical_hash(
+        [EXTRACTOR, mode, list(rules.drop), list(rules.resume), rules.min_position]
+    )[:16]
+
+
+# ---------------------------------------------------------------------------
+# Text layer
+# ---------------------------------------------------------------------------
+def extract_pages(file_path: str) -> List[str]:
+    """Per-page text of the PDF at *file_path*."""
+    reader = PdfReader(file_path)
+    return [page.extract_text() or "" for page in reader.pages]
+
+
+def _cached_pages(file_hash: str) -> Optional[List[str]]:
+    try:
+        entry = PaperText.find_one(PaperText.file_hash == file_hash).run()
+    except Exception as e:
+        logger.warning("Paper text cache lookup failed: %s", e)
+        return None
+    if entry and entry.extractor == EXTRACTOR:
+        return entry.pages
+    return None
+
+
+def _store_pages(file_hash: str, pages: List[str]) -> None:
+    try:
+        PaperText(file_hash=file_hash, extractor=EXTRACTOR, pages=pages).insert()
+    except DuplicateKeyError:
+        pass
+    except Exception as e:
+        logger.warning("Failed to cache paper text: %s", e)
+
+
+def load_pages(file_path: str, file_hash: Optional[str]) -> Tuple[List[str], bool]:
+    """Return ``(pages, cache_hit)``, extracting and caching on a miss."""
+    if file_hash:
+        pages = _cached_pages(file_hash)
+        if pages is not None:
+            return pages, True
+    pages = extract_pages(file_path)
+    if file_hash:
+        _store_pages(file_hash, pages)
+    return pages, False
+
+
+# ---------------------------------------------------------------------------
+# Section pruning
+# ---------------------------------------------------------------------------
+def prune_pages(pages: List[str], rules: SectionRules) -> List[List[str]]:
+    """Return the kept lines of each page after dropping ruled-out sections."""
+    total = sum(len(page) for page in pages) or 1
+    seen = 0
+    dropping = False
+    kept: List[List[str]] = []
+    for page in pages:
+        page_kept = []
+        for line in page.splitlines():
+            name = rules.heading(line)
+            if name in rules.drop and seen / total >= rules.min_position:
+                dropping = True
+            elif name is not None:
+                dropping = False
+            seen += len(line) + 1
+            if not dropping:
+                page_kept.append(line)
+        kept.append(page_kept)
+    return kept
+
+
+def _write_pdf(file_path: str, keep_pages: List[int]) -> str:
+    reader = PdfReader(file_path)
+    writer = PdfWriter()
+    for index in keep_pages:
+        writer.add_page(reader.pages[index])
+    fd, out_path = tempfile.mkstemp(suffix=".pdf", prefix="slim_")
+    with os.fdopen(fd, "wb") as out:
+        writer.write(out)
+    return out_path
+
+
+def _write_text(text: str) -> str:
+    fd, out_path = tempfile.mkstemp(suffix=".txt", prefix="paper_")
+    with os.fdopen(fd, "w", encoding="utf-8") as out:
+        out.write(text)
+    return out_path
+
+
+def preprocess_paper(
+    file_path: str,
+    file_hash: Optional[str],
+    mode: Optional[str] = None,
+    rules: Optional[SectionRules] = None,
+) -> PreprocessedPaper:
+    """Prepare *file_path* for extraction according to *mode*.
+
+    In text mode a ``.txt`` copy is also written, for strategies that can only
+    send files. Call ``cleanup()`` on the result when done.
+    """
+    mode = mode or preprocess_mode()
+    if mode == PREPROCESS_OFF:
+        return PreprocessedPaper(file_path=file_path)
+    rules = rules or SectionRules.from_env()
+    started = time.perf_counter()
+
+    try:
+        pages, cache_hit = load_pages(file_path, file_hash)
+    except Exception as e:
+        logger.warning("Text extraction failed; sending the PDF unchanged: %s", e)
+        return PreprocessedPaper(file_path=file_path)
+
+    chars_total = sum(len(page) for page in pages)
+    if chars_total < MIN_TEXT_CHARS:
+        logger.info("No usable text layer; sending the PDF unchanged")
+        return PreprocessedPaper(file_path=file_path)
+
+    kept = prune_pages(pages, rules)
+    stats: Dict[str, Any] = {
+        "mode": mode,
+        "text_cache_hit": cache_hit,
+        "pages_total": len(pages),
+    }
+
+    if mode == PREPROCESS_TEXT:
+        text = "\n\n".join("\n".join(lines) for lines in kept if lines)
+        result = PreprocessedPaper(file_path=file_path, text=text)
+        result._temp_path = result.file_path = _write_text(text)
+        chars_kept = len(text)
+        stats["pages_kept"] = sum(1 for lines in kept if lines)
+    else:
+        keep_pages = [i for i, lines in enumerate(kept) if lines]
+        result = PreprocessedPaper(file_path=file_path)
+        if len(keep_pages) < len(pages):
+            result._temp_path = result.file_path = _write_pdf(file_path, keep_pages)
+        chars_kept = sum(len(pages[i]) for i in keep_pages)
+        stats["pages_kept"] = len(keep_pages)
+
+    result.variant = preprocess_variant(mode, rules)
+    stats["chars_total"] = chars_total
+    stats["chars_kept"] = chars_kept
+    # A lower bound: providers also bill page images of PDF input.
+    stats["est_input_tokens_saved"] = (chars_total - chars_kept) // CHARS_PER_TOKEN
+    stats["seconds"] = round(time.perf_counter() - started, 3)
+    result.stats = stats
+    logger.info("Preprocessed paper: %s", stats)
+    return result
@@ -0,0 +1,152 @@
+"""Tests for the local PDF preprocessing stage.
+
+PDFs are generated with pypdf so text extraction runs for real; the
+``PaperText`` cache is replaced by a dict.
+"""
+
+import os
+
+import pytest
+from pypdf import PdfReader, PdfWriter
+from pypdf.generic import DecodedStreamObject, DictionaryObject, NameObject
+from services import pdf_preprocess as P
+
+BODY = [f"Participants in study {i} completed the task online." for i in range(12)]
+REFERENCES = [f"Author{i}, A. (2020). A cited paper. Journal, {i}." for i in range(12)]
+
+
+def _escape(text):
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def _write_pdf(path, pages):
+    """Write a PDF whose pages hold the given lines of text."""
+    writer = PdfWriter()
+    font = DictionaryObject(
+        {
+            NameObject("/Type"): NameObject("/Font"),
+            NameObject("/Subtype"): NameObject("/Type1"),
+            NameObject("/BaseFont"): NameObject("/Helvetica"),
+        }
+    )
+    for lines in pages:
+        page = writer.add_blank_page(width=612, height=792)
+        page[NameObject("/Resources")] = DictionaryObject(
+            {
+                NameObject("/Font"): DictionaryObject(
+                    {NameObject("/F1"): writer._add_object(font)}
+                )
+            }
+        )
+        ops = ["BT", "/F1 10 Tf", "14 TL", "50 750 Td"]
+        ops += [f"({_escape(line)}) Tj T*" for line in lines]
+        ops.append("ET")
+        stream = DecodedStreamObject()
+        stream.set_data("\n".join(ops).encode("latin-1"))
+        page[NameObject("/Contents")] = writer._add_object(stream)
+    with open(path, "wb") as out:
+        writer.write(out)
+    return str(path)
+
+
+@pytest.fixture
+def text_cache(monkeypatch):
+    store = {}
+    monkeypatch.setattr(P, "_cached_pages", lambda h: store.get(h))
+    monkeypatch.setattr(P, "_store_pages", lambda h, pages: store.setdefault(h, pages))
+    return store
+
+
+def _paper(tmp_path):
+    pages = [
+        ["Introduction"] + BODY,
+        ["Results"] + BODY,
+        ["Discussion"] + BODY[:6] + ["Acknowledgements", "We thank our funders."],
+        ["References"] + REFERENCES,
+        REFERENCES,
+        ["Appendix", "Table A1 lists all 12 study sites."],
+    ]
+    return _write_pdf(tmp_path / "paper.pdf", pages)
+
+
+@pytest.mark.unit
+def test_prune_drops_back_matter_until_a_resume_heading():
+    rules = P.SectionRules()
+    pages = [
+        "Contents\nReferences\n" + "\n".join(BODY),
+        "\n".join(BODY),
+        "2. Acknowledgments\nThanks.\nREFERENCES\n" + "\n".join(REFERENCES),
+        "Appendix A\nTable A1.\nAppendix\nTable A2.",
+    ]
+
+    kept = P.prune_pages(pages, rules)
+
+    # The early "References" (a table of contents) is not treated as a section.
+    assert kept[0][:2] == ["Contents", "References"]
+    assert kept[1] == BODY
+    assert kept[2] == []
+    # "Appendix A" is not a known heading; the bare "Appendix" resumes.
+    assert kept[3] == ["Appendix", "Table A2."]
+
+
+@pytest.mark.unit
+def test_text_mode_sends_pruned_text_and_reports_savings(tmp_path, text_cache):
+    path = _paper(tmp_path)
+
+    paper = P.preprocess_paper(path, "h1", mode=P.PREPROCESS_TEXT)
+    try:
+        assert "Participants in study 0" in paper.text
+        assert "Appendix" in paper.text
+        assert "cited paper" not in paper.text
+        assert "We thank our funders" not in paper.text
+        # A text copy is written for strategies that can only send files.
+        assert paper.file_path.endswith(".txt")
+        with open(paper.file_path, encoding="utf-8") as f:
+            assert f.read() == paper.text
+        assert paper.variant
+        assert paper.stats["text_cache_hit"] is False
+        assert paper.stats["chars_kept"] < paper.stats["chars_total"]
+        assert paper.stats["est_input_tokens_saved"] > 0
+    finally:
+        paper.cleanup()
+    assert not os.path.exists(paper.file_path)
+
+    # The second run reads the cached text layer.
+    again = P.preprocess_paper(path, "h1", mode=P.PREPROCESS_TEXT)
+    again.cleanup()
+    assert again.stats["text_cache_hit"] is True
+    assert again.text == paper.text
+
+
+@pytest.mark.unit
+def test_pdf_mode_drops_only_fully_pruned_pages(tmp_path, text_cache):
+    paper = P.preprocess_paper(_paper(tmp_path), None, mode=P.PREPROCESS_PDF)
+    try:
+        assert paper.text is None
+        assert paper.stats["pages_total"] == 6
+        # The reference pages go; the page acknowledgements start on stays.
+        assert paper.stats["pages_kept"] == 4
+        assert len(PdfReader(paper.file_path).pages) == 4
+    finally:
+        paper.cleanup()
+
+
+@pytest.mark.unit
+def test_papers_without_text_layer_are_sent_unchanged(tmp_path, text_cache):
+    path = _write_pdf(tmp_path / "scan.pdf", [[], []])
+
+    paper = P.preprocess_paper(path, "h2", mode=P.PREPROCESS_PDF)
+
+    assert paper.file_path == path
+    assert paper.variant == "" and paper.stats is None
+
+
+@pytest.mark.unit
+def test_variant_tracks_mode_and_rules(monkeypatch):
+    monkeypatch.delenv("EXTRACTION_PREPROCESS", raising=False)
+    assert P.preprocess_variant() == ""
+    text = P.preprocess_variant(P.PREPROCESS_TEXT, P.SectionRules())
+    assert text != P.preprocess_variant(P.PREPROCESS_PDF, P.SectionRules())
+    assert text != P.preprocess_variant(
+        P.PREPROCESS_TEXT, P.SectionRules(drop=("references",))
+    )
@@ -0,0 +1,221 @@
+"""Per-worker registry of compiled extraction schemas.
+
+Building the strict JSON schema for a project used to cost, on every
+extraction, a ``Project.get(fetch_links=True)``, one ``Features.find_one`` per
+parent scope and several recursive passes over the result — and the work was
+repeated by every caller in the same task (the cache fingerprint, the strategy
+itself, the assistant's function definition).
+
+This module compiles a feature set once into an immutable ``CompiledSchema``
+(schema JSON plus its content hash) and keeps it in a bounded in-process LRU.
+Entries are keyed by a *fingerprint* of the inputs rather than by project:
+the ``(id, identifier, version, updated_at)`` stamp of every feature and every
+parent definition involved, read with projected queries. Editing a feature
+(``version`` / ``updated_at`` change) or the project's feature list therefore
+produces a new key, and the stale entry simply ages out. No explicit
+invalidation is needed across workers.
+
+A warm lookup costs the project document plus two projected queries; a cold
+one adds a single batched fetch of the feature and parent documents.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from bunnet import PydanticObjectId
+from bunnet.operators import In
+from database.models.features import Features
+from database.models.projects import Project
+from gpt_assistant import (
+    build_parent_objects,
+    enforce_additional_properties,
+    parent_identifiers,
+)
+from pydantic import BaseModel
+from services.extraction_cache import canonical_hash
+
+logger = logging.getLogger(__name__)
+
+MAX_ENTRIES = int(os.getenv("SCHEMA_REGISTRY_SIZE", "256"))
+
+_cache: "OrderedDict[str, CompiledSchema]" = OrderedDict()
+_lock = threading.Lock()
+
+
+class FeatureStamp(BaseModel):
+    """The fields of a feature that decide if a compiled schema is stale."""
+
+    id: PydanticObjectId
+    feature_identifier: str
+    version: int = 1
+    updated_at: Optional[datetime] = None
+
+    class Settings:
+        projection = {
+            "id": "$_id",
+            "feature_identifier": 1,
+            "version": 1,
+            "updated_at": 1,
+        }
+
+
+@dataclass(frozen=True)
+class CompiledSchema:
+    """A strict extraction schema compiled from a feature set."""
+
+    fingerprint: str
+    schema_hash: str
+    feature_list: Tuple[str, ...]
+    schema_json: str
+
+    @property
+    def schema(self) -> dict:
+        """A fresh copy of the schema; callers may mutate it freely."""
+        return json.loads(self.schema_json)
+
+
+def get_compiled_schema(
+    project_id: Optional[str] = None, feature_ids: Optional[List[str]] = None
+) -> CompiledSchema:
+    """Return the compiled schema for *feature_ids* or the project's features.
+
+    Raises:
+        ValueError: if neither argument is given, or no features resolve.
+    """
+    if feature_ids:
+        ids = [PydanticObjectId(fid) for fid in feature_ids]
+    elif project_id:
+        project = Project.get(project_id).run()
+        if not project:
+            raise ValueError(f"Project {project_id} not found")
+        ids = [link.ref.id for link in project.features]
+    else:
+        raise ValueError("Either project_id or feature_ids must be provided")
+
+    stamps = _feature_stamps(ids)
+    if not stamps:
+        raise ValueError("No features found for extraction")
+
+    parents = parent_identifiers([s.feature_identifier for s in stamps])
+    parent_stamps = (
+        sorted(
+            Features.find(In(Features.feature_identifier, parents))
+            .project(FeatureStamp)
+            .run(),
+            key=lambda s: s.feature_identifier,
+        )
+        if parents
+        else []
+    )
+    fingerprint = _fingerprint(stamps, parent_stamps)
+
+    with _lock:
+        compiled = _cache.get(fingerprint)
+        if compiled is not None:
+            _cache.move_to_end(fingerprint)
+            return compiled
+
+    compiled = _compile(fingerprint, stamps, parent_stamps)
+    with _lock:
+        _cache[fingerprint] = compiled
+        _cache.move_to_end(fingerprint)
+        while len(_cache) > MAX_ENTRIES:
+            _cache.popitem(last=False)
+    return compiled
+
+
+def clear() -> None:
+    """Drop every compiled schema held by this worker."""
+    with _lock:
+        _cache.clear()
+
+
+def _feature_stamps(ids: List[PydanticObjectId]) -> List[FeatureStamp]:
+    """Stamps for the leaf features among *ids*, in the order given."""
+    found = {
+        stamp.id: stamp
+        for stamp in Features.find(In(Features.id, ids)).project(FeatureStamp).run()
+    }
+    return [
+        found[fid]
+        for fid in ids
+        if fid in found and not found[fid].feature_identifier.endswith("parent")
+    ]
+
+
+def _fingerprint(stamps: List[FeatureStamp], parent_stamps: List[FeatureStamp]) -> str:
+    """Hash the identity and revision of each document the schema uses."""
+    digest = hashlib.sha256()
+    for group in (stamps, parent_stamps):
+        for s in group:
+            updated = s.updated_at.isoformat() if s.updated_at else ""
+            digest.update(
+                f"{s.id}|{s.feature_identifier}|{s.version}|{updated}\n".encode()
+            )
+        digest.update(b"--\n")
+    return digest.hexdigest()
+
+
+def _compile(
+    fingerprint: str,
+    stamps: List[FeatureStamp],
+    parent_stamps: List[FeatureStamp],
+) -> CompiledSchema:
+    """Fetch the full documents once and build the strict schema."""
+    docs = {
+        doc.id: doc
+        for doc in Features.find(
+            In(Features.id, [s.id for s in stamps + parent_stamps])
+        ).run()
+    }
+
+    feature_obj: Dict[str, dict] = {}
+    order: List[str] = []
+    for stamp in stamps:
+        doc = docs.get(stamp.id)
+        if doc is None:
+            continue
+        feature_obj[doc.feature_identifier] = doc.feature_gpt_interface.model_dump(
+            exclude_none=True
+        )
+        order.append(doc.feature_identifier)
+    if not order:
+        raise ValueError("No features found for extraction")
+    feature_list = sorted(order, key=lambda s: s.count("."))
+
+    parent_schemas = {
+        doc.feature_identifier[: -len(".parent")]: (
+            doc.feature_gpt_interface.parent_dump()
+        )
+        for doc in (docs.get(s.id) for s in parent_stamps)
+        if doc is not None
+    }
+
+    schema = enforce_additional_properties(
+        {
+            "type": "object",
+            "properties": build_parent_objects(
+                feature_list, feature_obj, parent_schemas
+            ),
+            "required": ["paper"],
+            "additionalProperties": False,
+        }
+    )
+    logger.info(
+        "Compiled extraction schema for %d features (%s)",
+        len(feature_list),
+        fingerprint[:12],
+    )
+    return CompiledSchema(
+        fingerprint=fingerprint,
+        schema_hash=canonical_hash(schema),
+        feature_list=tuple(feature_list),
+        schema_json=json.dumps(schema, separators=(",", ":")),
+    )
@@ -0,0 +1,149 @@
+"""Tests for the compiled schema registry.
+
+``Features`` and ``Project`` are replaced with in-memory fakes that count the
+queries they serve, so the tests pin down both the compiled schema and the
+query budget: parents are fetched in one batch, and a warm lookup never
+re-fetches full documents.
+"""
+
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+from bunnet import PydanticObjectId
+from database.schemas.gpt_interface import GPTInterface
+from services import schema_registry as R
+
+
+def _feature(identifier, kind="string", version=1):
+    return SimpleNamespace(
+        id=PydanticObjectId(),
+        feature_identifier=identifier,
+        version=version,
+        updated_at=datetime(2026, 1, 1),
+        feature_gpt_interface=GPTInterface(
+            type=kind, description=f"{identifier} prompt"
+        ),
+    )
+
+
+class FakeFeatures:
+    """Just enough of the bunnet query API for the registry."""
+
+    id = "id"
+    feature_identifier = "feature_identifier"
+
+    def __init__(self, docs):
+        self.docs = docs
+        self.full_fetches = 0
+        self.stamp_queries = 0
+
+    def find(self, query):
+        field, values = query
+        matched = [d for d in self.docs if getattr(d, field) in values]
+        features = self
+
+        class _Query:
+            def project(self, model):
+                features.stamp_queries += 1
+                return SimpleNamespace(
+                    run=lambda: [
+                        model(
+                            id=d.id,
+                            feature_identifier=d.feature_identifier,
+                            version=d.version,
+                            updated_at=d.updated_at,
+                        )
+                        for d in matched
+                    ]
+                )
+
+            def run(self):
+                features.full_fetches += 1
+                return matched
+
+        return _Query()
+
+
+@pytest.fixture
+def registry(monkeypatch):
+    title = _feature("paper.title")
+    n = _feature("experiments.n", kind="integer")
+    parent = _feature("experiments.parent", kind="array")
+    features = FakeFeatures([title, n, parent])
+    project = SimpleNamespace(
+        features=[SimpleNamespace(ref=SimpleNamespace(id=f.id)) for f in (n, title)]
+    )
+
+    monkeypatch.setattr(R, "Features", features)
+    monkeypatch.setattr(R, "In", lambda field, values: (field, list(values)))
+    monkeypatch.setattr(
+        R, "Project", SimpleNamespace(get=lambda pid: SimpleNamespace(run=lambda: project))
+    )
+    R.clear()
+    yield SimpleNamespace(features=features, parent=parent, n=n, title=title)
+    R.clear()
+
+
+@pytest.mark.unit
+def test_compiles_strict_schema_with_parent_definitions(registry):
+    compiled = R.get_compiled_schema(project_id="p1")
+    schema = compiled.schema
+
+    assert compiled.feature_list == ("experiments.n", "paper.title")
+    assert schema["required"] == ["paper"]
+    assert schema["additionalProperties"] is False
+    experiments = schema["properties"]["experiments"]
+    assert experiments["description"] == "experiments.parent prompt"
+    assert experiments["items"]["properties"]["n"]["type"] == "integer"
+    assert experiments["items"]["required"] == ["n"]
+    assert experiments["items"]["additionalProperties"] is False
+    assert compiled.schema_hash == R.canonical_hash(schema)
+
+
+@pytest.mark.unit
+def test_warm_lookup_skips_document_fetch(registry):
+    first = R.get_compiled_schema(project_id="p1")
+    assert registry.features.full_fetches == 1
+
+    second = R.get_compiled_schema(project_id="p1")
+    assert second is first
+    assert registry.features.full_fetches == 1
+    # Leaf stamps + one batched parent stamp query per lookup.
+    assert registry.features.stamp_queries == 4
+
+
+@pytest.mark.unit
+def test_feature_edit_invalidates(registry):
+    first = R.get_compiled_schema(project_id="p1")
+
+    registry.parent.version = 2
+    registry.parent.feature_gpt_interface = GPTInterface(
+        type="array", description="Every experiment reported."
+    )
+    second = R.get_compiled_schema(project_id="p1")
+
+    assert second.fingerprint != first.fingerprint
+    assert second.schema_hash != first.schema_hash
+    assert (
+        second.schema["properties"]["experiments"]["description"]
+        == "Every experiment reported."
+    )
+
+
+@pytest.mark.unit
+def test_explicit_feature_ids_and_missing_inputs(registry):
+    compiled = R.get_compiled_schema(feature_ids=[str(registry.title.id)])
+    assert compiled.feature_list == ("paper.title",)
+
+    with pytest.raises(ValueError):
+        R.get_compiled_schema()
+    with pytest.raises(ValueError):
+        R.get_compiled_schema(feature_ids=[str(PydanticObjectId())])
+
+
+@pytest.mark.unit
+def test_schema_copies_are_independent(registry):
+    compiled = R.get_compiled_schema(project_id="p1")
+    compiled.schema["properties"].clear()
+    assert compiled.schema["properties"]
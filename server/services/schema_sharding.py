@@ -0,0 +1,225 @@
+"""Split a large extraction schema into shards and merge the shard results.
+
+A project with many features compiles into one strict schema, sent in a single
+call; the answer can outgrow the provider's output limit and its latency grows
+with its size. ``shard_schema`` partitions the leaf features into shards of at
+most ``max_features`` leaves, each a valid strict schema of its own, so the
+shards can be extracted concurrently and ``merge_results`` can put the partial
+answers back together into the shape of the full schema.
+
+Shards follow the parent scopes (``paper``, ``experiments``, ``conditions``):
+the leaves of one scope stay together unless the scope alone exceeds the
+limit. Every array of objects is aligned across shards by its key field (the
+first of ``KEY_FIELDS`` among its leaves), which is therefore included in
+every shard that touches the scope or one of its descendants. Arrays without a
+key field, or whose items do not all carry a key, are aligned by index. Keyed
+items that find no match are paired in order when both sides have the same
+number left over (the key was spelled differently), else appended.
+
+Merging is deterministic: shards are merged in order, the first value of a leaf
+wins, and object keys follow the schema's property order.
+"""
+
+import copy
+import os
+from functools import reduce
+from typing import Any, Dict, List, Optional, Tuple
+
+# Leaves per shard; 0 (the default) sends the whole schema in one call. Every
+# shard re-sends the paper and instructions, so sharding trades input cost for
+# latency and output headroom and is opt-in.
+SHARD_MAX_FEATURES = int(os.getenv("EXTRACTION_SHARD_FEATURES", "0"))
+
+# Leaf names that identify an item of an array of objects, in order of
+# preference.
+KEY_FIELDS = ("name", "title", "id", "label")
+
+Scope = Tuple[str, ...]
+
+
+def _item_schema(node: dict) -> Optional[dict]:
+    """The object schema of an array-of-objects node, else None."""
+    items = node.get("items")
+    if node.get("type") == "array" and isinstance(items, dict):
+        if items.get("type") == "object" or "properties" in items:
+            return items
+    return None
+
+
+def _container(node: dict) -> Optional[dict]:
+    """The object schema holding the properties of *node*, if it has any."""
+    if node.get("type") == "object" or "properties" in node:
+        return node
+    return _item_schema(node)
+
+
+def _key_field(container: dict) -> Optional[str]:
+    properties = container.get("properties", {})
+    for name in KEY_FIELDS:
+        if name in properties and _container(properties[name]) is None:
+            return name
+    return None
+
+
+def _scopes(schema: dict) -> Dict[Scope, List[str]]:
+    """The leaf names of every scope, in schema order."""
+    scopes: Dict[Scope, List[str]] = {}
+
+    def walk(container: dict, scope: Scope) -> None:
+        leaves = scopes.setdefault(scope, [])
+        for name, node in container.get("properties", {}).items():
+            child = _container(node)
+            if child is None:
+                leaves.append(name)
+            else:
+                walk(child, scope + (name,))
+
+    walk(schema, ())
+    return scopes
+
+
+def _keys_for(schema: dict, scope: Scope) -> Dict[Scope, str]:
+    """Key fields of *scope* and of every array scope above it."""
+    keys = {}
+    container = schema
+    for depth, name in enumerate(scope):
+        node = container["properties"][name]
+        container = _container(node)
+        key = _key_field(container) if _item_schema(node) else None
+        if key:
+            keys[scope[: depth + 1]] = key
+    return keys
+
+
+def _subschema(container: dict, wanted: Dict[Scope, set], scope: Scope) -> dict:
+    """Copy *container* keeping only the wanted leaves and their ancestors."""
+    kept = {}
+    for name, node in container.get("properties", {}).items():
+        child = _container(node)
+        if child is None:
+            if name in wanted.get(scope, ()):
+                kept[name] = copy.deepcopy(node)
+            continue
+        inner = scope + (name,)
+        if not any(s[: len(inner)] == inner for s in wanted):
+            continue
+        trimmed = _subschema(child, wanted, inner)
+        if child is node:
+            kept[name] = trimmed
+        else:
+            kept[name] = {**copy.deepcopy(node), "items": trimmed}
+    result = {k: copy.deepcopy(v) for k, v in container.items() if k != "properties"}
+    result["properties"] = kept
+    if "required" in container:
+        result["required"] = [k for k in container["required"] if k in kept]
+    return result
+
+
+def shard_schema(schema: dict, max_features: int = SHARD_MAX_FEATURES) -> List[dict]:
+    """Split *schema* into shards of at most *max_features* leaves.
+
+    Returns ``[schema]`` when no split is needed. Key fields are added to the
+    shards that need them and do not count towards the limit.
+    """
+    scopes = _scopes(schema)
+    if max_features <= 0 or sum(map(len, scopes.values())) <= max_features:
+        return [schema]
+
+    # Break every scope into pieces of at most max_features non-key leaves.
+    pieces: List[Tuple[Scope, List[str]]] = []
+    for scope, leaves in scopes.items():
+        key = _keys_for(schema, scope).get(scope)
+        rest = [leaf for leaf in leaves if leaf != key]
+        if leaves and not rest:
+            # Only the key field: it still has to be extracted somewhere.
+            pieces.append((scope, []))
+        for start in range(0, len(rest), max_features):
+            pieces.append((scope, rest[start : start + max_features]))
+
+    # Pack the pieces, in schema order, into as few shards as fit.
+    groups: List[List[Tuple[Scope, List[str]]]] = []
+    size = 0
+    for piece in pieces:
+        if not groups or size + len(piece[1]) > max_features:
+            groups.append([])
+            size = 0
+        groups[-1].append(piece)
+        size += len(piece[1])
+
+    shards = []
+    for group in groups:
+        wanted: Dict[Scope, set] = {}
+        for scope, leaves in group:
+            wanted.setdefault(scope, set()).update(leaves)
+            for key_scope, key in _keys_for(schema, scope).items():
+                wanted.setdefault(key_scope, set()).add(key)
+        shards.append(_subschema(schema, wanted, ()))
+    return shards
+
+
+def _normalized(value: Any) -> Any:
+    return " ".join(value.casefold().split()) if isinstance(value, str) else value
+
+
+def _merge_items(left: list, right: list, items: dict) -> list:
+    key = _key_field(items)
+    keyed = key is not None and all(
+        isinstance(item, dict) and item.get(key) not in (None, "")
+        for item in left + right
+    )
+    if not keyed:
+        merged = [_merge(a, b, items) for a, b in zip(left, right)]
+        longer = left if len(left) > len(right) else right
+        return merged + longer[len(merged) :]
+
+    merged = list(left)
+    unmatched = []
+    used = set()
+    for item in right:
+        match = next(
+            (
+                i
+                for i, existing in enumerate(left)
+                if i not in used
+                and _normalized(existing[key]) == _normalized(item[key])
+            ),
+            None,
+        )
+        if match is None:
+            unmatched.append(item)
+        else:
+            used.add(match)
+            merged[match] = _merge(left[match], item, items)
+    # As many leftovers on both sides: the keys were spelled differently
+    # across shards, so pair the leftovers in order.
+    free = [i for i in range(len(left)) if i not in used]
+    if len(free) != len(unmatched):
+        return merged + unmatched
+    for i, item in zip(free, unmatched):
+        merged[i] = _merge(left[i], item, items)
+    return merged
+
+
+def _merge(left: Any, right: Any, node: dict) -> Any:
+    if left is None:
+        return right
+    if right is None:
+        return left
+    items = _item_schema(node)
+    if items is not None and isinstance(left, list) and isinstance(right, list):
+        return _merge_items(left, right, items)
+    container = _container(node)
+    if container is not None and isinstance(left, dict) and isinstance(right, dict):
+        properties = container.get("properties", {})
+        order = list(properties) + [k for k in {**left, **right} if k not in properties]
+        return {
+            name: _merge(left.get(name), right.get(name), properties.get(name, {}))
+            for name in order
+            if name in left or name in right
+        }
+    return left
+
+
+def merge_results(schema: dict, results: List[dict]) -> dict:
+    """Merge shard results of *schema*, in shard order, into one result."""
+    return reduce(lambda merged, part: _merge(merged, part, schema), results, {})
@@ -0,0 +1,147 @@
+"""Tests for splitting extraction schemas into shards and merging the results.
+
+Schemas are built with ``build_parent_objects`` from in-memory feature
+definitions, so they have the exact shape the schema registry compiles.
+"""
+
+import pytest
+from gpt_assistant import build_parent_objects, enforce_additional_properties
+from services import schema_sharding as S
+
+PARENT = {
+    "type": "array",
+    "description": "parent",
+    "items": {"type": "object", "properties": {}, "required": []},
+}
+
+
+def _schema(feature_list):
+    features = {f: {"type": "string", "description": f} for f in feature_list}
+    parents = {"paper": PARENT, "experiments": PARENT, "conditions": PARENT}
+    return enforce_additional_properties(
+        {
+            "type": "object",
+            "properties": build_parent_objects(feature_list, features, parents),
+            "required": ["paper"],
+            "additionalProperties": False,
+        }
+    )
+
+
+FEATURES = (
+    ["paper.title"]
+    + [f"paper.p{i}" for i in range(3)]
+    + ["paper.experiments.name"]
+    + [f"paper.experiments.e{i}" for i in range(5)]
+    + ["paper.experiments.conditions.name"]
+    + [f"paper.experiments.conditions.c{i}" for i in range(4)]
+)
+
+
+def _leaves(schema, prefix=""):
+    out = set()
+    for name, node in schema.get("properties", {}).items():
+        child = S._container(node)
+        path = f"{prefix}{name}"
+        out |= _leaves(child, path + ".") if child else {path}
+    return out
+
+
+def _assert_strict(container):
+    assert container["required"] == list(container["properties"])
+    for node in container["properties"].values():
+        child = S._container(node)
+        if child:
+            _assert_strict(child)
+
+
+@pytest.mark.unit
+def test_small_schema_is_not_split():
+    schema = _schema(FEATURES)
+    assert S.shard_schema(schema, 20) == [schema]
+    assert S.shard_schema(schema, 0) == [schema]
+
+
+@pytest.mark.unit
+def test_shards_follow_scopes_and_carry_key_fields():
+    schema = _schema(FEATURES)
+
+    shards = S.shard_schema(schema, 5)
+
+    leaves = [_leaves(shard) for shard in shards]
+    for shard in shards:
+        _assert_strict(shard)
+    # Every leaf lands in some shard; the non-key leaves in exactly one.
+    assert set().union(*leaves) == _leaves(schema)
+    keys = {
+        "paper.title",
+        "paper.experiments.name",
+        "paper.experiments.conditions.name",
+    }
+    non_key = [leaf for shard in leaves for leaf in shard - keys]
+    assert len(non_key) == len(set(non_key)) == len(FEATURES) - len(keys)
+    # No shard holds more than the limit, key fields aside.
+    assert all(len(shard - keys) <= 5 for shard in leaves)
+    # A scope that fits stays in one shard.
+    assert any({f"paper.experiments.e{i}" for i in range(5)} <= s for s in leaves)
+    # Condition shards can be aligned at every level above them.
+    for shard in leaves:
+        if any(".conditions." in leaf for leaf in shard):
+            assert keys <= shard
+
+
+@pytest.mark.unit
+def test_merge_aligns_arrays_by_key_with_positional_fallback():
+    schema = _schema(FEATURES)
+    first = {
+        "paper": [
+            {
+                "title": "T",
+                "p0": "a",
+                "experiments": [
+                    {"name": "Study 1", "e0": "x"},
+                    {"name": "Study 2", "e0": "y"},
+                ],
+            }
+        ]
+    }
+    second = {
+        "paper": [
+            {
+                "title": "T",
+                "experiments": [
+                    {
+                        "name": "study  2",
+                        "conditions": [{"name": "control", "c0": "1"}],
+                    },
+                    {"name": "Study 1", "conditions": []},
+                ],
+            }
+        ]
+    }
+
+    merged = S.merge_results(schema, [first, second])
+
+    (paper,) = merged["paper"]
+    assert list(paper) == ["title", "p0", "experiments"]
+    assert paper["experiments"] == [
+        {"name": "Study 1", "e0": "x", "conditions": []},
+        {
+            "name": "Study 2",
+            "e0": "y",
+            "conditions": [{"name": "control", "c0": "1"}],
+        },
+    ]
+    # Merging is deterministic and the first shard wins on conflicts.
+    assert S.merge_results(schema, [first, second]) == merged
+    renamed = {"paper": [{"title": "Other", "experiments": [{"name": "Exp. 1"}]}]}
+    merged = S.merge_results(schema, [first, renamed])
+    assert merged["paper"][0]["title"] == "T"
+    # Unmatched keys append, unless the leftovers pair up one to one.
+    assert len(merged["paper"][0]["experiments"]) == 3
+    one = {"paper": [{"title": "T", "experiments": [{"name": "A", "e0": "x"}]}]}
+    other = {"paper": [{"title": "T", "experiments": [{"name": "B", "e1": "z"}]}]}
+    merged = S.merge_results(schema, [one, other])
+    assert merged["paper"][0]["experiments"] == [
+        {"name": "A", "e0": "x", "e1": "z"}
+    ]
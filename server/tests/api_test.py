@@ -43,6 +43,19 @@ async def test_health_ok(client):
     assert r.json.get("status") == "ok"
 
 
+@pytest.mark.asyncio
+@pytest.mark.route
+async def test_pdf_cache_stats(client, monkeypatch):
+    """
+    Test the PDF cache metrics endpoint.
+    """
+    stats = {"hits": 3, "misses": 1, "hit_rate": 0.75}
+    monkeypatch.setattr(api, "cache_stats", lambda: stats)
+    _, r = await client.get("/health/pdf_cache")
+    assert r.status_code == 200
+    assert r.json == stats
+
+
 @pytest.mark.asyncio
 @pytest.mark.route
 async def test_404_unknown(client):
@@ -1,65 +1,224 @@
-def flatten_object(obj, paths_to_collapse=None, current_path=""):
-    """
-    Flatten a nested dictionary / list structure into a list of flat dictionaries.
-    Adapted from the notebook examples for use in the server.
+"""
+Flatten nested extraction results into rows.
+
+Every list is expanded into one row per element, joined with the rows of its
+parent; nested keys are prefixed with their parent key and a space
+(``"experiments conditions name"``).
+
+The work is done on column buffers rather than row dicts. The scalar keys of a
+dict form a group: one record of values plus, for every row of the table, the
+position of the row's record (-1 for none). Joining parent and child rows only
+gathers these index vectors, so a result flattens in time and memory linear in
+the size of the output table, however wide and deep it is.
+"""
+
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import polars as pl
+
+
+class _Group:
+    """Columns filled together: per-row positions into a list of records."""
+
+    __slots__ = ("names", "records", "index")
+
+    def __init__(self, names: Tuple[str, ...], records: List[tuple], index):
+        self.names = names
+        self.records = records
+        self.index = index
+
+
+class _Table:
+    """Flattened rows stored as column groups.
+
+    ``order`` holds the column names in insertion order. Where groups share a
+    name, the later group's value wins in the rows where it has one, as a
+    later assignment to a row dict would.
     """
-    if paths_to_collapse is None:
-        paths_to_collapse = []
 
+    __slots__ = ("n_rows", "groups", "order")
+
+    def __init__(self, n_rows: int):
+        self.n_rows = n_rows
+        self.groups: List[_Group] = []
+        self.order: Dict[str, None] = {}
+
+    def add(self, names: List[str], values: List[Any]) -> None:
+        """Give every row *values* under *names*."""
+        index = np.zeros(self.n_rows, dtype=np.int64)
+        self.groups.append(_Group(tuple(names), [tuple(values)], index))
+        self.order.update(dict.fromkeys(names))
+
+    def join(self, child: "_Table", prefix: str) -> "_Table":
+        """Every row of self combined with every row of *child*."""
+        n, m = self.n_rows, child.n_rows
+        table = _Table(n * m)
+        parent_rows = None if m == 1 else np.repeat(np.arange(n), m)
+        child_rows = None if n == 1 else np.tile(np.arange(m), n)
+        for group in self.groups:
+            index = group.index if parent_rows is None else group.index[parent_rows]
+            table.groups.append(_Group(group.names, group.records, index))
+        for group in child.groups:
+            index = group.index if child_rows is None else group.index[child_rows]
+            names = tuple(f"{prefix} {name}" for name in group.names)
+            table.groups.append(_Group(names, group.records, index))
+        table.order.update(self.order)
+        table.order.update(dict.fromkeys(f"{prefix} {name}" for name in child.order))
+        return table
+
+    def _overlapping(self) -> bool:
+        return sum(len(g.names) for g in self.groups) != len(self.order)
+
+    @staticmethod
+    def concat(tables: List["_Table"]) -> "_Table":
+        """The rows of *tables* one after another; absent values go missing."""
+        # Tables without rows contribute no columns either.
+        tables = [table for table in tables if table.n_rows]
+        if not tables:
+            return _Table(0)
+        if len(tables) == 1:
+            return tables[0]
+
+        result = _Table(sum(t.n_rows for t in tables))
+        # Groups with the same columns are merged (list items usually share
+        # their keys), unless overlapping names make group order matter.
+        merge = not any(table._overlapping() for table in tables)
+        merged: Dict[Any, _Group] = {}
+        start = 0
+        for t, table in enumerate(tables):
+            for group in table.groups:
+                key = group.names if merge else (t, id(group))
+                target = merged.get(key)
+                if target is None:
+                    index = np.full(result.n_rows, -1, dtype=np.int64)
+                    target = merged[key] = _Group(group.names, [], index)
+                rows = slice(start, start + table.n_rows)
+                target.index[rows] = np.where(
+                    group.index >= 0, group.index + len(target.records), -1
+                )
+                target.records.extend(group.records)
+            result.order.update(table.order)
+            start += table.n_rows
+        result.groups = list(merged.values())
+        return result
+
+    def columns(self) -> List[Tuple[str, List[Any], np.ndarray]]:
+        """``(name, values, per-row position)`` in row-dict column order.
+
+        That is the order ``pl.DataFrame`` gives row dicts: a column first
+        present in an earlier row comes first, and the columns first present
+        in the same row keep their insertion order.
+        """
+        if self.n_rows == 0:
+            return []
+        parts: Dict[str, List[Tuple[_Group, int]]] = {name: [] for name in self.order}
+        for group in self.groups:
+            for j, name in enumerate(group.names):
+                parts[name].append((group, j))
+
+        columns = []
+        for name, sources in parts.items():
+            if len(sources) == 1:
+                group, j = sources[0]
+                values = [record[j] for record in group.records]
+                index = group.index
+            else:
+                candidates, index = [], np.full(self.n_rows, -1, dtype=np.int64)
+                for group, j in sources:
+                    present = group.index >= 0
+                    index[present] = group.index[present] + len(candidates)
+                    candidates.extend(record[j] for record in group.records)
+                # Keep only the values that won, so dtypes match row dicts'.
+                present = index >= 0
+                values = [candidates[p] for p in index[present].tolist()]
+                index[present] = np.arange(len(values))
+            columns.append((name, values, index))
+
+        first = [int(np.argmax(index >= 0)) for _, _, index in columns]
+        order = sorted(range(len(columns)), key=first.__getitem__)
+        return [columns[i] for i in order]
+
+    def rows(self) -> List[dict]:
+        out: List[dict] = [{} for _ in range(self.n_rows)]
+        for name, values, index in self.columns():
+            for row, position in zip(out, index.tolist()):
+                if position >= 0:
+                    row[name] = values[position]
+        return out
+
+    def frame(self) -> pl.DataFrame:
+        if self.n_rows == 0:
+            return pl.DataFrame()
+        series = []
+        for name, values, index in self.columns():
+            # Gathering at a null position gives null: the missing values.
+            positions = pl.Series(index)
+            if (index < 0).any():
+                positions = pl.select(
+                    pl.when(positions >= 0).then(positions)
+                ).to_series()
+            series.append(pl.Series(name, values, strict=False).gather(positions))
+        if not series:
+            # Rows without any value, as pl.DataFrame([{}, ...]) gives.
+            return pl.DataFrame([{}] * self.n_rows)
+        return pl.DataFrame(series)
+
+
+def _flatten(obj: Any, collapse: frozenset, current_path: str) -> _Table:
     def join_path(p, k):
         return f"{p}.{k}" if p else k
 
-    def prefix_keys(row, prefix):
-        """Prefix every key of `row` with `prefix`"""
-        return {f"{prefix} {k}": v for k, v in row.items()}
-
     if isinstance(obj, list):
-        result = []
-        for item in obj:
-            result.extend(flatten_object(item, paths_to_collapse, current_path))
-        return result
+        return _Table.concat([_flatten(item, collapse, current_path) for item in obj])
 
+    table = _Table(1)
     if not isinstance(obj, dict):
-        return [{"value": obj}]
-
-    rows = [{}]  # start with one empty row
+        table.add(["value"], [obj])
+        return table
 
+    # Scalars are buffered and added as one group until the next join.
+    names: List[str] = []
+    values: List[Any] = []
     for key, value in obj.items():
         full_path = join_path(current_path, key)
 
-        if isinstance(value, list):
-            if full_path in paths_to_collapse:
-                # collapse => one cell with the count
-                for r in rows:
-                    r[key] = f"{len(value)} {key}"
-            else:
-                # expand => one row per element
-                if len(value) == 0:
-                    child_rows = [{}]
-                else:
-                    child_rows = []
-                    for elem in value:
-                        child_rows.extend(
-                            flatten_object(elem, paths_to_collapse, full_path)
-                        )
-
-                new_rows = []
-                for r in rows:
-                    for cr in child_rows:
-                        new_rows.append({**r, **prefix_keys(cr, key)})
-                rows = new_rows
-            continue
-
-        if isinstance(value, dict):
-            child_rows = flatten_object(value, paths_to_collapse, full_path)
-            new_rows = []
-            for r in rows:
-                for cr in child_rows:
-                    new_rows.append({**r, **prefix_keys(cr, key)})
-            rows = new_rows
-            continue
-
-        for r in rows:
-            r[key] = value
-
-    return rows
+        if isinstance(value, list) and full_path in collapse:
+            # collapse => one cell with the count
+            names.append(key)
+            values.append(f"{len(value)} {key}")
+        elif isinstance(value, (list, dict)):
+            # expand => one row per element (an empty list keeps the row)
+            if names:
+                table.add(names, values)
+                names, values = [], []
+            empty = isinstance(value, list) and not value
+            child = _Table(1) if empty else _flatten(value, collapse, full_path)
+            table = table.join(child, key)
+        else:
+            names.append(key)
+            values.append(value)
+
+    if names:
+        table.add(names, values)
+    return table
+
+
+def flatten_object(obj, paths_to_collapse=None, current_path=""):
+    """
+    Flatten a nested dictionary / list structure into a list of flat dictionaries.
+    Adapted from the notebook examples for use in the server.
+    """
+    return _flatten(obj, frozenset(paths_to_collapse or ()), current_path).rows()
+
+
+def flatten_frame(
+    obj: Any, paths_to_collapse: Optional[Iterable[str]] = None
+) -> pl.DataFrame:
+    """
+    Flatten like ``flatten_object``, straight into a Polars frame.
+
+    Columns are built from the column buffers without materializing row
+    dicts; rows without a value for a column hold null.
+    """
+    return _flatten(obj, frozenset(paths_to_collapse or ()), "").frame()
@@ -0,0 +1,119 @@
+"""Tests for flattening nested results into rows and frames.
+
+``_reference`` is the row-dict implementation the column buffers replaced;
+the outputs must stay identical to it.
+"""
+
+import random
+
+import polars as pl
+import pytest
+from utils.flatten import flatten_frame, flatten_object
+
+
+def _reference(obj, paths_to_collapse=None, current_path=""):
+    if paths_to_collapse is None:
+        paths_to_collapse = set()
+
+    def join_path(p, k):
+        return f"{p}.{k}" if p else k
+
+    if isinstance(obj, list):
+        rows = []
+        for item in obj:
+            rows.extend(_reference(item, paths_to_collapse, current_path))
+        return rows
+
+    if not isinstance(obj, dict):
+        return [{"value": obj}]
+
+    rows = [{}]
+    for key, value in obj.items():
+        full_path = join_path(current_path, key)
+        if isinstance(value, list) and full_path in paths_to_collapse:
+            for row in rows:
+                row[key] = f"{len(value)} {key}"
+        elif isinstance(value, (list, dict)):
+            if isinstance(value, list) and not value:
+                continue
+            child_rows = _reference(value, paths_to_collapse, full_path)
+            new_rows = []
+            for row in rows:
+                for child in child_rows:
+                    merged = dict(row)
+                    merged.update({f"{key} {k}": v for k, v in child.items()})
+                    new_rows.append(merged)
+            rows = new_rows
+        else:
+            for row in rows:
+                row[key] = value
+    return rows
+
+
+RESULT = {
+    "paper": [
+        {
+            "title": "A Study",
+            "experiments": [
+                {
+                    "name": "Study 1",
+                    "conditions": [
+                        {"name": "control", "n": 10},
+                        {"name": "treatment", "n": 12},
+                    ],
+                    "measures": ["a", "b", "c"],
+                },
+                {"name": "Study 2", "conditions": [], "measures": []},
+            ],
+            "year": 2020,
+        }
+    ]
+}
+
+
+def _random_value(rng, depth):
+    kind = rng.random()
+    if depth < 3 and kind < 0.25:
+        return [_random_value(rng, depth + 1) for _ in range(rng.randint(0, 3))]
+    if depth < 3 and kind < 0.5:
+        keys = rng.sample(["a", "b", "c", "value", "name"], rng.randint(0, 4))
+        return {k: _random_value(rng, depth + 1) for k in keys}
+    return rng.choice([1, 2.5, "x", None, True])
+
+
+@pytest.mark.unit
+def test_rows_match_the_reference():
+    assert flatten_object(RESULT) == _reference(RESULT)
+    collapse = ["paper.experiments.measures"]
+    assert flatten_object(RESULT, collapse) == _reference(RESULT, collapse)
+
+    rng = random.Random(0)
+    for _ in range(300):
+        obj = _random_value(rng, 0)
+        assert flatten_object(obj) == _reference(obj)
+
+
+@pytest.mark.unit
+def test_collapsed_paths_hold_the_count():
+    rows = flatten_object(RESULT, ["paper.experiments.measures"])
+
+    assert len(rows) == 3
+    assert [row["paper experiments measures"] for row in rows] == [
+        "3 measures",
+        "3 measures",
+        "0 measures",
+    ]
+    # An empty list that is not collapsed keeps its parent's row.
+    assert "paper experiments conditions name" not in rows[2]
+
+
+@pytest.mark.unit
+def test_frame_matches_rows_frame():
+    expected = pl.DataFrame(flatten_object(RESULT))
+
+    frame = flatten_frame(RESULT)
+
+    assert frame.columns == expected.columns
+    assert frame.equals(expected)
+    assert flatten_frame([]).shape == (0, 0)
+    assert flatten_frame({"a": {}}).shape == (1, 0)
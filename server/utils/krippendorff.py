@@ -6,6 +6,7 @@ coefficient with additional utilities for practical use.
 """
 
 import numpy as np
+from concurrent.futures import ProcessPoolExecutor
 from typing import Union, Literal, Optional, Tuple, Any
 from dataclasses import dataclass
 
@@ -155,92 +156,55 @@ def krippendorff_alpha(
     elif pl_DataFrame is not Any and isinstance(data, pl_DataFrame):
         data = data.to_numpy()
 
-    print("version 1.0.1 - Polars support added")
-    # Handle categorical/string data by converting to numeric codes
-    value_map = None
-
-    # Check if data contains non-numeric values
-    if data.dtype == object or data.dtype.kind in ["U", "S", "O"]:
-        # Get unique non-NaN values, handling mixed types carefully
-        unique_vals = set()
-        for val in data.flatten():
-            # Skip None, NaN, and missing values
-            if val is None:
-                continue
-            if isinstance(val, float) and np.isnan(val):
-                continue
-            unique_vals.add(val)
-
-        unique_vals = sorted(list(unique_vals))  # Sort for consistent ordering
-
-        # Create mapping from categories to numbers
-        value_map = {val: idx for idx, val in enumerate(unique_vals)}
-
-        # Convert to numeric array
-        numeric_data = np.full(data.shape, np.nan, dtype=float)
-        for i in range(data.shape[0]):
-            for j in range(data.shape[1]):
-                val = data[i, j]
-                # Check if value is valid (not None, not NaN)
-                if val is not None and not (isinstance(val, float) and np.isnan(val)):
-                    numeric_data[i, j] = value_map[val]
-        data = numeric_data
-    else:
-        # Convert to float array to handle NaN
-        data = np.array(data, dtype=float)
-
+    data = _as_numeric(np.asarray(data))
     n_observers, n_units = data.shape
 
-    # Get all pairable values (ignoring NaN)
-    values_list = []
-    unit_values = []
-
-    for unit_idx in range(n_units):
-        unit_column = data[:, unit_idx]
-        # Get non-missing values for this unit
-        valid_values = unit_column[~np.isnan(unit_column)]
-
-        if len(valid_values) >= 2:  # Only units with 2+ values can be paired
-            values_list.extend(valid_values)
-            unit_values.append(valid_values)
-
-    if len(values_list) == 0:
+    # Only units with 2+ values can be paired
+    present = ~np.isnan(data)
+    m_u = present.sum(axis=0)
+    pairable = m_u >= 2
+    if not pairable.any():
         return np.nan if not return_detailed else None
-
-    n_total = len(values_list)
-
-    # Get unique values
-    unique_values = np.unique(values_list)
-
-    # Get difference function
-    delta_squared = _get_difference_function(
-        unique_values, metric, circumference, value_range, values_list
-    )
-
-    # Compute observed disagreement (Do)
-    Do = 0.0
-    for unit_vals in unit_values:
-        m_u = len(unit_vals)
-        if m_u >= 2:
-            for i, c in enumerate(unit_vals):
-                for j, k in enumerate(unit_vals):
-                    if i != j:
-                        c_idx = np.where(unique_values == c)[0][0]
-                        k_idx = np.where(unique_values == k)[0][0]
-                        Do += delta_squared[c_idx, k_idx] / (m_u - 1)
-
+    data, present, m_u = data[:, pairable], present[:, pairable], m_u[pairable]
+
+    # Code every pairable value by its rank among the unique values
+    unique_values, inverse = np.unique(data[present], return_inverse=True)
+    codes = np.full(data.shape, -1, dtype=np.intp)
+    codes[present] = inverse
+    n_c = np.bincount(inverse, minlength=len(unique_values))
+    n_total = int(n_c.sum())
+
+    delta = _DifferenceFunction(unique_values, n_c, metric, circumference, value_range)
+
+    # Observed disagreement (Do): the coincidences of every ordered pair of
+    # values within a unit, weighted by 1 / (m_u - 1)
+    n_values, n_pairable = len(unique_values), data.shape[1]
+    if metric == "interval":
+        # Σ_i Σ_j (x_i - x_j)² = 2 m_u Σ_i (x_i - mean_u)² within each unit
+        centered = np.where(present, data - np.nanmean(data, axis=0), 0.0)
+        Do = np.sum(2 * m_u * np.sum(centered**2, axis=0) / (m_u - 1))
+    elif n_pairable * n_values**2 <= int(np.sum(m_u * (m_u - 1))):
+        # Few distinct values: value-by-value coincidence matrix from the
+        # per-unit value counts (δ²(c, c) is 0, so the diagonal drops out)
+        unit = np.nonzero(present)[1]
+        counts = np.bincount(
+            unit * n_values + codes[present],
+            minlength=n_pairable * n_values,
+        ).reshape(n_pairable, n_values)
+        coincidences = (counts / (m_u - 1)[:, None]).T @ counts
+        Do = np.sum(coincidences * delta.matrix())
+    else:
+        # Many distinct values: sum over the pairs themselves
+        first, second = np.nonzero(~np.eye(len(data), dtype=bool))
+        pair, unit = np.nonzero(present[first] & present[second])
+        weights = 1.0 / (m_u[unit] - 1)
+        Do = np.sum(
+            delta(codes[first[pair], unit], codes[second[pair], unit]) * weights
+        )
     Do = Do / n_total
 
-    # Compute n_c (frequency of each value)
-    n_c = np.array([values_list.count(v) for v in unique_values])
-
-    # Compute expected disagreement (De)
-    De = 0.0
-    for c_idx in range(len(unique_values)):
-        for k_idx in range(len(unique_values)):
-            De += n_c[c_idx] * n_c[k_idx] * delta_squared[c_idx, k_idx]
-
-    De = De / (n_total * (n_total - 1))
+    # Expected disagreement (De) from the marginal value frequencies
+    De = delta.expected(n_c) / (n_total * (n_total - 1))
 
     # Compute alpha
     if De == 0:
@@ -262,89 +226,121 @@ def krippendorff_alpha(
         return alpha
 
 
-def _get_difference_function(
-    values: np.ndarray,
-    metric: str,
-    circumference: Optional[float],
-    value_range: Optional[Tuple[float, float]],
-    all_values: list,
-) -> np.ndarray:
+def _as_numeric(data: np.ndarray) -> np.ndarray:
+    """Float matrix with NaN for missing values; categories become ranks."""
+    if data.dtype == object or data.dtype.kind in ["U", "S", "O"]:
+        flat = data.ravel()
+        # Skip None, NaN, and missing values
+        missing = np.fromiter(
+            (v is None or (isinstance(v, float) and np.isnan(v)) for v in flat),
+            dtype=bool,
+            count=flat.size,
+        )
+        # Sorted unique categories for consistent ordering
+        _, ranks = np.unique(flat[~missing], return_inverse=True)
+        numeric = np.full(flat.shape, np.nan, dtype=float)
+        numeric[~missing] = ranks
+        return numeric.reshape(data.shape)
+    # Convert to float array to handle NaN
+    return np.array(data, dtype=float)
+
+
+_METRICS = ("nominal", "ordinal", "interval", "ratio", "circular", "bipolar")
+# Largest block of the V x V difference matrix built at once.
+_BLOCK_CELLS = 1 << 22
+
+
+class _DifferenceFunction:
     """
-    Compute the squared difference matrix for given metric.
+    Squared differences δ²(c, k) between value codes for a given metric.
 
-    Returns a matrix where delta_squared[i,j] = δ²(values[i], values[j])
+    Calling it with broadcastable arrays of codes returns δ² elementwise, so
+    pairs of values are compared without materializing the full matrix;
+    ``matrix()`` gives delta_squared[i, j] = δ²(values[i], values[j]).
     """
-    n = len(values)
-    delta_squared = np.zeros((n, n))
-
-    if metric == "nominal":
-        # Nominal: 0 if same, 1 if different
-        for i in range(n):
-            for j in range(n):
-                delta_squared[i, j] = 0.0 if values[i] == values[j] else 1.0
-
-    elif metric == "ordinal":
-        # Ordinal: based on cumulative frequencies
-        # δ²(c,k) = (Σ(g from c+1 to k) n_g)²
-        n_g = np.array([all_values.count(v) for v in values])
-
-        for i in range(n):
-            for j in range(n):
-                if i == j:
-                    delta_squared[i, j] = 0.0
-                else:
-                    start = min(i, j)
-                    end = max(i, j)
-                    sum_between = sum(n_g[start + 1 : end + 1])
-                    delta_squared[i, j] = sum_between**2
-
-    elif metric == "interval":
-        # Interval: (c - k)²
-        for i in range(n):
-            for j in range(n):
-                delta_squared[i, j] = (values[i] - values[j]) ** 2
-
-    elif metric == "ratio":
-        # Ratio: ((c - k) / (c + k))²
-        for i in range(n):
-            for j in range(n):
-                if values[i] + values[j] != 0:
-                    delta_squared[i, j] = (
-                        (values[i] - values[j]) / (values[i] + values[j])
-                    ) ** 2
-                else:
-                    delta_squared[i, j] = 0.0
-
-    elif metric == "circular":
-        # Circular: (sin(π * |c - k| / U))²
-        if circumference is None:
-            raise ValueError("Circumference (U) must be specified for circular metric")
-        for i in range(n):
-            for j in range(n):
-                delta_squared[i, j] = (
-                    np.sin(np.pi * abs(values[i] - values[j]) / circumference) ** 2
-                )
 
-    elif metric == "bipolar":
-        # Bipolar: ((c - k)² / ((c + k - 2*cmin) * (2*cmax - c - k)))
-        if value_range is None:
+    def __init__(
+        self,
+        values: np.ndarray,
+        n_c: np.ndarray,
+        metric: str,
+        circumference: Optional[float],
+        value_range: Optional[Tuple[float, float]],
+    ):
+        if metric not in _METRICS:
+            raise ValueError(f"Unknown metric: {metric}")
+        if metric == "circular" and circumference is None:
+            raise ValueError("Circumference (U) must be specified for circular metric")
+        if metric == "bipolar" and value_range is None:
             raise ValueError(
                 "Value range (cmin, cmax) must be specified for bipolar metric"
             )
-        cmin, cmax = value_range
-        for i in range(n):
-            for j in range(n):
-                c, k = values[i], values[j]
-                denominator = (c + k - 2 * cmin) * (2 * cmax - c - k)
-                if denominator != 0:
-                    delta_squared[i, j] = (c - k) ** 2 / denominator
-                else:
-                    delta_squared[i, j] = 0.0
-
-    else:
-        raise ValueError(f"Unknown metric: {metric}")
+        self.values = values
+        self.metric = metric
+        self.circumference = circumference
+        self.value_range = value_range
+        # cumulative[i] = n_0 + ... + n_(i-1), for the ordinal metric
+        self.cumulative = np.concatenate([[0], np.cumsum(n_c)])
+
+    def __call__(self, c: np.ndarray, k: np.ndarray) -> np.ndarray:
+        metric = self.metric
+        if metric == "nominal":
+            # Nominal: 0 if same, 1 if different
+            return (c != k).astype(float)
+        if metric == "ordinal":
+            # Ordinal: δ²(c,k) = (Σ(g from c+1 to k) n_g)²
+            low, high = np.minimum(c, k), np.maximum(c, k)
+            between = self.cumulative[high + 1] - self.cumulative[low + 1]
+            return between.astype(float) ** 2
+
+        v_c, v_k = self.values[c], self.values[k]
+        if metric == "interval":
+            # Interval: (c - k)²
+            return (v_c - v_k) ** 2
+        if metric == "ratio":
+            # Ratio: ((c - k) / (c + k))²
+            total = v_c + v_k
+            ratio = np.divide(
+                v_c - v_k, total, out=np.zeros(np.shape(total)), where=total != 0
+            )
+            return ratio**2
+        if metric == "circular":
+            # Circular: (sin(π * |c - k| / U))²
+            return np.sin(np.pi * np.abs(v_c - v_k) / self.circumference) ** 2
+        # Bipolar: ((c - k)² / ((c + k - 2*cmin) * (2*cmax - c - k)))
+        cmin, cmax = self.value_range
+        denominator = (v_c + v_k - 2 * cmin) * (2 * cmax - v_c - v_k)
+        return np.divide(
+            (v_c - v_k) ** 2,
+            denominator,
+            out=np.zeros(np.shape(denominator)),
+            where=denominator != 0,
+        )
 
-    return delta_squared
+    def matrix(self) -> np.ndarray:
+        codes = np.arange(len(self.values))
+        return self(codes[:, None], codes[None, :])
+
+    def expected(self, n_c: np.ndarray) -> float:
+        """Σ_c Σ_k n_c n_k δ²(c, k)."""
+        n = n_c.astype(float)
+        if self.metric == "nominal":
+            return n.sum() ** 2 - np.sum(n**2)
+        if self.metric == "interval":
+            # Σ n_c n_k (c - k)² = 2 N Σ n_c (c - mean)², with no V x V matrix
+            mean = np.dot(n, self.values) / n.sum()
+            return 2 * n.sum() * np.dot(n, (self.values - mean) ** 2)
+        # Other metrics: n @ δ² @ n, a block of rows at a time to bound memory
+        codes = np.arange(len(self.values))
+        step = max(1, _BLOCK_CELLS // len(codes))
+        return float(
+            sum(
+                n[start : start + step]
+                @ self(codes[start : start + step, None], codes[None, :])
+                @ n
+                for start in range(0, len(codes), step)
+            )
+        )
 
 
 def bootstrap_confidence_interval(
@@ -353,10 +349,20 @@ def bootstrap_confidence_interval(
     n_bootstrap: int = 1000,
     confidence_level: float = 0.95,
     random_seed: Optional[int] = None,
+    resample: Literal["units", "observers"] = "units",
+    circumference: Optional[float] = None,
+    value_range: Optional[Tuple[float, float]] = None,
+    n_jobs: int = 1,
 ) -> Tuple[float, float, float]:
     """
     Calculate bootstrap confidence intervals for Krippendorff's alpha.
 
+    Resampling units is done by reweighting: the data are coded once, each
+    unit's value counts and disagreement are computed once, and every
+    replicate's alpha follows from its unit multiplicities, for a whole chunk
+    of replicates at a time. Resampling observers (or too many distinct
+    values for the reweighting tables) resamples the coded matrix instead.
+
     Parameters
     ----------
     data : np.ndarray
@@ -368,30 +374,58 @@ def bootstrap_confidence_interval(
     confidence_level : float
         Confidence level (e.g., 0.95 for 95% CI)
     random_seed : int, optional
-        Random seed for reproducibility
+        Random seed for reproducibility; only a local generator is seeded
+    resample : str, default='units'
+        What to resample with replacement: the units (columns), or the
+        observers (rows) when the question is how alpha varies with them
+    circumference, value_range : optional
+        As for ``krippendorff_alpha``
+    n_jobs : int, default=1
+        Processes to spread the replicate chunks over. The result for a given
+        ``random_seed`` does not depend on it.
 
     Returns
     -------
     tuple of (alpha, lower_bound, upper_bound)
+        The bounds are NaN when no replicate has a defined alpha.
     """
-    if random_seed is not None:
-        np.random.seed(random_seed)
+    if pd_DataFrame is not Any and isinstance(data, pd_DataFrame):
+        data = data.values
+    elif pl_DataFrame is not Any and isinstance(data, pl_DataFrame):
+        data = data.to_numpy()
+    data = _as_numeric(np.asarray(data))
 
     # Calculate original alpha
-    original_alpha = krippendorff_alpha(data, metric=metric)
+    original_alpha = krippendorff_alpha(
+        data, metric=metric, circumference=circumference, value_range=value_range
+    )
 
-    # Bootstrap
-    n_observers, n_units = data.shape
-    alphas = []
+    engine = None
+    if resample == "units":
+        engine = _UnitBootstrap.build(data, metric, circumference, value_range)
+    if engine is None:
+        engine = _ResampleBootstrap(data, metric, resample, circumference, value_range)
 
-    for _ in range(n_bootstrap):
-        # Resample units with replacement
-        indices = np.random.choice(n_units, size=n_units, replace=True)
-        bootstrap_data = data[:, indices]
+    # Fixed-size chunks, each with its own child seed: the replicates are the
+    # same however the chunks are spread over processes.
+    seeds = np.random.SeedSequence(random_seed).spawn(
+        max(1, -(-n_bootstrap // _BOOTSTRAP_CHUNK))
+    )
+    sizes = [
+        min(_BOOTSTRAP_CHUNK, n_bootstrap - i * _BOOTSTRAP_CHUNK)
+        for i in range(len(seeds))
+    ]
+    if n_jobs > 1 and len(seeds) > 1:
+        with ProcessPoolExecutor(max_workers=n_jobs) as pool:
+            engines = [engine] * len(seeds)
+            chunks = list(pool.map(_bootstrap_chunk, engines, seeds, sizes))
+    else:
+        chunks = [_bootstrap_chunk(engine, s, n) for s, n in zip(seeds, sizes)]
 
-        alpha = krippendorff_alpha(bootstrap_data, metric=metric)
-        if not np.isnan(alpha):
-            alphas.append(alpha)
+    alphas = np.concatenate(chunks) if chunks else np.array([])
+    alphas = alphas[~np.isnan(alphas)]
+    if len(alphas) == 0:
+        return original_alpha, np.nan, np.nan
 
     # Calculate confidence interval
     alpha_lower = (1 - confidence_level) / 2
@@ -403,6 +437,135 @@ def bootstrap_confidence_interval(
     return original_alpha, lower_bound, upper_bound
 
 
+# Bootstrap replicates drawn and evaluated together.
+_BOOTSTRAP_CHUNK = 250
+
+
+def _bootstrap_chunk(engine, seed: np.random.SeedSequence, size: int) -> np.ndarray:
+    return engine.replicates(np.random.default_rng(seed), size)
+
+
+class _ResampleBootstrap:
+    """Alpha of resampled copies of the coded data matrix."""
+
+    def __init__(self, data, metric, resample, circumference, value_range):
+        self.data = data
+        self.axis = 0 if resample == "observers" else 1
+        self.kwargs = dict(
+            metric=metric, circumference=circumference, value_range=value_range
+        )
+
+    def replicates(self, rng: np.random.Generator, size: int) -> np.ndarray:
+        n = self.data.shape[self.axis]
+        alphas = np.empty(size)
+        for b in range(size):
+            indices = rng.integers(0, n, size=n)
+            sample = np.take(self.data, indices, axis=self.axis)
+            alphas[b] = krippendorff_alpha(sample, **self.kwargs)
+        return alphas
+
+
+class _UnitBootstrap:
+    """Alpha of unit-resampled replicates, from per-unit tables.
+
+    A replicate is a vector of unit multiplicities ``w``. Its pairable values
+    are Σ w_u m_u, its value frequencies Σ w_u C_u (C_u: the unit's value
+    counts) and its observed disagreement comes from the units' coincidences
+    weighted by ``w``, so no replicate re-codes or re-pairs the data. For the
+    interval metric, per-unit sums of values and squares replace the tables.
+    """
+
+    def __init__(self, n_units, pairable, m_u, metric, delta, counts, moments):
+        self.n_units = n_units
+        self.pairable = pairable
+        self.m_u = m_u
+        self.metric = metric
+        self.delta = delta
+        self.counts = counts
+        self.moments = moments
+
+    @classmethod
+    def build(cls, data, metric, circumference, value_range):
+        """The engine for *data*, or None if its tables would be too large."""
+        n_units = data.shape[1]
+        present = ~np.isnan(data)
+        m_u = present.sum(axis=0)
+        pairable = m_u >= 2
+        if not pairable.any():
+            return cls(n_units, pairable, m_u, metric, None, None, None)
+        data, present, m_u = data[:, pairable], present[:, pairable], m_u[pairable]
+
+        unique_values, inverse = np.unique(data[present], return_inverse=True)
+        n_c = np.bincount(inverse, minlength=len(unique_values))
+        delta = _DifferenceFunction(
+            unique_values, n_c, metric, circumference, value_range
+        )
+        if metric == "interval":
+            # Shift to the mean for precision; interval alpha ignores shifts.
+            shifted = np.where(present, data - unique_values @ n_c / n_c.sum(), 0.0)
+            moments = np.stack([shifted.sum(axis=0), (shifted**2).sum(axis=0)])
+            return cls(n_units, pairable, m_u, metric, delta, None, moments)
+
+        n_values = len(unique_values)
+        if len(m_u) * n_values**2 > _BLOCK_CELLS:
+            return None
+        # Value counts per unit (np.nonzero and data[present] share an order)
+        unit = np.nonzero(present)[1]
+        counts = np.bincount(
+            unit * n_values + inverse, minlength=len(m_u) * n_values
+        ).reshape(len(m_u), n_values)
+        return cls(n_units, pairable, m_u, metric, delta, counts, None)
+
+    def replicates(self, rng: np.random.Generator, size: int) -> np.ndarray:
+        n = self.n_units
+        # Multiplicity of each unit in each replicate's draw of n units
+        draws = rng.integers(0, n, size=(size, n)) + n * np.arange(size)[:, None]
+        weights = np.bincount(draws.ravel(), minlength=size * n).reshape(size, n)
+        return self.alphas(weights)
+
+    def alphas(self, weights: np.ndarray) -> np.ndarray:
+        """Alpha per replicate, given (replicates, units) multiplicities."""
+        if self.delta is None:
+            return np.full(len(weights), np.nan)
+        w = weights[:, self.pairable].astype(float)
+        n_total = w @ self.m_u
+
+        if self.metric == "interval":
+            s1, s2 = self.moments
+            # Per unit: Σ_i Σ_j (x_i - x_j)² = 2 (m_u Σ x² - (Σ x)²)
+            Do = w @ (2 * (self.m_u * s2 - s1**2) / (self.m_u - 1))
+            sum1, sum2 = w @ s1, w @ s2
+            De = 2 * (n_total * sum2 - sum1**2)
+        else:
+            counts = self.counts.astype(float)
+            n_c = w @ counts
+            # Coincidences: Σ_u w_u (C_u C_uᵀ - diag C_u) / (m_u - 1)
+            scaled = w / (self.m_u - 1)
+            coincidences = np.einsum(
+                "bu,uv,uk->bvk", scaled, counts, counts, optimize=True
+            )
+            diagonal = np.arange(counts.shape[1])
+            coincidences[:, diagonal, diagonal] -= scaled @ counts
+            if self.metric == "ordinal":
+                # Ordinal differences depend on the replicate's frequencies.
+                cumulative = np.concatenate(
+                    [np.zeros((len(w), 1)), np.cumsum(n_c, axis=1)], axis=1
+                )
+                low = np.minimum(diagonal[:, None], diagonal[None, :]) + 1
+                high = np.maximum(diagonal[:, None], diagonal[None, :]) + 1
+                delta = (cumulative[:, high] - cumulative[:, low]) ** 2
+            else:
+                delta = np.broadcast_to(self.delta.matrix(), coincidences.shape)
+            Do = np.sum(coincidences * delta, axis=(1, 2))
+            De = np.einsum("bv,bvk,bk->b", n_c, delta, n_c)
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            Do = Do / n_total
+            De = De / (n_total * (n_total - 1))
+            alphas = np.where(De == 0, np.where(Do == 0, 1.0, np.nan), 1 - Do / De)
+        return alphas
+
+
 def visualize_agreement_matrix(
     data: np.ndarray,
     observer_names: Optional[list] = None,
@@ -0,0 +1,330 @@
+"""
+Incremental parsing of streamed upload request bodies.
+
+Upload routes are registered with ``stream=True`` so Sanic hands them the body
+chunk by chunk instead of buffering all of it in memory. ``read_form`` parses
+that stream as ``multipart/form-data`` (or a small urlencoded form) as it
+arrives:
+
+- plain fields are collected in memory, up to ``MAX_FIELD_BYTES`` each;
+- every file part goes to a sink opened for it by the route: an ``S3Sink``
+  streaming it into object storage as a multipart upload (hashing it on the
+  way), or a ``FileSink`` writing it to local disk through ``aiofiles``;
+  either way the event loop never blocks on I/O;
+- a file that grows past the route's limit is dropped the moment it does,
+  instead of after the whole body has been received.
+
+Parsing itself holds one network chunk plus one boundary, whatever the size of
+the upload. An ``S3Sink`` adds the ``MultipartWriter`` buffers: a part of
+``INGEST_PART_BYTES`` (8 MiB) being filled plus up to ``INGEST_CONCURRENCY``
+(4) parts in flight, so roughly 40 MiB per concurrent upload at the defaults.
+A ``FileSink`` adds nothing.
+"""
+
+import asyncio
+import hashlib
+import os
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Callable, Dict, List, Optional, Protocol
+from urllib.parse import parse_qsl
+
+import aiofiles
+from sanic.headers import parse_content_header
+from workers.services.paper_ingest import MultipartWriter
+
+# Plain form fields (ids, flags) are tiny; anything bigger is not a field.
+MAX_FIELD_BYTES = 64 * 1024
+_MAX_HEADER_BYTES = 16 * 1024
+
+
+class UploadError(ValueError):
+    """A malformed or unacceptable upload; ``status`` is the HTTP reply."""
+
+    status = 400
+
+
+class UploadTooLarge(UploadError):
+    """A file or field crossed its size limit mid-stream."""
+
+    status = 413
+
+
+class Sink(Protocol):
+    """Where the bytes of one uploaded file go."""
+
+    async def write(self, data: bytes) -> None: ...
+
+    async def close(self) -> None: ...
+
+    async def abort(self) -> None: ...
+
+
+class FileSink:
+    """Write one uploaded file to *path* without blocking the event loop."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = None
+
+    async def write(self, data: bytes) -> None:
+        if self._file is None:
+            self._file = await aiofiles.open(self.path, "wb")
+        await self._file.write(data)
+
+    async def close(self) -> None:
+        if self._file is None:
+            # An empty file still exists once closed.
+            self._file = await aiofiles.open(self.path, "wb")
+        await self._file.close()
+
+    async def abort(self) -> None:
+        if self._file is not None:
+            await self._file.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class S3Sink:
+    """Stream one uploaded file to an S3 key, hashing it on the way.
+
+    Parts are uploaded from a worker thread; ``close`` commits the object and
+    ``abort`` makes sure nothing is left under the key.
+    """
+
+    def __init__(self, s3_client, bucket: str, key: str, extra_args: dict):
+        self.s3_client = s3_client
+        self.bucket = bucket
+        self.key = key
+        self.digest = hashlib.sha256()
+        self._writer = MultipartWriter(s3_client, bucket, key, extra_args)
+        self._committed = False
+
+    @property
+    def sha256(self) -> str:
+        return self.digest.hexdigest()
+
+    async def write(self, data: bytes) -> None:
+        self.digest.update(data)
+        await asyncio.to_thread(self._writer.write, data)
+
+    async def close(self) -> None:
+        await asyncio.to_thread(self._writer.commit)
+        self._committed = True
+
+    async def abort(self) -> None:
+        if self._committed:
+            await asyncio.to_thread(
+                self.s3_client.delete_object, Bucket=self.bucket, Key=self.key
+            )
+        else:
+            await asyncio.to_thread(self._writer.abort)
+
+
+OpenSink = Callable[[str, str], Sink]
+
+
+@dataclass
+class UploadedFile:
+    """A file part that has been written to its sink."""
+
+    field: str
+    name: str
+    content_type: Optional[str]
+    size: int
+    sink: Sink
+
+
+@dataclass
+class StreamedForm:
+    """Fields and files of a streamed form, like ``request.form``/``files``."""
+
+    fields: Dict[str, str] = field(default_factory=dict)
+    files: Dict[str, List[UploadedFile]] = field(default_factory=dict)
+
+    def get(self, name: str, default: Optional[str] = None) -> Optional[str]:
+        return self.fields.get(name, default)
+
+    def getlist(self, name: str) -> List[UploadedFile]:
+        return self.files.get(name, [])
+
+    async def discard(self) -> None:
+        """Remove every stored file, e.g. when the request is rejected."""
+        for uploads in self.files.values():
+            for upload in uploads:
+                await upload.sink.abort()
+        self.files = {}
+
+
+async def request_chunks(request) -> AsyncIterator[bytes]:
+    """The body of a ``stream=True`` Sanic request, chunk by chunk."""
+    while True:
+        chunk = await request.stream.read()
+        if chunk is None:
+            return
+        yield chunk
+
+
+async def read_form(
+    chunks: AsyncIterator[bytes],
+    content_type: str,
+    open_sink: OpenSink,
+    max_file_bytes: int,
+) -> StreamedForm:
+    """
+    Parse a streamed form body, sending each file to
+    ``open_sink(field, name)``.
+
+    Raises :class:`UploadError` for a malformed body and
+    :class:`UploadTooLarge` when a file exceeds *max_file_bytes*; in both cases
+    every file stored so far is removed first.
+    """
+    kind, options = parse_content_header(content_type or "")
+    if kind == "application/x-www-form-urlencoded":
+        body = bytearray()
+        async for chunk in chunks:
+            body += chunk
+            if len(body) > MAX_FIELD_BYTES:
+                raise UploadTooLarge("Form body is too large.")
+        return StreamedForm(fields=dict(parse_qsl(body.decode("utf-8", "replace"))))
+    if kind != "multipart/form-data":
+        # No body worth parsing (e.g. a bodiless POST): an empty form.
+        async for _ in chunks:
+            pass
+        return StreamedForm()
+    boundary = options.get("boundary")
+    if not boundary:
+        raise UploadError("Multipart body has no boundary.")
+
+    parser = _MultipartParser(boundary.encode("latin-1"), open_sink, max_file_bytes)
+    try:
+        async for chunk in chunks:
+            await parser.feed(chunk)
+        if not parser.done:
+            raise UploadError("Multipart body ended early.")
+    except BaseException:
+        await parser.abort()
+        raise
+    return parser.form
+
+
+class _MultipartParser:
+    """A push parser for one ``multipart/form-data`` body."""
+
+    def __init__(self, boundary: bytes, open_sink: OpenSink, max_file_bytes: int):
+        self.open_sink = open_sink
+        self.max_file_bytes = max_file_bytes
+        self.form = StreamedForm()
+        self.done = False
+        # The first delimiter may open the body; later ones follow a CRLF.
+        self._delimiter = b"\r\n--" + boundary
+        self._buffer = bytearray(b"\r\n")
+        self._state = "preamble"
+        self._part: Optional[dict] = None
+
+    async def feed(self, data: bytes) -> None:
+        self._buffer += data
+        progress = True
+        while progress and not self.done:
+            progress = await getattr(self, f"_{self._state}")()
+
+    async def _preamble(self) -> bool:
+        at = self._buffer.find(self._delimiter)
+        if at < 0:
+            # Keep a possible partial delimiter, drop the rest of the preamble.
+            del self._buffer[: max(0, len(self._buffer) - len(self._delimiter))]
+            return False
+        del self._buffer[: at + len(self._delimiter)]
+        self._state = "after_delimiter"
+        return True
+
+    async def _after_delimiter(self) -> bool:
+        if len(self._buffer) < 2:
+            return False
+        marker = bytes(self._buffer[:2])
+        del self._buffer[:2]
+        if marker == b"--":
+            self.done = True
+            return False
+        if marker != b"\r\n":
+            raise UploadError("Malformed multipart delimiter.")
+        self._state = "headers"
+        return True
+
+    async def _headers(self) -> bool:
+        end = self._buffer.find(b"\r\n\r\n")
+        if end < 0:
+            if len(self._buffer) > _MAX_HEADER_BYTES:
+                raise UploadError("Multipart part headers are too large.")
+            return False
+        lines = bytes(self._buffer[:end]).decode("utf-8", "replace").split("\r\n")
+        del self._buffer[: end + 4]
+        headers = {}
+        for line in lines:
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+        _, disposition = parse_content_header(headers.get("content-disposition", ""))
+        name = disposition.get("name")
+        if name is None:
+            raise UploadError("Multipart part has no field name.")
+        part = {"name": name, "size": 0}
+        if "filename" in disposition:
+            filename = os.path.basename(disposition["filename"].replace("\\", "/"))
+            part["upload"] = UploadedFile(
+                field=name,
+                name=filename,
+                content_type=headers.get("content-type"),
+                size=0,
+                sink=self.open_sink(name, filename),
+            )
+        else:
+            part["value"] = bytearray()
+        self._part = part
+        self._state = "body"
+        return True
+
+    async def _body(self) -> bool:
+        at = self._buffer.find(self._delimiter)
+        if at < 0:
+            # Everything but a possible partial delimiter is part data.
+            keep = len(self._delimiter) - 1
+            if len(self._buffer) > keep:
+                await self._write(bytes(self._buffer[:-keep]))
+                del self._buffer[:-keep]
+            return False
+        await self._write(bytes(self._buffer[:at]))
+        del self._buffer[: at + len(self._delimiter)]
+        await self._finish_part()
+        self._state = "after_delimiter"
+        return True
+
+    async def _write(self, data: bytes) -> None:
+        if not data:
+            return
+        part = self._part
+        part["size"] += len(data)
+        upload = part.get("upload")
+        if upload is None:
+            if part["size"] > MAX_FIELD_BYTES:
+                raise UploadTooLarge(f"Form field '{part['name']}' is too large.")
+            part["value"] += data
+            return
+        if part["size"] > self.max_file_bytes:
+            limit_mb = self.max_file_bytes // (1024 * 1024)
+            raise UploadTooLarge(f"'{upload.name}' exceeds the {limit_mb}MB limit.")
+        upload.size = part["size"]
+        await upload.sink.write(data)
+
+    async def _finish_part(self) -> None:
+        part, self._part = self._part, None
+        upload = part.get("upload")
+        if upload is None:
+            self.form.fields[part["name"]] = part["value"].decode("utf-8", "replace")
+            return
+        await upload.sink.close()
+        self.form.files.setdefault(part["name"], []).append(upload)
+
+    async def abort(self) -> None:
+        if self._part is not None and "upload" in self._part:
+            await self._part["upload"].sink.abort()
+        self._part = None
+        await self.form.discard()
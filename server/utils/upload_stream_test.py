@@ -0,0 +1,130 @@
+"""Tests for the streaming form parser.
+
+Bodies are encoded by hand and fed back in chunks of every size from one byte
+up, so delimiters and headers split across chunks are covered.
+"""
+
+import asyncio
+import hashlib
+import os
+import random
+
+import pytest
+from utils import upload_stream as U
+
+BOUNDARY = "----atlas-boundary"
+CONTENT_TYPE = f"multipart/form-data; boundary={BOUNDARY}"
+
+
+def _body(parts):
+    out = b""
+    for name, filename, data in parts:
+        disposition = f'form-data; name="{name}"'
+        if filename is not None:
+            disposition += f'; filename="{filename}"'
+        out += f"--{BOUNDARY}\r\nContent-Disposition: {disposition}\r\n".encode()
+        if filename is not None:
+            out += b"Content-Type: application/octet-stream\r\n"
+        out += b"\r\n" + data + b"\r\n"
+    return out + f"--{BOUNDARY}--\r\n".encode()
+
+
+async def _chunks(body, size):
+    for i in range(0, len(body), size):
+        yield body[i : i + size]
+
+
+def _read(tmp_path, body, size, max_file_bytes=10**6, content_type=CONTENT_TYPE):
+    def open_sink(field, name):
+        return U.FileSink(str(tmp_path / f"{len(os.listdir(tmp_path))}-{name}"))
+
+    return asyncio.run(
+        U.read_form(_chunks(body, size), content_type, open_sink, max_file_bytes)
+    )
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 64, 1000, 10**6])
+def test_fields_and_files_survive_any_chunking(tmp_path, size):
+    rng = random.Random(size)
+    first = bytes(rng.getrandbits(8) for _ in range(3000))
+    # A file holding a near-copy of the delimiter must come through intact.
+    tricky = b"\r\n--" + BOUNDARY[:-1].encode() + b"x\r\n--"
+    body = _body(
+        [
+            ("files[]", "a.pdf", first),
+            ("project_id", None, b"proj-1"),
+            ("files[]", "dir/b.pdf", tricky),
+            ("empty", "c.pdf", b""),
+        ]
+    )
+
+    form = _read(tmp_path, body, size)
+
+    assert form.fields == {"project_id": "proj-1"}
+    uploads = form.getlist("files[]")
+    assert [u.name for u in uploads] == ["a.pdf", "b.pdf"]
+    assert [u.size for u in uploads] == [len(first), len(tricky)]
+    assert open(uploads[0].sink.path, "rb").read() == first
+    assert open(uploads[1].sink.path, "rb").read() == tricky
+    assert open(form.getlist("empty")[0].sink.path, "rb").read() == b""
+
+
+@pytest.mark.unit
+def test_oversized_files_are_rejected_and_removed(tmp_path):
+    body = _body([("files[]", "a.pdf", b"x" * 100), ("files[]", "b.pdf", b"y" * 300)])
+
+    with pytest.raises(U.UploadTooLarge, match="b.pdf"):
+        _read(tmp_path, body, 16, max_file_bytes=200)
+
+    assert os.listdir(tmp_path) == []
+
+
+@pytest.mark.unit
+def test_truncated_bodies_are_rejected_and_removed(tmp_path):
+    body = _body([("files[]", "a.pdf", b"x" * 100)])[:-40]
+
+    with pytest.raises(U.UploadError, match="ended early"):
+        _read(tmp_path, body, 16)
+
+    assert os.listdir(tmp_path) == []
+
+
+@pytest.mark.unit
+def test_urlencoded_and_empty_bodies_parse_as_plain_forms(tmp_path):
+    urlencoded = "application/x-www-form-urlencoded"
+
+    form = _read(tmp_path, b"project_id=p1&sid=s%201", 3, content_type=urlencoded)
+    empty = _read(tmp_path, b"", 3, content_type="")
+
+    assert form.fields == {"project_id": "p1", "sid": "s 1"}
+    assert form.getlist("files[]") == []
+    assert (empty.fields, empty.files) == ({}, {})
+
+
+class FakeS3:
+    def __init__(self):
+        self.objects = {}
+
+    def put_object(self, Bucket, Key, Body, **extra):
+        self.objects[Key] = Body
+
+    def delete_object(self, Bucket, Key):
+        self.objects.pop(Key, None)
+
+
+@pytest.mark.unit
+def test_s3_sinks_hash_commit_and_abort():
+    s3 = FakeS3()
+
+    def open_sink(field, name):
+        return U.S3Sink(s3, "bucket", f"staging/{name}", {})
+
+    body = _body([("files[]", "a.pdf", b"%PDF-a"), ("files[]", "b.pdf", b"%PDF-b")])
+    form = asyncio.run(U.read_form(_chunks(body, 5), CONTENT_TYPE, open_sink, 1000))
+
+    first, second = form.getlist("files[]")
+    assert first.sink.sha256 == hashlib.sha256(b"%PDF-a").hexdigest()
+    assert s3.objects == {"staging/a.pdf": b"%PDF-a", "staging/b.pdf": b"%PDF-b"}
+    asyncio.run(form.discard())
+    assert s3.objects == {}
@@ -6,6 +6,7 @@ It uses Celery for asynchronous execution and emits socket updates.
 
 import logging
 import os
+import tempfile
 from datetime import datetime
 from typing import Optional, Tuple
 
@@ -16,9 +17,16 @@ from database.models.project_paper_result import ProjectPaperResult
 from database.models.projects import Project
 from database.models.results import Result
 from database.models.users import User
+from services.incremental_extraction import (
+    feature_versions,
+    merge_incremental,
+    plan_incremental,
+)
 from services.llm_credentials import BudgetExceededError, MissingPlatformKeyError
+from services.schema_registry import get_compiled_schema
 from workers.celery_config import celery
 from workers.services.file_s3_service import FileService
+from workers.services.paper_ingest import IngestError
 from workers.services.socket_emitter import SocketEmmiter
 
 logger = logging.getLogger(__name__)
@@ -147,6 +155,19 @@ def _is_successful_result(result: Result) -> bool:
     return True
 
 
+def _latest_successful_result(paper: Paper, project: Project) -> Optional[Result]:
+    """The newest result of *paper* in *project* holding a real extraction."""
+    results = (
+        Result.find(
+            Result.paper.id == paper.id,
+            Result.project.id == project.id,
+        )
+        .sort("-version")
+        .run()
+    )
+    return next((r for r in results if _is_successful_result(r)), None)
+
+
 def create_result_record(
     task_id: str,
     user: User,
@@ -200,6 +221,7 @@ def create_result_record(
         prompt_token=0,
         completion_token=0,
         feature_list=user_features,
+        feature_versions=feature_versions(project.features),
         task_id=task_id,
         finished=False,
         version=version,
@@ -241,6 +263,24 @@ def update_project_paper_mapping(
     return mapping
 
 
+def save_extraction_result(
+    task_id: str, user: User, paper: Paper, project: Project, output: dict
+) -> Result:
+    """Store a finished extraction as a new result version for the paper."""
+    result_obj, _ = create_result_record(
+        task_id=task_id, user=user, paper=paper, project=project
+    )
+    result_obj.json_response = output["result"]
+    result_obj.prompt_token = output.get("prompt_tokens", 0) or 0
+    result_obj.cached_prompt_token = output.get("cached_prompt_tokens", 0) or 0
+    result_obj.completion_token = output.get("completion_tokens", 0) or 0
+    result_obj.finished = True
+    result_obj.updated_at = datetime.now()
+    result_obj.save()
+    update_project_paper_mapping(project, paper, result_obj)
+    return result_obj
+
+
 @celery.task(bind=True, name="add_paper", base=BaseTaskWithCleanup, max_retries=1)
 def add_paper(
     self: Task,
@@ -252,10 +292,18 @@ def add_paper(
     original_filename: Optional[str] = None,
     paper_id: Optional[str] = None,  # For reprocessing existing papers
     staged_s3_key: Optional[str] = None,  # For curl/presigned uploads
+    use_cache: bool = True,  # Reuse a cached extraction when inputs are unchanged
+    incremental: bool = False,  # Extract only features the latest result lacks
 ):
     """
     Process the uploaded paper with S3 integration and run the assistant API.
-    Always reprocesses the paper, creating a new version if needed.
+    Always creates a new result version; the extraction itself is served from
+    the extraction cache when the paper, schema, model and prompt are
+    unchanged.
+
+    With ``incremental`` (reprocessing only), the features the paper's latest
+    result already holds at their current version are not extracted again;
+    see ``services.incremental_extraction``.
     """
     task_id = self.request.id
     emitter = SocketEmmiter(socket_id, task_id)
@@ -263,6 +311,7 @@ def add_paper(
     processing_file_path = file_path
     result_obj = None
     is_new_paper = True
+    previous = plan = None
 
     try:
         emitter.emit_status(message="Starting...", progress=0)
@@ -292,6 +341,7 @@ def add_paper(
         if existing_result:
             # This is a retry, use the existing result object
             result_obj = existing_result
+            paper = existing_result.paper
             logger.info("Using existing result for retry of task %s", task_id)
 
             # Idempotency guard: if a previous attempt already completed the
@@ -332,32 +382,36 @@ def add_paper(
                 emitter.emit_status(
                     message="Downloading paper from storage...", progress=5
                 )
-                temp_file_path = self.file_service.download_from_s3(paper.s3_key)
+                temp_file_path = self.file_service.download_paper(paper)
                 processing_file_path = temp_file_path
                 is_new_paper = False
             else:
-                # New paper upload. The bytes may already be staged in S3 (the
-                # presigned "upload by curl" flow) — if so, pull them down to a
-                # temp file first so the normal hash/dedup path can run.
+                # New paper upload. The bytes may already be staged in S3
+                # (the presigned "upload by curl" flow) — if so, stream them
+                # straight into ingest, keeping a local copy for extraction on
+                # the way.
+                emitter.emit_status(message="Processing uploaded paper...", progress=5)
                 if staged_s3_key:
-                    emitter.emit_status(
-                        message="Retrieving uploaded paper...", progress=5
-                    )
-                    temp_file_path = self.file_service.download_from_s3(staged_s3_key)
-                    processing_file_path = temp_file_path
-                    file_path = temp_file_path
                     if not original_filename:
                         original_filename = os.path.basename(staged_s3_key)
-
-                emitter.emit_status(message="Processing uploaded paper...", progress=5)
-                paper, is_new_paper = self.file_service.get_or_create_paper(
-                    file_path=processing_file_path,
-                    user=user,
-                    original_filename=original_filename,
-                )
+                    fd, temp_file_path = tempfile.mkstemp(suffix=".pdf")
+                    os.close(fd)
+                    processing_file_path = temp_file_path
+                    paper, is_new_paper = self.file_service.ingest_paper(
+                        self.file_service.stream_from_s3(staged_s3_key),
+                        user=user,
+                        original_filename=original_filename,
+                        local_path=temp_file_path,
+                    )
+                else:
+                    paper, is_new_paper = self.file_service.get_or_create_paper(
+                        file_path=processing_file_path,
+                        user=user,
+                        original_filename=original_filename,
+                    )
 
                 # The staged object was a temporary holding spot; the canonical
-                # copy now lives under the hashed key from get_or_create_paper.
+                # copy now lives under the key ingest gave it.
                 if staged_s3_key:
                     try:
                         self.file_service.s3_client.delete_object(
@@ -374,6 +428,31 @@ def add_paper(
                         progress=8,
                     )
 
+            # Incremental reprocessing: plan against the latest result before a
+            # new version supersedes it. (A retry re-extracts everything.)
+            if incremental and current_project and not is_new_paper:
+                previous = _latest_successful_result(paper, current_project)
+                if previous is not None:
+                    plan = plan_incremental(
+                        current_project.features,
+                        previous.feature_list,
+                        previous.feature_versions,
+                    )
+                if plan is not None and plan.up_to_date and not plan.stale:
+                    emitter.emit_status(
+                        message="Paper is up to date", progress=100, done=True
+                    )
+                    return {
+                        "status": "success",
+                        "file_name": original_filename,
+                        "paper_id": str(paper.id),
+                        "result_id": str(previous.id),
+                        "version": previous.version,
+                        "cached": False,
+                        "incremental": {"extracted": 0, "dropped": 0},
+                        "project_id": str(current_project.id),
+                    }
+
             # Create result record with versioning - ONLY if project exists
             if current_project:
                 result_obj, version = create_result_record(
@@ -401,20 +480,45 @@ def add_paper(
                 strategy_type,
             )
 
-            open_ai_res = run_assistant_api(
-                file_path=processing_file_path,
-                project_id=project_id,
-                emitter=emitter,
-                user=user,
-                strategy_type=strategy_type,
-            )
+            if plan is not None and plan.up_to_date:
+                # Only removed features to drop; nothing to extract.
+                open_ai_res = {
+                    "output": {
+                        "result": {},
+                        "prompt_tokens": 0,
+                        "completion_tokens": 0,
+                    }
+                }
+            else:
+                open_ai_res = run_assistant_api(
+                    file_path=processing_file_path,
+                    project_id=project_id,
+                    emitter=emitter,
+                    user=user,
+                    strategy_type=strategy_type,
+                    file_hash=paper.file_hash if paper else None,
+                    use_cache=use_cache,
+                    feature_ids=plan.feature_ids if plan else None,
+                )
 
             emitter.emit_status(message="Saving results...", progress=90)
 
+            json_response = open_ai_res["output"]["result"]
+            if plan is not None:
+                json_response = merge_incremental(
+                    get_compiled_schema(project_id=str(current_project.id)).schema,
+                    previous.json_response,
+                    json_response,
+                    plan.stale,
+                )
+
             # Update result
             if result_obj:  # Only update if a result object was created
-                result_obj.json_response = open_ai_res["output"]["result"]
+                result_obj.json_response = json_response
                 result_obj.prompt_token = open_ai_res["output"]["prompt_tokens"]
+                result_obj.cached_prompt_token = (
+                    open_ai_res["output"].get("cached_prompt_tokens", 0) or 0
+                )
                 result_obj.completion_token = open_ai_res["output"]["completion_tokens"]
                 result_obj.finished = True
                 result_obj.updated_at = datetime.now()
@@ -436,16 +540,23 @@ def add_paper(
                 message="Paper processed successfully", progress=100, done=True
             )
 
-            return {
+            response = {
                 "status": "success",
                 "file_name": original_filename,
-                "experiments": open_ai_res["output"]["result"],
+                "experiments": json_response,
                 "paper_id": str(paper.id),
                 "result_id": str(result_obj.id) if result_obj else None,
                 "version": version,
-                "cached": False,
+                "cached": open_ai_res.get("cached", False),
+                "preprocessing": open_ai_res.get("preprocessing"),
                 "project_id": str(current_project.id),
             }
+            if plan is not None:
+                response["incremental"] = {
+                    "extracted": len(plan.feature_ids),
+                    "dropped": len(plan.stale),
+                }
+            return response
         else:
             # Just library upload, no extraction
             emitter.emit_status(
@@ -458,9 +569,10 @@ def add_paper(
                 "message": "Paper added to library (no extraction run)",
             }
 
-    except (BudgetExceededError, MissingPlatformKeyError) as exc:
-        # Credential/budget problems are deterministic — retrying wastes work and
-        # (for a genuine over-limit user) money once a key is added. Fail fast.
+    except (BudgetExceededError, MissingPlatformKeyError, IngestError) as exc:
+        # Credential/budget problems and rejected uploads are deterministic —
+        # retrying wastes work and (for a genuine over-limit user) money once a
+        # key is added. Fail fast.
         logger.warning("Extraction blocked for task %s: %s", task_id, exc)
         emitter.emit_status(
             message=str(exc),
@@ -527,6 +639,8 @@ def reprocess_paper(
     user_email: str,
     project_id: str,
     strategy_type: str = "assistant_api",
+    use_cache: bool = True,
+    incremental: bool = False,
 ):
     """
     Reprocess an existing paper from S3.
@@ -547,5 +661,7 @@ def reprocess_paper(
             "strategy_type": strategy_type,
             "original_filename": paper.original_filename,
             "paper_id": paper_id,
+            "use_cache": use_cache,
+            "incremental": incremental,
         },
     )
@@ -24,11 +24,21 @@ celery = Celery(
 
 celery.conf.broker_connection_retry_on_startup = True
 
+# Periodic tasks; run a beat process (``celery beat``) alongside the workers.
+celery.conf.beat_schedule = {
+    "sweep-provider-resources": {
+        "task": "sweep_provider_resources",
+        "schedule": float(os.getenv("RESOURCE_SWEEP_INTERVAL_SECONDS", "3600")),
+    },
+}
+
 
 AWS_S3_BUCKET = os.getenv("AWS_S3_BUCKET")
 AWS_REGION = os.getenv("AWS_REGION")
 AWS_S3_KEY = os.getenv("AWS_S3_KEY")
 AWS_S3_SECRET = os.getenv("AWS_S3_SECRET")
+# An S3-compatible endpoint (e.g. a local MinIO) instead of AWS itself.
+AWS_S3_ENDPOINT_URL = os.getenv("AWS_S3_ENDPOINT_URL") or None
 
 REDIS_URL = os.getenv("CELERY_BROKER_URL", "redis://localhost:6379/0")
 
@@ -40,6 +50,7 @@ s3 = boto3.client(
     "s3",
     aws_access_key_id=AWS_S3_KEY,
     aws_secret_access_key=AWS_S3_SECRET,
+    endpoint_url=AWS_S3_ENDPOINT_URL,
 )
 
 
@@ -69,10 +80,24 @@ redis_client = Redis.from_url(REDIS_URL) if REDIS_URL else None
 
 # Import the tasks to register them with Celery
 from workers.add_paper_task import add_paper, reprocess_paper
+from workers.concurrent_extraction_task import extract_papers_concurrently
+from workers.extraction_batch_task import (
+    poll_extraction_batch,
+    submit_extraction_batch,
+)
+from workers.resource_janitor_task import sweep_provider_resources
 from workers.score_features import score_csv_data
-from workers.evaluate_repeatability_task import evaluate_feature_repeatability
+from workers.evaluate_repeatability_task import (
+    evaluate_feature_repeatability,
+    evaluate_project_repeatability,
+)
 
 celery.register_task(add_paper)
 celery.register_task(reprocess_paper)
+celery.register_task(extract_papers_concurrently)
+celery.register_task(submit_extraction_batch)
+celery.register_task(poll_extraction_batch)
+celery.register_task(sweep_provider_resources)
 celery.register_task(score_csv_data)
 celery.register_task(evaluate_feature_repeatability)
+celery.register_task(evaluate_project_repeatability)
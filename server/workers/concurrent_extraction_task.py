@@ -0,0 +1,142 @@
+"""
+Concurrent extraction of many papers inside one worker slot.
+
+``reprocess_project`` in ``concurrent`` mode queues a single task that runs
+every paper of the project through ``arun_assistant_api`` on one event loop,
+bounded by ``AsyncExtractionExecutor``. Each paper keeps its own progress
+stream (task id ``<task_id>:<paper_id>``), its own cache lookup and its own
+metering, exactly as ``add_paper`` would.
+"""
+
+import asyncio
+import logging
+import os
+from typing import List, Optional
+
+from celery import Task
+from controllers.assisstant import arun_assistant_api
+from database.models.papers import Paper
+from database.models.projects import Project
+from database.models.users import User
+from workers.add_paper_task import save_extraction_result
+from workers.celery_config import celery
+from workers.services.async_executor import AsyncExtractionExecutor
+from workers.services.file_s3_service import FileService
+from workers.services.socket_emitter import SocketEmmiter
+
+logger = logging.getLogger(__name__)
+
+
+async def _extract_paper(
+    task_id: str,
+    paper: Paper,
+    project: Project,
+    user: User,
+    strategy_type: str,
+    socket_id: Optional[str],
+    use_cache: bool,
+    file_service: FileService,
+) -> dict:
+    """Download, extract and save one paper."""
+    paper_task_id = f"{task_id}:{paper.id}"
+    emitter = SocketEmmiter(socket_id, paper_task_id)
+    emitter.emit_status(message="Downloading paper from storage...", progress=5)
+
+    file_path = await asyncio.to_thread(file_service.download_paper, paper)
+    try:
+        res = await arun_assistant_api(
+            file_path=file_path,
+            project_id=str(project.id),
+            emitter=emitter,
+            user=user,
+            strategy_type=strategy_type,
+            file_hash=paper.file_hash,
+            use_cache=use_cache,
+        )
+        emitter.emit_status(message="Saving results...", progress=90)
+        result_obj = await asyncio.to_thread(
+            save_extraction_result, paper_task_id, user, paper, project, res["output"]
+        )
+    except Exception as exc:
+        emitter.emit_status(
+            message=f"Processing failed: {exc}",
+            progress=100,
+            done=True,
+            status="FAILURE",
+        )
+        raise
+    finally:
+        os.remove(file_path)
+
+    emitter.emit_status(message="Paper processed successfully", progress=100, done=True)
+    return {
+        "paper_id": str(paper.id),
+        "result_id": str(result_obj.id),
+        "cached": res.get("cached", False),
+        "preprocessing": res.get("preprocessing"),
+    }
+
+
+@celery.task(bind=True, name="extract_papers_concurrently")
+def extract_papers_concurrently(
+    self: Task,
+    project_id: str,
+    user_email: str,
+    strategy_type: str,
+    socket_id: Optional[str] = None,
+    paper_ids: Optional[List[str]] = None,
+    use_cache: bool = True,
+):
+    """
+    Extract the project's papers (or just *paper_ids*) concurrently.
+    """
+    task_id = self.request.id
+    user = User.find_one(User.email == user_email).run()
+    project = Project.get(project_id, fetch_links=True).run()
+    if not user or not project:
+        raise ValueError("User or project not found")
+
+    papers = [
+        paper
+        for paper in project.papers
+        if paper_ids is None or str(paper.id) in paper_ids
+    ]
+    file_service = FileService()
+    executor = AsyncExtractionExecutor()
+    logger.info(
+        "Extracting %d papers for project %s with up to %d in flight",
+        len(papers),
+        project_id,
+        executor.max_concurrency,
+    )
+
+    outcomes = executor.run_blocking(
+        [
+            lambda paper=paper: _extract_paper(
+                task_id,
+                paper,
+                project,
+                user,
+                strategy_type,
+                socket_id,
+                use_cache,
+                file_service,
+            )
+            for paper in papers
+        ]
+    )
+
+    succeeded, failed = [], {}
+    for paper, outcome in zip(papers, outcomes):
+        if isinstance(outcome, BaseException):
+            logger.warning("Extraction failed for paper %s: %s", paper.id, outcome)
+            failed[str(paper.id)] = str(outcome)
+        else:
+            succeeded.append(outcome)
+
+    return {
+        "status": "success" if not failed else "partial",
+        "task_ids": {str(p.id): f"{task_id}:{p.id}" for p in papers},
+        "succeeded": succeeded,
+        "failed": failed,
+    }
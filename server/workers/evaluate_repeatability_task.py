@@ -5,15 +5,19 @@ Celery task for evaluating feature repeatability.
 import logging
 import os
 import math
-from typing import Optional
+import random
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Callable, List, Optional, Tuple
 
+import numpy as np
 import polars as pl
 from database.models.features import Features
 from database.models.papers import Paper
-from database.models.repeatability import RepeatabilityResult
+from database.models.projects import Project
+from database.models.repeatability import RepeatabilityReport, RepeatabilityResult
 from openai import OpenAI
-from utils.flatten import flatten_object
-from utils.krippendorff import krippendorff_alpha
+from utils.flatten import flatten_frame
+from utils.krippendorff import bootstrap_confidence_interval, krippendorff_alpha
 from workers.celery_config import celery
 from workers.services.file_s3_service import FileService
 from workers.services.socket_emitter import SocketEmmiter
@@ -21,6 +25,191 @@ from workers.strategies.openai_json_schema_strategy import OpenAIJSONSchemaStrat
 
 logger = logging.getLogger(__name__)
 
+# Extractions in flight at once (1 runs them one after another).
+REPEATABILITY_PARALLELISM = int(os.getenv("REPEATABILITY_PARALLELISM", "5"))
+# Adaptive mode: completed runs needed before stopping early, and the width of
+# the 95% bootstrap interval of alpha below which the remaining runs are
+# skipped.
+REPEATABILITY_MIN_RUNS = int(os.getenv("REPEATABILITY_MIN_RUNS", "3"))
+REPEATABILITY_TARGET_CI_WIDTH = float(
+    os.getenv("REPEATABILITY_TARGET_CI_WIDTH", "0.2")
+)
+# Bootstrap resamples per stopping check.
+REPEATABILITY_BOOTSTRAP = 200
+# Papers sampled by a project-wide evaluation when none are named.
+REPEATABILITY_SAMPLE_PAPERS = int(os.getenv("REPEATABILITY_SAMPLE_PAPERS", "10"))
+
+
+def _run_concurrently(
+    run: Callable[[int], Any],
+    num_runs: int,
+    parallelism: int,
+    stop: Optional[Callable[[List[Any]], bool]] = None,
+) -> Tuple[List[Any], int]:
+    """Call ``run(i)`` for each run, at most *parallelism* at a time.
+
+    The first run goes alone: it uploads the paper and fills the provider's
+    prompt cache, which the concurrent runs then read from. After each run
+    completes, *stop* is given the outputs so far (in completion order, failed
+    runs as None); once it returns true no further run is started, while the
+    runs already in flight are awaited and kept.
+
+    Returns the outputs in start order and the number of runs never started.
+    """
+    outputs = {}
+    done = []
+    in_flight = {}
+    started = 0
+    stopped = False
+    with ThreadPoolExecutor(max_workers=max(1, parallelism)) as pool:
+        while in_flight or (not stopped and started < num_runs):
+            limit = max(1, parallelism) if done else 1
+            while not stopped and started < num_runs and len(in_flight) < limit:
+                in_flight[pool.submit(run, started)] = started
+                started += 1
+            finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in finished:
+                i = in_flight.pop(future)
+                try:
+                    outputs[i] = future.result()
+                except Exception as e:
+                    logger.error(f"Extraction {i+1} failed: {e}")
+                    outputs[i] = None
+                done.append(outputs[i])
+                if stop is not None and not stopped:
+                    stopped = bool(stop(list(done)))
+    return [outputs[i] for i in range(started)], num_runs - started
+
+
+def _project(obj: Any, path: List[str]) -> Any:
+    """*obj* reduced to the branch leading to *path*.
+
+    Lists along the path are kept, with each item reduced the same way; every
+    other key is dropped, so sibling lists no longer multiply the rows.
+    """
+    if not path:
+        return obj
+    if isinstance(obj, list):
+        return [_project(item, path) for item in obj]
+    if not isinstance(obj, dict) or path[0] not in obj:
+        return {}
+    return {path[0]: _project(obj[path[0]], path[1:])}
+
+
+def _rating_matrix(
+    extractions: List[Optional[dict]], feature: Any, exact: bool = False
+) -> Optional[Tuple[np.ndarray, str]]:
+    """The (runs, items) matrix of the feature's values and its alpha metric.
+
+    The feature's own column is preferred; unless *exact*, a column whose
+    name contains the feature's name stands in for it. Returns None when no
+    column matches.
+
+    With *exact*, each run is first reduced to the feature's own path, so a
+    unit is one value at the feature's scope: a paper-level value counts once
+    rather than once per condition row, and runs that disagree on the number
+    of items in an unrelated list still line up.
+    """
+    path = feature.feature_identifier.split(".")
+    # We want to flatten each extraction and find the values for our feature.
+    all_dfs = []
+    for i, ext in enumerate(extractions):
+        if ext is None:
+            continue
+
+        # Flatten the extraction result into a Polars DataFrame
+        df = flatten_frame(_project(ext, path) if exact else ext)
+        if df.height == 0:
+            continue
+        df = df.with_columns(
+            pl.lit(f"rater_{i+1}").alias("rater"),
+            pl.Series(range(df.height)).alias("item_idx"),  # capital S
+        )
+        all_dfs.append(df)
+
+    if not all_dfs:
+        if exact:
+            return None
+        raise Exception("No extraction data collected")
+
+    # Runs may differ in which columns they produced.
+    combined = pl.concat(all_dfs, how="diagonal_relaxed")
+
+    # Identify target column; flatten_frame prefixes keys correctly.
+    own = feature.feature_identifier.replace(".", " ")
+    if own in combined.columns:
+        cols = [own]
+    elif exact:
+        return None
+    else:
+        cols = [
+            c
+            for c in combined.columns
+            if feature.feature_name in c
+            or feature.feature_identifier.split(".")[-1] in c
+        ]
+
+    if not cols:
+        # Fallback: cols that are not metadata
+        cols = [c for c in combined.columns if c not in ["rater", "item_idx"]]
+
+    if not cols:
+        return None
+
+    target_col = cols[0]
+    # Pivot to an (item, rater) matrix, then transpose to (raters, items).
+    matrix = combined.pivot(on="rater", index="item_idx", values=target_col)
+    data_matrix = matrix.drop("item_idx").to_numpy().T
+
+    # If target_col is numeric, use 'interval'
+    metric = "nominal"
+    sample_vals = combined[target_col].drop_nulls()
+    if len(sample_vals) > 0 and sample_vals.dtype in [
+        pl.Float64,
+        pl.Int64,
+        pl.Float32,
+        pl.Int32,
+    ]:
+        metric = "interval"
+    return data_matrix, metric
+
+
+def _cell(value: Any) -> Any:
+    return None if isinstance(value, float) and math.isnan(value) else value
+
+
+def _stopping_reason(
+    extractions: List[dict], feature: Any, min_runs: int, target_width: float
+) -> Optional[str]:
+    """Why no further runs are needed, or None to keep going.
+
+    *extractions* are the successful runs so far. Runs are resampled for the
+    bootstrap interval: the question is how much alpha would move with other
+    runs, not with other items.
+    """
+    if len(extractions) < max(2, min_runs):
+        return None
+    try:
+        rated = _rating_matrix(extractions, feature)
+        if rated is None:
+            return None
+        data_matrix, metric = rated
+        rows = {tuple(_cell(v) for v in row) for row in data_matrix.tolist()}
+        if len(rows) == 1:
+            return "unanimous"
+        _, lower, upper = bootstrap_confidence_interval(
+            data_matrix,
+            metric=metric,
+            n_bootstrap=REPEATABILITY_BOOTSTRAP,
+            resample="observers",
+        )
+    except Exception as e:
+        logger.warning(f"Repeatability stopping check failed: {e}")
+        return None
+    if upper - lower < target_width:
+        return f"alpha interval [{lower:.3f}, {upper:.3f}]"
+    return None
+
 
 @celery.task(name="evaluate_feature_repeatability", bind=True)
 def evaluate_feature_repeatability(
@@ -31,9 +220,17 @@ def evaluate_feature_repeatability(
     project_id: Optional[str],
     socket_id: str,
     num_runs: int = 5,
+    parallelism: Optional[int] = None,
+    adaptive: bool = False,
+    target_ci_width: Optional[float] = None,
 ):
     """
     Evaluate the repeatability of a feature by running extraction multiple times.
+
+    Runs execute concurrently, ``parallelism`` at a time. In adaptive mode
+    ``num_runs`` is an upper bound: no further runs are started once the
+    completed ones are unanimous or the bootstrap interval of alpha is
+    narrower than ``target_ci_width``.
     """
     task_id = self.request.id
     emitter = SocketEmmiter(socket_id, task_id)
@@ -64,108 +261,95 @@ def evaluate_feature_repeatability(
 
         file_service = FileService()
         emitter.emit_status(message="Downloading paper from storage...", progress=5)
-        temp_file_path = file_service.download_from_s3(paper.s3_key)
+        temp_file_path = file_service.download_paper(paper)
 
         client = OpenAI()
         # Handle project_id that might be empty string or None
         safe_project_id = project_id if project_id and project_id.strip() else None
         strategy = OpenAIJSONSchemaStrategy(client, safe_project_id, emitter)
+        # Upload the paper on the first run and reference it by id afterwards.
+        strategy.file_hash = paper.file_hash
+        # The runs resend the same paper; the first fills the prompt cache.
+        strategy.reuses_paper = True
+
+        parallelism = parallelism or REPEATABILITY_PARALLELISM
+        width = target_ci_width or REPEATABILITY_TARGET_CI_WIDTH
+        stop_reason = {}
+
+        def _run(i):
+            # We use a custom temperature for repeatability (0.7 is default)
+            # To test repeatability, we want to see how much it varies at the same temperature.
+            return strategy.extract(
+                temp_file_path, feature_ids=[feature_id], silent=True
+            )
 
-        extractions = []
-        for i in range(num_runs):
+        def _on_done(done):
             emitter.emit_status(
-                message=f"Running extraction {i+1}/{num_runs}...",
-                progress=int((i / num_runs) * 90),
+                message=f"Completed extraction {len(done)}/{num_runs}...",
+                progress=int((len(done) / num_runs) * 90),
             )
+            if not adaptive:
+                return False
+            results = [res["result"] for res in done if res]
+            reason = _stopping_reason(results, feature, REPEATABILITY_MIN_RUNS, width)
+            if reason:
+                stop_reason["reason"] = reason
+            return reason is not None
 
-            try:
-                # We use a custom temperature for repeatability (0.7 is default)
-                # To test repeatability, we want to see how much it varies at the same temperature.
-                res = strategy.extract(
-                    temp_file_path, feature_ids=[feature_id], silent=True
-                )
-                extractions.append(res["result"])
-            except Exception as e:
-                logger.error(f"Extraction {i+1} failed: {e}")
-                extractions.append(None)
+        emitter.emit_status(message=f"Running {num_runs} extractions...", progress=5)
+        outputs, runs_skipped = _run_concurrently(
+            _run, num_runs, parallelism, stop=_on_done
+        )
+        extractions = [res["result"] if res else None for res in outputs]
+        # Identical requests: after the first run the instructions and paper
+        # should be read from the provider's prompt cache.
+        prompt_tokens = sum((res or {}).get("prompt_tokens", 0) or 0 for res in outputs)
+        cached_prompt_tokens = sum(
+            (res or {}).get("cached_prompt_tokens", 0) or 0 for res in outputs
+        )
+        if runs_skipped:
+            logger.info(
+                "Repeatability stopped after %d of %d runs (%s)",
+                len(outputs),
+                num_runs,
+                stop_reason.get("reason"),
+            )
 
         # Cleanup temp file
         if temp_file_path and os.path.exists(temp_file_path):
             os.remove(temp_file_path)
             logger.info("Removed temp file: %s", temp_file_path)
 
+        logger.info(
+            "Repeatability runs used %d input tokens, %d from the prompt cache",
+            prompt_tokens,
+            cached_prompt_tokens,
+        )
+
         # Save extractions
         result_doc.extractions = extractions
+        result_doc.prompt_tokens = prompt_tokens
+        result_doc.cached_prompt_tokens = cached_prompt_tokens
+        result_doc.runs_used = len(outputs)
+        result_doc.runs_skipped = runs_skipped
         result_doc.save()
 
         # Calculate Repeatability
         emitter.emit_status(message="Calculating repeatability score...", progress=95)
 
         try:
-            # Prepare data for Krippendorff's Alpha
-            # We want to flatten each extraction and find the values for our feature.
-            all_dfs = []
-            for i, ext in enumerate(extractions):
-                if ext is None:
-                    continue
-
-                # Flatten the extraction result
-                flat_res = flatten_object(ext)
-                # Convert to Polars DataFrame
-                df = pl.DataFrame(flat_res)
-                df = df.with_columns(
-                    pl.lit(f"rater_{i+1}").alias("rater"),
-                    pl.Series(range(len(flat_res))).alias("item_idx"),  # capital S
-                )
-                all_dfs.append(df)
-
-            if not all_dfs:
-                raise Exception("No extraction data collected")
-
-            combined = pl.concat(all_dfs, how="vertical")
-
-            # Pivot to get (item, rater) matrix
-            # We need to find the column that matches our feature identifier.
-            # The flatten_object prefixes keys correctly.
-
-            # Identify target column
-            cols = [
-                c
-                for c in combined.columns
-                if feature.feature_name in c
-                or feature.feature_identifier.split(".")[-1] in c
-            ]
-
-            if not cols:
-                # Fallback: cols that are not metadata
-                cols = [c for c in combined.columns if c not in ["rater", "item_idx"]]
-
-            if cols:
-                target_col = cols[0]
-                # Pivot: index="item_idx", columns="rater", values=target_col
-                matrix = combined.pivot(on="rater", index="item_idx", values=target_col)
-
-                # Convert to matrix (raters, items) for Krippendorff
-                # matrix has [item_idx, rater_1, rater_2...]
-                # We drop item_idx and transpose
-                data_matrix = matrix.drop("item_idx").to_numpy().T
-
-                # Determine metric
-                metric = "nominal"
-                # If target_col is numeric, use 'interval'
-                sample_vals = combined[target_col].drop_nulls()
-                if len(sample_vals) > 0 and sample_vals.dtype in [
-                    pl.Float64,
-                    pl.Int64,
-                    pl.Float32,
-                    pl.Int32,
-                ]:
-                    metric = "interval"
-
+            rated = _rating_matrix(extractions, feature)
+            if rated is not None:
+                data_matrix, metric = rated
                 alpha = krippendorff_alpha(data_matrix, metric=metric)
                 if num_runs == 1 and not math.isnan(alpha):
                     alpha = 1.0
                 result_doc.alpha_score = float(alpha)
+                if num_runs > 1:
+                    # Runs are resampled: how far would alpha move with others?
+                    lower, upper = _alpha_interval(data_matrix, metric, "observers")
+                    result_doc.alpha_ci_lower = lower
+                    result_doc.alpha_ci_upper = upper
             else:
                 result_doc.alpha_score = 0.0
 
@@ -182,6 +366,15 @@ def evaluate_feature_repeatability(
         return {
             "result_id": str(result_doc.id),
             "alpha": result_doc.alpha_score,
+            "alpha_ci": (
+                [result_doc.alpha_ci_lower, result_doc.alpha_ci_upper]
+                if result_doc.alpha_ci_lower is not None
+                else None
+            ),
+            "prompt_tokens": prompt_tokens,
+            "cached_prompt_tokens": cached_prompt_tokens,
+            "runs_used": len(outputs),
+            "runs_skipped": runs_skipped,
             "extraction": extractions[0] if num_runs == 1 and extractions else None,
         }
 
@@ -192,3 +385,221 @@ def evaluate_feature_repeatability(
             result_doc.status = "failed"
             result_doc.save()
         raise
+
+
+def _sample_papers(
+    papers: List[Any], paper_ids: Optional[List[str]], sample_size: int
+) -> List[Any]:
+    """The named papers of the project, else a random sample of its papers."""
+    if paper_ids:
+        wanted = set(paper_ids)
+        return [paper for paper in papers if str(paper.id) in wanted]
+    if len(papers) <= sample_size:
+        return list(papers)
+    return random.sample(list(papers), sample_size)
+
+
+def _pooled_matrix(rated: List[Tuple[np.ndarray, str]]) -> Tuple[np.ndarray, str]:
+    """One rating matrix over the items of several papers' matrices.
+
+    Every item of every paper is a unit. Papers with fewer successful runs are
+    padded with missing values; alpha only looks at the values of each unit,
+    so which run is which row does not matter.
+    """
+    metric = "interval" if all(m == "interval" for _, m in rated) else "nominal"
+    runs = max(matrix.shape[0] for matrix, _ in rated)
+    blocks = []
+    for matrix, _ in rated:
+        block = np.full((runs, matrix.shape[1]), None, dtype=object)
+        block[: matrix.shape[0]] = matrix
+        blocks.append(block)
+    data = np.hstack(blocks)
+    if metric == "interval":
+        data = data.astype(float)
+    elif any(m == "interval" for _, m in rated):
+        # Numbers in some papers, text in others: compare them as text.
+        as_text = np.vectorize(
+            lambda v: None if _cell(v) is None else str(v), otypes=[object]
+        )
+        data = as_text(data)
+    return data, metric
+
+
+def _alpha_interval(
+    data_matrix: np.ndarray, metric: str, resample: str
+) -> Tuple[Optional[float], Optional[float]]:
+    """The 95% bootstrap interval of alpha, or (None, None) if undefined."""
+    try:
+        _, lower, upper = bootstrap_confidence_interval(
+            data_matrix, metric=metric, resample=resample
+        )
+    except Exception as e:
+        logger.warning(f"Bootstrap interval failed: {e}")
+        return None, None
+    if math.isnan(lower) or math.isnan(upper):
+        return None, None
+    return float(lower), float(upper)
+
+
+@celery.task(name="evaluate_project_repeatability", bind=True)
+def evaluate_project_repeatability(
+    self,
+    project_id: str,
+    user_id: str,
+    socket_id: Optional[str],
+    paper_ids: Optional[List[str]] = None,
+    sample_size: int = REPEATABILITY_SAMPLE_PAPERS,
+    num_runs: int = 5,
+    parallelism: Optional[int] = None,
+):
+    """
+    Evaluate the repeatability of every feature of a project.
+
+    Each sampled paper is extracted ``num_runs`` times with the project's full
+    schema, and the alpha of every feature is computed from those same runs
+    over the items of all sampled papers. Stores one ``RepeatabilityResult``
+    per feature and a ``RepeatabilityReport`` aggregating them.
+    """
+    task_id = self.request.id
+    emitter = SocketEmmiter(socket_id, task_id)
+
+    try:
+        emitter.emit_status(
+            message="Starting project repeatability evaluation...", progress=0
+        )
+
+        project = Project.get(project_id, fetch_links=True).run()
+        if not project:
+            emitter.emit_status(
+                message="Project not found", progress=0, status="FAILURE"
+            )
+            return {"error": "Project not found"}
+
+        features = [
+            f for f in project.features if not f.feature_identifier.endswith("parent")
+        ]
+        papers = _sample_papers(project.papers, paper_ids, sample_size)
+        if not features or not papers:
+            emitter.emit_status(
+                message="Project has no features or papers",
+                progress=0,
+                status="FAILURE",
+            )
+            return {"error": "Project has no features or papers"}
+
+        report = RepeatabilityReport(
+            project=project,
+            user=user_id,
+            papers=papers,
+            num_runs=num_runs,
+            status="processing",
+            task_id=task_id,
+        )
+        report.insert()
+
+        file_service = FileService()
+        client = OpenAI()
+        parallelism = parallelism or REPEATABILITY_PARALLELISM
+        runs = {}
+        for n, paper in enumerate(papers):
+            emitter.emit_status(
+                message=f"Extracting paper {n+1}/{len(papers)} {num_runs} times...",
+                progress=int((n / len(papers)) * 80),
+            )
+            temp_file_path = file_service.download_paper(paper)
+            strategy = OpenAIJSONSchemaStrategy(client, project_id, emitter)
+            strategy.file_hash = paper.file_hash
+            strategy.reuses_paper = True
+
+            def _run(i, strategy=strategy, path=temp_file_path):
+                return strategy.extract(path, silent=True)
+
+            try:
+                outputs, _ = _run_concurrently(_run, num_runs, parallelism)
+            finally:
+                if temp_file_path and os.path.exists(temp_file_path):
+                    os.remove(temp_file_path)
+
+            runs[str(paper.id)] = [res["result"] if res else None for res in outputs]
+            report.runs_failed += outputs.count(None)
+            report.prompt_tokens += sum(
+                (res or {}).get("prompt_tokens", 0) or 0 for res in outputs
+            )
+            report.cached_prompt_tokens += sum(
+                (res or {}).get("cached_prompt_tokens", 0) or 0 for res in outputs
+            )
+
+        emitter.emit_status(message="Calculating repeatability scores...", progress=85)
+
+        runs_used = sum(
+            sum(ext is not None for ext in extractions) for extractions in runs.values()
+        )
+        summary = []
+        for feature in features:
+            rated = []
+            for extractions in runs.values():
+                if not any(extractions):
+                    continue
+                matrix = _rating_matrix(extractions, feature, exact=True)
+                if matrix is not None:
+                    rated.append(matrix)
+            lower = upper = None
+            try:
+                alpha = 0.0
+                if rated:
+                    data_matrix, metric = _pooled_matrix(rated)
+                    alpha = float(krippendorff_alpha(data_matrix, metric=metric))
+                    lower, upper = _alpha_interval(data_matrix, metric, "units")
+                score = None if math.isnan(alpha) else alpha
+            except Exception as e:
+                logger.error(f"Score calculation failed for {feature.id}: {e}")
+                alpha, score = -1.0, None  # Error state
+
+            result_doc = RepeatabilityResult(
+                feature=feature,
+                feature_version=feature.version,
+                user=user_id,
+                report=report,
+                alpha_score=alpha,
+                alpha_ci_lower=lower,
+                alpha_ci_upper=upper,
+                runs_used=runs_used,
+                status="completed",
+                task_id=task_id,
+            )
+            result_doc.insert()
+            summary.append(
+                {
+                    "feature_id": str(feature.id),
+                    "feature_identifier": feature.feature_identifier,
+                    "alpha": score,
+                    "alpha_ci": [lower, upper] if lower is not None else None,
+                    "result_id": str(result_doc.id),
+                }
+            )
+
+        scored = [e["alpha"] for e in summary if e["alpha"] is not None]
+        report.features = summary
+        report.mean_alpha = sum(scored) / len(scored) if scored else None
+        report.status = "completed"
+        report.save()
+
+        emitter.emit_done(
+            message=f"Project repeatability evaluation complete "
+            f"({len(features)} features, {len(papers)} papers)."
+        )
+        return {
+            "report_id": str(report.id),
+            "features": summary,
+            "mean_alpha": report.mean_alpha,
+            "prompt_tokens": report.prompt_tokens,
+            "cached_prompt_tokens": report.cached_prompt_tokens,
+        }
+
+    except Exception as e:
+        logger.exception("Error in project repeatability evaluation")
+        emitter.emit_status(message=f"Error: {str(e)}", progress=0, status="FAILURE")
+        if "report" in locals():
+            report.status = "failed"
+            report.save()
+        raise
@@ -0,0 +1,147 @@
+"""Tests for the concurrent runs and early stopping of repeatability checks.
+
+The extraction itself is faked; run scheduling, the rating matrix and the
+stopping rule run for real.
+"""
+
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+from workers import evaluate_repeatability_task as T
+
+FEATURE = SimpleNamespace(feature_name="Sample size", feature_identifier="paper.n")
+
+
+def _extraction(*values):
+    return {"paper": [{"n": value} for value in values]}
+
+
+@pytest.mark.unit
+def test_runs_overlap_after_the_first_and_keep_start_order():
+    lock = threading.Lock()
+    active = []
+    peak = []
+
+    def run(i):
+        with lock:
+            active.append(i)
+            peak.append(len(active))
+        time.sleep(0.05 if i == 0 else 0.02)
+        with lock:
+            active.remove(i)
+        return {"run": i}
+
+    outputs, skipped = T._run_concurrently(run, 5, 3)
+
+    assert outputs == [{"run": i} for i in range(5)]
+    assert skipped == 0
+    # The first run goes alone (it warms the prompt cache), then 3 at a time.
+    assert peak[0] == 1 and max(peak) == 3
+
+
+@pytest.mark.unit
+def test_stop_skips_the_remaining_runs_and_failures_are_none():
+    def run(i):
+        if i == 1:
+            raise RuntimeError("provider error")
+        return {"run": i}
+
+    outputs, skipped = T._run_concurrently(
+        run, 10, 1, stop=lambda done: len(done) == 3
+    )
+
+    assert outputs == [{"run": 0}, None, {"run": 2}]
+    assert skipped == 7
+
+
+@pytest.mark.unit
+def test_stopping_reason_waits_for_min_runs_then_detects_unanimity():
+    runs = [_extraction("120", "80")] * 3
+
+    assert T._stopping_reason(runs[:2], FEATURE, 3, 0.2) is None
+    assert T._stopping_reason(runs, FEATURE, 3, 0.2) == "unanimous"
+
+
+@pytest.mark.unit
+def test_stopping_reason_keeps_going_while_the_interval_is_wide():
+    runs = [
+        _extraction("120", "80", "40"),
+        _extraction("100", "80", "45"),
+        _extraction("120", "60", "40"),
+    ]
+
+    assert T._stopping_reason(runs, FEATURE, 3, 0.2) is None
+    assert T._stopping_reason(runs, FEATURE, 3, 2.5) is not None
+
+
+@pytest.mark.unit
+def test_full_schema_runs_score_each_feature_from_its_own_column():
+    runs = [
+        {"paper": [{"n": "120", "design": "RCT", "note": "x"}]},
+        {"paper": [{"n": "120", "design": "survey", "note": "y"}]},
+    ]
+    design = SimpleNamespace(feature_name="Design", feature_identifier="paper.design")
+    missing = SimpleNamespace(feature_name="n", feature_identifier="paper.dropped")
+
+    matrix, metric = T._rating_matrix(runs, design, exact=True)
+
+    assert matrix.tolist() == [["RCT"], ["survey"]]
+    assert metric == "nominal"
+    # A substring match ("n" in "paper note") is not good enough here.
+    assert T._rating_matrix(runs, missing, exact=True) is None
+
+
+@pytest.mark.unit
+def test_exact_matrices_count_units_at_the_features_own_scope():
+    def run(*conditions):
+        return {
+            "paper": {"title": "T"},
+            "experiments": [
+                {"name": name, "conditions": [{"label": c} for c in labels]}
+                for name, labels in conditions
+            ],
+        }
+
+    runs = [
+        run(("e1", ["a", "b", "c"]), ("e2", ["d"])),
+        run(("e1", ["a"]), ("e2", ["d", "e"])),
+    ]
+    title = SimpleNamespace(feature_name="Title", feature_identifier="paper.title")
+    name = SimpleNamespace(feature_name="Name", feature_identifier="experiments.name")
+
+    titles, _ = T._rating_matrix(runs, title, exact=True)
+    names, _ = T._rating_matrix(runs, name, exact=True)
+
+    # One unit per paper and per experiment, whatever the condition counts.
+    assert titles.tolist() == [["T"], ["T"]]
+    assert names.tolist() == [["e1", "e2"], ["e1", "e2"]]
+
+
+@pytest.mark.unit
+def test_pooled_matrix_treats_every_paper_item_as_a_unit():
+    first = T._rating_matrix(
+        [_extraction("a", "b"), _extraction("a", "b"), _extraction("a", "c")],
+        FEATURE,
+    )
+    # A paper with a failed run contributes fewer rows.
+    second = T._rating_matrix([_extraction("d"), None, _extraction("d")], FEATURE)
+    agreeing = T._rating_matrix([_extraction("d"), _extraction("d")], FEATURE)
+
+    data, metric = T._pooled_matrix([first, second])
+    pooled = T.krippendorff_alpha(data, metric=metric)
+
+    assert data.shape == (3, 3) and metric == "nominal"
+    assert 0 < pooled < 1
+    assert T.krippendorff_alpha(*T._pooled_matrix([agreeing, agreeing])) == 1.0
+
+
+@pytest.mark.unit
+def test_sample_papers_prefers_named_papers():
+    papers = [SimpleNamespace(id=f"p{i}") for i in range(20)]
+
+    assert [p.id for p in T._sample_papers(papers, ["p3", "p7"], 10)] == ["p3", "p7"]
+    sample = T._sample_papers(papers, None, 10)
+    assert len(sample) == len({p.id for p in sample}) == 10
+    assert T._sample_papers(papers[:4], None, 10) == papers[:4]
@@ -0,0 +1,370 @@
+"""
+Batch-mode extraction for whole projects.
+
+``reprocess_project`` in sync mode queues one ``reprocess_paper`` task per
+paper, and each holds a worker slot for the full provider call. Batch mode
+instead builds every paper's request up front, submits them to the provider's
+batch API (OpenAI Batch / Anthropic Message Batches, see
+``workers/services/batch_provider.py``) and releases the worker. A poll task
+re-schedules itself until the provider reports the batch ended, then ingests
+each answer into ``Result`` / ``ProjectPaperResult`` exactly as ``add_paper``
+would, meters it at the batch rate and stores it in the extraction cache.
+
+Papers whose extraction is already cached are ingested at submit time and
+never sent to the provider.
+"""
+
+import json
+import logging
+import os
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from celery import Task
+from database.models.extraction_batch import ExtractionBatch, ExtractionBatchItem
+from database.models.papers import Paper
+from database.models.projects import Project
+from database.models.results import Result
+from database.models.users import User
+from services.extraction_cache import (
+    ExtractionFingerprint,
+    lookup_extraction,
+    store_extraction,
+)
+from services.llm_credentials import (
+    BudgetExceededError,
+    LlmCredentials,
+    MissingPlatformKeyError,
+    platform_credentials,
+    record_usage,
+    resolve_and_check,
+    resolve_llm_credentials,
+)
+from workers.add_paper_task import save_extraction_result
+from workers.celery_config import celery
+from workers.services.batch_provider import (
+    BATCH_ENDED,
+    BATCH_PENDING,
+    BatchRequest,
+    get_batch_provider,
+)
+from workers.services.file_s3_service import FileService
+from workers.services.socket_emitter import SocketEmmiter
+from workers.strategies.strategy_factory import ExtractionStrategyFactory
+
+logger = logging.getLogger(__name__)
+
+# Seconds between polls of a submitted batch.
+BATCH_POLL_SECONDS = int(os.getenv("EXTRACTION_BATCH_POLL_SECONDS", "60"))
+# Consecutive failed polls (network errors, 5xx, rate limits) before the
+# batch is given up as failed.
+BATCH_POLL_RETRIES = int(os.getenv("EXTRACTION_BATCH_POLL_RETRIES", "30"))
+# Split a project into several provider batches past these limits. Requests
+# embed base64 PDFs, so the byte limit is what usually applies (OpenAI caps
+# batch input files at 200 MB, Anthropic caps a batch at 256 MB).
+BATCH_MAX_REQUESTS = int(os.getenv("EXTRACTION_BATCH_MAX_REQUESTS", "1000"))
+BATCH_MAX_BYTES = int(os.getenv("EXTRACTION_BATCH_MAX_BYTES", str(150 * 1024 * 1024)))
+
+
+def _emit(socket_id: Optional[str], task_id: str, message: str, done: bool = False):
+    """Best-effort progress event; batch jobs usually outlive the socket."""
+    if not socket_id:
+        return
+    try:
+        SocketEmmiter(socket_id, task_id).emit_status(
+            message=message, progress=100 if done else 50, done=done
+        )
+    except Exception as e:
+        logger.warning("Failed to emit batch status: %s", e)
+
+
+@celery.task(bind=True, name="submit_extraction_batch")
+def submit_extraction_batch(
+    self: Task,
+    project_id: str,
+    user_email: str,
+    strategy_type: str,
+    socket_id: Optional[str] = None,
+    use_cache: bool = True,
+):
+    """
+    Build every paper's request for *project_id* and submit them as provider
+    batch jobs. Returns the ids of the ``ExtractionBatch`` records created.
+    """
+    task_id = self.request.id
+    user = User.find_one(User.email == user_email).run()
+    project = Project.get(project_id, fetch_links=True).run()
+    if not user or not project:
+        raise ValueError("User or project not found")
+
+    strategy_class = ExtractionStrategyFactory.get_strategy_class(strategy_type)
+    provider_name = strategy_class.BATCH_PROVIDER
+    if not provider_name:
+        raise ValueError(f"Strategy {strategy_type} has no batch mode")
+
+    try:
+        credentials = resolve_and_check(user, provider_name)
+    except (BudgetExceededError, MissingPlatformKeyError) as exc:
+        logger.warning("Batch extraction blocked for %s: %s", project_id, exc)
+        _emit(socket_id, task_id, str(exc), done=True)
+        return {"status": "error", "error": str(exc)}
+
+    strategy = ExtractionStrategyFactory.create_strategy(
+        strategy_type=strategy_type,
+        client=None,
+        project_id=project_id,
+        emitter=None,
+        api_key=credentials.api_key,
+    )
+    custom_prompt = project.prompt if project.prompt and project.prompt.strip() else None
+    schema = strategy._build_json_schema()
+    schema_hash, instructions = strategy.cache_inputs(custom_prompt)
+
+    provider = get_batch_provider(provider_name, credentials.api_key)
+    file_service = FileService()
+
+    batch_ids: List[str] = []
+    chunk: List[BatchRequest] = []
+    chunk_items: List[ExtractionBatchItem] = []
+    chunk_bytes = 0
+    cached = 0
+
+    def flush():
+        nonlocal chunk, chunk_items, chunk_bytes
+        if not chunk:
+            return
+        provider_batch_id = provider.submit(
+            chunk, metadata={"project_id": project_id, "strategy": strategy_type}
+        )
+        batch = ExtractionBatch(
+            project=project,
+            user=user,
+            strategy_type=strategy_type,
+            provider=provider_name,
+            provider_batch_id=provider_batch_id,
+            model=strategy_class.MODEL,
+            schema_hash=schema_hash,
+            instructions=instructions,
+            is_byo=credentials.is_byo,
+            items=chunk_items,
+        )
+        batch.insert()
+        batch_ids.append(str(batch.id))
+        logger.info(
+            "Submitted %s batch %s with %d papers for project %s",
+            provider_name,
+            provider_batch_id,
+            len(chunk),
+            project_id,
+        )
+        poll_extraction_batch.apply_async(
+            args=[str(batch.id)], countdown=BATCH_POLL_SECONDS
+        )
+        chunk, chunk_items, chunk_bytes = [], [], 0
+
+    for paper in project.papers:
+        paper_id = str(paper.id)
+        if use_cache and paper.file_hash:
+            fingerprint = ExtractionFingerprint.build(
+                paper.file_hash, schema_hash, strategy_class.MODEL, instructions
+            )
+            output = lookup_extraction(fingerprint)
+            if output is not None:
+                save_extraction_result(
+                    f"{task_id}:{paper_id}", user, paper, project, output
+                )
+                cached += 1
+                continue
+
+        file_path = file_service.download_paper(paper)
+        try:
+            # Always inline: a batch may wait up to a day for the provider,
+            # longer than a pooled upload is guaranteed to exist.
+            body = strategy.build_request(schema, instructions, file_path)
+        finally:
+            os.remove(file_path)
+
+        size = len(json.dumps(body))
+        if chunk and (
+            len(chunk) >= BATCH_MAX_REQUESTS or chunk_bytes + size > BATCH_MAX_BYTES
+        ):
+            flush()
+        chunk.append(BatchRequest(custom_id=paper_id, body=body))
+        chunk_items.append(ExtractionBatchItem(custom_id=paper_id, paper_id=paper_id))
+        chunk_bytes += size
+    flush()
+
+    submitted = len(project.papers) - cached
+    _emit(
+        socket_id,
+        task_id,
+        f"Submitted {submitted} papers in {len(batch_ids)} batch job(s); "
+        f"{cached} reused from cache.",
+    )
+    return {
+        "status": "submitted",
+        "batch_ids": batch_ids,
+        "submitted": submitted,
+        "cached": cached,
+    }
+
+
+def _ingested_result(task_id: str) -> Optional[Result]:
+    """The finished result an earlier poll already saved for *task_id*."""
+    return Result.find_one(
+        Result.task_id == task_id,
+        Result.finished == True,  # noqa: E712 - bunnet query needs ==
+    ).run()
+
+
+def _batch_credentials(user: User, batch: ExtractionBatch) -> Optional[LlmCredentials]:
+    """The key the batch was submitted under, or None if it is gone.
+
+    A provider batch is only visible to the key that created it: a BYO batch
+    needs the user's key still on file, and a platform batch the platform key
+    even if the user has since added their own.
+    """
+    try:
+        if not batch.is_byo:
+            return platform_credentials(batch.provider)
+        credentials = resolve_llm_credentials(user, batch.provider)
+    except MissingPlatformKeyError:
+        return None
+    return credentials if credentials.is_byo else None
+
+
+def _fail_batch(batch: ExtractionBatch, error: str) -> dict:
+    """Mark the batch and its unfinished items as failed."""
+    batch.status = "failed"
+    batch.error = error
+    for item in batch.items:
+        if item.status == "pending":
+            item.status, item.error = "failed", error
+    batch.completed_at = datetime.now()
+    batch.updated_at = datetime.now()
+    batch.save()
+    return {"status": "failed", "error": error}
+
+
+def _retry_poll(task: Task, batch: ExtractionBatch, error: Exception) -> dict:
+    """Poll again later after a provider error; fail once retries run out."""
+    if task.request.retries >= BATCH_POLL_RETRIES:
+        logger.error("Giving up on batch %s after provider errors: %s", batch.id, error)
+        return _fail_batch(batch, f"Provider unreachable: {error}")
+    logger.warning("Polling batch %s failed, retrying: %s", batch.id, error)
+    raise task.retry(exc=error, countdown=BATCH_POLL_SECONDS, max_retries=None)
+
+
+@celery.task(bind=True, name="poll_extraction_batch")
+def poll_extraction_batch(self: Task, batch_id: str):
+    """
+    Check a submitted batch; re-schedule while pending, ingest once ended.
+    """
+    batch = ExtractionBatch.get(batch_id).run()
+    if not batch or batch.status != "submitted":
+        return {"status": batch.status if batch else "missing"}
+
+    user = User.get(batch.user.ref.id).run()
+    project = Project.get(batch.project.ref.id, fetch_links=True).run()
+    credentials = _batch_credentials(user, batch)
+    if credentials is None:
+        return _fail_batch(
+            batch, "The API key the batch was submitted with has been removed"
+        )
+    provider = get_batch_provider(batch.provider, credentials.api_key)
+
+    try:
+        state = provider.status(batch.provider_batch_id)
+    except Exception as e:
+        return _retry_poll(self, batch, e)
+    batch.poll_count += 1
+    batch.updated_at = datetime.now()
+
+    if state == BATCH_PENDING:
+        batch.save()
+        poll_extraction_batch.apply_async(args=[batch_id], countdown=BATCH_POLL_SECONDS)
+        return {"status": "pending", "polls": batch.poll_count}
+
+    if state != BATCH_ENDED:
+        return _fail_batch(batch, "Provider reported the batch as failed")
+
+    strategy_class = ExtractionStrategyFactory.get_strategy_class(batch.strategy_type)
+    items: Dict[str, ExtractionBatchItem] = {i.custom_id: i for i in batch.items}
+
+    try:
+        results = iter(provider.results(batch.provider_batch_id))
+    except Exception as e:
+        return _retry_poll(self, batch, e)
+
+    while True:
+        # Items are saved as they are ingested, so a retry resumes from here.
+        try:
+            item_result = next(results, None)
+        except Exception as e:
+            return _retry_poll(self, batch, e)
+        if item_result is None:
+            break
+        item = items.get(item_result.custom_id)
+        if item is None or item.status != "pending":
+            continue
+        if item_result.error:
+            item.status, item.error = "failed", item_result.error
+            continue
+        task_id = f"{batch_id}:{item.paper_id}"
+        try:
+            output = strategy_class.parse_response_body(item_result.body)
+            paper = Paper.get(item.paper_id).run()
+            # A poll that crashed after saving the result but before recording
+            # the item left the result behind; reuse it instead of adding a
+            # second version.
+            result_obj = _ingested_result(task_id) or save_extraction_result(
+                task_id, user, paper, project, output
+            )
+        except Exception as e:
+            logger.warning(
+                "Failed to ingest batch item %s of %s: %s", item.custom_id, batch_id, e
+            )
+            item.status, item.error = "failed", str(e)
+            continue
+
+        item.status, item.result_id = "succeeded", str(result_obj.id)
+        batch.prompt_tokens += output["prompt_tokens"] or 0
+        batch.completion_tokens += output["completion_tokens"] or 0
+        # Record the item before metering it, so a poll that crashes from here
+        # on can never charge for it again.
+        batch.save()
+        if paper.file_hash:
+            store_extraction(
+                ExtractionFingerprint.build(
+                    paper.file_hash, batch.schema_hash, batch.model, batch.instructions
+                ),
+                batch.strategy_type,
+                output,
+            )
+        record_usage(
+            user,
+            credentials,
+            model=output["model"],
+            prompt_tokens=output["prompt_tokens"] or 0,
+            completion_tokens=output["completion_tokens"] or 0,
+            batch=True,
+            cached_tokens=output.get("cached_prompt_tokens", 0) or 0,
+            cache_write_tokens=output.get("cache_write_tokens", 0) or 0,
+        )
+
+    for item in batch.items:
+        if item.status == "pending":
+            item.status, item.error = "failed", "No result returned by provider"
+
+    batch.status = "completed"
+    batch.completed_at = datetime.now()
+    batch.save()
+
+    succeeded = sum(1 for i in batch.items if i.status == "succeeded")
+    logger.info(
+        "Ingested batch %s: %d/%d papers succeeded",
+        batch_id,
+        succeeded,
+        len(batch.items),
+    )
+    return {"status": "completed", "succeeded": succeeded, "total": len(batch.items)}
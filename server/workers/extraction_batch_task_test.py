@@ -0,0 +1,287 @@
+"""Tests for batch-mode extraction.
+
+The provider is the in-process ``LocalBatchProvider``; the database and S3
+boundaries are faked. What runs for real: request building, the provider
+round trip, response-body parsing and the poll task's ingest bookkeeping.
+"""
+
+import json
+from types import SimpleNamespace
+
+import pytest
+from database.models.extraction_batch import ExtractionBatchItem
+from services.llm_credentials import LlmCredentials
+from workers import extraction_batch_task as T
+from workers.services.batch_provider import (
+    BATCH_ENDED,
+    BatchRequest,
+    LocalBatchProvider,
+    OpenAIBatchProvider,
+)
+from workers.strategies.anthropic_json_schema_strategy import (
+    AnthropicJSONSchemaStrategy,
+)
+from workers.strategies.openai_json_schema_strategy import OpenAIJSONSchemaStrategy
+
+SCHEMA = {"type": "object", "properties": {"paper": {"type": "object"}}}
+
+
+def _pdf(tmp_path):
+    path = tmp_path / "paper.pdf"
+    path.write_bytes(b"%PDF-1.4 test")
+    return str(path)
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize(
+    "strategy_class, flavor",
+    [
+        (OpenAIJSONSchemaStrategy, "openai"),
+        (AnthropicJSONSchemaStrategy, "anthropic"),
+    ],
+)
+def test_local_provider_round_trip(tmp_path, strategy_class, flavor):
+    strategy = strategy_class(None, "p1", None, api_key="sk-test")
+    body = strategy.build_request(SCHEMA, "instructions", _pdf(tmp_path))
+    # Batch bodies must be plain JSON.
+    json.dumps(body)
+
+    provider = LocalBatchProvider(flavor=flavor)
+    batch_id = provider.submit([BatchRequest("paper-1", body)], metadata={})
+    assert provider.status(batch_id) == BATCH_ENDED
+
+    (item,) = list(provider.results(batch_id))
+    assert item.custom_id == "paper-1"
+    output = strategy_class.parse_response_body(item.body)
+    assert output["result"] == {"paper": {}}
+    assert output["model"] == strategy_class.MODEL
+
+
+@pytest.mark.unit
+def test_openai_results_split_successes_and_errors():
+    ok = {
+        "custom_id": "a",
+        "response": {"status_code": 200, "body": {"output": [], "usage": {}}},
+        "error": None,
+    }
+    bad = {
+        "custom_id": "b",
+        "response": {"status_code": 400, "body": {"error": "invalid schema"}},
+        "error": None,
+    }
+    files = {
+        "out": "\n".join(json.dumps(x) for x in (ok, bad)),
+        "err": json.dumps({"custom_id": "c", "error": {"code": "expired"}}),
+    }
+    provider = OpenAIBatchProvider.__new__(OpenAIBatchProvider)
+    provider.client = SimpleNamespace(
+        batches=SimpleNamespace(
+            retrieve=lambda _id: SimpleNamespace(
+                output_file_id="out", error_file_id="err"
+            )
+        ),
+        files=SimpleNamespace(content=lambda fid: SimpleNamespace(text=files[fid])),
+    )
+
+    results = {r.custom_id: r for r in provider.results("batch-1")}
+    assert results["a"].body == ok["response"]["body"]
+    assert results["b"].error and "invalid schema" in results["b"].error
+    assert results["c"].error and "expired" in results["c"].error
+
+
+@pytest.fixture
+def poll_env(monkeypatch):
+    """Fake the DB, credential and persistence boundaries of the poll task."""
+    items = [
+        ExtractionBatchItem(custom_id="p1", paper_id="p1"),
+        ExtractionBatchItem(custom_id="p2", paper_id="p2"),
+        ExtractionBatchItem(custom_id="p3", paper_id="p3"),
+    ]
+    batch = SimpleNamespace(
+        id="b1",
+        status="submitted",
+        provider="openai",
+        provider_batch_id=None,
+        strategy_type="openai_json_schema",
+        model=OpenAIJSONSchemaStrategy.MODEL,
+        schema_hash="s",
+        instructions="i",
+        is_byo=False,
+        items=items,
+        poll_count=0,
+        prompt_tokens=0,
+        completion_tokens=0,
+        user=SimpleNamespace(ref=SimpleNamespace(id="u1")),
+        project=SimpleNamespace(ref=SimpleNamespace(id="proj")),
+        save=lambda: None,
+    )
+
+    def responder(request):
+        if request.custom_id == "p2":
+            raise RuntimeError("refused")
+        text = json.dumps({"paper": {"id": request.custom_id}})
+        return {
+            "output": [
+                {"type": "message", "content": [{"type": "output_text", "text": text}]}
+            ],
+            "usage": {"input_tokens": 100, "output_tokens": 10},
+        }
+
+    provider = LocalBatchProvider(responder=responder)
+    # p3 is submitted but the provider never answers it.
+    batch.provider_batch_id = provider.submit(
+        [BatchRequest("p1", {}), BatchRequest("p2", {})], metadata={}
+    )
+
+    state = SimpleNamespace(batch=batch, saved=[], metered=[], cached=[], keys=[])
+    query = lambda value: SimpleNamespace(run=lambda: value)  # noqa: E731
+    monkeypatch.setattr(T.ExtractionBatch, "get", lambda _id: query(batch))
+    monkeypatch.setattr(T.User, "get", lambda _id: query(SimpleNamespace(id="u1")))
+    monkeypatch.setattr(
+        T.Project, "get", lambda _id, **kw: query(SimpleNamespace(id="proj"))
+    )
+    monkeypatch.setattr(
+        T.Paper, "get", lambda pid: query(SimpleNamespace(id=pid, file_hash="h" + pid))
+    )
+    monkeypatch.setattr(
+        T,
+        "resolve_llm_credentials",
+        lambda user, provider: LlmCredentials(provider, "k", is_byo=True),
+    )
+    monkeypatch.setattr(
+        T,
+        "platform_credentials",
+        lambda provider: LlmCredentials(provider, "platform", is_byo=False),
+    )
+
+    def _provider(name, key):
+        state.keys.append(key)
+        return provider
+
+    monkeypatch.setattr(T, "get_batch_provider", _provider)
+
+    def _save(task_id, user, paper, project, output):
+        state.saved.append((paper.id, output["result"]))
+        return SimpleNamespace(id=f"r-{paper.id}")
+
+    monkeypatch.setattr(T, "save_extraction_result", _save)
+    monkeypatch.setattr(T, "_ingested_result", lambda task_id: None)
+    monkeypatch.setattr(
+        T, "store_extraction", lambda fp, name, output: state.cached.append(fp)
+    )
+
+    def _record(user, credentials, **kwargs):
+        state.metered.append((credentials.is_byo, kwargs))
+        return 0
+
+    monkeypatch.setattr(T, "record_usage", _record)
+    return state
+
+
+@pytest.mark.unit
+def test_poll_ingests_results_and_meters_at_batch_rate(poll_env):
+    out = T.poll_extraction_batch.run("b1")
+
+    assert out == {"status": "completed", "succeeded": 1, "total": 3}
+    assert poll_env.saved == [("p1", {"paper": {"id": "p1"}})]
+    assert len(poll_env.cached) == 1
+
+    # Polled with the platform key the batch was submitted under, although
+    # the user now has their own, and metered at the batch rate.
+    assert set(poll_env.keys) == {"platform"}
+    ((is_byo, kwargs),) = poll_env.metered
+    assert is_byo is False
+    assert kwargs["batch"] is True
+    assert kwargs["prompt_tokens"] == 100
+
+    by_id = {i.custom_id: i for i in poll_env.batch.items}
+    assert by_id["p1"].status == "succeeded" and by_id["p1"].result_id == "r-p1"
+    assert by_id["p2"].status == "failed" and "refused" in by_id["p2"].error
+    assert by_id["p3"].status == "failed"
+    assert poll_env.batch.status == "completed"
+
+
+@pytest.mark.unit
+def test_poll_reuses_results_saved_before_a_crash(poll_env, monkeypatch):
+    # An earlier poll saved p1's result, then crashed before recording it.
+    earlier = {"b1:p1": SimpleNamespace(id="r-earlier")}
+    monkeypatch.setattr(T, "_ingested_result", earlier.get)
+
+    T.poll_extraction_batch.run("b1")
+
+    by_id = {i.custom_id: i for i in poll_env.batch.items}
+    assert poll_env.saved == []
+    assert by_id["p1"].result_id == "r-earlier"
+    assert len(poll_env.metered) == 1
+
+
+@pytest.mark.unit
+def test_poll_meters_items_only_once_recorded(poll_env, monkeypatch):
+    saved = []
+    poll_env.batch.save = lambda: saved.append(
+        {i.custom_id: i.status for i in poll_env.batch.items}
+    )
+    def _record(user, credentials, **kwargs):
+        poll_env.metered.append(saved[-1])
+
+    monkeypatch.setattr(T, "record_usage", _record)
+
+    T.poll_extraction_batch.run("b1")
+
+    # p1 was saved as succeeded before it was metered.
+    assert [state["p1"] for state in poll_env.metered] == ["succeeded"]
+
+
+@pytest.mark.unit
+def test_byo_batch_fails_once_the_users_key_is_removed(poll_env, monkeypatch):
+    poll_env.batch.is_byo = True
+    monkeypatch.setattr(
+        T,
+        "resolve_llm_credentials",
+        lambda user, provider: LlmCredentials(provider, "platform", is_byo=False),
+    )
+
+    out = T.poll_extraction_batch.run("b1")
+
+    assert out["status"] == "failed" and "removed" in out["error"]
+    assert poll_env.keys == []
+    assert all(i.status == "failed" for i in poll_env.batch.items)
+
+
+@pytest.mark.unit
+def test_provider_errors_retry_the_poll_until_retries_run_out(poll_env, monkeypatch):
+    class Unreachable:
+        def status(self, batch_id):
+            raise ConnectionError("503")
+
+    class Retry(Exception):
+        pass
+
+    def _retry(exc, countdown, max_retries):
+        raise Retry()
+
+    retry_poll, retried = T._retry_poll, []
+    monkeypatch.setattr(T, "get_batch_provider", lambda name, key: Unreachable())
+    monkeypatch.setattr(
+        T, "_retry_poll", lambda task, batch, error: retried.append(error)
+    )
+    T.poll_extraction_batch.run("b1")
+    assert [str(e) for e in retried] == ["503"]
+
+    task = SimpleNamespace(request=SimpleNamespace(retries=0), retry=_retry)
+    with pytest.raises(Retry):
+        retry_poll(task, poll_env.batch, ConnectionError("503"))
+    assert poll_env.batch.status == "submitted"
+
+    task.request.retries = T.BATCH_POLL_RETRIES
+    out = retry_poll(task, poll_env.batch, ConnectionError("503"))
+
+    assert out["status"] == "failed" and "503" in out["error"]
+    assert all(i.status == "failed" for i in poll_env.batch.items)
+
+
+@pytest.mark.unit
+def test_poll_ignores_finished_batches(poll_env):
+    poll_env.batch.status = "completed"
+    assert T.poll_extraction_batch.run("b1") == {"status": "completed"}
+    assert poll_env.saved == []
@@ -0,0 +1,80 @@
+"""
+Periodic cleanup of pooled provider resources.
+
+``sweep_provider_resources`` runs on the Celery beat schedule (see
+``workers/celery_config.py``; beat runs in its own container, both in
+docker-compose and in the ECS task definition). It deletes the provider
+objects of pool entries (assistants, vector stores, uploaded papers) that have
+outlived their TTL, then looks for pooled assistants and vector stores on the
+platform account that never made it into the registry (a worker died between
+creating and recording them) and deletes those too.
+"""
+
+import logging
+import os
+from typing import Any, Dict, Optional, Tuple
+
+import anthropic
+from database.models.provider_resources import ProviderResource
+from database.models.users import User
+from openai import OpenAI
+from services.llm_credentials import resolve_llm_credentials
+from workers.celery_config import celery
+from workers.services.resource_pool import (
+    key_owner,
+    sweep_expired_resources,
+    sweep_orphaned_resources,
+)
+
+logger = logging.getLogger(__name__)
+
+
+_PLATFORM_ENV = {"openai": "OPENAI_API_KEY", "anthropic": "ANTHROPIC_API_KEY"}
+_CLIENTS = {"openai": OpenAI, "anthropic": anthropic.Anthropic}
+
+
+def _client_resolver():
+    """Build ``client_for(entry)``, caching one client per key account."""
+    clients: Dict[Tuple[str, str], Optional[Any]] = {}
+
+    def resolve(entry: ProviderResource) -> Optional[str]:
+        if entry.user_id is None:
+            return os.getenv(_PLATFORM_ENV[entry.provider])
+        user = User.get(entry.user_id).run()
+        if not user:
+            return None
+        return resolve_llm_credentials(user, entry.provider).api_key
+
+    def client_for(entry: ProviderResource) -> Optional[Any]:
+        account = (entry.provider, entry.owner)
+        if account not in clients:
+            try:
+                api_key = resolve(entry)
+            except Exception as exc:
+                logger.warning("Could not resolve key for %s: %s", entry.owner[:12], exc)
+                api_key = None
+            # The key must still be the one that created the object.
+            clients[account] = (
+                _CLIENTS[entry.provider](api_key=api_key)
+                if api_key and key_owner(api_key) == entry.owner
+                else None
+            )
+        return clients[account]
+
+    return client_for
+
+
+@celery.task(name="sweep_provider_resources")
+def sweep_provider_resources():
+    """Delete expired and orphaned pooled provider objects."""
+    expired = sweep_expired_resources(_client_resolver())
+
+    orphaned = 0
+    platform_key = os.getenv("OPENAI_API_KEY")
+    if platform_key:
+        orphaned = sweep_orphaned_resources(OpenAI(api_key=platform_key), platform_key)
+
+    logger.info(
+        "Provider resource sweep: %d expired, %d orphaned", expired, orphaned
+    )
+    return {"expired": expired, "orphaned": orphaned}
@@ -2,24 +2,31 @@
 This module contains functions to compute scores for CSV data based on features
 """
 
-import json
 import logging
 import os
 from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
 
 import polars as pl
+from bunnet import BulkWriter, PydanticObjectId
 from bunnet.operators import In
 from celery import Task
 from database.models.features import Features
 from database.models.features_quality import FeaturesQuality
 from database.models.projects import Project
+from database.models.results import Result
 from database.models.users import User
-from openai import OpenAI
-from sklearn.metrics import f1_score, r2_score
+from utils.flatten import flatten_frame
+from workers.add_paper_task import _is_successful_result
 from workers.celery_config import celery
+from workers.services.file_s3_service import FileService
+from workers.services.string_comparison import ComparisonStats, compare_strings
 
 logger = logging.getLogger(__name__)
 
+# Similarity verdicts of (truth, prediction) pairs, in order.
+Compare = Callable[[Iterable[Tuple[Any, Any]]], List[str]]
+
 
 def compute_categorical_score(truth, prediction):
     """For categorical enums: return 1 if exact match, else 0."""
@@ -51,81 +58,367 @@ def compute_string_score(truth, prediction):
     return 1.0 if truth_lower == pred_lower else 0.0
 
 
-def gpt_function_string_comparison(user_refrence, gpt_answer):
+def _labels(name: str) -> pl.Expr:
+    return pl.col(name).cast(pl.String)
+
+
+def _numbers(name: str) -> pl.Expr:
+    return pl.col(name).cast(pl.Float64, strict=False)
+
+
+def score_expression(feat: dict, columns: Iterable[str]) -> pl.Expr:
     """
-    Compare the user refrence and gpt answer and return the similarity score.
+    The per-row score of *feat* as a Polars expression.
+
+    Column-wise versions of ``compute_categorical_score``,
+    ``compute_string_score`` and ``compute_number_score``; rows score None when
+    the CSV lacks the feature's columns or its type is not scored.
     """
+    ident = feat["identifier"]
+    truth_col = ident + "_truth"
+    score_col = ident + "_score"
+    if truth_col not in columns or ident not in columns:
+        return pl.lit(None).alias(score_col)
+
+    if feat["type"] == "string" and "enum" in feat:
+        score = _labels(truth_col).eq_missing(_labels(ident)).cast(pl.Int64)
+    elif feat["type"] == "string":
+        # str() of a missing value is "None", as in compute_string_score
+        truth, pred = (
+            _labels(name).fill_null("None").str.to_lowercase().str.strip_chars()
+            for name in (truth_col, ident)
+        )
+        score = (truth == pred).cast(pl.Float64)
+    elif feat["type"] == "number":
+        truth, pred = _numbers(truth_col), _numbers(ident)
+        error = (truth - pred).abs() / (truth.abs() + 1e-8)
+        score = (1 - error).clip(lower_bound=0).fill_nan(0.0).fill_null(0.0)
+    else:
+        return pl.lit(None).alias(score_col)
+    return score.alias(score_col)
 
-    client = OpenAI()
 
-    prompt = (
-        # do these two strings convey the same meaning
-        f"Do these two strings convey the same message or are they similar?\n\n"
-        f"String 1: {user_refrence}\n"
-        f"String 2: {gpt_answer}\n\n"
+def macro_f1(frame: pl.DataFrame, truth_col: str, pred_col: str) -> Optional[float]:
+    """
+    Macro-averaged F1 of the predicted labels, like
+    ``f1_score(average="macro")``.
+
+    Labels are compared as strings; a missing value is a label of its own.
+    """
+    if frame.height == 0:
+        return None
+    pairs = frame.select(truth=_labels(truth_col), pred=_labels(pred_col))
+    per_truth = pairs.group_by("truth").agg(
+        n_true=pl.len(),
+        tp=pl.col("truth").eq_missing(pl.col("pred")).sum(),
+    )
+    per_pred = pairs.group_by("pred").agg(n_pred=pl.len())
+    labels = per_truth.join(
+        per_pred,
+        left_on="truth",
+        right_on="pred",
+        how="full",
+        nulls_equal=True,
+    )
+    f1 = (
+        2
+        * pl.col("tp").fill_null(0)
+        / (pl.col("n_true").fill_null(0) + pl.col("n_pred").fill_null(0))
     )
+    return labels.select(f1.mean()).item()
 
-    gpt_function = {
-        "type": "function",
-        "function": {
-            "name": "compare_strings",
-            "description": "Determines if two strings convey the same message or if they are similar",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "similarity_threshold": {
-                        "type": "string",
-                        "description": "How similar are the two strings and do they convey the same message?",
-                        "enum": [
-                            "Very different",
-                            "Different",
-                            "Similar",
-                            "Very similar",
-                        ],
-                    }
-                },
-                "additionalProperties": False,
-                "required": ["similarity_threshold"],
-            },
-            "strict": True,
-        },
-    }
 
-    try:
-        response = client.chat.completions.create(
-            model="o3-mini",
-            # model="gpt-4o",
-            messages=[
-                {"role": "user", "content": [{"type": "text", "text": prompt}]},
-            ],
-            response_format={"type": "text"},
-            reasoning_effort="high",
-            tools=[gpt_function],
-            tool_choice={"type": "function", "function": {"name": "compare_strings"}},
+def r2_expressions(truth_col: str, pred_col: str) -> List[pl.Expr]:
+    """
+    Aggregates of the rows where both values are numbers: count, residual and
+    total sum of squares, for ``r2_from_sums``.
+    """
+    truth, pred = _numbers(truth_col), _numbers(pred_col)
+    valid = truth.is_not_null() & pred.is_not_null()
+    truth, pred = truth.filter(valid), pred.filter(valid)
+    return [
+        valid.sum().alias(f"{pred_col}_n"),
+        ((truth - pred) ** 2).sum().alias(f"{pred_col}_ss_res"),
+        ((truth - truth.mean()) ** 2).sum().alias(f"{pred_col}_ss_tot"),
+    ]
+
+
+def r2_from_sums(n: int, ss_res: float, ss_tot: float) -> Optional[float]:
+    """R² as ``r2_score`` computes it, or None for fewer than two rows."""
+    if n < 2:
+        return None
+    if ss_tot == 0:
+        return 1.0 if ss_res == 0 else 0.0
+    return 1 - ss_res / ss_tot
+
+
+def string_similarity_f1(
+    frame: pl.DataFrame,
+    truth_col: str,
+    pred_col: str,
+    compare: Compare = compare_strings,
+) -> Optional[float]:
+    """
+    Macro F1 of the model's similarity verdicts against "Very similar".
+
+    Each distinct (truth, prediction) pair is compared once and counted as
+    many times as it occurs.
+    """
+    if frame.height == 0:
+        return None
+    pairs = frame.group_by([truth_col, pred_col]).len()
+    categories = compare(pairs.select(truth_col, pred_col).iter_rows())
+    verdicts: Dict[str, int] = {}
+    for category, count in zip(categories, pairs["len"]):
+        verdicts[category] = verdicts.get(category, 0) + count
+    # Every truth is "Very similar": only that label can score, with
+    # F1 = 2 tp / (n + tp); each other predicted label scores 0.
+    tp = verdicts.get("Very similar", 0)
+    labels = set(verdicts) | {"Very similar"}
+    return 2 * tp / (frame.height + tp) / len(labels)
+
+
+def score_frame(
+    data: pl.LazyFrame,
+    feature_columns: List[dict],
+    compare: Compare = compare_strings,
+) -> Tuple[Dict[str, list], Dict[str, Optional[float]]]:
+    """
+    Per-row scores and aggregate scores of the features in *data*.
+
+    Only the truth and prediction columns are read; the row scores and the
+    aggregates (macro F1 for enums and strings, R² for numbers) are computed
+    column-wise from one collected frame.
+    """
+    columns = set(data.collect_schema().names())
+    # Features sharing an identifier score the same columns once.
+    unique: Dict[str, dict] = {}
+    for feat in feature_columns:
+        unique.setdefault(feat["identifier"], feat)
+    feature_columns = list(unique.values())
+    scored = [
+        feat
+        for feat in feature_columns
+        if feat["identifier"] + "_truth" in columns and feat["identifier"] in columns
+    ]
+    needed = list(
+        dict.fromkeys(
+            name
+            for feat in scored
+            for name in (feat["identifier"] + "_truth", feat["identifier"])
         )
+    )
+    # Without any scored column a row index keeps the frame at its height, so
+    # the null score columns still get one value per row.
+    frame = (
+        data.select(needed or [pl.int_range(pl.len()).alias("_row")])
+        .with_columns(score_expression(feat, columns) for feat in feature_columns)
+        .collect(engine="streaming")
+    )
+    per_row_scores = frame.select(
+        feat["identifier"] + "_score" for feat in feature_columns
+    ).to_dict(as_series=False)
+
+    numbers = [feat["identifier"] for feat in scored if feat["type"] == "number"]
+    sums = {}
+    if numbers:
+        sums = frame.select(
+            expr
+            for ident in numbers
+            for expr in r2_expressions(ident + "_truth", ident)
+        ).row(0, named=True)
+
+    aggregate_scores: Dict[str, Optional[float]] = {}
+    for feat in scored:
+        ident = feat["identifier"]
+        truth_col = ident + "_truth"
+        if feat["type"] == "string" and "enum" in feat:
+            score = macro_f1(frame, truth_col, ident)
+        elif feat["type"] == "string":
+            score = string_similarity_f1(frame, truth_col, ident, compare)
+        elif feat["type"] == "number":
+            score = r2_from_sums(
+                sums[f"{ident}_n"], sums[f"{ident}_ss_res"], sums[f"{ident}_ss_tot"]
+            )
+        else:
+            score = None
+        aggregate_scores[ident] = score
+    return per_row_scores, aggregate_scores
+
+
+# Ground-truth column naming the paper a row belongs to, in results mode.
+PAPER_ID_COLUMNS = ("paper_id", "_paper_id")
 
-        function_args = json.loads(
-            response.choices[0].message.tool_calls[0].function.arguments
+
+def _paper_id_column(columns: Iterable[str]) -> str:
+    found = next((c for c in PAPER_ID_COLUMNS if c in columns), None)
+    if found is None:
+        raise ValueError(
+            "Scoring against stored results needs a paper id column "
+            f"({' or '.join(PAPER_ID_COLUMNS)})"
+        )
+    return found
+
+
+def latest_results(project: Project, paper_ids: Iterable[str]) -> List[Result]:
+    """The latest successful result of each of *paper_ids* in *project*."""
+    ids = []
+    for paper_id in paper_ids:
+        try:
+            ids.append(PydanticObjectId(paper_id))
+        except Exception:
+            logger.warning("Ignoring invalid paper id %r in ground truth", paper_id)
+    if not ids:
+        return []
+    results = Result.find(
+        Result.project.id == project.id,
+        In(Result.paper.id, ids),
+        Result.is_latest == True,  # noqa: E712
+    ).to_list()
+    return [result for result in results if _is_successful_result(result)]
+
+
+def join_results(truth: pl.DataFrame, results: List[Result]) -> pl.DataFrame:
+    """
+    The ground-truth rows joined with the flattened predictions of *results*.
+
+    Every column of *truth* but the paper id is a ground-truth value (its
+    ``_truth`` suffix is optional). A paper's ground-truth rows are matched,
+    in order, with the rows its result flattens into (one per experiment /
+    condition, as in the exported table). Each row carries the id of the
+    result it was matched with in ``_result_id``.
+    """
+    paper_col = _paper_id_column(truth.columns)
+    truth = truth.rename(
+        {
+            col: f"{col}_truth"
+            for col in truth.columns
+            if col != paper_col
+            and not col.endswith("_truth")
+            and f"{col}_truth" not in truth.columns
+        }
+    ).with_columns(
+        pl.col(paper_col).cast(pl.String),
+        pl.int_range(pl.len()).over(paper_col).alias("_row"),
+    )
+
+    frames = []
+    for result in results:
+        flat = flatten_frame(result.json_response)
+        flat = flat.rename({col: col.replace(" ", ".") for col in flat.columns})
+        frames.append(
+            flat.with_columns(
+                pl.lit(str(result.paper.ref.id)).alias(paper_col),
+                pl.lit(str(result.id)).alias("_result_id"),
+                pl.int_range(pl.len()).alias("_row"),
+            )
+        )
+    if not frames:
+        return truth.with_columns(pl.lit(None, pl.String).alias("_result_id"))
+    predictions = pl.concat(frames, how="diagonal_relaxed")
+    # Prediction columns are named like the features; keep only those.
+    features = [col for col in predictions.columns if f"{col}_truth" in truth.columns]
+    predictions = predictions.select(paper_col, "_row", "_result_id", *features)
+    return truth.join(predictions, on=[paper_col, "_row"], how="left")
+
+
+def feature_sources(
+    joined: pl.DataFrame, identifiers: Iterable[str]
+) -> Dict[str, List[str]]:
+    """Ids of the results that gave a prediction for each feature's truths."""
+    sources = {}
+    for ident in identifiers:
+        if ident not in joined.columns:
+            continue
+        sources[ident] = (
+            joined.filter(
+                pl.col(ident + "_truth").is_not_null()
+                & pl.col("_result_id").is_not_null()
+            )
+            .get_column("_result_id")
+            .unique(maintain_order=True)
+            .to_list()
         )
-        similarity_category = function_args.get("similarity_threshold")
+    return sources
 
-        if similarity_category is None:
-            raise ValueError("similarity_threshold key not found in the response.")
 
-        return similarity_category
+def save_features_quality(
+    project: Project,
+    features: List[Features],
+    scores: Dict[str, Optional[float]],
+    sources: Optional[Dict[str, List[Result]]] = None,
+) -> List[FeaturesQuality]:
+    """
+    Upsert the ``FeaturesQuality`` of every scored feature in one bulk write.
 
-    except Exception as e:
-        print("An error occurred in gpt_function_string_comparison:", e)
-        return "Different"
+    Existing records of the project are read with a single query; *sources*
+    maps an identifier to the results (and so papers) the score was computed
+    from.
+    """
+    sources = sources or {}
+    by_identifier: Dict[str, Features] = {}
+    for feature in features:
+        if scores.get(feature.feature_identifier) is not None:
+            by_identifier.setdefault(feature.feature_identifier, feature)
+    if not by_identifier:
+        return []
+
+    existing = {
+        record.feature.ref.id: record
+        for record in FeaturesQuality.find(
+            In(FeaturesQuality.feature.id, [f.id for f in by_identifier.values()]),
+            FeaturesQuality.project.id == project.id,
+        ).to_list()
+    }
+    records = []
+    with BulkWriter() as writer:
+        for ident, feature in by_identifier.items():
+            results = sources.get(ident, [])
+            papers = list({str(r.paper.ref.id): r.paper for r in results}.values())
+            record = existing.get(feature.id)
+            if record is None:
+                record = FeaturesQuality(
+                    id=PydanticObjectId(),
+                    feature=feature,
+                    project=project,
+                    feature_score=scores[ident],
+                    paper_ids=papers,
+                    results_ids=results,
+                )
+                FeaturesQuality.insert_one(record, bulk_writer=writer)
+            else:
+                record.feature_score = scores[ident]
+                if results:
+                    record.paper_ids = papers
+                    record.results_ids = results
+                record.updated_at = datetime.now()
+                record.replace(bulk_writer=writer)
+            records.append(record)
+    return records
 
 
 @celery.task(bind=True, name="score_csv_data")
-def score_csv_data(self: Task, file_path: str, project_id: str, user_email: str = None):
+def score_csv_data(
+    self: Task,
+    csv_key: str,
+    project_id: str,
+    user_email: str = None,
+    against_results: bool = False,
+):
     """
     Score the CSV data based on the features in the database.
+
+    *csv_key* is the staged upload in object storage; it is streamed to this
+    worker's disk for scanning and deleted, with the local copy, when done.
+
+    With *against_results* the CSV holds only ground truth, keyed by paper id,
+    and the predictions are the project's latest results.
     """
 
+    file_service, file_path = None, None
     try:
+        file_service = FileService()
+
         # Get project and user if user_email provided
         project = Project.get(project_id).run()
         if not project:
@@ -135,13 +428,27 @@ def score_csv_data(self: Task, file_path: str, project_id: str, user_email: str
         if user_email:
             user = User.find_one(User.email == user_email).run()
 
-        # Read CSV with Polars from file path
-        df = pl.read_csv(file_path)
-        new_names = {col: col.replace(" ", ".") for col in df.columns}
-        df = df.rename(new_names)
+        file_path = file_service.download_from_s3(csv_key)
+
+        # Scan the CSV lazily; only the scored columns are ever read
+        data = pl.scan_csv(file_path)
+        names = data.collect_schema().names()
+        data = data.rename({col: col.replace(" ", ".") for col in names})
+
+        results: Dict[str, Result] = {}
+        if against_results:
+            truth = data.collect()
+            paper_col = _paper_id_column(truth.columns)
+            paper_ids = truth.get_column(paper_col).cast(pl.String).unique()
+            results = {
+                str(r.id): r
+                for r in latest_results(project, paper_ids.drop_nulls().to_list())
+            }
+            joined = join_results(truth, list(results.values()))
+            data = joined.lazy()
 
         identifiers = []
-        for col in df.columns:
+        for col in data.collect_schema().names():
             if col.endswith("_truth"):
                 base_identifier = col.replace("_truth", "")
                 identifiers.append(base_identifier)
@@ -170,111 +477,35 @@ def score_csv_data(self: Task, file_path: str, project_id: str, user_email: str
                     {"identifier": feature_db.feature_identifier, "type": feature_type}
                 )
 
-        score_dict = {}
-        for feat in feature_columns:
-            score_col = feat["identifier"] + "_score"
-            score_dict[score_col] = []
-
-        rows = df.to_dicts()
-        for row in rows:
-            for feat in feature_columns:
-                ident = feat["identifier"]
-                truth_key = ident + "_truth"
-                score_key = ident + "_score"
-                if truth_key not in row or ident not in row:
-                    score_dict[score_key].append(None)
-                    continue
-                truth_val = row[truth_key]
-                pred_val = row[ident]
-                if feat["type"] == "string" and "enum" in feat:
-                    sc = compute_categorical_score(truth_val, pred_val)
-                elif feat["type"] == "string":
-                    sc = compute_string_score(truth_val, pred_val)
-                elif feat["type"] == "number":
-                    sc = compute_number_score(truth_val, pred_val)
-                else:
-                    sc = None
-                score_dict[score_key].append(sc)
-
-        aggregate_scores = {}
-        features_quality_records = []  # To store FeaturesQuality records
-
-        for feat in feature_columns:
-            ident = feat["identifier"]
-            truth_col = ident + "_truth"
-            if truth_col not in df.columns or ident not in df.columns:
-                continue
-            if feat["type"] == "string" and "enum" in feat:
-                truth_list = df[truth_col].to_list()
-                pred_list = df[ident].to_list()
-                try:
-                    score = f1_score(truth_list, pred_list, average="macro")
-                except Exception as e:
-                    logger.error("Error computing F1 for %s: %s", ident, e)
-                    score = None
-            elif feat["type"] == "string":
-                truth_list = df[truth_col].to_list()
-                pred_list = df[ident].to_list()
-                y_pred = []
-                for truth_val, gpt_ans in zip(truth_list, pred_list):
-                    category = gpt_function_string_comparison(truth_val, gpt_ans)
-                    y_pred.append(category)
-                y_true = ["Very similar"] * len(truth_list)
-                score = f1_score(y_true, y_pred, average="macro")
-            elif feat["type"] == "number":
-                try:
-                    truth_list = [float(v) for v in df[truth_col].to_list()]
-                    pred_list = [float(v) for v in df[ident].to_list()]
-                    score = r2_score(truth_list, pred_list)
-                except Exception as e:
-                    logger.error("Error computing R² for %s: %s", ident, e)
-                    score = None
-            else:
-                score = None
-
-            aggregate_scores[ident] = score
+        comparisons = ComparisonStats()
+        score_dict, aggregate_scores = score_frame(
+            data,
+            feature_columns,
+            lambda pairs: compare_strings(pairs, user, stats=comparisons),
+        )
 
-            # Create FeaturesQuality record if we have a valid score
-            if score is not None:
-                # Find the feature in the database
-                feature = next(
-                    (f for f in features_from_db if f.feature_identifier == ident), None
-                )
-                if feature:
-                    # Check if a FeaturesQuality record already exists for this feature and project
-                    existing_quality = FeaturesQuality.find_one(
-                        FeaturesQuality.feature.id == feature.id,
-                        FeaturesQuality.project.id == project.id,
-                        fetch_links=True,
-                        nesting_depth=1,
-                    ).run()
-
-                    if existing_quality:
-                        # Update existing record
-                        existing_quality.feature_score = score
-                        existing_quality.updated_at = datetime.now()
-                        existing_quality.save()
-                        features_quality_records.append(existing_quality)
-                    else:
-                        # Create new record
-                        quality_record = FeaturesQuality(
-                            feature=feature,
-                            project=project,
-                            feature_score=score,
-                            paper_ids=[],  # You can populate this if you have specific papers
-                            results_ids=[],  # You can populate this if you have specific results
-                        )
-                        quality_record.save()
-                        features_quality_records.append(quality_record)
+        sources = {}
+        if against_results:
+            found = feature_sources(joined, aggregate_scores)
+            sources = {
+                ident: [results[result_id] for result_id in result_ids]
+                for ident, result_ids in found.items()
+            }
+        features_quality_records = save_features_quality(
+            project, features_from_db, aggregate_scores, sources
+        )
 
         return {
             "status": "success",
             "per_row_scores": score_dict,
             "aggregate_scores": aggregate_scores,
+            # How free-text pairs were judged (locally, cached, by the model)
+            "string_comparison": comparisons.as_dict(),
             "features_quality_records": [
                 str(record.id) for record in features_quality_records
             ],
             "project_id": project_id,
+            "results_scored": len(results),
         }
 
     except Exception as exc:
@@ -286,10 +517,17 @@ def score_csv_data(self: Task, file_path: str, project_id: str, user_email: str
             "aggregate_scores": {},
         }
     finally:
-        # Clean up the temporary file
+        # Clean up the temporary file and the staged upload
         if file_path and os.path.exists(file_path):
             try:
                 os.remove(file_path)
                 logger.info("Cleaned up temporary file: %s", file_path)
             except Exception as e:
                 logger.warning("Failed to clean up temporary file %s: %s", file_path, e)
+        if file_service is not None:
+            try:
+                file_service.s3_client.delete_object(
+                    Bucket=file_service.bucket_name, Key=csv_key
+                )
+            except Exception as e:
+                logger.warning("Failed to remove staged CSV %s: %s", csv_key, e)
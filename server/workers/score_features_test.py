@@ -0,0 +1,198 @@
+"""Tests for the column-wise CSV scoring engine.
+
+The per-cell ``compute_*`` functions and scikit-learn's metrics are the
+references the Polars expressions must agree with.
+"""
+
+from types import SimpleNamespace
+
+import polars as pl
+import pytest
+from sklearn.metrics import f1_score, r2_score
+from workers import score_features as S
+
+FEATURES = [
+    {"identifier": "paper.design", "type": "string", "enum": ["rct", "obs"]},
+    {"identifier": "paper.title", "type": "string"},
+    {"identifier": "paper.n", "type": "number"},
+    {"identifier": "paper.flag", "type": "boolean"},
+    {"identifier": "paper.absent", "type": "number"},
+]
+
+DATA = {
+    "paper.design_truth": ["rct", "obs", "rct", "obs", None, "rct"],
+    "paper.design": ["rct", "rct", "rct", "obs", None, "other"],
+    "paper.title_truth": ["A", "b ", "C", None, "x", "y"],
+    "paper.title": [" a", "B", "D", None, "x", "z"],
+    "paper.n_truth": [10, 20, 0, 5, 8, 3],
+    "paper.n": ["12", "20", "1", "n/a", "8", None],
+    "paper.flag_truth": [True, False, True, True, False, True],
+    "paper.flag": [True, True, True, True, False, True],
+    "paper.unrelated": [1, 2, 3, 4, 5, 6],
+}
+
+
+def _verdicts(judge):
+    return lambda pairs: [judge(truth, pred) for truth, pred in pairs]
+
+
+def _score(judge=lambda truth, pred: "Very similar"):
+    return S.score_frame(pl.LazyFrame(DATA), FEATURES, _verdicts(judge))
+
+
+@pytest.mark.unit
+def test_row_scores_match_the_per_cell_functions():
+    per_row, _ = _score()
+
+    reference = {
+        "paper.design": S.compute_categorical_score,
+        "paper.title": S.compute_string_score,
+        "paper.n": S.compute_number_score,
+    }
+    for ident, compute in reference.items():
+        truth, pred = DATA[ident + "_truth"], DATA[ident]
+        assert per_row[ident + "_score"] == pytest.approx(
+            [compute(t, p) for t, p in zip(truth, pred)]
+        )
+    assert per_row["paper.flag_score"] == [None] * 6
+    assert per_row["paper.absent_score"] == [None] * 6
+
+
+@pytest.mark.unit
+def test_features_without_predictions_score_null_in_every_row():
+    data = pl.LazyFrame({"x_truth": [1, 2, 3]})
+    features = [{"identifier": "x", "type": "number"}]
+
+    per_row, aggregates = S.score_frame(data, features, _verdicts(None))
+
+    assert per_row == {"x_score": [None, None, None]}
+    assert aggregates == {}
+
+
+@pytest.mark.unit
+def test_aggregates_match_sklearn():
+    verdicts = {("C", "D"): "Different", ("y", "z"): "Very different"}
+
+    def compare(truth, pred):
+        return verdicts.get((truth, pred), "Very similar")
+
+    _, aggregates = _score(compare)
+
+    labels = [str(v) for v in DATA["paper.design_truth"]]
+    predicted = [str(v) for v in DATA["paper.design"]]
+    assert aggregates["paper.design"] == pytest.approx(
+        f1_score(labels, predicted, average="macro")
+    )
+    pairs = zip(DATA["paper.title_truth"], DATA["paper.title"])
+    y_pred = [compare(t, p) for t, p in pairs]
+    assert aggregates["paper.title"] == pytest.approx(
+        f1_score(["Very similar"] * 6, y_pred, average="macro")
+    )
+    # Rows without a numeric prediction are left out of R².
+    assert aggregates["paper.n"] == pytest.approx(
+        r2_score([10, 20, 0, 8], [12, 20, 1, 8])
+    )
+    assert aggregates["paper.flag"] is None
+    assert "paper.absent" not in aggregates
+
+
+@pytest.mark.unit
+def test_distinct_string_pairs_are_compared_once():
+    calls = []
+    frame = pl.DataFrame({"t_truth": ["a", "a", "b"], "t": ["x", "x", "b"]})
+
+    def judge(truth, pred):
+        calls.append((truth, pred))
+        return "Very similar"
+
+    score = S.string_similarity_f1(frame, "t_truth", "t", _verdicts(judge))
+
+    assert sorted(calls) == [("a", "x"), ("b", "b")]
+    assert score == 1.0
+
+
+def _result(result_id, paper_id, json_response):
+    return SimpleNamespace(
+        id=result_id,
+        paper=SimpleNamespace(ref=SimpleNamespace(id=paper_id)),
+        json_response=json_response,
+    )
+
+
+@pytest.mark.unit
+def test_ground_truth_joins_flattened_results_by_paper_and_row():
+    truth = pl.DataFrame(
+        {
+            "paper_id": ["p1", "p1", "p2", "p3"],
+            "paper.experiments.name": ["S1", "S2", "Only", "None"],
+            "paper.n_truth": [10, 20, 5, 1],
+        }
+    )
+    results = [
+        _result("r1", "p1", {"paper": {"n": 10, "experiments": [{"name": "S1"}]}}),
+        _result("r2", "p2", {"paper": {"n": 4, "experiments": [{"name": "only"}]}}),
+    ]
+
+    joined = S.join_results(truth, results)
+
+    assert joined["paper.experiments.name"].to_list() == ["S1", None, "only", None]
+    assert joined["paper.n"].to_list() == [10, None, 4, None]
+    assert joined["_result_id"].to_list() == ["r1", None, "r2", None]
+    assert S.feature_sources(joined, ["paper.n", "paper.absent"]) == {
+        "paper.n": ["r1", "r2"]
+    }
+
+
+@pytest.mark.unit
+def test_features_quality_is_upserted_in_one_bulk_write(monkeypatch):
+    written = []
+
+    class FakeWriter:
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *exc):
+            written.append("commit")
+
+    class FakeQuality(SimpleNamespace):
+        feature = SimpleNamespace(id="feature.id")
+        project = SimpleNamespace(id="project.id")
+
+        @staticmethod
+        def find(*args):
+            return SimpleNamespace(to_list=lambda: [stored])
+
+        @staticmethod
+        def insert_one(record, bulk_writer):
+            written.append(("insert", record.feature.id))
+
+        def replace(self, bulk_writer):
+            written.append(("replace", self.feature.ref.id))
+
+    stored = FakeQuality(
+        feature=SimpleNamespace(ref=SimpleNamespace(id="f1")),
+        feature_score=0.1,
+        paper_ids=[],
+        results_ids=[],
+    )
+    monkeypatch.setattr(S, "FeaturesQuality", FakeQuality)
+    monkeypatch.setattr(S, "BulkWriter", FakeWriter)
+    monkeypatch.setattr(S, "In", lambda field, values: values)
+    features = [
+        SimpleNamespace(id="f1", feature_identifier="paper.n"),
+        SimpleNamespace(id="f2", feature_identifier="paper.design"),
+        SimpleNamespace(id="f3", feature_identifier="paper.flag"),
+    ]
+    results = [_result("r1", "p1", {}), _result("r2", "p1", {})]
+
+    records = S.save_features_quality(
+        SimpleNamespace(id="project"),
+        features,
+        {"paper.n": 0.9, "paper.design": 0.5, "paper.flag": None},
+        {"paper.n": results},
+    )
+
+    assert written == [("replace", "f1"), ("insert", "f2"), "commit"]
+    assert records[0] is stored and stored.feature_score == 0.9
+    assert stored.results_ids == results
+    assert [p.ref.id for p in stored.paper_ids] == ["p1"]
@@ -0,0 +1,61 @@
+"""
+Shared async provider clients for the running event loop.
+
+Async strategies may have dozens of calls in flight at once. Giving each call
+its own ``AsyncOpenAI`` / ``AsyncAnthropic`` would open a fresh connection pool
+(and TLS handshake) per paper. Instead, clients are cached per event loop and
+per API key, so concurrent extractions for the same key share one pool.
+httpx pools cannot cross event loops, which is why the loop is part of the key.
+
+Whoever owns the loop calls ``close_async_clients`` before it shuts down (see
+``AsyncExtractionExecutor``).
+"""
+
+import asyncio
+import weakref
+from typing import Any, Dict, Optional, Tuple
+
+import anthropic
+from openai import AsyncOpenAI
+
+_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[Tuple[str, str], Any]]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def _get(provider: str, api_key: Optional[str], factory) -> Any:
+    loop = asyncio.get_running_loop()
+    per_loop = _clients.setdefault(loop, {})
+    key = (provider, api_key or "")
+    if key not in per_loop:
+        per_loop[key] = factory()
+    return per_loop[key]
+
+
+def get_async_openai(api_key: Optional[str] = None) -> AsyncOpenAI:
+    """The loop's ``AsyncOpenAI`` client for *api_key* (None: env key)."""
+    return _get(
+        "openai",
+        api_key,
+        lambda: AsyncOpenAI(api_key=api_key) if api_key else AsyncOpenAI(),
+    )
+
+
+def get_async_anthropic(api_key: Optional[str] = None) -> anthropic.AsyncAnthropic:
+    """The loop's ``AsyncAnthropic`` client for *api_key* (None: env key)."""
+    return _get(
+        "anthropic",
+        api_key,
+        lambda: (
+            anthropic.AsyncAnthropic(api_key=api_key)
+            if api_key
+            else anthropic.AsyncAnthropic()
+        ),
+    )
+
+
+async def close_async_clients() -> None:
+    """Close and forget every client created on the running loop."""
+    per_loop = _clients.pop(asyncio.get_running_loop(), {})
+    for client in per_loop.values():
+        await client.close()
@@ -0,0 +1,66 @@
+"""
+Run many extractions concurrently inside one worker process.
+
+Workers run with ``--concurrency=1`` and a synchronous extraction spends nearly
+all its time waiting on a provider response. ``AsyncExtractionExecutor`` runs a
+set of coroutine jobs on one event loop with at most ``max_concurrency`` in
+flight, so a single worker slot can keep dozens of provider calls open without
+the memory cost of extra prefork processes.
+
+Blocking work inside jobs (Mongo, S3, file reads) should go through
+``asyncio.to_thread``; the executor sizes the loop's default thread pool to
+match its concurrency so those calls do not queue behind each other.
+"""
+
+import asyncio
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Iterable, List, Optional
+
+from workers.services.async_clients import close_async_clients
+
+logger = logging.getLogger(__name__)
+
+# Provider calls in flight per worker process.
+EXTRACTION_CONCURRENCY = int(os.getenv("EXTRACTION_CONCURRENCY", "16"))
+
+Job = Callable[[], Awaitable[Any]]
+
+
+class AsyncExtractionExecutor:
+    """Run coroutine jobs with bounded concurrency."""
+
+    def __init__(self, max_concurrency: Optional[int] = None):
+        self.max_concurrency = max(1, max_concurrency or EXTRACTION_CONCURRENCY)
+
+    async def run(self, jobs: Iterable[Job]) -> List[Any]:
+        """Run every job and return their results in order.
+
+        A job that raises does not cancel the others; its exception is
+        returned in its slot instead.
+        """
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def guarded(job: Job) -> Any:
+            async with semaphore:
+                return await job()
+
+        return await asyncio.gather(
+            *(guarded(job) for job in jobs), return_exceptions=True
+        )
+
+    def run_blocking(self, jobs: Iterable[Job]) -> List[Any]:
+        """Run *jobs* to completion on a fresh event loop (for Celery)."""
+
+        async def main() -> List[Any]:
+            loop = asyncio.get_running_loop()
+            loop.set_default_executor(
+                ThreadPoolExecutor(max_workers=self.max_concurrency * 2)
+            )
+            try:
+                return await self.run(jobs)
+            finally:
+                await close_async_clients()
+
+        return asyncio.run(main())
@@ -0,0 +1,38 @@
+"""Tests for the bounded-concurrency extraction executor."""
+
+import asyncio
+
+import pytest
+from workers.services.async_executor import AsyncExtractionExecutor
+
+
+@pytest.mark.unit
+def test_runs_jobs_concurrently_up_to_the_limit():
+    state = {"in_flight": 0, "peak": 0}
+
+    async def job(i):
+        state["in_flight"] += 1
+        state["peak"] = max(state["peak"], state["in_flight"])
+        await asyncio.sleep(0.01)
+        state["in_flight"] -= 1
+        return i
+
+    executor = AsyncExtractionExecutor(max_concurrency=4)
+    results = executor.run_blocking([lambda i=i: job(i) for i in range(20)])
+
+    assert results == list(range(20))
+    assert state["peak"] == 4
+
+
+@pytest.mark.unit
+def test_failures_are_returned_in_place():
+    async def ok():
+        return "ok"
+
+    async def boom():
+        raise RuntimeError("provider down")
+
+    results = AsyncExtractionExecutor(max_concurrency=2).run_blocking([ok, boom, ok])
+
+    assert results[0] == results[2] == "ok"
+    assert isinstance(results[1], RuntimeError)
@@ -0,0 +1,248 @@
+"""
+Provider batch APIs behind one small interface.
+
+Batch extraction (see ``workers/extraction_batch_task.py``) submits many
+requests at once, lets the provider work through them within its completion
+window, and ingests the answers later. The two providers expose this very
+differently — OpenAI takes a JSONL file upload and returns an output file,
+Anthropic takes the request list inline and streams results back — so each is
+wrapped in a ``BatchProvider`` that speaks plain request/response dicts.
+
+``LocalBatchProvider`` completes batches in-process without any network call.
+It is selected with ``EXTRACTION_BATCH_PROVIDER=local`` and is what the tests
+use.
+"""
+
+import json
+import logging
+import os
+import tempfile
+import uuid
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterator, List, Optional
+
+import anthropic
+from openai import OpenAI
+
+logger = logging.getLogger(__name__)
+
+# Normalized batch states.
+BATCH_PENDING = "pending"
+BATCH_ENDED = "ended"
+BATCH_FAILED = "failed"
+
+
+@dataclass(frozen=True)
+class BatchRequest:
+    """One request in a batch; ``body`` is the provider's request payload."""
+
+    custom_id: str
+    body: dict
+
+
+@dataclass(frozen=True)
+class BatchItemResult:
+    """The outcome of one request: a raw response ``body`` or an ``error``."""
+
+    custom_id: str
+    body: Optional[dict] = None
+    error: Optional[str] = None
+
+
+class BatchProvider(ABC):
+    """Submit, poll and read back a provider batch job."""
+
+    @abstractmethod
+    def submit(self, requests: List[BatchRequest], metadata: Dict[str, str]) -> str:
+        """Submit *requests* and return the provider's batch id."""
+
+    @abstractmethod
+    def status(self, batch_id: str) -> str:
+        """Return ``BATCH_PENDING``, ``BATCH_ENDED`` or ``BATCH_FAILED``."""
+
+    @abstractmethod
+    def results(self, batch_id: str) -> Iterator[BatchItemResult]:
+        """Yield one result per request of an ended batch."""
+
+
+class OpenAIBatchProvider(BatchProvider):
+    """OpenAI Batch API against the ``/v1/responses`` endpoint."""
+
+    ENDPOINT = "/v1/responses"
+    PENDING_STATES = {"validating", "in_progress", "finalizing", "cancelling"}
+    # Expired and cancelled batches still carry the requests that finished.
+    ENDED_STATES = {"completed", "expired", "cancelled"}
+
+    def __init__(self, api_key: Optional[str] = None):
+        self.client = OpenAI(api_key=api_key) if api_key else OpenAI()
+
+    def submit(self, requests: List[BatchRequest], metadata: Dict[str, str]) -> str:
+        # Requests carry base64 PDFs; spool the JSONL to disk, not memory.
+        with tempfile.NamedTemporaryFile(
+            "w", suffix=".jsonl", delete=False, encoding="utf-8"
+        ) as handle:
+            for request in requests:
+                handle.write(
+                    json.dumps(
+                        {
+                            "custom_id": request.custom_id,
+                            "method": "POST",
+                            "url": self.ENDPOINT,
+                            "body": request.body,
+                        }
+                    )
+                )
+                handle.write("\n")
+            path = handle.name
+
+        try:
+            with open(path, "rb") as file:
+                input_file = self.client.files.create(file=file, purpose="batch")
+        finally:
+            os.remove(path)
+
+        batch = self.client.batches.create(
+            input_file_id=input_file.id,
+            endpoint=self.ENDPOINT,
+            completion_window="24h",
+            metadata=metadata,
+        )
+        return batch.id
+
+    def status(self, batch_id: str) -> str:
+        state = self.client.batches.retrieve(batch_id).status
+        if state in self.PENDING_STATES:
+            return BATCH_PENDING
+        if state in self.ENDED_STATES:
+            return BATCH_ENDED
+        return BATCH_FAILED
+
+    def results(self, batch_id: str) -> Iterator[BatchItemResult]:
+        batch = self.client.batches.retrieve(batch_id)
+        for file_id in (batch.output_file_id, batch.error_file_id):
+            if not file_id:
+                continue
+            for line in self.client.files.content(file_id).text.splitlines():
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                response = entry.get("response") or {}
+                if entry.get("error") or response.get("status_code") != 200:
+                    yield BatchItemResult(
+                        custom_id=entry["custom_id"],
+                        error=json.dumps(entry.get("error") or response.get("body")),
+                    )
+                else:
+                    yield BatchItemResult(
+                        custom_id=entry["custom_id"], body=response["body"]
+                    )
+
+
+class AnthropicBatchProvider(BatchProvider):
+    """Anthropic Message Batches API."""
+
+    def __init__(self, api_key: Optional[str] = None):
+        self.client = (
+            anthropic.Anthropic(api_key=api_key) if api_key else anthropic.Anthropic()
+        )
+
+    def submit(self, requests: List[BatchRequest], metadata: Dict[str, str]) -> str:
+        batch = self.client.messages.batches.create(
+            requests=[
+                {"custom_id": request.custom_id, "params": request.body}
+                for request in requests
+            ]
+        )
+        return batch.id
+
+    def status(self, batch_id: str) -> str:
+        state = self.client.messages.batches.retrieve(batch_id).processing_status
+        return BATCH_ENDED if state == "ended" else BATCH_PENDING
+
+    def results(self, batch_id: str) -> Iterator[BatchItemResult]:
+        for entry in self.client.messages.batches.results(batch_id):
+            if entry.result.type == "succeeded":
+                yield BatchItemResult(
+                    custom_id=entry.custom_id,
+                    body=entry.result.message.model_dump(mode="json"),
+                )
+            else:
+                error = getattr(entry.result, "error", None)
+                yield BatchItemResult(
+                    custom_id=entry.custom_id,
+                    error=f"{entry.result.type}: {error}" if error else entry.result.type,
+                )
+
+
+def _default_local_body(flavor: str, request: BatchRequest) -> dict:
+    """An empty but valid extraction in the provider's response format."""
+    text = json.dumps({"paper": {}})
+    usage = {"input_tokens": 0, "output_tokens": 0}
+    if flavor == "anthropic":
+        return {"content": [{"type": "text", "text": text}], "usage": usage}
+    return {
+        "output": [
+            {"type": "message", "content": [{"type": "output_text", "text": text}]}
+        ],
+        "usage": usage,
+    }
+
+
+class LocalBatchProvider(BatchProvider):
+    """In-process stand-in for a provider batch API.
+
+    Batches end as soon as they are submitted. ``responder`` maps each request
+    to a raw response body (or raises to produce a per-item error); by default
+    every request gets an empty extraction in the *flavor* provider's format.
+    State is kept in memory, so submit and poll must run in the same process.
+    """
+
+    _batches: Dict[str, List[BatchRequest]] = {}
+
+    def __init__(
+        self,
+        flavor: str = "openai",
+        responder: Optional[Callable[[BatchRequest], dict]] = None,
+    ):
+        self.flavor = flavor
+        self.responder = responder or (
+            lambda request: _default_local_body(flavor, request)
+        )
+
+    def submit(self, requests: List[BatchRequest], metadata: Dict[str, str]) -> str:
+        batch_id = f"local-{uuid.uuid4().hex}"
+        self._batches[batch_id] = list(requests)
+        return batch_id
+
+    def status(self, batch_id: str) -> str:
+        return BATCH_ENDED if batch_id in self._batches else BATCH_FAILED
+
+    def results(self, batch_id: str) -> Iterator[BatchItemResult]:
+        for request in self._batches.pop(batch_id, []):
+            try:
+                yield BatchItemResult(
+                    custom_id=request.custom_id, body=self.responder(request)
+                )
+            except Exception as e:
+                yield BatchItemResult(custom_id=request.custom_id, error=str(e))
+
+
+_PROVIDERS = {
+    "openai": OpenAIBatchProvider,
+    "anthropic": AnthropicBatchProvider,
+}
+
+
+def get_batch_provider(provider: str, api_key: Optional[str] = None) -> BatchProvider:
+    """Return the batch provider for *provider* ("openai" / "anthropic").
+
+    ``EXTRACTION_BATCH_PROVIDER=local`` swaps in ``LocalBatchProvider`` so the
+    batch pipeline can run without provider access.
+    """
+    if os.getenv("EXTRACTION_BATCH_PROVIDER", "").lower() == "local":
+        return LocalBatchProvider(flavor=provider)
+    provider_class = _PROVIDERS.get(provider)
+    if not provider_class:
+        raise ValueError(f"No batch API for provider: {provider}")
+    return provider_class(api_key=api_key)
@@ -2,21 +2,35 @@
 File service for handling file operations with S3.
 """
 
-import hashlib
 import logging
 import os
 import tempfile
 import time
+import uuid
 from datetime import datetime
-from typing import Optional, Tuple
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
 
 import boto3
 import redis
 from botocore.exceptions import ClientError
+from bunnet.operators import In
 from database.models.papers import Paper
+from database.models.projects import Project
 from database.models.users import User
-from pymongo.errors import DuplicateKeyError
-from workers.celery_config import AWS_REGION, AWS_S3_BUCKET, AWS_S3_KEY, AWS_S3_SECRET
+from workers.celery_config import (
+    AWS_REGION,
+    AWS_S3_BUCKET,
+    AWS_S3_ENDPOINT_URL,
+    AWS_S3_KEY,
+    AWS_S3_SECRET,
+)
+from workers.services.paper_ingest import (
+    PDF_MAGIC,
+    READ_CHUNK_BYTES,
+    ingest_paper,
+    iter_file,
+)
+from workers.services.pdf_cache import pdf_cache
 
 logger = logging.getLogger(__name__)
 
@@ -26,8 +40,13 @@ logger = logging.getLogger(__name__)
 # MAX_UPLOAD_BYTES env var if needed.
 MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(50 * 1024 * 1024)))
 
-# PDF magic number: every valid PDF begins with these bytes ("%PDF-").
-_PDF_MAGIC = b"%PDF-"
+# Uploads wait under these prefixes until their task picks them up; the tasks
+# delete them when done and a bucket lifecycle rule (see
+# ``ensure_staging_lifecycle``) expires whatever a failed task leaves behind.
+PAPER_STAGING_PREFIX = "papers/uploads/"
+CSV_STAGING_PREFIX = "uploads/csv/"
+STAGING_TTL_DAYS = int(os.getenv("STAGING_TTL_DAYS", "1"))
+_LIFECYCLE_RULE_PREFIX = "atlas-staging-"
 
 
 class FileService:
@@ -39,6 +58,7 @@ class FileService:
             aws_access_key_id=AWS_S3_KEY,
             aws_secret_access_key=AWS_S3_SECRET,
             region_name=AWS_REGION,
+            endpoint_url=AWS_S3_ENDPOINT_URL,
         )
         self.bucket_name = AWS_S3_BUCKET
         # Initialize Redis client for distributed locks
@@ -46,17 +66,8 @@ class FileService:
             os.getenv("CELERY_BROKER_URL", "redis://localhost:6379")
         )
 
-    @staticmethod
-    def calculate_file_hash(file_path: str) -> str:
-        """Calculate SHA-256 hash of a file for better uniqueness."""
-        hash_sha256 = hashlib.sha256()
-        with open(file_path, "rb") as f:
-            for chunk in iter(lambda: f.read(4096), b""):
-                hash_sha256.update(chunk)
-        return hash_sha256.hexdigest()
-
     def generate_s3_key(self, filename: str, user_id: str, file_hash: str) -> str:
-        """Generate a unique S3 key for the file using hash."""
+        """Generate a unique S3 key for the file from its hash or a token."""
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         safe_filename = filename.replace(" ", "_").replace("/", "_")
         # Include hash in the path to ensure uniqueness
@@ -88,103 +99,110 @@ class FileService:
         lock_key = f"paper_upload_lock:{file_hash}"
         self.redis_client.delete(lock_key)
 
-    def get_or_create_paper(
-        self, file_path: str, user: User, original_filename: str
+    def s3_url(self, s3_key: str) -> str:
+        """The public URL of an object in the papers bucket."""
+        if AWS_S3_ENDPOINT_URL:
+            endpoint = AWS_S3_ENDPOINT_URL.rstrip("/")
+            return f"{endpoint}/{self.bucket_name}/{s3_key}"
+        return f"https://{self.bucket_name}.s3.{AWS_REGION}.amazonaws.com/{s3_key}"
+
+    @staticmethod
+    def staging_key(prefix: str, user_id: str, filename: str) -> str:
+        """A fresh key under *prefix* for an upload waiting on its task."""
+        safe_name = os.path.basename(filename).replace(" ", "_")
+        return f"{prefix}{user_id}/{uuid.uuid4().hex}/{safe_name}"
+
+    def ensure_staging_lifecycle(self, days: int = STAGING_TTL_DAYS) -> List[dict]:
+        """
+        Expire staged uploads (and abandoned multipart uploads) after *days*.
+
+        The bucket's other lifecycle rules are kept; ours are replaced. Returns
+        the rules now in force.
+        """
+        try:
+            current = self.s3_client.get_bucket_lifecycle_configuration(
+                Bucket=self.bucket_name
+            )["Rules"]
+        except ClientError as e:
+            if e.response["Error"]["Code"] != "NoSuchLifecycleConfiguration":
+                raise
+            current = []
+        rules = [
+            rule
+            for rule in current
+            if not rule.get("ID", "").startswith(_LIFECYCLE_RULE_PREFIX)
+        ]
+        staging = {"papers": PAPER_STAGING_PREFIX, "csv": CSV_STAGING_PREFIX}
+        for name, prefix in staging.items():
+            rules.append(
+                {
+                    "ID": f"{_LIFECYCLE_RULE_PREFIX}{name}",
+                    "Filter": {"Prefix": prefix},
+                    "Status": "Enabled",
+                    "Expiration": {"Days": days},
+                    "AbortIncompleteMultipartUpload": {"DaysAfterInitiation": days},
+                }
+            )
+        self.s3_client.put_bucket_lifecycle_configuration(
+            Bucket=self.bucket_name, LifecycleConfiguration={"Rules": rules}
+        )
+        return rules
+
+    def ingest_paper(
+        self,
+        chunks: Iterable[bytes],
+        user: User,
+        original_filename: str,
+        local_path: Optional[str] = None,
     ) -> Tuple[Paper, bool]:
         """
-        Get existing paper by hash or create new one with S3 upload.
-        Handles concurrent uploads gracefully.
+        Get existing paper by hash or create new one, reading *chunks* once.
+
+        The bytes are hashed, validated and uploaded in a single pass (see
+        ``workers.services.paper_ingest``); with *local_path* they are also
+        written there. Handles concurrent uploads gracefully.
 
         Returns:
             Tuple of (Paper, is_new) where is_new indicates if paper was newly created
         """
-        # Calculate file hash
-        file_hash = self.calculate_file_hash(file_path)
-        file_size = os.path.getsize(file_path)
-
-        # First check without lock
-        existing_paper = Paper.find_one(Paper.file_hash == file_hash).run()
-        if existing_paper:
-            logger.info("Paper already exists with hash %s", file_hash)
-            return existing_paper, False
-
-        # Try to acquire lock for this file
-        lock_acquired = self.acquire_upload_lock(file_hash)
+        return ingest_paper(
+            self, chunks, user, original_filename, MAX_UPLOAD_BYTES, local_path
+        )
 
-        try:
-            # Double-check after acquiring lock (or timeout)
-            existing_paper = Paper.find_one(Paper.file_hash == file_hash).run()
-            if existing_paper:
-                logger.info(
-                    "Paper was created by another process with hash %s", file_hash
-                )
-                return existing_paper, False
-
-            if not lock_acquired:
-                # Lock timeout - check one more time
-                existing_paper = Paper.find_one(Paper.file_hash == file_hash).run()
-                if existing_paper:
-                    return existing_paper, False
-
-                logger.warning(
-                    "Could not acquire lock for file %s, proceeding anyway", file_hash
-                )
-
-            # Upload to S3
-            s3_key = self.generate_s3_key(original_filename, str(user.id), file_hash)
-
-            # Check if file already exists in S3 (another safety check)
-            if self.check_s3_exists(s3_key):
-                logger.info("File already exists in S3 with key %s", s3_key)
-                # Try to find the paper again
-                existing_paper = Paper.find_one(Paper.file_hash == file_hash).run()
-                if existing_paper:
-                    return existing_paper, False
-
-            s3_url = self.upload_to_s3(file_path, s3_key)
-
-            # Create new paper record
-            new_paper = Paper(
-                user=user,
-                title=original_filename,
-                s3_url=s3_url,
-                s3_key=s3_key,
-                file_hash=file_hash,
-                file_size=file_size,
-                original_filename=original_filename,
-                metadata={
-                    "uploaded_by": str(user.id),
-                    "upload_timestamp": datetime.now().isoformat(),
-                },
-            )
+    @staticmethod
+    def find_papers_by_hash(file_hashes: List[str]) -> Dict[str, Paper]:
+        """Stored papers among *file_hashes*, in one indexed ``$in`` lookup."""
+        if not file_hashes:
+            return {}
+        papers = Paper.find(In(Paper.file_hash, list(set(file_hashes)))).run()
+        return {paper.file_hash: paper for paper in papers}
 
-            try:
-                new_paper.save()
-                logger.info("Created new paper with ID %s", new_paper.id)
-                return new_paper, True
-
-            except DuplicateKeyError:
-                # Another process created the paper while we were uploading
-                logger.info("Paper was created by another process during save")
-                existing_paper = Paper.find_one(Paper.file_hash == file_hash).run()
-                if existing_paper:
-                    # Clean up our S3 upload since we won't use it
-                    try:
-                        self.s3_client.delete_object(
-                            Bucket=self.bucket_name, Key=s3_key
-                        )
-                    except Exception as e:
-                        logger.warning("Failed to clean up duplicate S3 upload: %s", e)
-
-                    return existing_paper, False
-                else:
-                    # This shouldn't happen, but re-raise if it does
-                    raise
+    @staticmethod
+    def accessible_papers_by_hash(
+        file_hashes: List[str], user: User
+    ) -> Dict[str, Paper]:
+        """Stored papers among *file_hashes* that *user* can already access.
+
+        Those are the papers they uploaded and the papers in their projects.
+        A digest alone must not reveal, or grant use of, anyone else's paper;
+        for those the bytes have to be uploaded.
+        """
+        if not file_hashes:
+            return {}
+        projects = Project.find({"user.$id": user.id}).run()
+        shared = list({link.ref.id for project in projects for link in project.papers})
+        papers = Paper.find(
+            In(Paper.file_hash, list(set(file_hashes))),
+            {"$or": [{"user.$id": user.id}, {"_id": {"$in": shared}}]},
+        ).run()
+        return {paper.file_hash: paper for paper in papers}
 
-        finally:
-            # Always release the lock if we acquired it
-            if lock_acquired:
-                self.release_upload_lock(file_hash)
+    def get_or_create_paper(
+        self, file_path: str, user: User, original_filename: str
+    ) -> Tuple[Paper, bool]:
+        """Ingest the paper at *file_path* (see ``ingest_paper``)."""
+        with open(file_path, "rb") as f:
+            return self.ingest_paper(iter_file(f), user, original_filename)
 
     def generate_presigned_put(self, s3_key: str, expires_in: int = 3600) -> str:
         """Return a presigned URL the client can PUT a file to directly.
@@ -259,10 +277,10 @@ class FileService:
             resp = self.s3_client.get_object(
                 Bucket=self.bucket_name,
                 Key=s3_key,
-                Range=f"bytes=0-{len(_PDF_MAGIC) - 1}",
+                Range=f"bytes=0-{len(PDF_MAGIC) - 1}",
             )
-            head = resp["Body"].read(len(_PDF_MAGIC))
-            return head.startswith(_PDF_MAGIC)
+            head = resp["Body"].read(len(PDF_MAGIC))
+            return head.startswith(PDF_MAGIC)
         except ClientError as e:
             logger.error("Failed to read object header for %s: %s", s3_key, e)
             return False
@@ -277,31 +295,13 @@ class FileService:
                 return False
             raise
 
-    def upload_to_s3(self, file_path: str, s3_key: str) -> str:
-        """Upload file to S3 and return the URL."""
+    def stream_from_s3(self, s3_key: str) -> Iterator[bytes]:
+        """The bytes of an object, in chunks, without touching local disk."""
+        body = self.s3_client.get_object(Bucket=self.bucket_name, Key=s3_key)["Body"]
         try:
-            extra_args = {
-                "ContentType": "application/pdf",
-                "ServerSideEncryption": "AES256",
-                "Metadata": {
-                    "upload_timestamp": datetime.now().isoformat(),
-                },
-            }
-
-            self.s3_client.upload_file(
-                file_path, self.bucket_name, s3_key, ExtraArgs=extra_args
-            )
-
-            # Generate URL
-            s3_url = (
-                f"https://{self.bucket_name}.s3.{AWS_REGION}.amazonaws.com/{s3_key}"
-            )
-            logger.info("Successfully uploaded file to S3: %s", s3_url)
-            return s3_url
-
-        except ClientError as e:
-            logger.error("Failed to upload file to S3: %s", e)
-            raise
+            yield from body.iter_chunks(READ_CHUNK_BYTES)
+        finally:
+            body.close()
 
     def download_from_s3(self, s3_key: str, target_path: Optional[str] = None) -> str:
         """
@@ -324,3 +324,15 @@ class FileService:
         except ClientError as e:
             logger.error("Failed to download file from S3: %s", e)
             raise
+
+    def download_paper(self, paper: Paper) -> str:
+        """
+        Download *paper*'s PDF to a local path the caller deletes when done.
+
+        Served from the worker's PDF cache when it holds the paper's hash (see
+        ``workers.services.pdf_cache``); only a miss downloads from S3.
+        """
+        return pdf_cache.fetch(
+            paper.file_hash,
+            lambda target: self.download_from_s3(paper.s3_key, target),
+        )
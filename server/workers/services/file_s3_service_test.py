@@ -0,0 +1,64 @@
+"""Tests for the staging lifecycle rules FileService installs on the bucket."""
+
+import pytest
+from botocore.exceptions import ClientError
+from workers import celery_config  # noqa: F401  (loads file_s3_service first)
+from workers.services import file_s3_service as F
+
+
+class FakeS3:
+    def __init__(self, rules=None):
+        self.rules = rules
+
+    def get_bucket_lifecycle_configuration(self, Bucket):
+        if self.rules is None:
+            error = {"Error": {"Code": "NoSuchLifecycleConfiguration"}}
+            raise ClientError(error, "GetBucketLifecycleConfiguration")
+        return {"Rules": self.rules}
+
+    def put_bucket_lifecycle_configuration(self, Bucket, LifecycleConfiguration):
+        self.rules = LifecycleConfiguration["Rules"]
+
+
+def _service(s3):
+    service = F.FileService.__new__(F.FileService)
+    service.s3_client, service.bucket_name = s3, "bucket"
+    return service
+
+
+@pytest.mark.unit
+def test_staging_rules_expire_both_prefixes():
+    s3 = FakeS3()
+
+    _service(s3).ensure_staging_lifecycle(days=2)
+
+    assert {rule["Filter"]["Prefix"] for rule in s3.rules} == {
+        F.PAPER_STAGING_PREFIX,
+        F.CSV_STAGING_PREFIX,
+    }
+    for rule in s3.rules:
+        assert rule["Expiration"] == {"Days": 2}
+        assert rule["AbortIncompleteMultipartUpload"] == {"DaysAfterInitiation": 2}
+
+
+@pytest.mark.unit
+def test_staging_rules_keep_other_rules_and_replace_their_own():
+    other = {"ID": "archive", "Filter": {"Prefix": "old/"}, "Status": "Enabled"}
+    s3 = FakeS3([other])
+
+    _service(s3).ensure_staging_lifecycle(days=1)
+    _service(s3).ensure_staging_lifecycle(days=3)
+
+    assert s3.rules[0] == other
+    assert len(s3.rules) == 3
+    assert all(rule["Expiration"] == {"Days": 3} for rule in s3.rules[1:])
+
+
+@pytest.mark.unit
+def test_staging_keys_are_unique_and_scoped_to_the_user():
+    first = F.FileService.staging_key(F.CSV_STAGING_PREFIX, "user-1", "my data.csv")
+    second = F.FileService.staging_key(F.CSV_STAGING_PREFIX, "user-1", "my data.csv")
+
+    assert first != second
+    assert first.startswith("uploads/csv/user-1/")
+    assert first.endswith("/my_data.csv")
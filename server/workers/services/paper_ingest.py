@@ -0,0 +1,283 @@
+"""
+Single-pass ingest of an uploaded paper into S3.
+
+Ingesting a paper used to read its bytes once per concern: to hash them, to
+stat their size, and again to upload them (after a full download, for papers
+staged in S3 by a presigned upload). ``ingest_paper`` streams the bytes once;
+every chunk is
+
+- fed to SHA-256,
+- checked: the stream must open with the PDF magic bytes and stay within the
+  upload size limit,
+- uploaded: parts of ``INGEST_PART_BYTES`` go to an S3 multipart upload, at
+  most ``INGEST_CONCURRENCY`` in flight (a paper that fits in one part is sent
+  with a single ``put_object`` at the end instead),
+- and optionally written to a local file the caller extracts from.
+
+Nothing is committed until the stream ends: the paper's hash is then checked
+against the stored papers, and a duplicate aborts the multipart upload so no
+second copy is ever stored. The object key is chosen before the hash is known,
+so its first segment is a random token rather than the hash prefix
+``generate_s3_key`` normally uses.
+"""
+
+import hashlib
+import logging
+import os
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime
+from typing import BinaryIO, Iterable, Iterator, List, Optional, Tuple
+
+from database.models.papers import Paper
+from database.models.users import User
+from pymongo.errors import DuplicateKeyError
+
+logger = logging.getLogger(__name__)
+
+# S3 parts must be at least 5 MiB (all but the last).
+_MIN_PART_BYTES = 5 * 1024 * 1024
+INGEST_PART_BYTES = max(
+    _MIN_PART_BYTES, int(os.getenv("INGEST_PART_BYTES", str(8 * 1024 * 1024)))
+)
+# Parts uploaded at once; memory use is bounded by part size x concurrency.
+INGEST_CONCURRENCY = max(1, int(os.getenv("INGEST_CONCURRENCY", "4")))
+READ_CHUNK_BYTES = 1024 * 1024
+
+# Every valid PDF begins with these bytes.
+PDF_MAGIC = b"%PDF-"
+
+
+class IngestError(ValueError):
+    """Raised when the uploaded bytes are not an acceptable paper."""
+
+
+def iter_file(handle: BinaryIO, chunk_size: int = READ_CHUNK_BYTES) -> Iterator[bytes]:
+    """The contents of an open binary file, in chunks."""
+    return iter(lambda: handle.read(chunk_size), b"")
+
+
+class MultipartWriter:
+    """Upload a byte stream to one S3 key in parts; commit or abort at the end.
+
+    The multipart upload is only started once a full part is buffered, so a
+    stream that fits in a single part costs one ``put_object`` on commit (and
+    nothing on abort).
+    """
+
+    def __init__(
+        self,
+        s3_client,
+        bucket: str,
+        key: str,
+        extra_args: dict,
+        part_bytes: int = INGEST_PART_BYTES,
+        concurrency: int = INGEST_CONCURRENCY,
+    ):
+        self.s3_client = s3_client
+        self.bucket = bucket
+        self.key = key
+        self.extra_args = extra_args
+        self.part_bytes = part_bytes
+        self.concurrency = concurrency
+        self.upload_id: Optional[str] = None
+        self._buffer = bytearray()
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._pending: List[Future] = []
+        self._parts: List[dict] = []
+
+    def write(self, data: bytes) -> None:
+        self._buffer += data
+        while len(self._buffer) >= self.part_bytes:
+            part = bytes(self._buffer[: self.part_bytes])
+            del self._buffer[: self.part_bytes]
+            self._submit(part)
+
+    def _submit(self, part: bytes) -> None:
+        if self.upload_id is None:
+            response = self.s3_client.create_multipart_upload(
+                Bucket=self.bucket, Key=self.key, **self.extra_args
+            )
+            self.upload_id = response["UploadId"]
+            self._pool = ThreadPoolExecutor(max_workers=self.concurrency)
+        if len(self._pending) >= self.concurrency:
+            self._parts.append(self._pending.pop(0).result())
+        number = len(self._parts) + len(self._pending) + 1
+        self._pending.append(self._pool.submit(self._upload_part, number, part))
+
+    def _upload_part(self, number: int, part: bytes) -> dict:
+        response = self.s3_client.upload_part(
+            Bucket=self.bucket,
+            Key=self.key,
+            UploadId=self.upload_id,
+            PartNumber=number,
+            Body=part,
+        )
+        return {"PartNumber": number, "ETag": response["ETag"]}
+
+    def _drain(self) -> None:
+        try:
+            for future in self._pending:
+                self._parts.append(future.result())
+        finally:
+            self._pending = []
+            if self._pool is not None:
+                self._pool.shutdown(wait=True)
+
+    def commit(self) -> None:
+        """Store the object under its key.
+
+        A failed part or completion aborts the multipart upload, so no
+        incomplete upload is left behind (and billed) under the key.
+        """
+        if self.upload_id is None:
+            self.s3_client.put_object(
+                Bucket=self.bucket,
+                Key=self.key,
+                Body=bytes(self._buffer),
+                **self.extra_args,
+            )
+            return
+        try:
+            if self._buffer:
+                self._submit(bytes(self._buffer))
+                self._buffer.clear()
+            self._drain()
+            self.s3_client.complete_multipart_upload(
+                Bucket=self.bucket,
+                Key=self.key,
+                UploadId=self.upload_id,
+                MultipartUpload={"Parts": self._parts},
+            )
+        except BaseException:
+            self.abort()
+            raise
+
+    def abort(self) -> None:
+        """Discard the upload; nothing is stored."""
+        self._buffer.clear()
+        if self.upload_id is None:
+            return
+        for future in self._pending:
+            future.cancel()
+        try:
+            self._drain()
+        except Exception:
+            pass  # the parts are discarded anyway
+        try:
+            self.s3_client.abort_multipart_upload(
+                Bucket=self.bucket, Key=self.key, UploadId=self.upload_id
+            )
+        except Exception as e:
+            logger.warning("Failed to abort multipart upload of %s: %s", self.key, e)
+        # Aborting again (a sink aborted after a failed commit) is a no-op.
+        self.upload_id = None
+
+
+def ingest_paper(
+    file_service,
+    chunks: Iterable[bytes],
+    user: User,
+    original_filename: str,
+    max_bytes: int,
+    local_path: Optional[str] = None,
+) -> Tuple[Paper, bool]:
+    """
+    Hash, validate and upload a paper in one pass over *chunks*.
+
+    Returns ``(paper, is_new)``: the existing paper when one with the same
+    hash is stored, else a new one. With *local_path*, the bytes are also
+    written there for processing. Raises :class:`IngestError` for bytes that
+    are not a PDF or exceed *max_bytes*.
+    """
+    token = uuid.uuid4().hex
+    s3_key = file_service.generate_s3_key(original_filename, str(user.id), token)
+    writer = MultipartWriter(
+        file_service.s3_client,
+        file_service.bucket_name,
+        s3_key,
+        {
+            "ContentType": "application/pdf",
+            "ServerSideEncryption": "AES256",
+            "Metadata": {"upload_timestamp": datetime.now().isoformat()},
+        },
+    )
+    digest = hashlib.sha256()
+    size = 0
+    head = b""
+    local = open(local_path, "wb") if local_path else None
+    try:
+        for chunk in chunks:
+            if len(head) < len(PDF_MAGIC):
+                head += chunk[: len(PDF_MAGIC) - len(head)]
+                if not PDF_MAGIC.startswith(head[: len(PDF_MAGIC)]):
+                    raise IngestError("Uploaded file is not a valid PDF.")
+            size += len(chunk)
+            if size > max_bytes:
+                limit_mb = max_bytes // (1024 * 1024)
+                raise IngestError(f"Uploaded file exceeds the {limit_mb}MB limit.")
+            digest.update(chunk)
+            writer.write(chunk)
+            if local is not None:
+                local.write(chunk)
+        if head != PDF_MAGIC:
+            raise IngestError("Uploaded file is not a valid PDF.")
+    except BaseException:
+        writer.abort()
+        raise
+    finally:
+        if local is not None:
+            local.close()
+
+    file_hash = digest.hexdigest()
+    existing = Paper.find_one(Paper.file_hash == file_hash).run()
+    if existing:
+        logger.info("Paper already exists with hash %s", file_hash)
+        writer.abort()
+        return existing, False
+
+    lock_acquired = file_service.acquire_upload_lock(file_hash)
+    try:
+        # Double-check now that concurrent ingests of the same bytes are held.
+        existing = Paper.find_one(Paper.file_hash == file_hash).run()
+        if existing:
+            logger.info("Paper was created by another process with hash %s", file_hash)
+            writer.abort()
+            return existing, False
+        if not lock_acquired:
+            logger.warning(
+                "Could not acquire lock for file %s, proceeding anyway", file_hash
+            )
+
+        writer.commit()
+        bucket = file_service.bucket_name
+        paper = Paper(
+            user=user,
+            title=original_filename,
+            s3_url=file_service.s3_url(s3_key),
+            s3_key=s3_key,
+            file_hash=file_hash,
+            file_size=size,
+            original_filename=original_filename,
+            metadata={
+                "uploaded_by": str(user.id),
+                "upload_timestamp": datetime.now().isoformat(),
+            },
+        )
+        try:
+            paper.save()
+        except DuplicateKeyError:
+            logger.info("Paper was created by another process during save")
+            existing = Paper.find_one(Paper.file_hash == file_hash).run()
+            if not existing:
+                raise
+            try:
+                file_service.s3_client.delete_object(Bucket=bucket, Key=s3_key)
+            except Exception as e:
+                logger.warning("Failed to clean up duplicate S3 upload: %s", e)
+            return existing, False
+        logger.info("Created new paper with ID %s (%d bytes)", paper.id, size)
+        return paper, True
+    finally:
+        if lock_acquired:
+            file_service.release_upload_lock(file_hash)
@@ -0,0 +1,235 @@
+"""Tests for the single-pass paper ingest.
+
+S3 is an in-memory fake that records every call, and ``Paper`` is replaced by
+a fake whose ``find_one`` looks up a dict of stored papers by hash.
+"""
+
+import hashlib
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+from workers.services import paper_ingest as I
+
+MiB = 1024 * 1024
+
+
+class FakeS3:
+    """Store objects and multipart uploads in memory, recording calls."""
+
+    def __init__(self, delay: float = 0, fail_part: int = 0):
+        self.objects = {}
+        self.uploads = {}
+        self.calls = []
+        self.delay = delay
+        self.fail_part = fail_part
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+
+    def put_object(self, Bucket, Key, Body, **extra):
+        self.calls.append("put_object")
+        self.objects[Key] = Body
+
+    def create_multipart_upload(self, Bucket, Key, **extra):
+        self.calls.append("create_multipart_upload")
+        upload_id = f"upload-{len(self.uploads)}"
+        self.uploads[upload_id] = {}
+        return {"UploadId": upload_id}
+
+    def upload_part(self, Bucket, Key, UploadId, PartNumber, Body):
+        with self._lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        time.sleep(self.delay)
+        if PartNumber == self.fail_part:
+            with self._lock:
+                self.in_flight -= 1
+            raise ConnectionError(f"part {PartNumber} failed")
+        self.uploads[UploadId][PartNumber] = Body
+        with self._lock:
+            self.in_flight -= 1
+        return {"ETag": f"etag-{PartNumber}"}
+
+    def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload):
+        self.calls.append("complete_multipart_upload")
+        parts = self.uploads.pop(UploadId)
+        numbers = [p["PartNumber"] for p in MultipartUpload["Parts"]]
+        assert numbers == sorted(parts)
+        self.objects[Key] = b"".join(parts[n] for n in numbers)
+
+    def abort_multipart_upload(self, Bucket, Key, UploadId):
+        self.calls.append("abort_multipart_upload")
+        self.uploads.pop(UploadId)
+
+    def delete_object(self, Bucket, Key):
+        self.calls.append("delete_object")
+        self.objects.pop(Key, None)
+
+
+@pytest.fixture
+def papers(monkeypatch):
+    stored = {}
+
+    class Field:
+        def __eq__(self, value):
+            return value
+
+    class FakePaper(SimpleNamespace):
+        file_hash = Field()
+
+        @classmethod
+        def find_one(cls, file_hash):
+            return SimpleNamespace(run=lambda: stored.get(file_hash))
+
+        def save(self):
+            self.id = f"paper-{len(stored)}"
+            stored[self.file_hash] = self
+
+    # ``Paper.file_hash == h`` evaluates to ``h`` on the fake.
+    monkeypatch.setattr(I, "Paper", FakePaper)
+    return stored
+
+
+def _service(s3):
+    return SimpleNamespace(
+        s3_client=s3,
+        bucket_name="bucket",
+        generate_s3_key=lambda name, user_id, token: f"papers/{token}/{name}",
+        s3_url=lambda key: f"https://bucket/{key}",
+        acquire_upload_lock=lambda file_hash: True,
+        release_upload_lock=lambda file_hash: None,
+    )
+
+
+def _chunks(data: bytes, size: int = 1000):
+    return (data[i : i + size] for i in range(0, len(data), size))
+
+
+USER = SimpleNamespace(id="user-1")
+PDF = b"%PDF-1.7\n" + bytes(range(256)) * 40
+
+
+@pytest.mark.unit
+def test_small_paper_is_stored_with_one_put(papers, tmp_path):
+    s3 = FakeS3()
+    local = tmp_path / "paper.pdf"
+
+    paper, is_new = I.ingest_paper(
+        _service(s3), _chunks(PDF), USER, "a.pdf", 10 * MiB, str(local)
+    )
+
+    assert is_new
+    assert paper.file_hash == hashlib.sha256(PDF).hexdigest()
+    assert paper.file_size == len(PDF)
+    assert s3.calls == ["put_object"]
+    assert s3.objects[paper.s3_key] == PDF
+    assert local.read_bytes() == PDF
+
+
+@pytest.mark.unit
+def test_large_paper_is_uploaded_in_parts(papers):
+    s3 = FakeS3()
+    data = b"%PDF-" + bytes(range(256)) * (I.INGEST_PART_BYTES // 128)
+
+    paper, is_new = I.ingest_paper(
+        _service(s3), _chunks(data, MiB), USER, "big.pdf", 100 * MiB
+    )
+
+    assert is_new
+    assert s3.calls == ["create_multipart_upload", "complete_multipart_upload"]
+    assert s3.objects[paper.s3_key] == data
+    assert paper.file_hash == hashlib.sha256(data).hexdigest()
+
+
+@pytest.mark.unit
+def test_duplicates_are_never_committed(papers):
+    s3 = FakeS3()
+    first, _ = I.ingest_paper(_service(s3), _chunks(PDF), USER, "a.pdf", 10 * MiB)
+    data = b"%PDF-" + bytes(range(256)) * (I.INGEST_PART_BYTES // 128)
+    big, _ = I.ingest_paper(_service(s3), _chunks(data, MiB), USER, "b.pdf", 100 * MiB)
+    s3.calls.clear()
+
+    again, is_new = I.ingest_paper(
+        _service(s3), _chunks(PDF), USER, "copy.pdf", 10 * MiB
+    )
+    big_again, big_is_new = I.ingest_paper(
+        _service(s3), _chunks(data, MiB), USER, "copy.pdf", 100 * MiB
+    )
+
+    assert (again, is_new) == (first, False)
+    assert (big_again, big_is_new) == (big, False)
+    # The small copy was never sent; the large one was started and aborted.
+    assert s3.calls == ["create_multipart_upload", "abort_multipart_upload"]
+    assert len(s3.objects) == 2
+    assert s3.uploads == {}
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize(
+    "data, message",
+    [
+        (b"<html>" + PDF, "not a valid PDF"),
+        (b"%PD", "not a valid PDF"),
+        (b"", "not a valid PDF"),
+        (PDF, "exceeds the 0MB limit"),
+    ],
+)
+def test_rejected_uploads_store_nothing(papers, data, message):
+    s3 = FakeS3()
+
+    with pytest.raises(I.IngestError, match=message):
+        I.ingest_paper(_service(s3), _chunks(data, 2), USER, "x.pdf", 1000)
+
+    assert s3.objects == {} and s3.uploads == {}
+    assert papers == {}
+
+
+@pytest.mark.unit
+def test_parts_upload_concurrently_with_bounded_in_flight():
+    s3 = FakeS3(delay=0.05)
+    writer = I.MultipartWriter(s3, "bucket", "key", {}, part_bytes=10, concurrency=3)
+    data = bytes(range(256))
+
+    for chunk in _chunks(data, 7):
+        writer.write(chunk)
+    writer.commit()
+
+    assert s3.objects["key"] == data
+    assert s3.max_in_flight == 3
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize("fail_part", [1, 3])
+def test_failed_parts_abort_the_multipart_upload(papers, fail_part):
+    s3 = FakeS3(fail_part=fail_part)
+    # Three parts; the last one is only sent on commit.
+    data = b"%PDF-" + b"x" * (I.INGEST_PART_BYTES * 5 // 2)
+
+    with pytest.raises(ConnectionError):
+        I.ingest_paper(_service(s3), _chunks(data, MiB), USER, "a.pdf", 100 * MiB)
+
+    assert s3.calls == ["create_multipart_upload", "abort_multipart_upload"]
+    assert s3.uploads == {} and s3.objects == {}
+    assert papers == {}
+
+
+@pytest.mark.unit
+def test_failed_completion_aborts_and_a_second_abort_is_a_no_op():
+    s3 = FakeS3()
+
+    def _fail(**kwargs):
+        raise ConnectionError("completion failed")
+
+    s3.complete_multipart_upload = _fail
+    writer = I.MultipartWriter(s3, "bucket", "key", {}, part_bytes=10, concurrency=2)
+    for chunk in _chunks(bytes(range(256)), 7):
+        writer.write(chunk)
+
+    with pytest.raises(ConnectionError):
+        writer.commit()
+    writer.abort()
+
+    assert s3.calls == ["create_multipart_upload", "abort_multipart_upload"]
+    assert s3.uploads == {}
@@ -0,0 +1,291 @@
+"""
+Worker-local, content-addressed cache of paper PDFs in front of S3.
+
+Every reprocess, repeatability run and extraction used to download the paper
+from S3 into a fresh temp file and delete it afterwards, so the same 20-50 MB
+PDF was pulled again for every job. ``PdfCache`` keeps the bytes on the
+worker's disk under ``Paper.file_hash``:
+
+- fills are atomic: the download lands in a temp file that is renamed into
+  place only once its SHA-256 matches the paper's hash;
+- reads are verified: a cached file whose hash no longer matches is dropped
+  and downloaded again;
+- fills are single-flight: a per-hash file lock makes concurrent tasks (in any
+  worker process on the host) wait for one download instead of starting their
+  own;
+- the cache is an LRU bounded by ``PDF_CACHE_MAX_BYTES``: a hit refreshes the
+  file's mtime and every fetch evicts the least recently used files above the
+  cap.
+
+Callers get a private hard link to the cached file, not the file itself, so
+they can delete it when done (as they always have) and eviction never pulls a
+file out from under a running task. Links share their file's blocks, so the
+cap counts every file still held on disk, cached or checked out; only files no
+task holds can be evicted. A link's name carries its creation time, and links
+older than a day (left behind by crashed tasks) are swept on every fetch.
+
+Hits, misses, fills and evictions are counted in the ``pdf_cache:stats`` Redis
+hash shared by all workers; ``cache_stats`` reads it back.
+"""
+
+import fcntl
+import hashlib
+import logging
+import os
+import re
+import shutil
+import tempfile
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+PDF_CACHE_DIR = os.getenv(
+    "PDF_CACHE_DIR", os.path.join(tempfile.gettempdir(), "atlas-pdf-cache")
+)
+# Bytes of PDFs kept per host; 0 disables the cache.
+PDF_CACHE_MAX_BYTES = int(os.getenv("PDF_CACHE_MAX_BYTES", str(2 * 1024**3)))
+# Links left behind by crashed tasks are removed after this many seconds.
+_STALE_LINK_SECONDS = 24 * 3600
+
+STATS_KEY = "pdf_cache:stats"
+_STAT_FIELDS = ("hits", "misses", "fills", "fill_bytes", "evictions", "corrupt")
+
+_SHA256 = re.compile(r"^[0-9a-f]{64}$")
+
+
+def _redis():
+    from workers.celery_config import redis_client
+
+    return redis_client
+
+
+def _record(field: str, amount: int = 1) -> None:
+    """Add *amount* to a shared counter; metrics never fail a download."""
+    try:
+        client = _redis()
+        if client is not None:
+            client.hincrby(STATS_KEY, field, amount)
+    except Exception as e:
+        logger.debug("Failed to record PDF cache metric %s: %s", field, e)
+
+
+def cache_stats() -> Dict[str, Any]:
+    """The shared counters, plus the hit rate over all lookups."""
+    raw = {}
+    try:
+        client = _redis()
+        if client is not None:
+            raw = client.hgetall(STATS_KEY)
+    except Exception as e:
+        logger.warning("Failed to read PDF cache metrics: %s", e)
+    stats = {field: 0 for field in _STAT_FIELDS}
+    for field, value in raw.items():
+        field = field.decode() if isinstance(field, bytes) else field
+        if field in stats:
+            stats[field] = int(value)
+    lookups = stats["hits"] + stats["misses"]
+    stats["hit_rate"] = stats["hits"] / lookups if lookups else None
+    return stats
+
+
+def _sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class PdfCache:
+    """A size-capped LRU of PDFs on local disk, keyed by their SHA-256."""
+
+    def __init__(
+        self, root: str = PDF_CACHE_DIR, max_bytes: int = PDF_CACHE_MAX_BYTES
+    ):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.objects = os.path.join(root, "objects")
+        self.links = os.path.join(root, "links")
+        self.locks = os.path.join(root, "locks")
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def _path(self, file_hash: str) -> str:
+        return os.path.join(self.objects, file_hash[:2], f"{file_hash}.pdf")
+
+    @contextmanager
+    def _lock(self, name: str, blocking: bool = True) -> Iterator[bool]:
+        """Hold the host-wide file lock *name*; yields False if it is busy."""
+        os.makedirs(self.locks, exist_ok=True)
+        with open(os.path.join(self.locks, f"{name}.lock"), "w") as handle:
+            flags = fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB)
+            try:
+                fcntl.flock(handle, flags)
+            except BlockingIOError:
+                yield False
+                return
+            try:
+                yield True
+            finally:
+                fcntl.flock(handle, fcntl.LOCK_UN)
+
+    def _checkout(self, file_hash: str) -> Optional[str]:
+        """A verified private link to the cached file, or None on a miss."""
+        path = self._path(file_hash)
+        os.makedirs(self.links, exist_ok=True)
+        # The creation time is in the name: the link shares the cached file's
+        # mtime, which every hit refreshes.
+        link = os.path.join(self.links, f"{int(time.time())}-{uuid.uuid4().hex}.pdf")
+        try:
+            os.link(path, link)
+        except FileNotFoundError:
+            return None
+        except OSError:
+            # No hard links on this filesystem: hand out a copy instead.
+            try:
+                shutil.copyfile(path, link)
+            except FileNotFoundError:
+                return None
+
+        if _sha256(link) != file_hash:
+            logger.warning("Cached PDF %s is corrupt; dropping it", file_hash[:12])
+            _record("corrupt")
+            for stale in (link, path):
+                try:
+                    os.remove(stale)
+                except FileNotFoundError:
+                    pass
+            return None
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+        return link
+
+    def fetch(self, file_hash: str, fill: Callable[[str], Any]) -> str:
+        """
+        A path holding the PDF with *file_hash*, for the caller to delete.
+
+        *fill* downloads the PDF to the path it is given; it is called only on
+        a miss, by one caller at a time per hash. Without a usable hash (or
+        with the cache disabled) this is a plain download to a temp file.
+        """
+        if not self.enabled or not _SHA256.match(file_hash or ""):
+            fd, target = tempfile.mkstemp(suffix=".pdf")
+            os.close(fd)
+            fill(target)
+            return target
+
+        link = self._checkout(file_hash)
+        if link is None:
+            with self._lock(file_hash):
+                # Another task may have filled it while we waited.
+                link = self._checkout(file_hash)
+                if link is None:
+                    _record("misses")
+                    link = self._fill(file_hash, fill)
+                    self._evict()
+                    return link
+        _record("hits")
+        self._evict()
+        return link
+
+    def _fill(self, file_hash: str, fill: Callable[[str], Any]) -> str:
+        path = self._path(file_hash)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, partial = tempfile.mkstemp(suffix=".part", dir=os.path.dirname(path))
+        os.close(fd)
+        try:
+            fill(partial)
+            if _sha256(partial) != file_hash:
+                # Serve the bytes, but never under a hash they do not have.
+                logger.warning(
+                    "Downloaded PDF does not match hash %s; not caching it",
+                    file_hash[:12],
+                )
+                return partial
+            size = os.path.getsize(partial)
+            os.replace(partial, path)
+        except BaseException:
+            if os.path.exists(partial):
+                os.remove(partial)
+            raise
+        _record("fills")
+        _record("fill_bytes", size)
+        return self._checkout(file_hash) or self._copy(path)
+
+    def _copy(self, path: str) -> str:
+        fd, target = tempfile.mkstemp(suffix=".pdf")
+        os.close(fd)
+        shutil.copyfile(path, target)
+        return target
+
+    def _sweep_links(self) -> None:
+        """Remove links older than ``_STALE_LINK_SECONDS``."""
+        cutoff = time.time() - _STALE_LINK_SECONDS
+        try:
+            entries = list(os.scandir(self.links))
+        except FileNotFoundError:
+            return
+        for entry in entries:
+            created, _, _ = entry.name.partition("-")
+            try:
+                if int(created) < cutoff:
+                    os.remove(entry.path)
+            except ValueError:
+                # Not a name this cache made; leave it alone.
+                continue
+            except FileNotFoundError:
+                pass
+
+    @staticmethod
+    def _files(directory: str) -> Iterator[tuple]:
+        """``(mtime, size, inode, path)`` of the PDFs under *directory*."""
+        for parent, _, names in os.walk(directory):
+            for name in names:
+                if not name.endswith(".pdf"):
+                    continue
+                path = os.path.join(parent, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                yield stat.st_mtime, stat.st_size, stat.st_ino, path
+
+    def _evict(self) -> None:
+        """Sweep stale links, then evict until what is on disk fits the cap.
+
+        Bytes are counted per inode over cached files and live links, so a
+        checked-out paper counts once, and a link to an evicted file still
+        counts. Files a link holds free nothing when removed and are kept.
+        """
+        with self._lock("evict", blocking=False) as acquired:
+            if not acquired:
+                return  # another process is already evicting
+            self._sweep_links()
+            objects = list(self._files(self.objects))
+            linked = {inode: size for _, size, inode, _ in self._files(self.links)}
+            held = {inode: size for _, size, inode, _ in objects}
+            held.update(linked)
+            total = sum(held.values())
+            evicted = 0
+            for _, size, inode, path in sorted(objects):
+                if total <= self.max_bytes:
+                    break
+                if inode in linked:
+                    continue
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
+                evicted += 1
+            if evicted:
+                _record("evictions", evicted)
+
+pdf_cache = PdfCache()
@@ -0,0 +1,180 @@
+"""Tests for the worker-local PDF cache.
+
+The cache runs on a temp directory; S3 is a fill function that writes known
+bytes and counts its calls, and the shared Redis counters are a dict.
+"""
+
+import hashlib
+import os
+import threading
+import time
+
+import pytest
+from workers.services import pdf_cache as C
+
+
+def _pdf(n: int, size: int = 1000) -> bytes:
+    return b"%PDF-" + bytes([n]) * size
+
+
+def _hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+class FakeS3:
+    """Serve PDFs by hash, counting downloads."""
+
+    def __init__(self, delay: float = 0):
+        self.downloads = []
+        self.delay = delay
+
+    def filler(self, data: bytes):
+        def fill(target):
+            self.downloads.append(_hash(data))
+            time.sleep(self.delay)
+            with open(target, "wb") as f:
+                f.write(data)
+
+        return fill
+
+
+@pytest.fixture
+def stats(monkeypatch):
+    counters = {}
+
+    class FakeRedis:
+        def hincrby(self, key, field, amount):
+            counters[field] = counters.get(field, 0) + amount
+
+        def hgetall(self, key):
+            return {k.encode(): str(v).encode() for k, v in counters.items()}
+
+    monkeypatch.setattr(C, "_redis", lambda: FakeRedis())
+    return counters
+
+
+@pytest.mark.unit
+def test_repeat_fetches_are_served_from_disk(tmp_path, stats):
+    cache, s3, data = C.PdfCache(str(tmp_path), 10**6), FakeS3(), _pdf(1)
+
+    first = cache.fetch(_hash(data), s3.filler(data))
+    second = cache.fetch(_hash(data), s3.filler(data))
+
+    assert first != second
+    assert open(first, "rb").read() == open(second, "rb").read() == data
+    assert len(s3.downloads) == 1
+    # Callers own their path: deleting it leaves the cache intact.
+    os.remove(first)
+    os.remove(second)
+    cache.fetch(_hash(data), s3.filler(data))
+    assert len(s3.downloads) == 1
+    assert C.cache_stats() == {
+        "hits": 2,
+        "misses": 1,
+        "fills": 1,
+        "fill_bytes": len(data),
+        "evictions": 0,
+        "corrupt": 0,
+        "hit_rate": 2 / 3,
+    }
+
+
+@pytest.mark.unit
+def test_corrupt_entries_are_downloaded_again(tmp_path, stats):
+    cache, s3, data = C.PdfCache(str(tmp_path), 10**6), FakeS3(), _pdf(2)
+    os.remove(cache.fetch(_hash(data), s3.filler(data)))
+    with open(cache._path(_hash(data)), "r+b") as f:
+        f.write(b"garbage")
+
+    path = cache.fetch(_hash(data), s3.filler(data))
+
+    assert open(path, "rb").read() == data
+    assert len(s3.downloads) == 2
+    assert stats["corrupt"] == 1
+
+
+@pytest.mark.unit
+def test_mismatching_downloads_are_served_but_not_cached(tmp_path, stats):
+    cache, s3 = C.PdfCache(str(tmp_path), 10**6), FakeS3()
+
+    path = cache.fetch(_hash(_pdf(3)), s3.filler(_pdf(4)))
+
+    assert open(path, "rb").read() == _pdf(4)
+    assert not os.path.exists(cache._path(_hash(_pdf(3))))
+
+
+@pytest.mark.unit
+def test_least_recently_used_files_are_evicted_above_the_cap(tmp_path, stats):
+    cache, s3 = C.PdfCache(str(tmp_path), 2500), FakeS3()
+    pdfs = [_pdf(n) for n in range(3)]
+    for age, data in enumerate(pdfs[:2]):
+        os.remove(cache.fetch(_hash(data), s3.filler(data)))
+        os.utime(cache._path(_hash(data)), (age, age))
+
+    cache.fetch(_hash(pdfs[2]), s3.filler(pdfs[2]))
+
+    cached = [os.path.exists(cache._path(_hash(d))) for d in pdfs]
+    assert cached == [False, True, True]
+    assert stats["evictions"] == 1
+
+
+@pytest.mark.unit
+def test_concurrent_fetches_share_one_download(tmp_path, stats):
+    cache, s3, data = C.PdfCache(str(tmp_path), 10**6), FakeS3(delay=0.2), _pdf(5)
+    paths = []
+
+    def fetch():
+        paths.append(cache.fetch(_hash(data), s3.filler(data)))
+
+    threads = [threading.Thread(target=fetch) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(s3.downloads) == 1
+    assert len(set(paths)) == 4
+    assert all(open(path, "rb").read() == data for path in paths)
+
+
+@pytest.mark.unit
+def test_disabled_cache_downloads_every_time(tmp_path, stats):
+    cache, s3, data = C.PdfCache(str(tmp_path), 0), FakeS3(), _pdf(6)
+
+    for _ in range(2):
+        os.remove(cache.fetch(_hash(data), s3.filler(data)))
+
+    assert len(s3.downloads) == 2
+    assert stats == {}
+
+
+@pytest.mark.unit
+def test_checked_out_files_count_toward_the_cap_and_are_kept(tmp_path, stats):
+    cache, s3 = C.PdfCache(str(tmp_path), 1500), FakeS3()
+    held, data = _pdf(7), _pdf(8)
+    link = cache.fetch(_hash(held), s3.filler(held))
+    os.utime(cache._path(_hash(held)), (0, 0))
+
+    os.remove(cache.fetch(_hash(data), s3.filler(data)))
+    cache._evict()
+
+    # The held paper is older, but removing it would free nothing.
+    assert os.path.exists(cache._path(_hash(held)))
+    assert not os.path.exists(cache._path(_hash(data)))
+    assert open(link, "rb").read() == held
+
+
+@pytest.mark.unit
+def test_stale_links_are_swept_by_age_even_for_hot_papers(tmp_path, stats):
+    cache, s3, data = C.PdfCache(str(tmp_path), 10**6), FakeS3(), _pdf(9)
+    fresh = cache.fetch(_hash(data), s3.filler(data))
+    # A link a crashed task left behind a day and a half ago.
+    created = int(time.time() - 1.5 * C._STALE_LINK_SECONDS)
+    leaked = os.path.join(cache.links, f"{created}-leaked.pdf")
+    os.link(cache._path(_hash(data)), leaked)
+
+    # A hit refreshes the shared mtime, but the sweep goes by the name.
+    hit = cache.fetch(_hash(data), s3.filler(data))
+
+    assert not os.path.exists(leaked)
+    assert os.path.exists(fresh) and os.path.exists(hit)
@@ -0,0 +1,410 @@
+"""
+Pooled provider objects: assistants, vector stores and uploaded papers.
+
+Creating an assistant, uploading the PDF and building a vector store costs
+several provider round trips, and deleting them afterwards a few more. None of
+it depends on the individual run: an assistant is fully determined by
+(model, instructions, schema) and a vector store by the paper bytes. So they
+are created once, recorded in ``ProviderResource`` and reused until they have
+gone unused for their TTL:
+
+- assistants for ``ASSISTANT_POOL_TTL_HOURS`` (default a week);
+- vector stores for ``VECTOR_STORE_POOL_TTL_HOURS`` (default 20h, kept below
+  the one day of inactivity after which OpenAI expires the store itself).
+
+The vector store is attached to each run's thread rather than to the assistant,
+which is what lets one assistant serve every paper.
+
+The JSON-schema strategies reference papers by provider file id instead of
+inlining them as base64 on every call (see ``ExtractionStrategy``). Uploads
+are pooled per provider and ``Paper.file_hash`` for ``PROVIDER_FILE_TTL_HOURS``
+(default 72h) from upload. That window does not slide: OpenAI files are
+uploaded with a matching expiry so the provider removes them on its own.
+
+``sweep_expired_resources`` and ``sweep_orphaned_resources`` are run by the
+``sweep_provider_resources`` janitor task. The OpenAI client is always passed
+in, so tests can substitute a fake one.
+"""
+
+import hashlib
+import logging
+import os
+from datetime import UTC, datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional
+
+import anthropic
+import openai
+from bunnet.operators import Inc, Set
+from database.models.provider_resources import (
+    RESOURCE_ASSISTANT,
+    RESOURCE_FILE,
+    RESOURCE_VECTOR_STORE,
+    ProviderResource,
+)
+from openai import OpenAI
+from pymongo.errors import DuplicateKeyError
+from services.extraction_cache import canonical_hash
+
+logger = logging.getLogger(__name__)
+
+ASSISTANT_POOL_TTL = timedelta(
+    hours=float(os.getenv("ASSISTANT_POOL_TTL_HOURS", "168"))
+)
+VECTOR_STORE_POOL_TTL = timedelta(
+    hours=float(os.getenv("VECTOR_STORE_POOL_TTL_HOURS", "20"))
+)
+# Set to "off" to always send papers inline instead of uploading them.
+PROVIDER_FILE_UPLOADS = os.getenv("PROVIDER_FILE_UPLOADS", "on").lower() not in {
+    "0",
+    "false",
+    "off",
+}
+PROVIDER_FILE_TTL = timedelta(
+    hours=float(os.getenv("PROVIDER_FILE_TTL_HOURS", "72"))
+)
+# OpenAI deletes an uploaded paper this long after its registry entry expires,
+# so a request built just before expiry still finds the file.
+PROVIDER_FILE_GRACE = timedelta(hours=1)
+
+ANTHROPIC_FILES_BETA = "files-api-2025-04-14"
+
+_NOT_FOUND = (openai.NotFoundError, anthropic.NotFoundError)
+
+# Metadata marker on pooled provider objects; the orphan sweep only ever
+# deletes objects that carry it.
+POOL_METADATA_KEY = "atlas_pool_key"
+
+# Objects younger than this are never treated as orphans: their registry entry
+# may simply not be written yet.
+ORPHAN_GRACE = timedelta(hours=1)
+
+_TTL = {
+    RESOURCE_ASSISTANT: ASSISTANT_POOL_TTL,
+    RESOURCE_VECTOR_STORE: VECTOR_STORE_POOL_TTL,
+    RESOURCE_FILE: PROVIDER_FILE_TTL,
+}
+# Kinds whose expiry is pushed back on every use.
+_SLIDING = {RESOURCE_ASSISTANT, RESOURCE_VECTOR_STORE}
+
+
+def key_owner(api_key: Optional[str]) -> str:
+    """Identify the provider account behind *api_key* without storing it."""
+    return hashlib.sha256((api_key or "").encode("utf-8")).hexdigest()
+
+
+# ---------------------------------------------------------------------------
+# Registry access
+# ---------------------------------------------------------------------------
+def _find(**query: str) -> Optional[ProviderResource]:
+    return ProviderResource.find_one(query).run()
+
+
+def _register(**fields: Any) -> ProviderResource:
+    """Insert a registry entry; raises ``DuplicateKeyError`` if one exists."""
+    return ProviderResource(**fields).insert()
+
+
+def _touch(entry: ProviderResource, now: datetime) -> None:
+    updates = {ProviderResource.last_used_at: now}
+    if entry.kind in _SLIDING:
+        updates[ProviderResource.expires_at] = now + _TTL[entry.kind]
+    ProviderResource.find_one({"_id": entry.id}).update(
+        Set(updates), Inc({ProviderResource.uses: 1})
+    ).run()
+
+
+def _forget(entry: ProviderResource) -> None:
+    entry.delete()
+
+
+def _expired(now: datetime, limit: int) -> List[ProviderResource]:
+    return ProviderResource.find({"expires_at": {"$lte": now}}).limit(limit).to_list()
+
+
+def _known_ids(owner: str) -> set:
+    return {
+        entry.resource_id
+        for entry in ProviderResource.find(
+            {"provider": "openai", "owner": owner}
+        ).to_list()
+    }
+
+
+# ---------------------------------------------------------------------------
+# Provider objects
+# ---------------------------------------------------------------------------
+def delete_provider_objects(
+    client: Any,
+    kind: str,
+    resource_id: str,
+    file_id: Optional[str] = None,
+    provider: str = "openai",
+) -> None:
+    """Delete a pooled object (and its file); already-gone ones are fine.
+
+    *client* is an ``OpenAI`` or ``anthropic.Anthropic`` client for *provider*.
+    """
+    deletions = []
+    if kind == RESOURCE_ASSISTANT:
+        deletions.append(lambda: client.beta.assistants.delete(resource_id))
+    elif kind == RESOURCE_VECTOR_STORE:
+        deletions.append(lambda: client.vector_stores.delete(vector_store_id=resource_id))
+        if file_id:
+            deletions.append(lambda: client.files.delete(file_id))
+    elif provider == "anthropic":
+        deletions.append(
+            lambda: client.beta.files.delete(resource_id, betas=[ANTHROPIC_FILES_BETA])
+        )
+    else:
+        deletions.append(lambda: client.files.delete(resource_id))
+    for delete in deletions:
+        try:
+            delete()
+        except _NOT_FOUND:
+            pass
+
+
+def _as_utc(value: datetime) -> datetime:
+    return value if value.tzinfo else value.replace(tzinfo=UTC)
+
+
+class ResourcePool:
+    """Hand out pooled provider objects for one API key.
+
+    *client* is an ``OpenAI`` client, or an ``anthropic.Anthropic`` client when
+    *provider* is ``"anthropic"`` (which only supports ``file``).
+    """
+
+    def __init__(
+        self,
+        client: Any,
+        api_key: Optional[str],
+        user_id: Optional[str] = None,
+        provider: str = "openai",
+    ):
+        self.client = client
+        self.provider = provider
+        # Default to the key the client was built with (e.g. the env key).
+        self.owner = key_owner(api_key or getattr(client, "api_key", None))
+        # Only set for BYO keys, so the janitor can resolve the key again.
+        self.user_id = user_id
+
+    def assistant(
+        self,
+        model: str,
+        instructions: str,
+        schema_hash: str,
+        function: Dict[str, Any],
+        schema: Dict[str, Any],
+    ) -> str:
+        """Return an assistant id for these inputs, creating one if needed."""
+        pool_key = canonical_hash([model, instructions, schema_hash])
+
+        def create() -> Dict[str, Any]:
+            logger.info("Creating pooled assistant %s for model %s", pool_key[:12], model)
+            assistant = self.client.beta.assistants.create(
+                name="Atlas extractor",
+                model=model,
+                instructions=instructions,
+                tools=[
+                    {"type": "file_search"},
+                    {"type": "function", "function": function},
+                ],
+                response_format={
+                    "type": "json_schema",
+                    "json_schema": {
+                        "name": "extract_features",
+                        "strict": True,
+                        "schema": schema,
+                    },
+                },
+                metadata={POOL_METADATA_KEY: pool_key},
+            )
+            return {"resource_id": assistant.id}
+
+        return self._acquire(RESOURCE_ASSISTANT, pool_key, create).resource_id
+
+    def vector_store(self, file_hash: str, file_path: str) -> str:
+        """Return a vector store id for this paper, uploading it if needed."""
+
+        def create() -> Dict[str, Any]:
+            logger.info("Creating pooled vector store for file %s", file_hash[:12])
+            with open(file_path, "rb") as file:
+                file_info = self.client.files.create(file=file, purpose="assistants")
+            try:
+                vector_store = self.client.vector_stores.create(
+                    name=f"atlas_{file_hash[:12]}",
+                    file_ids=[file_info.id],
+                    expires_after={"anchor": "last_active_at", "days": 1},
+                    metadata={POOL_METADATA_KEY: file_hash},
+                )
+            except Exception:
+                self.client.files.delete(file_info.id)
+                raise
+            return {"resource_id": vector_store.id, "file_id": file_info.id}
+
+        return self._acquire(RESOURCE_VECTOR_STORE, file_hash, create).resource_id
+
+    def file(self, file_hash: str, file_path: str) -> str:
+        """Return this paper's provider file id, uploading it if needed."""
+
+        def create() -> Dict[str, Any]:
+            logger.info(
+                "Uploading file %s to %s", file_hash[:12], self.provider
+            )
+            with open(file_path, "rb") as file:
+                if self.provider == "anthropic":
+                    uploaded = self.client.beta.files.upload(
+                        file=(f"{file_hash[:12]}.pdf", file, "application/pdf"),
+                        betas=[ANTHROPIC_FILES_BETA],
+                    )
+                else:
+                    uploaded = self.client.files.create(
+                        file=file,
+                        purpose="user_data",
+                        expires_after={
+                            "anchor": "created_at",
+                            "seconds": int(
+                                (PROVIDER_FILE_TTL + PROVIDER_FILE_GRACE).total_seconds()
+                            ),
+                        },
+                    )
+            return {"resource_id": uploaded.id}
+
+        return self._acquire(RESOURCE_FILE, file_hash, create).resource_id
+
+    def invalidate(self, kind: str, resource_id: str) -> None:
+        """Forget a pooled object the provider no longer recognises."""
+        entry = _find(
+            provider=self.provider,
+            kind=kind,
+            owner=self.owner,
+            resource_id=resource_id,
+        )
+        if entry:
+            logger.warning("Dropping stale pooled %s %s", kind, entry.resource_id)
+            _forget(entry)
+
+    def _acquire(self, kind: str, pool_key: str, create) -> ProviderResource:
+        now = datetime.now(UTC)
+        entry = self._find(kind, pool_key)
+        if entry and _as_utc(entry.expires_at) > now:
+            _touch(entry, now)
+            return entry
+        if entry:
+            # Past its TTL: the provider may already have expired it.
+            delete_provider_objects(
+                self.client, kind, entry.resource_id, entry.file_id, self.provider
+            )
+            _forget(entry)
+
+        fields = create()
+        try:
+            return _register(
+                provider=self.provider,
+                kind=kind,
+                owner=self.owner,
+                pool_key=pool_key,
+                user_id=self.user_id,
+                uses=1,
+                last_used_at=now,
+                expires_at=now + _TTL[kind],
+                **fields,
+            )
+        except DuplicateKeyError:
+            # Another worker created the same object concurrently; use theirs.
+            delete_provider_objects(
+                self.client, kind, provider=self.provider, **fields
+            )
+            winner = self._find(kind, pool_key)
+            if winner is None:
+                raise
+            return winner
+
+    def _find(self, kind: str, pool_key: str) -> Optional[ProviderResource]:
+        return _find(
+            provider=self.provider, kind=kind, owner=self.owner, pool_key=pool_key
+        )
+
+
+# ---------------------------------------------------------------------------
+# Janitor
+# ---------------------------------------------------------------------------
+def sweep_expired_resources(
+    client_for, now: Optional[datetime] = None, limit: int = 500
+) -> int:
+    """Delete expired pool entries and their provider objects.
+
+    *client_for(entry)* returns a client for the entry's provider and key
+    account, or None when the key can no longer be resolved (e.g. a rotated
+    BYO key); such entries are dropped without touching the provider.
+    """
+    now = now or datetime.now(UTC)
+    swept = 0
+    for entry in _expired(now, limit):
+        client = client_for(entry)
+        if client is None:
+            logger.warning(
+                "No key for pooled %s %s; dropping entry only",
+                entry.kind,
+                entry.resource_id,
+            )
+        else:
+            try:
+                delete_provider_objects(
+                    client,
+                    entry.kind,
+                    entry.resource_id,
+                    entry.file_id,
+                    entry.provider,
+                )
+            except Exception as exc:
+                logger.error("Failed to delete %s %s: %s", entry.kind, entry.resource_id, exc)
+                continue
+        _forget(entry)
+        swept += 1
+    return swept
+
+
+def _orphans(objects: Iterable[Any], known: set, cutoff: datetime) -> List[Any]:
+    return [
+        obj
+        for obj in objects
+        if POOL_METADATA_KEY in (obj.metadata or {})
+        and obj.id not in known
+        and datetime.fromtimestamp(obj.created_at, UTC) < cutoff
+    ]
+
+
+def sweep_orphaned_resources(
+    client: OpenAI, api_key: str, now: Optional[datetime] = None
+) -> int:
+    """Delete pooled objects on *api_key*'s account that the registry lost.
+
+    These leak when a worker dies between creating an object and recording
+    it. Only objects carrying ``POOL_METADATA_KEY`` are considered.
+    """
+    cutoff = (now or datetime.now(UTC)) - ORPHAN_GRACE
+    known = _known_ids(key_owner(api_key))
+    swept = 0
+
+    for assistant in _orphans(client.beta.assistants.list(limit=100), known, cutoff):
+        try:
+            client.beta.assistants.delete(assistant.id)
+            swept += 1
+        except openai.NotFoundError:
+            pass
+
+    for store in _orphans(client.vector_stores.list(limit=100), known, cutoff):
+        try:
+            file_ids = [
+                f.id for f in client.vector_stores.files.list(vector_store_id=store.id)
+            ]
+            client.vector_stores.delete(vector_store_id=store.id)
+            for file_id in file_ids:
+                client.files.delete(file_id)
+            swept += 1
+        except openai.NotFoundError:
+            pass
+
+    return swept
@@ -0,0 +1,223 @@
+"""Tests for the pooled assistant / vector store registry.
+
+The OpenAI client is a fake that counts creations and deletions; the Mongo
+registry is replaced by an in-memory dict behind the module's access helpers.
+"""
+
+import itertools
+from datetime import UTC, datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+from pymongo.errors import DuplicateKeyError
+from workers.services import resource_pool as P
+
+
+class FakeOpenAI:
+    """Just enough of the OpenAI client to create and delete pooled objects."""
+
+    def __init__(self):
+        ids = itertools.count(1)
+        self.created = []
+        self.deleted = []
+
+        def create(kind):
+            def _create(**kwargs):
+                obj = SimpleNamespace(id=f"{kind}-{next(ids)}", kwargs=kwargs)
+                self.created.append(obj)
+                return obj
+
+            return _create
+
+        def delete(kind):
+            return lambda *args, **kwargs: self.deleted.append(
+                (kind, args[0] if args else next(iter(kwargs.values())))
+            )
+
+        self.beta = SimpleNamespace(
+            assistants=SimpleNamespace(create=create("asst"), delete=delete("asst"))
+        )
+        self.files = SimpleNamespace(create=create("file"), delete=delete("file"))
+        self.vector_stores = SimpleNamespace(
+            create=create("vs"), delete=delete("vs")
+        )
+
+
+class FakeAnthropic:
+    """The Anthropic Files API (beta) surface used for uploads."""
+
+    def __init__(self):
+        self.uploaded = []
+        self.deleted = []
+
+        def upload(file, betas):
+            self.uploaded.append((file[0], betas))
+            return SimpleNamespace(id=f"afile-{len(self.uploaded)}")
+
+        self.beta = SimpleNamespace(
+            files=SimpleNamespace(
+                upload=upload,
+                delete=lambda file_id, betas: self.deleted.append(file_id),
+            )
+        )
+
+
+@pytest.fixture
+def registry(monkeypatch):
+    """Replace the Mongo registry with a dict keyed like the unique index."""
+    entries = {}
+
+    def _key(fields):
+        return (fields["provider"], fields["kind"], fields["owner"], fields["pool_key"])
+
+    def _find(**query):
+        for entry in entries.values():
+            if all(getattr(entry, k) == v for k, v in query.items()):
+                return entry
+        return None
+
+    def _register(**fields):
+        if _key(fields) in entries:
+            raise DuplicateKeyError("duplicate")
+        fields.setdefault("file_id", None)
+        entry = SimpleNamespace(**fields)
+        entries[_key(fields)] = entry
+        return entry
+
+    def _touch(entry, now):
+        entry.uses += 1
+        if entry.kind in P._SLIDING:
+            entry.expires_at = now + P._TTL[entry.kind]
+
+    def _forget(entry):
+        entries.pop((entry.provider, entry.kind, entry.owner, entry.pool_key), None)
+
+    def _expired(now, limit):
+        return [e for e in entries.values() if e.expires_at <= now][:limit]
+
+    monkeypatch.setattr(P, "_find", _find)
+    monkeypatch.setattr(P, "_register", _register)
+    monkeypatch.setattr(P, "_touch", _touch)
+    monkeypatch.setattr(P, "_forget", _forget)
+    monkeypatch.setattr(P, "_expired", _expired)
+    return entries
+
+
+def _pdf(tmp_path):
+    path = tmp_path / "paper.pdf"
+    path.write_bytes(b"%PDF-1.4 test")
+    return str(path)
+
+
+def _assistant(pool, schema_hash="s1"):
+    return pool.assistant("gpt-4.1", "prompt", schema_hash, {"name": "f"}, {})
+
+
+@pytest.mark.unit
+def test_assistants_are_reused_per_inputs(registry):
+    client = FakeOpenAI()
+    pool = P.ResourcePool(client, "sk-a")
+
+    first = _assistant(pool)
+    assert _assistant(pool) == first
+    assert _assistant(P.ResourcePool(client, "sk-a")) == first
+    # A different schema, or a different key account, gets its own assistant.
+    assert _assistant(pool, schema_hash="s2") != first
+    assert _assistant(P.ResourcePool(client, "sk-b")) != first
+    assert len(client.created) == 3
+
+
+@pytest.mark.unit
+def test_vector_store_is_uploaded_once_per_file_hash(registry, tmp_path):
+    client = FakeOpenAI()
+    pool = P.ResourcePool(client, "sk-a")
+
+    first = pool.vector_store("h1", _pdf(tmp_path))
+    assert pool.vector_store("h1", _pdf(tmp_path)) == first
+    # One file upload plus one vector store.
+    assert [obj.id.split("-")[0] for obj in client.created] == ["file", "vs"]
+    (entry,) = registry.values()
+    assert entry.uses == 2 and entry.file_id.startswith("file-")
+
+
+@pytest.mark.unit
+def test_expired_entry_is_replaced(registry):
+    client = FakeOpenAI()
+    pool = P.ResourcePool(client, "sk-a")
+    first = _assistant(pool)
+    (entry,) = registry.values()
+    entry.expires_at = datetime.now(UTC) - timedelta(seconds=1)
+
+    second = _assistant(pool)
+    assert second != first
+    assert ("asst", first) in client.deleted
+
+
+@pytest.mark.unit
+def test_losing_a_creation_race_uses_the_winner(registry, monkeypatch):
+    client = FakeOpenAI()
+    pool = P.ResourcePool(client, "sk-a")
+    winner = _assistant(pool)
+
+    # Simulate a concurrent creator: the lookup misses once, then insert
+    # collides with the entry that already exists.
+    real_find = P._find
+    calls = itertools.count()
+    monkeypatch.setattr(
+        P, "_find", lambda **q: None if next(calls) == 0 else real_find(**q)
+    )
+
+    assert _assistant(pool) == winner
+    loser = client.created[-1].id
+    assert ("asst", loser) in client.deleted
+
+
+@pytest.mark.unit
+def test_sweep_deletes_expired_objects(registry, tmp_path):
+    client = FakeOpenAI()
+    pool = P.ResourcePool(client, "sk-a")
+    store = pool.vector_store("h1", _pdf(tmp_path))
+    live = _assistant(pool)
+    file_id = registry[("openai", "vector_store", pool.owner, "h1")].file_id
+
+    later = datetime.now(UTC) + P.VECTOR_STORE_POOL_TTL + timedelta(minutes=1)
+    assert P.sweep_expired_resources(lambda entry: client, now=later) == 1
+
+    assert ("vs", store) in client.deleted and ("file", file_id) in client.deleted
+    assert [e.resource_id for e in registry.values()] == [live]
+
+
+@pytest.mark.unit
+def test_openai_paper_upload_expires_with_its_entry(registry, tmp_path):
+    client = FakeOpenAI()
+    pool = P.ResourcePool(client, "sk-a")
+
+    first = pool.file("h1", _pdf(tmp_path))
+    (entry,) = registry.values()
+    expires_at = entry.expires_at
+    assert pool.file("h1", _pdf(tmp_path)) == first
+
+    (upload,) = client.created
+    assert upload.kwargs["purpose"] == "user_data"
+    # The provider drops the file shortly after the (non-sliding) entry.
+    ttl = (P.PROVIDER_FILE_TTL + P.PROVIDER_FILE_GRACE).total_seconds()
+    assert upload.kwargs["expires_after"] == {"anchor": "created_at", "seconds": ttl}
+    assert entry.expires_at == expires_at and entry.uses == 2
+
+
+@pytest.mark.unit
+def test_anthropic_papers_are_pooled_separately(registry, tmp_path):
+    client = FakeAnthropic()
+    pool = P.ResourcePool(client, "sk-ant", provider="anthropic")
+
+    file_id = pool.file("h1", _pdf(tmp_path))
+    assert pool.file("h1", _pdf(tmp_path)) == file_id
+    assert client.uploaded == [("h1.pdf", [P.ANTHROPIC_FILES_BETA])]
+    # The same paper on OpenAI is a different pool entry.
+    P.ResourcePool(FakeOpenAI(), "sk-ant").file("h1", _pdf(tmp_path))
+    assert len(registry) == 2
+
+    later = datetime.now(UTC) + P.PROVIDER_FILE_TTL + timedelta(minutes=1)
+    anthropic_only = lambda entry: client if entry.provider == "anthropic" else None  # noqa: E731
+    assert P.sweep_expired_resources(anthropic_only, now=later) == 2
+    assert client.deleted == [file_id]
@@ -0,0 +1,350 @@
+"""
+Semantic comparison of ground-truth strings with extracted ones.
+
+Scoring a free-text feature asks a model whether each reference string and the
+extracted string convey the same message. Asking once per row, serially, with a
+fresh client per call made a 2,000-row upload take over an hour. Here:
+
+- pairs are normalized (case and whitespace) and deduplicated; pairs that are
+  equal once normalized are "Very similar" without asking;
+- a local tier scores the rest by token-set overlap, character trigram overlap
+  and TF-IDF cosine, and settles the clear cases: "Very similar" when every
+  score reaches ``LOCAL_SIMILAR``, "Very different" when none exceeds
+  ``LOCAL_DIFFERENT``; only the ambiguous pairs go on to the model;
+- verdicts are cached by normalized pair and model (see
+  ``database/models/string_comparison_cache``), so a pair is asked only once;
+- the remaining pairs are packed ``COMPARISON_BATCH_SIZE`` to a request and the
+  requests run concurrently, at most ``COMPARISON_CONCURRENCY`` in flight;
+- requests use the user's resolved credentials and are metered like any other
+  platform call (see ``services/llm_credentials``).
+
+A pair the model left unanswered, or whose request failed, scores "Different"
+(as a failed comparison always has) and is not cached, so a later upload asks
+again.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import re
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from bunnet.operators import In
+from database.models.string_comparison_cache import StringComparisonCache
+from database.models.users import User
+from pymongo.errors import BulkWriteError
+from services.extraction_cache import canonical_hash
+from services.llm_credentials import LlmCredentials, record_usage, resolve_and_check
+from sklearn.feature_extraction.text import TfidfVectorizer
+from workers.services.async_clients import get_async_openai
+from workers.services.async_executor import AsyncExtractionExecutor
+
+logger = logging.getLogger(__name__)
+
+COMPARISON_MODEL = os.getenv("STRING_COMPARISON_MODEL", "o3-mini")
+COMPARISON_REASONING = os.getenv("STRING_COMPARISON_REASONING", "high")
+# Pairs judged in one request.
+COMPARISON_BATCH_SIZE = int(os.getenv("STRING_COMPARISON_BATCH_SIZE", "25"))
+# Comparison requests in flight at once.
+COMPARISON_CONCURRENCY = int(os.getenv("STRING_COMPARISON_CONCURRENCY", "4"))
+
+# Local tier: every similarity at least LOCAL_SIMILAR => "Very similar", none
+# above LOCAL_DIFFERENT => "Very different"; anything between goes to the
+# model.
+LOCAL_SIMILAR = float(os.getenv("STRING_COMPARISON_LOCAL_SIMILAR", "0.9"))
+LOCAL_DIFFERENT = float(os.getenv("STRING_COMPARISON_LOCAL_DIFFERENT", "0.1"))
+
+SIMILARITY_CATEGORIES = ["Very different", "Different", "Similar", "Very similar"]
+MATCH = "Very similar"
+MISMATCH = "Very different"
+FALLBACK = "Different"
+
+Pair = Tuple[str, str]
+
+_WORD = re.compile(r"\w+")
+
+
+@dataclass
+class ComparisonStats:
+    """How the distinct pairs given to ``compare_strings`` were settled."""
+
+    pairs: int = 0
+    # Equal once normalized, or settled by the local tier.
+    local: int = 0
+    cached: int = 0
+    asked: int = 0
+
+    @property
+    def local_fraction(self) -> Optional[float]:
+        return self.local / self.pairs if self.pairs else None
+
+    def as_dict(self) -> dict:
+        return {
+            "pairs": self.pairs,
+            "resolved_locally": self.local,
+            "cached": self.cached,
+            "asked": self.asked,
+            "local_fraction": self.local_fraction,
+        }
+
+
+def normalize(value: Any) -> str:
+    """Case- and whitespace-insensitive text of *value* ("" for missing)."""
+    if value is None:
+        return ""
+    return " ".join(str(value).casefold().split())
+
+
+def _jaccard(a: set, b: set) -> float:
+    return len(a & b) / len(a | b) if a or b else 1.0
+
+
+def _trigrams(words: List[str]) -> set:
+    padded = f"  {' '.join(words)} "
+    return {padded[i : i + 3] for i in range(len(padded) - 2)}
+
+
+def similarities(pairs: Sequence[Pair]) -> np.ndarray:
+    """Token-set, character trigram and TF-IDF cosine similarity of each pair.
+
+    All three ignore punctuation. Returns an array of shape (pairs, 3). The
+    TF-IDF weights are fitted on the strings of *pairs*, so words shared by
+    many of them count for less.
+    """
+    scores = np.zeros((len(pairs), 3))
+    for i, (truth, pred) in enumerate(pairs):
+        truth_words, pred_words = _WORD.findall(truth), _WORD.findall(pred)
+        scores[i, 0] = _jaccard(set(truth_words), set(pred_words))
+        scores[i, 1] = _jaccard(_trigrams(truth_words), _trigrams(pred_words))
+    try:
+        vectorizer = TfidfVectorizer(token_pattern=r"(?u)\b\w+\b")
+        vectorizer.fit([text for pair in pairs for text in pair])
+        truths = vectorizer.transform([truth for truth, _ in pairs])
+        preds = vectorizer.transform([pred for _, pred in pairs])
+        scores[:, 2] = np.asarray(truths.multiply(preds).sum(axis=1)).ravel()
+    except ValueError:
+        # No words at all: the cosine is as uninformative as the others.
+        scores[:, 2] = scores[:, 1]
+    return scores
+
+
+def local_verdicts(pairs: Sequence[Pair]) -> List[Optional[str]]:
+    """The local tier's verdict of each pair, or None where it is unsure."""
+    if not pairs:
+        return []
+    scores = similarities(pairs)
+    similar = scores.min(axis=1) >= LOCAL_SIMILAR
+    different = scores.max(axis=1) <= LOCAL_DIFFERENT
+    return [
+        MATCH if s else MISMATCH if d else None
+        for s, d in zip(similar.tolist(), different.tolist())
+    ]
+
+
+def comparison_key(model: str, pair: Pair) -> str:
+    """The cache key of a normalized *pair* judged by *model*."""
+    return canonical_hash([model, pair[0], pair[1]])
+
+
+def _lookup(model: str, pairs: List[Pair]) -> Dict[Pair, str]:
+    """Cached verdicts of *pairs*; a lookup error is treated as all misses."""
+    if not pairs:
+        return {}
+    by_key = {comparison_key(model, pair): pair for pair in pairs}
+    try:
+        entries = StringComparisonCache.find(
+            In(StringComparisonCache.cache_key, list(by_key))
+        ).to_list()
+    except Exception as e:
+        logger.warning("String comparison cache lookup failed: %s", e)
+        return {}
+    return {by_key[entry.cache_key]: entry.verdict for entry in entries}
+
+
+def _store(model: str, verdicts: Dict[Pair, str]) -> None:
+    """Cache *verdicts*; entries another worker stored first are kept."""
+    if not verdicts:
+        return
+    entries = [
+        StringComparisonCache(
+            cache_key=comparison_key(model, pair),
+            model=model,
+            truth=pair[0],
+            prediction=pair[1],
+            verdict=verdict,
+        )
+        for pair, verdict in verdicts.items()
+    ]
+    try:
+        StringComparisonCache.insert_many(entries, ordered=False)
+    except BulkWriteError:
+        logger.info("Some string comparisons were already cached")
+    except Exception as e:
+        logger.warning("Failed to cache string comparisons: %s", e)
+
+
+def build_request(pairs: Sequence[Pair], model: str = COMPARISON_MODEL) -> dict:
+    """Chat completion arguments asking for a verdict on every pair."""
+    listing = "\n\n".join(
+        f"Pair {i}:\nString 1: {truth}\nString 2: {prediction}"
+        for i, (truth, prediction) in enumerate(pairs)
+    )
+    prompt = (
+        "For each pair below: do the two strings convey the same message or "
+        f"are they similar?\n\n{listing}\n"
+    )
+    tool = {
+        "type": "function",
+        "function": {
+            "name": "compare_strings",
+            "description": (
+                "Determines, for each pair, if the two strings convey the same "
+                "message or if they are similar"
+            ),
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "comparisons": {
+                        "type": "array",
+                        "items": {
+                            "type": "object",
+                            "properties": {
+                                "pair": {"type": "integer"},
+                                "similarity_threshold": {
+                                    "type": "string",
+                                    "description": (
+                                        "How similar are the two strings and do "
+                                        "they convey the same message?"
+                                    ),
+                                    "enum": SIMILARITY_CATEGORIES,
+                                },
+                            },
+                            "additionalProperties": False,
+                            "required": ["pair", "similarity_threshold"],
+                        },
+                    }
+                },
+                "additionalProperties": False,
+                "required": ["comparisons"],
+            },
+            "strict": True,
+        },
+    }
+    return {
+        "model": model,
+        "messages": [{"role": "user", "content": [{"type": "text", "text": prompt}]}],
+        "response_format": {"type": "text"},
+        "reasoning_effort": COMPARISON_REASONING,
+        "tools": [tool],
+        "tool_choice": {"type": "function", "function": {"name": "compare_strings"}},
+    }
+
+
+def parse_verdicts(response: Any, n_pairs: int) -> Dict[int, str]:
+    """Verdicts by pair position, without invalid or out-of-range entries."""
+    arguments = json.loads(response.choices[0].message.tool_calls[0].function.arguments)
+    verdicts = {}
+    for item in arguments.get("comparisons", []):
+        position, verdict = item.get("pair"), item.get("similarity_threshold")
+        if isinstance(position, int) and 0 <= position < n_pairs:
+            if verdict in SIMILARITY_CATEGORIES:
+                verdicts.setdefault(position, verdict)
+    return verdicts
+
+
+def _usage(response: Any) -> Dict[str, int]:
+    usage = getattr(response, "usage", None)
+    details = getattr(usage, "prompt_tokens_details", None)
+    return {
+        "prompt_tokens": getattr(usage, "prompt_tokens", 0) or 0,
+        "completion_tokens": getattr(usage, "completion_tokens", 0) or 0,
+        "cached_tokens": getattr(details, "cached_tokens", 0) or 0,
+    }
+
+
+def _ask(
+    pairs: List[Pair],
+    model: str,
+    user: Optional[User],
+    credentials: Optional[LlmCredentials],
+) -> Dict[Pair, str]:
+    """Judge *pairs* in concurrent packed requests; drop unanswered ones."""
+    chunks = [
+        pairs[start : start + COMPARISON_BATCH_SIZE]
+        for start in range(0, len(pairs), COMPARISON_BATCH_SIZE)
+    ]
+
+    def job(chunk: List[Pair]):
+        async def run() -> Dict[Pair, str]:
+            client = get_async_openai(credentials.api_key if credentials else None)
+            response = await client.chat.completions.create(
+                **build_request(chunk, model)
+            )
+            if user is not None and credentials is not None:
+                await asyncio.to_thread(
+                    record_usage, user, credentials, model, **_usage(response)
+                )
+            verdicts = parse_verdicts(response, len(chunk))
+            return {chunk[i]: verdict for i, verdict in verdicts.items()}
+
+        return run
+
+    executor = AsyncExtractionExecutor(COMPARISON_CONCURRENCY)
+    answered: Dict[Pair, str] = {}
+    for chunk, outcome in zip(chunks, executor.run_blocking(map(job, chunks))):
+        if isinstance(outcome, BaseException):
+            logger.error(
+                "String comparison of %d pairs failed: %s", len(chunk), outcome
+            )
+            continue
+        answered.update(outcome)
+    return answered
+
+
+def compare_strings(
+    pairs: Iterable[Tuple[Any, Any]],
+    user: Optional[User] = None,
+    model: str = COMPARISON_MODEL,
+    stats: Optional[ComparisonStats] = None,
+) -> List[str]:
+    """
+    The similarity verdict of every (truth, prediction) pair, in order.
+
+    Credentials are resolved for *user* (and the budget checked) only when a
+    pair has to be asked; without a user the platform key is used unmetered.
+    How the distinct pairs were settled is added to *stats*, if given.
+    """
+    normalized = [(normalize(truth), normalize(pred)) for truth, pred in pairs]
+    distinct = [pair for pair in dict.fromkeys(normalized) if pair[0] != pair[1]]
+    verdicts: Dict[Pair, str] = {pair: MATCH for pair in normalized}
+    pending = []
+    for pair, verdict in zip(distinct, local_verdicts(distinct)):
+        if verdict is None:
+            del verdicts[pair]
+            pending.append(pair)
+        else:
+            verdicts[pair] = verdict
+    local = len(verdicts)
+
+    verdicts.update(_lookup(model, pending))
+    cached = len(verdicts) - local
+    pending = [pair for pair in pending if pair not in verdicts]
+    if stats is not None:
+        stats.pairs += local + cached + len(pending)
+        stats.local += local
+        stats.cached += cached
+        stats.asked += len(pending)
+    if pending:
+        credentials = resolve_and_check(user, "openai") if user is not None else None
+        answered = _ask(pending, model, user, credentials)
+        _store(model, answered)
+        verdicts.update(answered)
+        logger.info(
+            "Asked about %d string pairs (%d unanswered)",
+            len(pending),
+            len(pending) - len(answered),
+        )
+    return [verdicts.get(pair, FALLBACK) for pair in normalized]
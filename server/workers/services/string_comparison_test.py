@@ -0,0 +1,145 @@
+"""Tests for the cached, packed semantic string comparison.
+
+The OpenAI client answers from a lookup table and the cache is an in-memory
+dict behind the module's access helpers; credentials and metering are faked.
+"""
+
+import json
+from types import SimpleNamespace
+
+import pytest
+from workers.services import string_comparison as C
+
+JUDGE = {
+    ("a cat", "a dog"): "Different",
+    ("red car", "crimson car"): "Very similar",
+}
+
+
+class FakeCompletions:
+    """Answer every pair of a packed request from ``JUDGE``."""
+
+    def __init__(self, skip=()):
+        self.requests = []
+        self.skip = set(skip)
+
+    async def create(self, **kwargs):
+        self.requests.append(kwargs)
+        text = kwargs["messages"][0]["content"][0]["text"]
+        comparisons = []
+        for i, block in enumerate(text.split("Pair ")[1:]):
+            lines = block.splitlines()
+            pair = (lines[1][len("String 1: ") :], lines[2][len("String 2: ") :])
+            if pair not in self.skip:
+                comparisons.append(
+                    {"pair": i, "similarity_threshold": JUDGE.get(pair, "Similar")}
+                )
+        call = SimpleNamespace(
+            function=SimpleNamespace(arguments=json.dumps({"comparisons": comparisons}))
+        )
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(tool_calls=[call]))],
+            usage=SimpleNamespace(prompt_tokens=100, completion_tokens=10),
+        )
+
+
+@pytest.fixture
+def fake(monkeypatch):
+    cache, charges = {}, []
+    completions = FakeCompletions()
+    client = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+    monkeypatch.setattr(C, "get_async_openai", lambda api_key: client)
+    monkeypatch.setattr(
+        C, "_lookup", lambda model, pairs: {p: cache[p] for p in pairs if p in cache}
+    )
+    monkeypatch.setattr(C, "_store", lambda model, verdicts: cache.update(verdicts))
+    monkeypatch.setattr(
+        C,
+        "resolve_and_check",
+        lambda user, provider: SimpleNamespace(api_key="sk", is_byo=False),
+    )
+    monkeypatch.setattr(
+        C, "record_usage", lambda user, creds, model, **usage: charges.append(usage)
+    )
+    monkeypatch.setattr(C, "COMPARISON_BATCH_SIZE", 2)
+    return SimpleNamespace(cache=cache, charges=charges, completions=completions)
+
+
+@pytest.mark.unit
+def test_pairs_are_normalized_deduplicated_and_packed(fake):
+    pairs = [
+        ("A  cat", "a dog"),
+        ("a cat", "A DOG "),
+        ("Same", " same"),
+        ("red car", "crimson car"),
+        ("big red barn", "a big red barn"),
+        (None, None),
+    ]
+    stats = C.ComparisonStats()
+
+    verdicts = C.compare_strings(pairs, user=SimpleNamespace(id="u1"), stats=stats)
+
+    assert verdicts == [
+        "Different",
+        "Different",
+        "Very similar",
+        "Very similar",
+        "Similar",
+        "Very similar",
+    ]
+    # Three distinct pairs needed a model, two to a request; each is metered.
+    assert len(fake.completions.requests) == 2
+    assert len(fake.charges) == 2
+    assert set(fake.cache) == {
+        ("a cat", "a dog"),
+        ("red car", "crimson car"),
+        ("big red barn", "a big red barn"),
+    }
+    assert stats.as_dict() == {
+        "pairs": 5,
+        "resolved_locally": 2,
+        "cached": 0,
+        "asked": 3,
+        "local_fraction": 0.4,
+    }
+
+
+@pytest.mark.unit
+def test_cached_pairs_are_not_asked_again(fake):
+    C.compare_strings([("a cat", "a dog")])
+    fake.completions.requests.clear()
+
+    assert C.compare_strings([("A cat", "a  dog")]) == ["Different"]
+    assert fake.completions.requests == []
+
+
+@pytest.mark.unit
+def test_unanswered_pairs_fall_back_and_are_not_cached(fake):
+    fake.completions.skip = {("a cat", "a dog")}
+
+    assert C.compare_strings([("a cat", "a dog"), ("red car", "crimson car")]) == [
+        "Different",
+        "Very similar",
+    ]
+    assert ("a cat", "a dog") not in fake.cache
+
+
+@pytest.mark.unit
+def test_local_tier_settles_only_clear_pairs(fake):
+    pairs = [
+        ("randomized controlled trial", "Randomized, controlled trial."),
+        ("online survey", "laboratory experiment"),
+        ("significant effect", "no significant effect"),
+        ("", "something"),
+    ]
+
+    verdicts = C.local_verdicts([tuple(map(C.normalize, pair)) for pair in pairs])
+
+    assert verdicts == ["Very similar", "Very different", None, "Very different"]
+    assert C.compare_strings(pairs) == [
+        "Very similar",
+        "Very different",
+        "Similar",
+        "Very different",
+    ]
+    assert len(fake.completions.requests) == 1
@@ -4,21 +4,28 @@ Anthropic JSON Schema Strategy for Feature Extraction.
 Uses the Anthropic Messages API with a strict JSON schema output format.
 """
 
+import asyncio
 import json
 import logging
 from typing import Any, Dict, Optional
 
 import anthropic
-from workers.strategies.extraction_strategy import ExtractionStrategy
+from workers.services.async_clients import get_async_anthropic
+from workers.services.resource_pool import ANTHROPIC_FILES_BETA
+from workers.strategies.extraction_strategy import PROMPT_CACHE, JSONSchemaStrategy
 
 logger = logging.getLogger(__name__)
 
 
-class AnthropicJSONSchemaStrategy(ExtractionStrategy):
+class AnthropicJSONSchemaStrategy(JSONSchemaStrategy):
     """Extract features using the Anthropic Messages API with JSON Schema output."""
 
     MODEL = "claude-opus-4-8"
     MAX_TOKENS = 16000
+    BATCH_PROVIDER = "anthropic"
+    FILE_PROVIDER = "anthropic"
+    STALE_FILE_ERRORS = (anthropic.NotFoundError,)
+    BAD_REQUEST_ERRORS = (anthropic.BadRequestError,)
 
     def __init__(self, client, project_id, emitter, api_key=None):
         super().__init__(client, project_id, emitter, api_key=api_key)
@@ -32,6 +39,9 @@ class AnthropicJSONSchemaStrategy(ExtractionStrategy):
     def get_strategy_name(self) -> str:
         return "anthropic_json_schema"
 
+    def _files_client(self) -> anthropic.Anthropic:
+        return self.anthropic_client
+
     def extract(
         self,
         file_path: str,
@@ -53,8 +63,6 @@ class AnthropicJSONSchemaStrategy(ExtractionStrategy):
 
             if not silent:
                 self.emitter.emit_status(message="Reading file...", progress=20)
-            file_content = self._encode_file_to_base64(file_path)
-
             instructions = self._resolve_instructions(custom_prompt)
 
             if not silent:
@@ -62,45 +70,169 @@ class AnthropicJSONSchemaStrategy(ExtractionStrategy):
                     message="Calling Anthropic API...", progress=30
                 )
 
-            response = self.anthropic_client.messages.create(
-                model=self.MODEL,
-                max_tokens=self.MAX_TOKENS,
-                system=instructions,
-                messages=[
-                    {
-                        "role": "user",
-                        "content": [
-                            {
-                                "type": "document",
-                                "source": {
-                                    "type": "base64",
-                                    "media_type": "application/pdf",
-                                    "data": file_content,
-                                },
-                            }
-                        ],
-                    }
-                ],
-                output_config={
-                    "format": {
-                        "type": "json_schema",
-                        "schema": schema,
-                    }
-                },
-            )
+            output = self._run_schema(schema, instructions, file_path)
 
             if not silent:
                 self.emitter.emit_status(message="Processing response...", progress=60)
 
-            result = json.loads(response.content[0].text)
+            return output
 
-            return {
-                "result": result,
-                "model": self.MODEL,
-                "prompt_tokens": response.usage.input_tokens,
-                "completion_tokens": response.usage.output_tokens,
-            }
+        except Exception as e:
+            logger.error("Error in AnthropicJSONSchemaStrategy: %s", e)
+            raise
+
+    async def aextract(
+        self,
+        file_path: str,
+        custom_prompt: Optional[str] = None,
+        feature_ids: Optional[list[str]] = None,
+        silent: bool = False,
+    ) -> Dict[str, Any]:
+        """``extract`` on the async client; blocking prep runs in a thread."""
+
+        try:
+            if not silent:
+                self.emitter.emit_status(
+                    message="Starting Anthropic JSON Schema extraction...", progress=0
+                )
+
+            if not silent:
+                self.emitter.emit_status(message="Building JSON schema...", progress=10)
+            schema = await asyncio.to_thread(self._build_json_schema, feature_ids)
+
+            if not silent:
+                self.emitter.emit_status(message="Reading file...", progress=20)
+            instructions = await asyncio.to_thread(
+                self._resolve_instructions, custom_prompt
+            )
+
+            if not silent:
+                self.emitter.emit_status(
+                    message="Calling Anthropic API...", progress=30
+                )
+
+            output = await self._arun_schema(schema, instructions, file_path)
+
+            if not silent:
+                self.emitter.emit_status(message="Processing response...", progress=60)
+
+            return output
 
         except Exception as e:
             logger.error("Error in AnthropicJSONSchemaStrategy: %s", e)
             raise
+
+    def _call(self, schema: dict, instructions: str, file_path: str) -> Dict[str, Any]:
+        response = self._send_request(
+            file_path,
+            lambda file_id: self.build_request(
+                schema, instructions, file_path, file_id=file_id
+            ),
+            lambda request: _messages(self.anthropic_client, request).create(
+                **request
+            ),
+        )
+        return self._output(response.content[0].text, response.usage)
+
+    async def _acall(
+        self, schema: dict, instructions: str, file_path: str
+    ) -> Dict[str, Any]:
+        client = get_async_anthropic(self.api_key)
+        response = await self._asend_request(
+            file_path,
+            lambda file_id: self.build_request(
+                schema, instructions, file_path, file_id=file_id
+            ),
+            lambda request: _messages(client, request).create(**request),
+        )
+        return self._output(response.content[0].text, response.usage)
+
+    def build_request(
+        self,
+        schema: dict,
+        instructions: str,
+        file_path: str,
+        file_id: Optional[str] = None,
+    ) -> dict:
+        """Build the Messages API parameters for one paper.
+
+        The paper is sent as preprocessed text when ``paper_text`` is set, else
+        referenced by *file_id* (Files API, beta) when given, else inlined as
+        base64. The inline form is also used as ``params`` of an Anthropic
+        Message Batches request.
+
+        With ``PROMPT_CACHE`` on and ``reuses_paper`` set, a cache breakpoint
+        after the document caches the system prompt and the paper, so later
+        requests for the same paper and instructions read them from the prompt
+        cache. A paper extracted once is not marked: the write costs more than
+        plain input and would never be read back.
+        """
+        if self.paper_text is not None:
+            source = {
+                "type": "text",
+                "media_type": "text/plain",
+                "data": self.paper_text,
+            }
+        elif file_id:
+            source = {"type": "file", "file_id": file_id}
+        else:
+            source = {
+                "type": "base64",
+                "media_type": "application/pdf",
+                "data": self._encode_file_to_base64(file_path),
+            }
+        document = {"type": "document", "source": source}
+        if PROMPT_CACHE and self.reuses_paper:
+            document["cache_control"] = {"type": "ephemeral"}
+        request = {
+            "model": self.MODEL,
+            "max_tokens": self.MAX_TOKENS,
+            "system": instructions,
+            "messages": [{"role": "user", "content": [document]}],
+            "output_config": {
+                "format": {
+                    "type": "json_schema",
+                    "schema": schema,
+                }
+            },
+        }
+        if file_id:
+            request["betas"] = [ANTHROPIC_FILES_BETA]
+        return request
+
+    @classmethod
+    def parse_response_body(cls, body: dict) -> Dict[str, Any]:
+        """Parse a raw Messages API body (a batch result's ``message``)."""
+        text = next(
+            (
+                block.get("text", "")
+                for block in body.get("content", [])
+                if block.get("type") == "text"
+            ),
+            "",
+        )
+        return cls._output(text, body.get("usage"))
+
+    @classmethod
+    def _output(cls, text: str, usage: Any) -> Dict[str, Any]:
+        """Parsed result and token usage.
+
+        Anthropic's ``input_tokens`` excludes cache reads and writes, so
+        ``prompt_tokens`` adds them back to report the call's total input.
+        """
+        cached = cls._usage_count(usage, "cache_read_input_tokens")
+        written = cls._usage_count(usage, "cache_creation_input_tokens")
+        uncached = cls._usage_count(usage, "input_tokens")
+        return {
+            "result": json.loads(text),
+            "model": cls.MODEL,
+            "prompt_tokens": uncached + cached + written,
+            "completion_tokens": cls._usage_count(usage, "output_tokens"),
+            "cached_prompt_tokens": cached,
+            "cache_write_tokens": written,
+        }
+
+
+def _messages(client, request: dict):
+    """The Messages endpoint for *request*; file references need the beta."""
+    return client.beta.messages if "betas" in request else client.messages
@@ -0,0 +1,58 @@
+"""Tests for AnthropicJSONSchemaStrategy request building and usage parsing."""
+
+import pytest
+from workers.strategies import anthropic_json_schema_strategy as A
+from workers.strategies.anthropic_json_schema_strategy import (
+    AnthropicJSONSchemaStrategy,
+)
+
+SCHEMA = {"type": "object", "properties": {}, "additionalProperties": False}
+
+
+def _strategy():
+    return AnthropicJSONSchemaStrategy(None, "project-1", None, api_key="sk-test")
+
+
+@pytest.mark.unit
+def test_request_marks_a_cache_breakpoint_only_when_the_paper_is_reused(
+    monkeypatch,
+):
+    strategy = _strategy()
+    strategy.paper_text = "paper text"
+
+    request = strategy.build_request(SCHEMA, "instructions", "paper.pdf")
+
+    assert request["system"] == "instructions"
+    (document,) = request["messages"][0]["content"]
+    assert document["type"] == "document"
+    # A one-off extraction would pay for a cache write it never reads.
+    assert "cache_control" not in document
+
+    strategy.reuses_paper = True
+    request = strategy.build_request(SCHEMA, "instructions", "paper.pdf")
+    document = request["messages"][0]["content"][0]
+    assert document["cache_control"] == {"type": "ephemeral"}
+
+    monkeypatch.setattr(A, "PROMPT_CACHE", False)
+    request = strategy.build_request(SCHEMA, "instructions", "paper.pdf")
+    assert "cache_control" not in request["messages"][0]["content"][0]
+
+
+@pytest.mark.unit
+def test_usage_adds_cache_reads_and_writes_to_the_prompt_total():
+    body = {
+        "content": [{"type": "text", "text": "{}"}],
+        "usage": {
+            "input_tokens": 10,
+            "cache_read_input_tokens": 900,
+            "cache_creation_input_tokens": 0,
+            "output_tokens": 20,
+        },
+    }
+
+    out = AnthropicJSONSchemaStrategy.parse_response_body(body)
+
+    assert out["prompt_tokens"] == 910
+    assert out["cached_prompt_tokens"] == 900
+    assert out["cache_write_tokens"] == 0
+    assert out["completion_tokens"] == 20
@@ -5,18 +5,21 @@ Assistant API Strategy for Feature Extraction
 import json
 import logging
 import time
-from typing import Any, Dict, Optional
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 
+from database.models.provider_resources import (
+    RESOURCE_ASSISTANT,
+    RESOURCE_VECTOR_STORE,
+)
 from gpt_assistant import (
-    build_openai_feature_functions,
-    build_parent_objects,
+    DEFAULT_ASSISTANT_PROMPT,
     check_output_format,
-    create_temporary_assistant,
-    enforce_additional_properties,
-    get_all_features,
-    update_assistant,
+    openai_feature_function,
     upload_file_to_vector_store,
 )
+from openai import NotFoundError
+from workers.services.resource_pool import ResourcePool
 from workers.strategies.extraction_strategy import ExtractionStrategy
 
 logger = logging.getLogger(__name__)
@@ -25,133 +28,209 @@ logger = logging.getLogger(__name__)
 class AssistantAPIStrategy(ExtractionStrategy):
     """Strategy for extracting features using OpenAI Assistant API."""
 
-    # The temporary assistant is created with this model (see
-    # gpt_assistant.create_temporary_assistant). Kept here so metering can price
-    # the call; keep the two in sync.
+    # The pooled assistant is created with this model; metering prices the
+    # call with it too.
     MODEL = "gpt-4.1"
 
     def get_strategy_name(self) -> str:
         return "assistant_api"
 
+    # Run polling backs off from POLL_INITIAL_SECONDS, doubling up to
+    # POLL_MAX_SECONDS, and starts over whenever the run changes state.
+    POLL_INITIAL_SECONDS = 0.25
+    POLL_MAX_SECONDS = 5.0
+    END_STATES = {"expired", "completed", "failed", "incomplete", "canceled"}
+
     def extract(
         self,
         file_path: str,
         custom_prompt: Optional[str] = None,
+        feature_ids: Optional[List[str]] = None,
     ) -> Dict[str, Any]:
-        """Extract features using Assistant API with function calling."""
+        """Extract features using Assistant API with function calling.
+
+        The output includes ``timings``: seconds spent in each phase (setup
+        steps, each run status, answering tool calls) for latency analysis.
+        """
 
         vector_store = None
-        assistant = None
         thread = None
+        timings: Dict[str, float] = {}
 
         try:
             self.emitter.emit_status(message="Starting task...", progress=0)
 
-            feature_list, feature_obj = get_all_features(self.project_id)
-
             self.emitter.emit_status(
                 message="Building feature functions...", progress=5
             )
 
-            functions = build_openai_feature_functions(feature_list, feature_obj)
-
-            self.emitter.emit_status(
-                message="Uploading file to vector store...", progress=10
-            )
-            vector_store = upload_file_to_vector_store(self.client, file_path)
-
-            self.emitter.emit_status(message="Creating assistant...", progress=15)
-
-            assistant = create_temporary_assistant(self.client, custom_prompt)
-
-            schema = self._build_json_schema(feature_list, feature_obj)
-
-            updated_assistant = update_assistant(
-                self.client, assistant.id, vector_store, functions, schema=schema
-            )
-
-            self.emitter.emit_status(message="Running assistant...", progress=20)
-
-            thread = self.client.beta.threads.create(
-                messages=[
-                    {
-                        "role": "user",
-                        "content": (
-                            "Please use the defined function to extract features from the paper."
-                            "Use the tool call `extract_features` to extract the features "
-                            f"which would conform to the following schema: {json.dumps(functions)}"
-                        ),
-                    }
-                ]
-            )
+            with _phase(timings, "schema"):
+                # The function parameters and response format share one schema.
+                compiled = self._compiled_schema(feature_ids)
+                schema = compiled.schema
+                functions = openai_feature_function(schema)
 
-            run = self.client.beta.threads.runs.create_and_poll(
-                assistant_id=updated_assistant.id,
-                thread_id=thread.id,
-            )
+            pool = ResourcePool(self.client, self.api_key, self.byo_user_id)
+            instructions = custom_prompt or DEFAULT_ASSISTANT_PROMPT
 
-            # Process run status and handle tool calls
-            end_states = ["expired", "completed", "failed", "incomplete", "canceled"]
-            while run.status not in end_states:
-                logger.info("Assistant run status: %s", run.status)
-                run = self.client.beta.threads.runs.retrieve(
-                    thread_id=run.thread_id, run_id=run.id
+            for attempt in range(2):
+                self.emitter.emit_status(
+                    message="Uploading file to vector store...", progress=10
                 )
-                if run.status in end_states:
-                    break
-                if run.status == "requires_action":
-                    run = self.client.beta.threads.runs.submit_tool_outputs(
-                        thread_id=run.thread_id,
-                        run_id=run.id,
-                        tool_outputs=[
-                            {
-                                "tool_call_id": run.required_action.submit_tool_outputs.tool_calls[
-                                    0
-                                ].id,
-                                "output": run.required_action.submit_tool_outputs.tool_calls[
-                                    0
-                                ].function.arguments,
-                            }
-                        ],
+                with _phase(timings, "upload"):
+                    if self.file_hash:
+                        vector_store_id = pool.vector_store(self.file_hash, file_path)
+                    else:
+                        # No content hash: nothing to key a pooled store by.
+                        vector_store = vector_store or upload_file_to_vector_store(
+                            self.client, file_path
+                        )
+                        vector_store_id = vector_store.id
+
+                self.emitter.emit_status(message="Creating assistant...", progress=15)
+
+                with _phase(timings, "assistant_setup"):
+                    assistant_id = pool.assistant(
+                        self.MODEL,
+                        instructions,
+                        compiled.schema_hash,
+                        functions,
+                        schema,
                     )
-                time.sleep(10)
+
+                self.emitter.emit_status(message="Running assistant...", progress=20)
+
+                try:
+                    with _phase(timings, "run_create"):
+                        thread = self.client.beta.threads.create(
+                            messages=[
+                                {
+                                    "role": "user",
+                                    "content": (
+                                        "Please use the defined function to extract features from the paper."
+                                        "Use the tool call `extract_features` to extract the features "
+                                        f"which would conform to the following schema: {json.dumps(functions)}"
+                                    ),
+                                }
+                            ],
+                            # Attached per thread so the pooled assistant stays
+                            # paper-agnostic.
+                            tool_resources={
+                                "file_search": {"vector_store_ids": [vector_store_id]}
+                            },
+                        )
+
+                        run = self.client.beta.threads.runs.create(
+                            assistant_id=assistant_id,
+                            thread_id=thread.id,
+                        )
+                    break
+                except NotFoundError:
+                    # A pooled object is gone provider-side (deleted by hand or
+                    # expired early). Forget it and build a fresh one, once.
+                    if attempt:
+                        raise
+                    logger.warning("Pooled assistant resources missing; recreating")
+                    pool.invalidate(RESOURCE_ASSISTANT, assistant_id)
+                    if self.file_hash:
+                        pool.invalidate(RESOURCE_VECTOR_STORE, vector_store_id)
+                    if thread:
+                        self.client.beta.threads.delete(thread_id=thread.id)
+                        thread = None
+
+            run = self._wait_for_run(run, timings)
 
             self.emitter.emit_status(message="Assistant run completed.", progress=60)
 
-            messages = self.client.beta.threads.messages.list(thread_id=run.thread_id)
+            with _phase(timings, "fetch_output"):
+                messages = self.client.beta.threads.messages.list(
+                    thread_id=run.thread_id
+                )
             tool_outputs = json.loads(messages.data[0].content[0].text.value)
 
             check_output_format(tool_outputs)
 
+            logger.info(
+                "Assistant run %s latency by phase: %s",
+                run.id,
+                {k: round(v, 3) for k, v in timings.items()},
+            )
             return {
                 "result": tool_outputs,
                 "model": self.MODEL,
                 "prompt_tokens": run.usage.prompt_tokens if run.usage else 0,
                 "completion_tokens": run.usage.completion_tokens if run.usage else 0,
+                "timings": timings,
             }
 
         except Exception as e:
             logger.error("Error in AssistantAPIStrategy: %s", e)
             raise
         finally:
-            self._cleanup(vector_store, assistant, thread)
-
-    def _build_json_schema(self, feature_list: list, feature_obj: dict) -> dict:
-        """Build the JSON schema from features."""
-        properties = build_parent_objects(feature_list, feature_obj)
+            self._cleanup(vector_store, thread)
+
+    def _wait_for_run(self, run, timings: Dict[str, float]):
+        """Poll *run* to a terminal state, answering tool calls as they arrive.
+
+        Time is attributed to the status the run was in (``run_queued``,
+        ``run_in_progress``, ...) and to ``tool_calls`` for submitting outputs.
+        """
+        runs = self.client.beta.threads.runs
+        delay = self.POLL_INITIAL_SECONDS
+        status, since = run.status, time.monotonic()
+
+        while run.status not in self.END_STATES:
+            if run.status == "requires_action":
+                with _phase(timings, "tool_calls"):
+                    run = runs.submit_tool_outputs(
+                        thread_id=run.thread_id,
+                        run_id=run.id,
+                        tool_outputs=[
+                            # The function's "output" is its own arguments: the
+                            # extracted features are what we want back.
+                            {"tool_call_id": call.id, "output": call.function.arguments}
+                            for call in run.required_action.submit_tool_outputs.tool_calls
+                        ],
+                    )
+                status, since = run.status, time.monotonic()
+                delay = self.POLL_INITIAL_SECONDS
+                continue
 
-        schema = {
-            "type": "object",
-            "properties": properties,
-            "required": ["paper"],
-            "additionalProperties": False,
-        }
+            time.sleep(delay)
+            run = runs.retrieve(thread_id=run.thread_id, run_id=run.id)
+            if run.status != status:
+                logger.info("Assistant run status: %s", run.status)
+                now = time.monotonic()
+                _add(timings, f"run_{status}", now - since)
+                status, since = run.status, now
+                delay = self.POLL_INITIAL_SECONDS
+            else:
+                delay = min(delay * 2, self.POLL_MAX_SECONDS)
 
-        # Ensure all objects have additionalProperties: False
-        return enforce_additional_properties(schema)
+        _add(timings, f"run_{status}", time.monotonic() - since)
+        return run
 
-    def _cleanup(self, vector_store, assistant, thread):
-        """Clean up resources."""
+    def cache_inputs(
+        self,
+        custom_prompt: Optional[str] = None,
+        feature_ids: Optional[List[str]] = None,
+    ) -> Tuple[str, str]:
+        """Return the schema hash and the temporary assistant's instructions.
+
+        The assistant is not given the project prompt fallback the JSON-schema
+        strategies use; it runs on ``custom_prompt`` or its own default.
+        """
+        return (
+            self._compiled_schema(feature_ids).schema_hash,
+            custom_prompt or DEFAULT_ASSISTANT_PROMPT,
+        )
+
+    def _cleanup(self, vector_store, thread):
+        """Clean up per-run resources.
+
+        Pooled assistants and vector stores are left in place for reuse; only
+        the thread and an unpooled vector store are deleted.
+        """
         self.emitter.emit_status(message="Cleaning up resources...", progress=70)
 
         try:
@@ -175,8 +254,19 @@ class AssistantAPIStrategy(ExtractionStrategy):
             if thread:
                 self.client.beta.threads.delete(thread_id=thread.id)
 
-            if assistant:
-                self.client.beta.assistants.delete(assistant.id)
-
         except Exception as e:
             logger.error("Error during cleanup: %s", e)
+
+
+def _add(timings: Dict[str, float], name: str, seconds: float) -> None:
+    timings[name] = timings.get(name, 0.0) + seconds
+
+
+@contextmanager
+def _phase(timings: Dict[str, float], name: str) -> Iterator[None]:
+    """Accumulate the wall-clock time of the block into ``timings[name]``."""
+    start = time.monotonic()
+    try:
+        yield
+    finally:
+        _add(timings, name, time.monotonic() - start)
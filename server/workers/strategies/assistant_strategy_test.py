@@ -0,0 +1,187 @@
+"""Tests for AssistantAPIStrategy's run handling with a fake Assistants client.
+
+The schema lookup and the resource pool are faked; the run loop (backoff,
+tool-call answers, phase timings) and resource wiring run for real.
+"""
+
+import json
+from types import SimpleNamespace
+
+import httpx
+import pytest
+from workers.strategies import assistant_strategy as S
+
+RESULT = {"paper": {"title": "T"}}
+
+
+class FakeEmitter:
+    def emit_status(self, **kwargs):
+        pass
+
+
+def _run(status, **extra):
+    return SimpleNamespace(
+        id="run-1",
+        thread_id="thread-1",
+        status=status,
+        usage=SimpleNamespace(prompt_tokens=10, completion_tokens=2),
+        **extra,
+    )
+
+
+def _tool_call(call_id):
+    return SimpleNamespace(
+        id=call_id, function=SimpleNamespace(arguments=json.dumps(RESULT))
+    )
+
+
+class FakeAssistantsClient:
+    """Walk a run through *statuses*, one per ``retrieve`` call."""
+
+    def __init__(self, statuses):
+        self.statuses = list(statuses)
+        self.submitted = []
+        self.threads = []
+        self.deleted_threads = []
+        runs = SimpleNamespace(
+            create=self._create_run,
+            retrieve=self._retrieve,
+            submit_tool_outputs=self._submit,
+        )
+        message = SimpleNamespace(
+            content=[SimpleNamespace(text=SimpleNamespace(value=json.dumps(RESULT)))]
+        )
+        self.beta = SimpleNamespace(
+            threads=SimpleNamespace(
+                create=self._create_thread,
+                runs=runs,
+                messages=SimpleNamespace(list=lambda **kw: SimpleNamespace(data=[message])),
+                delete=lambda thread_id: self.deleted_threads.append(thread_id),
+            ),
+        )
+
+    def _create_thread(self, **kwargs):
+        self.threads.append(kwargs)
+        return SimpleNamespace(id=f"thread-{len(self.threads)}")
+
+    def _create_run(self, assistant_id, thread_id):
+        if assistant_id == "gone":
+            raise S.NotFoundError(
+                "No assistant found",
+                response=httpx.Response(404, request=httpx.Request("POST", "http://x")),
+                body=None,
+            )
+        return _run("queued")
+
+    def _retrieve(self, thread_id, run_id):
+        status = self.statuses.pop(0)
+        if status == "requires_action":
+            action = SimpleNamespace(
+                submit_tool_outputs=SimpleNamespace(
+                    tool_calls=[_tool_call("call-1"), _tool_call("call-2")]
+                )
+            )
+            return _run(status, required_action=action)
+        return _run(status)
+
+    def _submit(self, thread_id, run_id, tool_outputs):
+        self.submitted.append(tool_outputs)
+        return _run("in_progress")
+
+
+class FakePool:
+    """Hand out fixed ids; ``assistant_ids`` in order, repeating the last."""
+
+    def __init__(self, client, api_key, user_id=None):
+        self.assistant_ids = list(FakePool.assistant_ids)
+        self.invalidated = []
+        FakePool.last = self
+
+    def assistant(self, model, instructions, schema_hash, function, schema):
+        if len(self.assistant_ids) > 1:
+            return self.assistant_ids.pop(0)
+        return self.assistant_ids[0]
+
+    def vector_store(self, file_hash, file_path):
+        return f"vs-{file_hash}"
+
+    def invalidate(self, kind, resource_id):
+        self.invalidated.append((kind, resource_id))
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    recorded = []
+    monkeypatch.setattr(S.time, "sleep", recorded.append)
+    monkeypatch.setattr(
+        S.AssistantAPIStrategy,
+        "_compiled_schema",
+        lambda self, ids=None: SimpleNamespace(schema={}, schema_hash="s"),
+    )
+    FakePool.assistant_ids = ["asst-1"]
+    monkeypatch.setattr(S, "ResourcePool", FakePool)
+    return recorded
+
+
+def _strategy(client, file_hash="h1"):
+    strategy = S.AssistantAPIStrategy(client, "p1", FakeEmitter())
+    strategy.file_hash = file_hash
+    return strategy
+
+
+@pytest.mark.unit
+def test_run_polling_backs_off_and_resets_on_status_change(sleeps):
+    statuses = ["queued", "in_progress"] + ["in_progress"] * 6 + ["completed"]
+    client = FakeAssistantsClient(statuses)
+    strategy = _strategy(client)
+
+    out = strategy.extract("paper.pdf")
+
+    assert out["result"] == RESULT
+    # The delay doubles while the status holds, resets when it changes
+    # (queued -> in_progress) and never exceeds the cap.
+    assert sleeps == [0.25, 0.5, 0.25, 0.5, 1.0, 2.0, 4.0, 5.0, 5.0]
+    assert {"schema", "upload", "assistant_setup", "run_create"} <= set(out["timings"])
+    assert {"run_queued", "run_in_progress", "fetch_output"} <= set(out["timings"])
+
+
+@pytest.mark.unit
+def test_every_tool_call_is_answered_without_waiting(sleeps):
+    client = FakeAssistantsClient(["requires_action", "completed"])
+    strategy = _strategy(client)
+
+    out = strategy.extract("paper.pdf")
+
+    (outputs,) = client.submitted
+    assert [o["tool_call_id"] for o in outputs] == ["call-1", "call-2"]
+    assert json.loads(outputs[0]["output"]) == RESULT
+    # One sleep before the first retrieve, one after submitting; no 10s waits.
+    assert sleeps == [0.25, 0.25]
+    assert "tool_calls" in out["timings"]
+
+
+@pytest.mark.unit
+def test_pooled_vector_store_is_attached_to_the_thread(sleeps):
+    client = FakeAssistantsClient(["completed"])
+
+    _strategy(client).extract("paper.pdf")
+
+    (thread,) = client.threads
+    assert thread["tool_resources"] == {"file_search": {"vector_store_ids": ["vs-h1"]}}
+    # Only the per-run thread is cleaned up; pooled objects stay.
+    assert client.deleted_threads == ["thread-1"]
+
+
+@pytest.mark.unit
+def test_missing_pooled_assistant_is_recreated_once(sleeps):
+    FakePool.assistant_ids = ["gone", "asst-2"]
+    client = FakeAssistantsClient(["completed"])
+
+    out = _strategy(client).extract("paper.pdf")
+
+    assert out["result"] == RESULT
+    assert FakePool.last.invalidated == [
+        ("assistant", "gone"),
+        ("vector_store", "vs-h1"),
+    ]
+    assert client.deleted_threads == ["thread-1", "thread-2"]
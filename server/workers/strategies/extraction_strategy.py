@@ -2,24 +2,53 @@
 Extraction strategy abstract base class.
 """
 
+import asyncio
 import base64
+import hashlib
+import logging
+import os
 from abc import ABC, abstractmethod
-from typing import Any, Dict, List, Optional
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
 
 from database.models.projects import Project
-from gpt_assistant import (
-    build_parent_objects,
-    enforce_additional_properties,
-    get_all_features,
-    get_features_by_ids,
-)
+from database.models.provider_resources import RESOURCE_FILE
 from openai import OpenAI
+from services.schema_registry import CompiledSchema, get_compiled_schema
+from services.schema_sharding import SHARD_MAX_FEATURES, merge_results, shard_schema
+from workers.services.resource_pool import PROVIDER_FILE_UPLOADS, ResourcePool
 from workers.services.socket_emitter import SocketEmmiter
 
+logger = logging.getLogger(__name__)
+
+# Set to "off" to stop marking requests for provider prompt caching. Requests
+# put the instructions and the paper first, so repeated extractions of the same
+# paper bill that prefix at the cached rate. OpenAI caches for free, so its
+# requests always carry a cache key. Anthropic charges 1.25x input to write the
+# cache, so its breakpoint is only set when the caller sets ``reuses_paper``.
+PROMPT_CACHE = os.getenv("PROMPT_CACHE", "on").lower() not in {"0", "false", "off"}
+
 
 class ExtractionStrategy(ABC):
     """Abstract base class for different extraction strategies."""
 
+    # Provider batch API this strategy can submit to ("openai" / "anthropic").
+    # Strategies that set it implement ``build_request(schema, instructions,
+    # file_path)`` and ``parse_response_body(body)``; see
+    # ``workers/extraction_batch_task.py``.
+    BATCH_PROVIDER: Optional[str] = None
+
+    # Files API the strategy uploads papers to ("openai" / "anthropic") so
+    # requests can reference them by id. None always inlines the paper.
+    # Strategies that set it accept ``file_id`` in ``build_request``.
+    FILE_PROVIDER: Optional[str] = None
+    # Provider errors that mean a referenced file is gone; the request is
+    # then retried once with the paper inline.
+    STALE_FILE_ERRORS: Tuple[type, ...] = ()
+    # Provider 400s; one only counts as a stale file when its code, param or
+    # message points at the file reference (not a bad schema or a long input).
+    BAD_REQUEST_ERRORS: Tuple[type, ...] = ()
+
     def __init__(
         self,
         client: OpenAI,
@@ -34,6 +63,20 @@ class ExtractionStrategy(ABC):
         # client (e.g. Anthropic) must use this rather than an env default so
         # bring-your-own keys and metering stay consistent.
         self.api_key = api_key
+        # Set by the caller when known. ``file_hash`` identifies the paper
+        # bytes so provider-side uploads can be reused; ``byo_user_id`` is the
+        # owner of ``api_key`` when it is a bring-your-own key, so background
+        # jobs can resolve the same key later (e.g. to delete pooled
+        # resources).
+        self.file_hash: Optional[str] = None
+        self.byo_user_id: Optional[str] = None
+        # Preprocessed paper text (see ``services.pdf_preprocess``). Strategies
+        # that can send text use it instead of the file when set.
+        self.paper_text: Optional[str] = None
+        # Set by callers that send the same paper again within minutes (e.g.
+        # repeatability runs); only then is paying to write a prompt cache
+        # worth it.
+        self.reuses_paper = False
 
     @abstractmethod
     def extract(
@@ -45,6 +88,19 @@ class ExtractionStrategy(ABC):
         """Extract features from the provided file."""
         pass
 
+    async def aextract(
+        self,
+        file_path: str,
+        custom_prompt: Optional[str] = None,
+        **kwargs: Any,
+    ) -> Dict[str, Any]:
+        """Async variant of ``extract``.
+
+        Strategies with an async provider client override this; the default
+        runs the blocking ``extract`` in a worker thread.
+        """
+        return await asyncio.to_thread(self.extract, file_path, custom_prompt, **kwargs)
+
     @abstractmethod
     def get_strategy_name(self) -> str:
         """Return the name of this strategy."""
@@ -53,26 +109,138 @@ class ExtractionStrategy(ABC):
     # ------------------------------------------------------------------
     # Shared helpers for JSON-schema based strategies
     # ------------------------------------------------------------------
+    def _compiled_schema(
+        self, feature_ids: Optional[List[str]] = None
+    ) -> CompiledSchema:
+        """Fetch the compiled schema of the requested features or project."""
+        return get_compiled_schema(
+            project_id=self.project_id, feature_ids=feature_ids
+        )
+
     def _build_json_schema(self, feature_ids: Optional[List[str]] = None) -> dict:
         """Resolve the project/feature set and build a strict JSON schema."""
-        if feature_ids:
-            feature_list, feature_obj = get_features_by_ids(feature_ids)
-        elif self.project_id:
-            feature_list, feature_obj = get_all_features(self.project_id)
-        else:
-            raise ValueError("Either project_id or feature_ids must be provided")
-
-        if not feature_list:
-            raise ValueError("No features found for extraction")
-
-        properties = build_parent_objects(feature_list, feature_obj)
-        schema = {
-            "type": "object",
-            "properties": properties,
-            "required": ["paper"],
-            "additionalProperties": False,
-        }
-        return enforce_additional_properties(schema)
+        return self._compiled_schema(feature_ids).schema
+
+    def cache_inputs(
+        self,
+        custom_prompt: Optional[str] = None,
+        feature_ids: Optional[List[str]] = None,
+    ) -> Tuple[str, str]:
+        """Return the ``(schema_hash, instructions)`` ``extract`` would send.
+
+        Together with the paper hash and ``MODEL`` these fully determine the
+        provider request, so they make up the extraction cache fingerprint.
+        """
+        return (
+            self._compiled_schema(feature_ids).schema_hash,
+            self._resolve_instructions(custom_prompt),
+        )
+
+    # ------------------------------------------------------------------
+    # Paper upload: reference by provider file id, fall back to inline
+    # ------------------------------------------------------------------
+    def _files_client(self) -> Any:
+        """The client of ``FILE_PROVIDER`` used for uploads."""
+        return self.client
+
+    def _file_pool(self) -> ResourcePool:
+        return ResourcePool(
+            self._files_client(),
+            self.api_key,
+            self.byo_user_id,
+            provider=self.FILE_PROVIDER,
+        )
+
+    def _provider_file_id(self, file_path: str) -> Optional[str]:
+        """The paper's provider file id (uploaded once per ``file_hash``).
+
+        Returns None, meaning "send the paper inline", when the strategy has no
+        Files API, the paper hash is unknown, uploads are disabled or fail, or
+        the paper is sent as text.
+        """
+        if self.paper_text is not None:
+            return None
+        if not (self.FILE_PROVIDER and self.file_hash and PROVIDER_FILE_UPLOADS):
+            return None
+        try:
+            return self._file_pool().file(self.file_hash, file_path)
+        except Exception as e:
+            logger.warning(
+                "Upload to %s failed, sending the paper inline: %s",
+                self.FILE_PROVIDER,
+                e,
+            )
+            return None
+
+    def _is_stale_file_error(self, error: Exception, file_id: str) -> bool:
+        """Whether *error* says the referenced file *file_id* is unusable."""
+        if isinstance(error, self.STALE_FILE_ERRORS):
+            return True
+        if not isinstance(error, self.BAD_REQUEST_ERRORS):
+            return False
+        body = getattr(error, "body", None)
+        details = body.get("error", body) if isinstance(body, dict) else {}
+        if not isinstance(details, dict):
+            details = {}
+        code = str(details.get("code") or getattr(error, "code", None) or "")
+        param = str(details.get("param") or getattr(error, "param", None) or "")
+        names_file = "file" in code.lower() or "file" in param.lower()
+        return names_file or file_id in str(error)
+
+    def _send_request(
+        self,
+        file_path: str,
+        build: Callable[[Optional[str]], dict],
+        send: Callable[[dict], Any],
+    ) -> Any:
+        """``send(build(file_id))``; retried inline if the file id is stale."""
+        file_id = self._provider_file_id(file_path)
+        try:
+            return send(build(file_id))
+        except Exception as e:
+            if not file_id or not self._is_stale_file_error(e, file_id):
+                raise
+            self._file_pool().invalidate(RESOURCE_FILE, file_id)
+            return send(build(None))
+
+    async def _asend_request(
+        self,
+        file_path: str,
+        build: Callable[[Optional[str]], dict],
+        send: Callable[[dict], Awaitable[Any]],
+    ) -> Any:
+        """Async ``_send_request``; uploading and building run in a thread."""
+        file_id = await asyncio.to_thread(self._provider_file_id, file_path)
+        try:
+            return await send(await asyncio.to_thread(build, file_id))
+        except Exception as e:
+            if not file_id or not self._is_stale_file_error(e, file_id):
+                raise
+            await asyncio.to_thread(
+                self._file_pool().invalidate, RESOURCE_FILE, file_id
+            )
+            return await send(await asyncio.to_thread(build, None))
+
+    # ------------------------------------------------------------------
+    # Prompt caching
+    # ------------------------------------------------------------------
+    def _prompt_cache_key(self) -> Optional[str]:
+        """A per-paper routing key for the provider prompt cache, if known."""
+        if not (PROMPT_CACHE and self.file_hash):
+            return None
+        return "paper-" + hashlib.sha256(self.file_hash.encode()).hexdigest()[:32]
+
+    @staticmethod
+    def _usage_count(usage: Any, *path: str) -> int:
+        """Read a token count from an SDK usage object or a raw usage dict."""
+        for name in path:
+            if usage is None:
+                return 0
+            if isinstance(usage, dict):
+                usage = usage.get(name)
+            else:
+                usage = getattr(usage, name, None)
+        return usage or 0
 
     def _encode_file_to_base64(self, file_path: str) -> str:
         """Encode file content to base64."""
@@ -98,3 +266,76 @@ class ExtractionStrategy(ABC):
             "Your response should be in JSON format that strictly adheres to the schema. "
             "Extract all relevant information from the paper that matches the requested features."
         )
+
+
+class JSONSchemaStrategy(ExtractionStrategy):
+    """Base class for strategies that extract with a strict JSON schema.
+
+    Subclasses implement ``_call``/``_acall`` (one provider call for a schema);
+    ``_run_schema`` runs large schemas as concurrent shard calls through them.
+    """
+
+    @abstractmethod
+    def _call(self, schema: dict, instructions: str, file_path: str) -> Dict[str, Any]:
+        """One provider call for *schema*; returns the strategy output dict."""
+        pass
+
+    @abstractmethod
+    async def _acall(
+        self, schema: dict, instructions: str, file_path: str
+    ) -> Dict[str, Any]:
+        """Async ``_call``."""
+        pass
+
+    def _run_schema(
+        self, schema: dict, instructions: str, file_path: str
+    ) -> Dict[str, Any]:
+        """Extract *schema* with one call, or with concurrent shard calls.
+
+        Schemas with more than ``SHARD_MAX_FEATURES`` features are split (see
+        ``services.schema_sharding``) and the shard results merged.
+        """
+        shards = shard_schema(schema, SHARD_MAX_FEATURES)
+        if len(shards) == 1:
+            return self._call(schema, instructions, file_path)
+        logger.info("Extracting in %d shards", len(shards))
+        # Upload once up front rather than racing the upload in every shard.
+        self._provider_file_id(file_path)
+        with ThreadPoolExecutor(max_workers=len(shards)) as executor:
+            outputs = list(
+                executor.map(
+                    lambda shard: self._call(shard, instructions, file_path), shards
+                )
+            )
+        return self._merge_outputs(schema, outputs)
+
+    async def _arun_schema(
+        self, schema: dict, instructions: str, file_path: str
+    ) -> Dict[str, Any]:
+        """Async ``_run_schema``; shard calls run concurrently on the loop."""
+        shards = shard_schema(schema, SHARD_MAX_FEATURES)
+        if len(shards) == 1:
+            return await self._acall(schema, instructions, file_path)
+        logger.info("Extracting in %d shards", len(shards))
+        await asyncio.to_thread(self._provider_file_id, file_path)
+        outputs = await asyncio.gather(
+            *(self._acall(shard, instructions, file_path) for shard in shards)
+        )
+        return self._merge_outputs(schema, list(outputs))
+
+    @staticmethod
+    def _merge_outputs(schema: dict, outputs: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Merge shard outputs: one result, summed token counts."""
+        merged = {
+            "result": merge_results(schema, [out["result"] for out in outputs]),
+            "model": outputs[0]["model"],
+            "shards": len(outputs),
+        }
+        for field in (
+            "prompt_tokens",
+            "completion_tokens",
+            "cached_prompt_tokens",
+            "cache_write_tokens",
+        ):
+            merged[field] = sum(out.get(field, 0) or 0 for out in outputs)
+        return merged
@@ -4,19 +4,26 @@ OpenAI JSON Schema Strategy for Feature Extraction.
 Uses the OpenAI Responses API with a strict JSON schema output format.
 """
 
+import asyncio
 import json
 import logging
 from typing import Any, Dict, Optional
 
-from workers.strategies.extraction_strategy import ExtractionStrategy
+import openai
+from workers.services.async_clients import get_async_openai
+from workers.strategies.extraction_strategy import JSONSchemaStrategy
 
 logger = logging.getLogger(__name__)
 
 
-class OpenAIJSONSchemaStrategy(ExtractionStrategy):
+class OpenAIJSONSchemaStrategy(JSONSchemaStrategy):
     """Extract features using the OpenAI Responses API with JSON Schema output."""
 
     MODEL = "gpt-5.4-mini"
+    BATCH_PROVIDER = "openai"
+    FILE_PROVIDER = "openai"
+    STALE_FILE_ERRORS = (openai.NotFoundError,)
+    BAD_REQUEST_ERRORS = (openai.BadRequestError,)
 
     def get_strategy_name(self) -> str:
         return "openai_json_schema"
@@ -42,56 +49,168 @@ class OpenAIJSONSchemaStrategy(ExtractionStrategy):
 
             if not silent:
                 self.emitter.emit_status(message="Reading file...", progress=20)
-            file_content = self._encode_file_to_base64(file_path)
-            filename = file_path.split("/")[-1]
-
             instructions = self._resolve_instructions(custom_prompt)
 
             if not silent:
                 self.emitter.emit_status(message="Calling OpenAI API...", progress=30)
 
-            response = self.client.responses.create(
-                model=self.MODEL,
-                input=[
-                    {"role": "system", "content": instructions},
-                    {
-                        "role": "user",
-                        "content": [
-                            {
-                                "type": "input_file",
-                                "filename": filename,
-                                "file_data": f"data:application/pdf;base64,{file_content}",
-                            }
-                        ],
-                    },
-                ],
-                text={
-                    "format": {
-                        "type": "json_schema",
-                        "name": "extract_features",
-                        "strict": True,
-                        "schema": schema,
-                    },
-                    "verbosity": "medium",
-                },
-                reasoning={"effort": "medium", "summary": "auto"},
-                tools=[],
-                store=False,
-                include=[],
-            )
+            output = self._run_schema(schema, instructions, file_path)
 
             if not silent:
                 self.emitter.emit_status(message="Processing response...", progress=60)
 
-            result = json.loads(response.output_text)
+            return output
 
-            return {
-                "result": result,
-                "model": self.MODEL,
-                "prompt_tokens": response.usage.input_tokens,
-                "completion_tokens": response.usage.output_tokens,
-            }
+        except Exception as e:
+            logger.error("Error in OpenAIJSONSchemaStrategy: %s", e)
+            raise
+
+    async def aextract(
+        self,
+        file_path: str,
+        custom_prompt: Optional[str] = None,
+        feature_ids: Optional[list[str]] = None,
+        silent: bool = False,
+    ) -> Dict[str, Any]:
+        """``extract`` on the async client; blocking prep runs in a thread."""
+
+        try:
+            if not silent:
+                self.emitter.emit_status(
+                    message="Starting OpenAI JSON Schema extraction...", progress=0
+                )
+
+            if not silent:
+                self.emitter.emit_status(message="Building JSON schema...", progress=10)
+            schema = await asyncio.to_thread(self._build_json_schema, feature_ids)
+
+            if not silent:
+                self.emitter.emit_status(message="Reading file...", progress=20)
+            instructions = await asyncio.to_thread(
+                self._resolve_instructions, custom_prompt
+            )
+
+            if not silent:
+                self.emitter.emit_status(message="Calling OpenAI API...", progress=30)
+
+            output = await self._arun_schema(schema, instructions, file_path)
+
+            if not silent:
+                self.emitter.emit_status(message="Processing response...", progress=60)
+
+            return output
 
         except Exception as e:
             logger.error("Error in OpenAIJSONSchemaStrategy: %s", e)
             raise
+
+    def _call(self, schema: dict, instructions: str, file_path: str) -> Dict[str, Any]:
+        response = self._send_request(
+            file_path,
+            lambda file_id: self.build_request(
+                schema, instructions, file_path, file_id=file_id
+            ),
+            lambda request: self.client.responses.create(**request),
+        )
+        return self._output(response.output_text, response.usage)
+
+    async def _acall(
+        self, schema: dict, instructions: str, file_path: str
+    ) -> Dict[str, Any]:
+        client = get_async_openai(self.api_key)
+        response = await self._asend_request(
+            file_path,
+            lambda file_id: self.build_request(
+                schema, instructions, file_path, file_id=file_id
+            ),
+            lambda request: client.responses.create(**request),
+        )
+        return self._output(response.output_text, response.usage)
+
+    def build_request(
+        self,
+        schema: dict,
+        instructions: str,
+        file_path: str,
+        file_id: Optional[str] = None,
+    ) -> dict:
+        """Build the Responses API request body for one paper.
+
+        The paper is sent as preprocessed text when ``paper_text`` is set, else
+        referenced by *file_id* when given, else inlined as base64. The body is
+        plain JSON so it can be sent directly or written as a line of an OpenAI
+        Batch input file (endpoint ``/v1/responses``).
+
+        The instructions and the paper lead the input so repeated requests for
+        the same paper share a cacheable prefix; ``prompt_cache_key`` routes
+        them to the same cache.
+        """
+        if self.paper_text is not None:
+            paper = {"type": "input_text", "text": self.paper_text}
+        elif file_id:
+            paper = {"type": "input_file", "file_id": file_id}
+        else:
+            paper = {
+                "type": "input_file",
+                "filename": file_path.split("/")[-1],
+                "file_data": "data:application/pdf;base64,"
+                + self._encode_file_to_base64(file_path),
+            }
+        request = {
+            "model": self.MODEL,
+            "input": [
+                {"role": "system", "content": instructions},
+                {"role": "user", "content": [paper]},
+            ],
+            "text": {
+                "format": {
+                    "type": "json_schema",
+                    "name": "extract_features",
+                    "strict": True,
+                    "schema": schema,
+                },
+                "verbosity": "medium",
+            },
+            "reasoning": {"effort": "medium", "summary": "auto"},
+            "tools": [],
+            "store": False,
+            "include": [],
+        }
+        cache_key = self._prompt_cache_key()
+        if cache_key:
+            request["prompt_cache_key"] = cache_key
+        return request
+
+    @classmethod
+    def parse_response_body(cls, body: dict) -> Dict[str, Any]:
+        """Parse a raw Responses API body (as returned by the Batch API).
+
+        Raw bodies have no ``output_text`` convenience field, so the text is
+        collected from the ``output_text`` parts of the message items.
+        """
+        text = "".join(
+            part.get("text", "")
+            for item in body.get("output", [])
+            if item.get("type") == "message"
+            for part in item.get("content", [])
+            if part.get("type") == "output_text"
+        )
+        return cls._output(text, body.get("usage"))
+
+    @classmethod
+    def _output(cls, text: str, usage: Any) -> Dict[str, Any]:
+        """Parsed result and token usage.
+
+        ``input_tokens`` already includes the ``cached_tokens`` read from the
+        prompt cache; OpenAI does not bill cache writes.
+        """
+        return {
+            "result": json.loads(text),
+            "model": cls.MODEL,
+            "prompt_tokens": cls._usage_count(usage, "input_tokens"),
+            "completion_tokens": cls._usage_count(usage, "output_tokens"),
+            "cached_prompt_tokens": cls._usage_count(
+                usage, "input_tokens_details", "cached_tokens"
+            ),
+            "cache_write_tokens": 0,
+        }
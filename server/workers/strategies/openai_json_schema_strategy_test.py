@@ -154,3 +154,239 @@ def test_get_strategy_name():
     """The strategy reports a stable identifier."""
     strategy = OpenAIJSONSchemaStrategy(FakeResponsesClient("{}"), "p", FakeEmitter())
     assert strategy.get_strategy_name() == "openai_json_schema"
+
+
+@pytest.mark.unit
+async def test_aextract_uses_async_client_and_matches_sync_output(
+    tmp_path, patch_schema, monkeypatch
+):
+    """The async path sends the same request and parses the same output."""
+    sync_client = FakeResponsesClient(output_text=json.dumps({"paper": {"n": 1}}))
+    captured = {}
+
+    async def _acreate(**kwargs):
+        captured.update(kwargs)
+        return sync_client._response
+
+    monkeypatch.setattr(
+        "workers.strategies.openai_json_schema_strategy.get_async_openai",
+        lambda api_key: SimpleNamespace(responses=SimpleNamespace(create=_acreate)),
+    )
+    pdf_path = str(_make_pdf(tmp_path))
+    emitter = FakeEmitter()
+    strategy = OpenAIJSONSchemaStrategy(sync_client, "project-1", emitter)
+
+    async_out = await strategy.aextract(pdf_path, custom_prompt="custom")
+    sync_out = strategy.extract(pdf_path, custom_prompt="custom")
+
+    assert async_out == sync_out
+    assert captured == sync_client.last_kwargs
+    progress = [event["progress"] for event in emitter.events]
+    assert progress[:5] == [0, 10, 20, 30, 60]
+
+
+class FakeFilePool:
+    """Stand-in for ``ResourcePool`` that hands out one file id."""
+
+    def __init__(self):
+        self.uploads = []
+        self.invalidated = []
+
+    def file(self, file_hash, file_path):
+        self.uploads.append(file_hash)
+        return "file-abc"
+
+    def invalidate(self, kind, resource_id):
+        self.invalidated.append((kind, resource_id))
+
+
+@pytest.mark.unit
+def test_extract_references_uploaded_file_by_id(tmp_path, patch_schema, monkeypatch):
+    """With a known paper hash the PDF is referenced, not inlined."""
+    pool = FakeFilePool()
+    monkeypatch.setattr(OpenAIJSONSchemaStrategy, "_file_pool", lambda self: pool)
+    client = FakeResponsesClient(output_text=json.dumps({"paper": {}}))
+    strategy = OpenAIJSONSchemaStrategy(client, "project-1", FakeEmitter())
+    strategy.file_hash = "h" * 64
+
+    strategy.extract(str(_make_pdf(tmp_path)))
+
+    file_part = client.last_kwargs["input"][1]["content"][0]
+    assert file_part == {"type": "input_file", "file_id": "file-abc"}
+    assert pool.uploads == ["h" * 64]
+
+
+@pytest.mark.unit
+def test_extract_falls_back_inline_when_file_id_is_stale(
+    tmp_path, patch_schema, monkeypatch
+):
+    """A rejected file id is forgotten and the paper is sent inline once."""
+    import httpx
+    import openai
+
+    pool = FakeFilePool()
+    monkeypatch.setattr(OpenAIJSONSchemaStrategy, "_file_pool", lambda self: pool)
+    client = FakeResponsesClient(output_text=json.dumps({"paper": {}}))
+    sent = []
+
+    def _create(**kwargs):
+        sent.append(kwargs)
+        if "file_id" in kwargs["input"][1]["content"][0]:
+            raise openai.NotFoundError(
+                "No such file",
+                response=httpx.Response(404, request=httpx.Request("POST", "http://x")),
+                body=None,
+            )
+        return client._response
+
+    client.responses = SimpleNamespace(create=_create)
+    strategy = OpenAIJSONSchemaStrategy(client, "project-1", FakeEmitter())
+    strategy.file_hash = "h" * 64
+
+    out = strategy.extract(str(_make_pdf(tmp_path)))
+
+    assert out["result"] == {"paper": {}}
+    assert len(sent) == 2
+    assert "file_data" in sent[1]["input"][1]["content"][0]
+    assert pool.invalidated == [("file", "file-abc")]
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize(
+    "body, retried",
+    [
+        ({"message": "Invalid file", "code": "invalid_file", "param": None}, True),
+        ({"message": "Bad file_id", "code": None, "param": "input[1].file_id"}, True),
+        ({"message": "Too long", "code": "context_length_exceeded"}, False),
+        ({"message": "Invalid schema", "param": "text.format.schema"}, False),
+    ],
+)
+def test_only_bad_requests_about_the_file_are_retried_inline(
+    tmp_path, patch_schema, monkeypatch, body, retried
+):
+    """Other 400s keep the shared file id and are not resent."""
+    import httpx
+    import openai
+
+    pool = FakeFilePool()
+    monkeypatch.setattr(OpenAIJSONSchemaStrategy, "_file_pool", lambda self: pool)
+    client = FakeResponsesClient(output_text=json.dumps({"paper": {}}))
+    sent = []
+
+    def _create(**kwargs):
+        sent.append(kwargs)
+        if "file_id" in kwargs["input"][1]["content"][0]:
+            raise openai.BadRequestError(
+                body["message"],
+                response=httpx.Response(400, request=httpx.Request("POST", "http://x")),
+                body=body,
+            )
+        return client._response
+
+    client.responses = SimpleNamespace(create=_create)
+    strategy = OpenAIJSONSchemaStrategy(client, "project-1", FakeEmitter())
+    strategy.file_hash = "h" * 64
+    pdf = str(_make_pdf(tmp_path))
+
+    if retried:
+        assert strategy.extract(pdf)["result"] == {"paper": {}}
+        assert pool.invalidated == [("file", "file-abc")]
+    else:
+        with pytest.raises(openai.BadRequestError):
+            strategy.extract(pdf)
+        assert pool.invalidated == []
+    assert len(sent) == (2 if retried else 1)
+
+
+@pytest.mark.unit
+def test_extract_reports_cached_tokens_and_sets_prompt_cache_key(
+    tmp_path, patch_schema, monkeypatch
+):
+    """Repeated requests for one paper share a cache key; hits are reported."""
+    monkeypatch.setattr(
+        OpenAIJSONSchemaStrategy, "_provider_file_id", lambda self, path: None
+    )
+    client = FakeResponsesClient(output_text=json.dumps({"paper": {}}))
+    client._response.usage.input_tokens_details = SimpleNamespace(cached_tokens=100)
+    strategy = OpenAIJSONSchemaStrategy(client, "project-1", FakeEmitter())
+
+    strategy.extract(str(_make_pdf(tmp_path)))
+    assert "prompt_cache_key" not in client.last_kwargs
+
+    strategy.file_hash = "h" * 64
+    out = strategy.extract(str(_make_pdf(tmp_path)))
+    key = client.last_kwargs["prompt_cache_key"]
+    assert key.startswith("paper-") and len(key) <= 64
+    assert out["prompt_tokens"] == 123
+    assert out["cached_prompt_tokens"] == 100
+    assert out["cache_write_tokens"] == 0
+
+
+@pytest.mark.unit
+def test_parse_response_body_reads_cached_tokens():
+    body = {
+        "output": [
+            {"type": "message", "content": [{"type": "output_text", "text": "{}"}]}
+        ],
+        "usage": {
+            "input_tokens": 50,
+            "output_tokens": 5,
+            "input_tokens_details": {"cached_tokens": 40},
+        },
+    }
+
+    out = OpenAIJSONSchemaStrategy.parse_response_body(body)
+
+    assert (out["prompt_tokens"], out["cached_prompt_tokens"]) == (50, 40)
+
+
+@pytest.mark.unit
+def test_large_schema_is_extracted_in_merged_shards(
+    tmp_path, patch_schema, monkeypatch
+):
+    """Each shard call asks for part of the schema; the answers are merged."""
+    from workers.strategies import extraction_strategy
+
+    properties = {f"f{i}": {"type": "string"} for i in range(4)}
+    schema = {
+        "type": "object",
+        "properties": {
+            "paper": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": properties,
+                    "required": list(properties),
+                    "additionalProperties": False,
+                },
+            }
+        },
+        "required": ["paper"],
+        "additionalProperties": False,
+    }
+    monkeypatch.setattr(
+        OpenAIJSONSchemaStrategy, "_build_json_schema", lambda self, ids=None: schema
+    )
+    monkeypatch.setattr(extraction_strategy, "SHARD_MAX_FEATURES", 2)
+    client = FakeResponsesClient(output_text="")
+    sent = []
+
+    def _create(**kwargs):
+        sent.append(kwargs)
+        fields = kwargs["text"]["format"]["schema"]["properties"]["paper"]["items"]
+        answer = {"paper": [{name: name.upper() for name in fields["properties"]}]}
+        return SimpleNamespace(
+            output_text=json.dumps(answer), usage=client._response.usage
+        )
+
+    client.responses = SimpleNamespace(create=_create)
+    strategy = OpenAIJSONSchemaStrategy(client, "project-1", FakeEmitter())
+
+    out = strategy.extract(str(_make_pdf(tmp_path)))
+
+    assert len(sent) == 2
+    assert out["result"] == {
+        "paper": [{"f0": "F0", "f1": "F1", "f2": "F2", "f3": "F3"}]
+    }
+    assert out["shards"] == 2
+    assert out["prompt_tokens"] == 2 * 123
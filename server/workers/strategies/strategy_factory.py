@@ -2,7 +2,7 @@
 Strategy factory for creating extraction strategies.
 """
 
-from typing import Optional
+from typing import Optional, Type
 
 from openai import OpenAI
 from workers.services.socket_emitter import SocketEmmiter
@@ -53,14 +53,28 @@ class ExtractionStrategyFactory:
         Raises:
             ValueError: If strategy type is not recognized
         """
+        strategy_class = cls.get_strategy_class(strategy_type)
+        return strategy_class(client, project_id, emitter, api_key=api_key)
+
+    @classmethod
+    def get_strategy_class(cls, strategy_type: str) -> Type[ExtractionStrategy]:
+        """Return the class for *strategy_type* without instantiating it."""
         strategy_class = cls._strategies.get(strategy_type)
         if not strategy_class:
             raise ValueError(
                 f"Unknown strategy type: {strategy_type}. "
                 f"Available strategies: {list(cls._strategies.keys())}"
             )
+        return strategy_class
 
-        return strategy_class(client, project_id, emitter, api_key=api_key)
+    @classmethod
+    def get_batch_strategies(cls) -> list[str]:
+        """Get the strategy types that support provider batch mode."""
+        return [
+            name
+            for name, strategy_class in cls._strategies.items()
+            if strategy_class.BATCH_PROVIDER
+        ]
 
     @classmethod
     def get_available_strategies(cls) -> list[str]: